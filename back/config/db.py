@@ -1,7 +1,12 @@
+import asyncio
 import os
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from config.pool import opciones_engine, preparar_engine
+from config.replica import MonitorReplica, SesionEnrutada
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,7 +26,9 @@ url = URL.create(
     database=DB_NAME,
 )
 
-engine = create_engine(url)
+# Pool y timeouts configurables por entorno (ver config/pool.py)
+engine = create_engine(url, **opciones_engine())
+preparar_engine("primario", engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -31,4 +38,106 @@ def get_db():
     finally:
         db.close()
 
+# Engine asíncrono (asyncpg) para los endpoints async: la espera de la BD no
+# ocupa un hilo del threadpool, así un worker sostiene muchas peticiones en vuelo
+async_engine = create_async_engine(url.set(drivername="postgresql+asyncpg"), **opciones_engine(asincrono=True))
+preparar_engine("primario_async", async_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def en_hilo_con_sesion(fn):
+    """
+    Ejecuta fn(sesion) en un hilo del threadpool con una sesión sync del primario.
+    Para que los endpoints async consulten las cachés en memoria: su carga desde
+    la BD y los locks que comparten con los hilos sync no bloquean el event loop.
+    """
+    def ejecutar():
+        db = SessionLocal()
+        try:
+            return fn(db)
+        finally:
+            db.close()
+    return await asyncio.to_thread(ejecutar)
+
+# Réplica de lectura (o un segundo Postgres local como sustituto). Sin
+# DB_REPLICA_HOST no hay réplica y las sesiones de lectura usan el primario.
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST")
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", DB_PORT)
+DB_REPLICA_MAX_RETRASO_S = float(os.getenv("DB_REPLICA_MAX_RETRASO_S", "10"))
+DB_REPLICA_VERIFICAR_S = float(os.getenv("DB_REPLICA_VERIFICAR_S", "5"))
+
+replica_engine = None
+async_replica_engine = None
+if DB_REPLICA_HOST:
+    url_replica = url.set(
+        host=DB_REPLICA_HOST,
+        port=DB_REPLICA_PORT,
+        username=os.getenv("DB_REPLICA_USER", DB_USER),
+        password=os.getenv("DB_REPLICA_PASSWORD", DB_PASSWORD),
+        database=os.getenv("DB_REPLICA_NAME", DB_NAME),
+    )
+    entorno_replica = {**os.environ, "DB_PORT": str(DB_REPLICA_PORT)}
+    replica_engine = create_engine(url_replica, **opciones_engine(entorno=entorno_replica))
+    preparar_engine("replica", replica_engine, entorno_replica)
+    async_replica_engine = create_async_engine(
+        url_replica.set(drivername="postgresql+asyncpg"), **opciones_engine(asincrono=True, entorno=entorno_replica)
+    )
+    preparar_engine("replica_async", async_replica_engine, entorno_replica)
+
+monitor_replica = MonitorReplica(replica_engine, DB_REPLICA_MAX_RETRASO_S, DB_REPLICA_VERIFICAR_S)
+
+
+class SesionLectura(SesionEnrutada):
+    primario = engine
+    replica = replica_engine
+    monitor = monitor_replica
+
+
+class SesionLecturaAsync(SesionEnrutada):
+    primario = async_engine.sync_engine
+    replica = async_replica_engine.sync_engine if async_replica_engine is not None else None
+    monitor = monitor_replica
+
+
+SessionLecturaLocal = sessionmaker(autocommit=False, autoflush=False, class_=SesionLectura)
+AsyncSessionLecturaLocal = async_sessionmaker(
+    class_=AsyncSession, sync_session_class=SesionLecturaAsync, autoflush=False, expire_on_commit=False
+)
+
+def engine_lectura():
+    """Engine para consultas de solo lectura fuera de una sesión (réplica si está al día)."""
+    return monitor_replica.engine_lectura(engine, replica_engine)
+
+def get_db_lectura():
+    """Sesión para endpoints de solo lectura: réplica dentro del límite de retraso, si no el primario."""
+    db = SessionLecturaLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db_lectura():
+    async with AsyncSessionLecturaLocal() as db:
+        yield db
+
+@contextmanager
+def sesion_primaria(db):
+    """
+    Sesión con la que se cargan las cachés compartidas: siempre del primario.
+    Una sesión de lectura puede estar en la réplica, atrasada hasta
+    DB_REPLICA_MAX_RETRASO_S, y lo cargado quedaría en la caché hasta la
+    próxima invalidación; en ese caso se abre una sesión del primario.
+    """
+    if not isinstance(db, SesionEnrutada):
+        yield db
+        return
+    primaria = SessionLocal()
+    try:
+        yield primaria
+    finally:
+        primaria.close()
+
 Base = declarative_base()
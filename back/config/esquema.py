@@ -0,0 +1,93 @@
+"""
+Registro de esquema: reflexión de tablas una sola vez por engine.
+
+Los servicios que trabajan con tablas reflejadas (reporte, paradero,
+ruta_paradero) piden la tabla al registro en lugar de crear un MetaData y
+reflejar en cada llamada. La tabla resuelta y las columnas elegidas sobre
+ella quedan en caché hasta una invalidación explícita (por ejemplo, después
+de una migración).
+"""
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import MetaData, Table
+from sqlalchemy.engine import Engine
+
+
+class RegistroEsquema:
+    """Caché de tablas reflejadas y de columnas elegidas sobre ellas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metadatas: Dict[Engine, MetaData] = {}
+        # {(engine, candidatos): Table}
+        self._tablas: Dict[Tuple[Engine, Tuple[str, ...]], Table] = {}
+        self.reflexiones = 0
+
+    def tabla(self, engine: Engine, candidatos: Iterable[str]) -> Table:
+        """Primera tabla existente entre `candidatos` (se refleja solo la primera vez)."""
+        candidatos = tuple(candidatos)
+        clave = (engine, candidatos)
+        tabla = self._tablas.get(clave)
+        if tabla is not None:
+            return tabla
+        with self._lock:
+            tabla = self._tablas.get(clave)
+            if tabla is not None:
+                return tabla
+            meta = self._metadatas.setdefault(engine, MetaData())
+            last_err = None
+            for name in candidatos:
+                try:
+                    tabla = Table(name, meta, autoload_with=engine)
+                    break
+                except Exception as e:
+                    last_err = e
+                    continue
+            else:
+                raise RuntimeError(f"No se encontró ninguna tabla entre: {list(candidatos)}. Error último: {last_err}")
+            self.reflexiones += 1
+            self._tablas[clave] = tabla
+            return tabla
+
+    @staticmethod
+    def elegido(tabla: Table, clave: str, elegir: Callable[[Table], object]):
+        """
+        Resultado de `elegir(tabla)` guardado en tabla.info bajo `clave`.
+        Sirve para columnas de id, conjuntos de columnas insertables, etc.;
+        se descarta junto con la tabla al invalidar.
+        """
+        cache = tabla.info.setdefault("_elegidos", {})
+        if clave not in cache:
+            cache[clave] = elegir(tabla)
+        return cache[clave]
+
+    def precargar(self, engine: Engine, grupos: Iterable[Iterable[str]]) -> None:
+        """Refleja de antemano (al iniciar la app) los grupos de tablas candidatas."""
+        for candidatos in grupos:
+            try:
+                self.tabla(engine, candidatos)
+            except Exception as e:
+                print(f"⚠️ No se pudo reflejar {list(candidatos)} al iniciar: {e}")
+
+    def invalidar(self, engine: Optional[Engine] = None) -> None:
+        """Olvida las tablas reflejadas (de un engine o de todos)."""
+        with self._lock:
+            if engine is None:
+                self._tablas.clear()
+                self._metadatas.clear()
+            else:
+                self._tablas = {k: v for k, v in self._tablas.items() if k[0] is not engine}
+                self._metadatas.pop(engine, None)
+
+
+# Singleton global
+registro_esquema = RegistroEsquema()
+
+
+def get_registro_esquema() -> RegistroEsquema:
+    """
+    Obtener el registro de esquema compartido
+    Uso: from config.esquema import get_registro_esquema
+    """
+    return registro_esquema
@@ -0,0 +1,104 @@
+"""
+Notificación de cambios confirmados en la BD
+Permite que las cachés en memoria se invaliden o actualicen cuando una sesión
+hace commit de inserciones, actualizaciones o eliminaciones de ciertos modelos.
+
+Los commits de otras instancias o los cambios hechos directo en Supabase no
+pasan por estas sesiones: iniciar_caducidad_periodica avisa cada
+CACHES_CADUCIDAD_S a los oyentes de ciertos modelos con un cambio "externo"
+(sin filas), para que sus cachés se vuelvan a leer.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# Cada cambio es (accion, modelo, valores) con accion en {"insert", "update", "delete", "externo"}
+Cambio = Tuple[str, type, Dict]
+
+CADUCIDAD_S = float(os.getenv("CACHES_CADUCIDAD_S", "60"))
+
+_oyentes: List[Tuple[Tuple[type, ...], Callable[[List[Cambio]], None]]] = []
+_CLAVE_PENDIENTES = "_cambios_pendientes"
+
+
+def al_confirmar_cambios(modelos, callback: Callable[[List[Cambio]], None]) -> None:
+    """
+    Registra un callback que se ejecuta tras cada commit que haya tocado
+    alguno de los modelos indicados.
+
+    Args:
+        modelos: Tupla/lista de clases ORM a observar
+        callback: Función que recibe la lista de cambios confirmados
+    """
+    _oyentes.append((tuple(modelos), callback))
+
+
+def _es_observado(obj) -> bool:
+    return any(isinstance(obj, modelos) for modelos, _ in _oyentes)
+
+
+def _valores(obj) -> Dict:
+    """Copia de las columnas del objeto (después del commit quedan expiradas)"""
+    mapper = inspect(obj).mapper
+    return {attr.key: getattr(obj, attr.key, None) for attr in mapper.column_attrs}
+
+
+@event.listens_for(Session, "after_flush")
+def _registrar_cambios(session, flush_context):
+    if not _oyentes:
+        return
+    pendientes = session.info.setdefault(_CLAVE_PENDIENTES, [])
+    # En after_flush new/dirty/deleted todavía reflejan el estado previo al flush
+    for accion, objetos in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objetos:
+            if _es_observado(obj):
+                pendientes.append((accion, type(obj), _valores(obj)))
+
+
+def _despachar(cambios: List[Cambio]) -> None:
+    for modelos, callback in _oyentes:
+        relevantes = [c for c in cambios if issubclass(c[1], modelos)]
+        if not relevantes:
+            continue
+        try:
+            callback(relevantes)
+        except Exception as e:
+            # Una caché que falla no debe romper la transacción ya confirmada
+            print(f"❌ Error al notificar cambios a {getattr(callback, '__qualname__', callback)}: {e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _notificar_cambios(session):
+    cambios = session.info.pop(_CLAVE_PENDIENTES, None)
+    if cambios:
+        _despachar(cambios)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_cambios(session):
+    session.info.pop(_CLAVE_PENDIENTES, None)
+
+
+def solo_externos(cambios: List[Cambio]) -> bool:
+    """True si los cambios son solo avisos de caducidad (no hubo un commit en este proceso)."""
+    return all(accion == "externo" for accion, _, _ in cambios)
+
+
+def notificar_cambios_externos(modelos) -> None:
+    """Avisa a los oyentes de `modelos` que sus tablas pudieron cambiar fuera de este proceso."""
+    _despachar([("externo", modelo, {}) for modelo in modelos])
+
+
+def iniciar_caducidad_periodica(modelos, intervalo_s: float = CADUCIDAD_S) -> threading.Thread:
+    """Hilo de fondo que llama a notificar_cambios_externos(modelos) cada intervalo_s segundos."""
+    def ciclo():
+        while True:
+            time.sleep(intervalo_s)
+            notificar_cambios_externos(modelos)
+
+    hilo = threading.Thread(target=ciclo, name="caducidad-caches", daemon=True)
+    hilo.start()
+    return hilo
@@ -1,11 +1,50 @@
 """
 Firebase Admin SDK - Singleton
 Inicialización centralizada de Firebase Admin SDK para enviar push notifications
+
+La inicialización es perezosa: importar este módulo no carga el SDK (su import
+toma cientos de ms) ni lee credenciales. Se inicializa en el primer envío o,
+si main lo pide al arrancar, en un hilo de fondo (`inicializar_en_segundo_plano`),
+así la API levanta rápido y sin credenciales (p. ej. en tests).
+
+El envío a tokens (send_multicast) parte la lista en bloques del máximo que
+acepta FCM por llamada y los envía en paralelo. Los tokens que FCM reporta
+como no registrados o inválidos se entregan a los callbacks registrados con
+`al_invalidar_tokens` (p. ej. para borrarlos de usuario_base).
 """
 import os
-import firebase_admin
-from firebase_admin import credentials, messaging
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Máximo de tokens por llamada a send_each_for_multicast (límite de FCM)
+MAX_TOKENS_MULTICAST = 500
+PARALELISMO_MULTICAST = int(os.getenv("FCM_MULTICAST_PARALELISMO", "4"))
+
+_limpiezas_tokens: List[Callable[[List[str]], None]] = []
+
+
+def al_invalidar_tokens(callback: Callable[[List[str]], None]) -> None:
+    """Registra un callback que recibe los tokens que FCM dio por muertos en un envío."""
+    _limpiezas_tokens.append(callback)
+
+
+def _token_muerto(error: Exception) -> bool:
+    """True si el error indica que el token no sirve más (no un fallo transitorio)."""
+    from firebase_admin import exceptions, messaging
+
+    if isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+        return True
+    return isinstance(error, exceptions.InvalidArgumentError) and "registration token" in str(error).lower()
+
+
+def _reintentable(error: Exception) -> bool:
+    from firebase_admin import exceptions, messaging
+
+    return isinstance(error, (
+        messaging.QuotaExceededError, exceptions.UnavailableError,
+        exceptions.InternalError, exceptions.DeadlineExceededError,
+    ))
 
 
 class FirebaseAdmin:
@@ -13,53 +52,84 @@ class FirebaseAdmin:
     
     _instance: Optional['FirebaseAdmin'] = None
     _app = None
+    _ejecutor: Optional[ThreadPoolExecutor] = None
     
     def __new__(cls):
         """Implementar patrón Singleton"""
         if cls._instance is None:
             cls._instance = super(FirebaseAdmin, cls).__new__(cls)
             cls._instance._initialized = False
+            cls._instance._lock = threading.Lock()
         return cls._instance
     
-    def __init__(self):
-        """Inicializar Firebase Admin SDK si no está inicializado"""
+    @property
+    def inicializado(self) -> bool:
+        return self._initialized
+
+    def _get_ejecutor(self) -> ThreadPoolExecutor:
+        """Pool compartido para los bloques multicast (uno solo aunque dos envíos lleguen juntos)"""
+        if FirebaseAdmin._ejecutor is None:
+            with self._lock:
+                if FirebaseAdmin._ejecutor is None:
+                    FirebaseAdmin._ejecutor = ThreadPoolExecutor(
+                        max_workers=PARALELISMO_MULTICAST, thread_name_prefix="fcm-multicast"
+                    )
+        return FirebaseAdmin._ejecutor
+
+    def _inicializar(self) -> None:
+        """Inicializar Firebase Admin SDK si no está inicializado (primer uso)"""
         if self._initialized:
             return
-        
+        with self._lock:
+            if self._initialized:
+                return
+            try:
+                import firebase_admin
+                from firebase_admin import credentials
 
-        try:
-            # Construir credenciales desde variables de entorno
-            cred_dict = {
-                "type": os.getenv("FIREBASE_TYPE", "service_account"),
-                "project_id": os.getenv("FIREBASE_PROJECT_ID"),
-                "private_key_id": os.getenv("FIREBASE_PRIVATE_KEY_ID"),
-                "private_key": os.getenv("FIREBASE_PRIVATE_KEY", "").replace('\\n', '\n'),
-                "client_email": os.getenv("FIREBASE_CLIENT_EMAIL"),
-                "client_id": os.getenv("FIREBASE_CLIENT_ID"),
-                "auth_uri": os.getenv("FIREBASE_AUTH_URI"),
-                "token_uri": os.getenv("FIREBASE_TOKEN_URI"),
-                "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-                "client_x509_cert_url": os.getenv("FIREBASE_CLIENT_X509_CERT_URL", ""),
-                "universe_domain": os.getenv("FIREBASE_UNIVERSE_DOMAIN", "googleapis.com")
-            }
-            
-            # Validar que tenemos credenciales
-            if not cred_dict["project_id"]:
-                raise ValueError("❌ FIREBASE_PROJECT_ID no está configurado en .env")
-            if not cred_dict["private_key"]:
-                raise ValueError("❌ FIREBASE_PRIVATE_KEY no está configurado en .env")
-            
-            # Inicializar Firebase
-            cred = credentials.Certificate(cred_dict)
-            self._app = firebase_admin.initialize_app(cred)
-            self._initialized = True
-            print("✅ Firebase Admin SDK inicializado correctamente")
-            
-        except Exception as e:
-            self._initialized = False
-            
-            print(f"❌ Error al inicializar Firebase: {str(e)}")
-            raise
+                # Construir credenciales desde variables de entorno
+                cred_dict = {
+                    "type": os.getenv("FIREBASE_TYPE", "service_account"),
+                    "project_id": os.getenv("FIREBASE_PROJECT_ID"),
+                    "private_key_id": os.getenv("FIREBASE_PRIVATE_KEY_ID"),
+                    "private_key": os.getenv("FIREBASE_PRIVATE_KEY", "").replace('\\n', '\n'),
+                    "client_email": os.getenv("FIREBASE_CLIENT_EMAIL"),
+                    "client_id": os.getenv("FIREBASE_CLIENT_ID"),
+                    "auth_uri": os.getenv("FIREBASE_AUTH_URI"),
+                    "token_uri": os.getenv("FIREBASE_TOKEN_URI"),
+                    "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+                    "client_x509_cert_url": os.getenv("FIREBASE_CLIENT_X509_CERT_URL", ""),
+                    "universe_domain": os.getenv("FIREBASE_UNIVERSE_DOMAIN", "googleapis.com")
+                }
+                
+                # Validar que tenemos credenciales
+                if not cred_dict["project_id"]:
+                    raise ValueError("❌ FIREBASE_PROJECT_ID no está configurado en .env")
+                if not cred_dict["private_key"]:
+                    raise ValueError("❌ FIREBASE_PRIVATE_KEY no está configurado en .env")
+                
+                # Inicializar Firebase
+                cred = credentials.Certificate(cred_dict)
+                self._app = firebase_admin.initialize_app(cred)
+                self._initialized = True
+                print("✅ Firebase Admin SDK inicializado correctamente")
+                
+            except Exception as e:
+                print(f"❌ Error al inicializar Firebase: {str(e)}")
+                raise
+
+    def inicializar_en_segundo_plano(self) -> threading.Thread:
+        """Inicializar en un hilo de fondo para que el primer envío no espere (el arranque tampoco)"""
+        def inicializar():
+            try:
+                self._inicializar()
+            except Exception:
+                # Ya se informó; el primer envío lo reintenta y el outbox reintenta el envío
+                pass
+
+        hilo = threading.Thread(target=inicializar, name="firebase-init", daemon=True)
+        hilo.start()
+        return hilo
     
     def send_notification(
         self,
@@ -91,6 +161,9 @@ class FirebaseAdmin:
         if not token and not topic:
             raise ValueError("❌ Debe proporcionar 'token' o 'topic'")
         
+        self._inicializar()
+        from firebase_admin import messaging
+
         try:
             # Construir notificación
             notification = messaging.Notification(
@@ -137,6 +210,15 @@ class FirebaseAdmin:
             print(f"❌ Error al enviar notificación: {str(e)}")
             raise
     
+    def _enviar_bloque(self, message):
+        from firebase_admin import messaging
+
+        try:
+            return messaging.send_each_for_multicast(message)
+        except Exception as e:
+            # El bloque entero falló (red, credenciales...): vale para todos sus tokens
+            return e
+
     def send_multicast(
         self,
         title: str,
@@ -147,6 +229,10 @@ class FirebaseAdmin:
         """
         Enviar notificación a múltiples dispositivos
         
+        Los tokens se deduplican, se parten en bloques de MAX_TOKENS_MULTICAST y
+        los bloques se envían en paralelo. Los tokens no registrados o inválidos
+        se informan a los callbacks de `al_invalidar_tokens`.
+        
         Args:
             title: Título de la notificación
             body: Cuerpo del mensaje
@@ -154,36 +240,65 @@ class FirebaseAdmin:
             data: Datos adicionales (dict)
         
         Returns:
-            Dict con estadísticas de envío
+            Dict con estadísticas de envío: successful, failed, total, bloques,
+            failure_responses, tokens_invalidos, tokens_reintentables
         """
-        try:
-            message = messaging.MulticastMessage(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body,
-                ),
-                data=data or {},
-                tokens=tokens
-            )
-            
-            response = messaging.send_multicast(message)
-            
-            stats = {
-                "successful": response.successful,
-                "failed": response.failed,
-                "total": len(tokens),
-                "failure_responses": [str(err) for err in response.errors]
-            }
-            
-            print(f"✅ Notificación multicast enviada: {stats['successful']}/{stats['total']} exitosas")
-            if response.errors:
-                print(f"⚠️ Errores: {stats['failure_responses']}")
-            
+        tokens = list(dict.fromkeys(t for t in tokens if t))
+        stats: Dict = {
+            "successful": 0,
+            "failed": 0,
+            "total": len(tokens),
+            "bloques": 0,
+            "failure_responses": [],
+            "tokens_invalidos": [],
+            "tokens_reintentables": [],
+        }
+        if not tokens:
             return stats
-            
-        except Exception as e:
-            print(f"❌ Error al enviar notificación multicast: {str(e)}")
-            raise
+
+        self._inicializar()
+        from firebase_admin import messaging
+
+        notification = messaging.Notification(title=title, body=body)
+        bloques = [tokens[i:i + MAX_TOKENS_MULTICAST] for i in range(0, len(tokens), MAX_TOKENS_MULTICAST)]
+        mensajes = [messaging.MulticastMessage(notification=notification, data=data or {}, tokens=b) for b in bloques]
+
+        if len(mensajes) > 1:
+            respuestas = list(self._get_ejecutor().map(self._enviar_bloque, mensajes))
+        else:
+            respuestas = [self._enviar_bloque(m) for m in mensajes]
+
+        stats["bloques"] = len(bloques)
+        for bloque, respuesta in zip(bloques, respuestas):
+            if isinstance(respuesta, Exception):
+                stats["failed"] += len(bloque)
+                stats["failure_responses"].append(str(respuesta))
+                # Solo los fallos transitorios (red, cuota...); credenciales o configuración no se arreglan reintentando
+                if _reintentable(respuesta):
+                    stats["tokens_reintentables"].extend(bloque)
+                continue
+            stats["successful"] += respuesta.success_count
+            stats["failed"] += respuesta.failure_count
+            for token, r in zip(bloque, respuesta.responses):
+                if r.success:
+                    continue
+                stats["failure_responses"].append(str(r.exception))
+                if _token_muerto(r.exception):
+                    stats["tokens_invalidos"].append(token)
+                elif _reintentable(r.exception):
+                    stats["tokens_reintentables"].append(token)
+
+        print(f"✅ Notificación multicast enviada: {stats['successful']}/{stats['total']} exitosas en {stats['bloques']} bloques")
+        if stats["failed"]:
+            print(f"⚠️ Fallidas: {stats['failed']} ({len(stats['tokens_invalidos'])} tokens inválidos)")
+
+        if stats["tokens_invalidos"]:
+            for callback in _limpiezas_tokens:
+                try:
+                    callback(stats["tokens_invalidos"])
+                except Exception as e:
+                    print(f"❌ Error limpiando tokens FCM inválidos: {e}")
+        return stats
     
     def send_to_topic(
         self,
@@ -212,13 +327,12 @@ class FirebaseAdmin:
         )
     
     def get_app(self):
-        """Obtener instancia de la app Firebase"""
-        if not self._initialized:
-            raise RuntimeError("Firebase no está inicializado")
+        """Obtener instancia de la app Firebase (la inicializa si hace falta)"""
+        self._inicializar()
         return self._app
 
 
-# Singleton global
+# Singleton global (no inicializa el SDK: ver _inicializar)
 firebase_admin_instance = FirebaseAdmin()
 
 
@@ -0,0 +1,196 @@
+"""
+Pool de conexiones configurable y medido.
+
+Los parámetros del pool salen de variables de entorno (ver `opciones_engine`):
+
+    DB_POOL_SIZE              conexiones fijas por engine y proceso (5)
+    DB_MAX_OVERFLOW           conexiones extra en picos (10)
+    DB_POOL_TIMEOUT_S         espera máxima por una conexión libre (30)
+    DB_POOL_RECYCLE_S         reemplazar conexiones con más de N s (1800)
+    DB_POOL_PRE_PING          validar la conexión al sacarla del pool (true)
+    DB_STATEMENT_TIMEOUT_MS   statement_timeout de Postgres, 0 = sin límite (0)
+    DB_POOLER_MODE            "sesion" o "transaccion"; por defecto "transaccion"
+                              si DB_PORT es 6543 (pooler de Supabase en modo
+                              transacción) y "sesion" en otro caso
+
+En modo transacción el pooler reparte cada transacción en cualquier conexión
+del servidor: no se pueden usar sentencias preparadas con nombre (asyncpg las
+usa por defecto) ni parámetros de arranque, así que el statement_timeout se
+fija con `SET LOCAL` al empezar cada transacción.
+
+Cada checkout registra cuánto esperó por la conexión; `metricas_pools()`
+devuelve esas esperas y la utilización actual de cada pool.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Mapping
+
+import numpy as np
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+PUERTO_POOLER_TRANSACCION = "6543"
+# Ventana de muestras de espera para las métricas (últimos N checkouts)
+VENTANA_METRICAS = 1000
+
+# {nombre: engine}; se lee engine.pool en cada consulta porque dispose() lo reemplaza
+_engines: Dict[str, object] = {}
+_lock_engines = threading.Lock()
+
+
+def _verdadero(valor: str) -> bool:
+    return valor.strip().lower() in ("1", "true", "si", "sí", "yes")
+
+
+def modo_pooler(entorno: Mapping[str, str] = os.environ) -> str:
+    """'transaccion' o 'sesion' según DB_POOLER_MODE (o el puerto, si no se indica)."""
+    modo = entorno.get("DB_POOLER_MODE")
+    if not modo:
+        return "transaccion" if entorno.get("DB_PORT") == PUERTO_POOLER_TRANSACCION else "sesion"
+    modo = modo.strip().lower()
+    if modo in ("transaccion", "transacción", "transaction"):
+        return "transaccion"
+    if modo in ("sesion", "sesión", "session"):
+        return "sesion"
+    raise ValueError(f"DB_POOLER_MODE inválido: {modo}")
+
+
+class _EstadisticasPool:
+    """Esperas por checkout y timeouts de un pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.max_en_uso = 0
+        self._esperas_ms = deque(maxlen=VENTANA_METRICAS)
+
+    def registrar(self, espera_ms: float, en_uso: int) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self._esperas_ms.append(espera_ms)
+            self.max_en_uso = max(self.max_en_uso, en_uso)
+
+    def registrar_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def resumen(self) -> Dict:
+        with self._lock:
+            esperas = np.array(self._esperas_ms)
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "max_en_uso": self.max_en_uso,
+                "espera_ms": {
+                    "p50": round(float(np.percentile(esperas, 50)), 3) if len(esperas) else None,
+                    "p95": round(float(np.percentile(esperas, 95)), 3) if len(esperas) else None,
+                    "maximo": round(float(esperas.max()), 3) if len(esperas) else None,
+                },
+            }
+
+
+class _PoolMedido:
+    """Mixin para QueuePool: mide la espera de cada checkout."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estadisticas = _EstadisticasPool()
+
+    def recreate(self):
+        # engine.dispose() recrea el pool; conservar las métricas acumuladas
+        nuevo = super().recreate()
+        nuevo.estadisticas = self.estadisticas
+        return nuevo
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super().connect()
+        except exc.TimeoutError:
+            self.estadisticas.registrar_timeout()
+            raise
+        self.estadisticas.registrar((time.perf_counter() - inicio) * 1000, self.checkedout())
+        return conexion
+
+    def metricas(self) -> Dict:
+        capacidad = self.size() + max(self._max_overflow, 0)
+        en_uso = self.checkedout()
+        return {
+            "tamano": self.size(),
+            "max_overflow": self._max_overflow,
+            "en_uso": en_uso,
+            "en_reposo": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "utilizacion": round(en_uso / capacidad, 3) if capacidad else None,
+            **self.estadisticas.resumen(),
+        }
+
+
+class PoolMedido(_PoolMedido, QueuePool):
+    """QueuePool con métricas de checkout (engine síncrono)."""
+
+
+class PoolMedidoAsync(_PoolMedido, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool con métricas de checkout (engine asyncpg)."""
+
+
+def opciones_engine(asincrono: bool = False, entorno: Mapping[str, str] = os.environ) -> Dict:
+    """Argumentos de create_engine / create_async_engine según el entorno."""
+    modo = modo_pooler(entorno)
+    timeout_ms = int(entorno.get("DB_STATEMENT_TIMEOUT_MS", "0"))
+    connect_args: Dict = {}
+    if asincrono and modo == "transaccion":
+        # Sin caché de sentencias preparadas y con nombres únicos: el pooler
+        # puede ejecutar cada sentencia en otra conexión del servidor
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    if timeout_ms and modo == "sesion":
+        if asincrono:
+            connect_args["server_settings"] = {"statement_timeout": str(timeout_ms)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout_ms}"
+    return {
+        "poolclass": PoolMedidoAsync if asincrono else PoolMedido,
+        "pool_size": int(entorno.get("DB_POOL_SIZE", "5")),
+        "max_overflow": int(entorno.get("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(entorno.get("DB_POOL_TIMEOUT_S", "30")),
+        "pool_recycle": int(entorno.get("DB_POOL_RECYCLE_S", "1800")),
+        "pool_pre_ping": _verdadero(entorno.get("DB_POOL_PRE_PING", "true")),
+        "connect_args": connect_args,
+        "pool_use_lifo": True,
+        "pool_reset_on_return": "rollback",
+    }
+
+
+def preparar_engine(nombre: str, engine, entorno: Mapping[str, str] = os.environ) -> None:
+    """
+    Registra el engine (o AsyncEngine) para metricas_pools() y, en modo
+    transacción con statement_timeout, fija el timeout con `SET LOCAL` al
+    inicio de cada transacción (los parámetros de arranque no llegan al servidor).
+    """
+    engine = getattr(engine, "sync_engine", engine)
+    with _lock_engines:
+        _engines[nombre] = engine
+    timeout_ms = int(entorno.get("DB_STATEMENT_TIMEOUT_MS", "0"))
+    if not timeout_ms or modo_pooler(entorno) != "transaccion":
+        return
+
+    @event.listens_for(engine, "begin")
+    def _statement_timeout(conexion):
+        conexion.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+def metricas_pools() -> Dict[str, Dict]:
+    """{nombre: métricas} de los engines registrados cuyo pool es medido."""
+    with _lock_engines:
+        engines = dict(_engines)
+    return {
+        nombre: engine.pool.metricas()
+        for nombre, engine in engines.items()
+        if isinstance(engine.pool, _PoolMedido)
+    }
@@ -0,0 +1,147 @@
+"""
+Enrutamiento de lecturas a una réplica de solo lectura.
+
+Un hilo de fondo mide periódicamente el retraso de replicación de la réplica.
+Mientras ese retraso esté dentro del límite (DB_REPLICA_MAX_RETRASO_S) las
+sesiones de lectura usan la réplica; si la réplica se atrasa, no responde o
+aún no se verificó, las lecturas vuelven al primario. Sin réplica configurada
+todo va al primario.
+
+`SesionEnrutada` elige el engine en `get_bind`: las escrituras (flush o
+sentencias DML) van siempre al primario y, una vez que la sesión escribió,
+también sus lecturas siguientes (lee lo que acaba de escribir). Una sesión
+que empezó a leer de un engine se queda en él hasta terminar la transacción.
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+# Réplica física: segundos desde la última transacción aplicada, 0 si ya
+# aplicó todo lo recibido. Servidor que no está en recuperación (p. ej. un
+# Postgres local usado como réplica de prueba): 0.
+SQL_RETRASO = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class MonitorReplica:
+    """Retraso de la réplica medido en segundo plano."""
+
+    def __init__(self, replica: Optional[Engine], max_retraso_s: float = 10.0,
+                 intervalo_s: float = 5.0, reloj=time.monotonic):
+        self.replica = replica
+        self.max_retraso_s = max_retraso_s
+        self.intervalo_s = intervalo_s
+        self._reloj = reloj
+        self.retraso_s: Optional[float] = None
+        self._verificado_en: Optional[float] = None
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        # Métricas
+        self.verificaciones = 0
+        self.errores = 0
+        self.lecturas_replica = 0
+        self.lecturas_primario = 0
+
+    def verificar(self) -> Optional[float]:
+        """Consulta el retraso actual; None si la réplica no responde."""
+        if self.replica is None:
+            return None
+        try:
+            with self.replica.connect() as conexion:
+                retraso = conexion.execute(SQL_RETRASO).scalar()
+            self.retraso_s = float(retraso or 0)
+        except SQLAlchemyError as e:
+            print("⚠️ Réplica de lectura no disponible:", e)
+            self.retraso_s = None
+            self.errores += 1
+        self._verificado_en = self._reloj()
+        self.verificaciones += 1
+        return self.retraso_s
+
+    def disponible(self) -> bool:
+        """True si la última verificación es reciente y el retraso está dentro del límite."""
+        if self.replica is None or self.retraso_s is None or self._verificado_en is None:
+            return False
+        # Una verificación vieja (hilo detenido o bloqueado) no garantiza el límite
+        if self._reloj() - self._verificado_en > 3 * self.intervalo_s:
+            return False
+        return self.retraso_s <= self.max_retraso_s
+
+    def engine_lectura(self, primario: Engine, replica: Optional[Engine] = None) -> Engine:
+        """Engine para una lectura: `replica` (o la monitoreada) si está al día, si no el primario."""
+        if self.disponible():
+            self.lecturas_replica += 1
+            return replica or self.replica
+        self.lecturas_primario += 1
+        return primario
+
+    def _bucle(self) -> None:
+        while not self._detener.is_set():
+            self.verificar()
+            self._detener.wait(self.intervalo_s)
+
+    def iniciar(self) -> None:
+        if self.replica is None or (self._hilo and self._hilo.is_alive()):
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="monitor-replica", daemon=True)
+        self._hilo.start()
+        print("✅ Monitor de réplica de lectura iniciado")
+
+    def detener(self) -> None:
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout=self.intervalo_s)
+
+    def metricas(self) -> Dict:
+        return {
+            "configurada": self.replica is not None,
+            "disponible": self.disponible(),
+            "retraso_s": self.retraso_s,
+            "max_retraso_s": self.max_retraso_s,
+            "verificaciones": self.verificaciones,
+            "errores": self.errores,
+            "lecturas_replica": self.lecturas_replica,
+            "lecturas_primario": self.lecturas_primario,
+        }
+
+
+class SesionEnrutada(Session):
+    """
+    Sesión de lectura: réplica mientras esté al día, primario para escrituras.
+    Las subclases fijan `primario`, `replica` y `monitor`.
+    """
+
+    primario: Engine = None
+    replica: Optional[Engine] = None
+    monitor: MonitorReplica = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._escribio = False
+        self._engine_lectura: Optional[Engine] = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or getattr(clause, "is_dml", False):
+            self._escribio = True
+        if self._escribio:
+            return self.primario
+        if self._engine_lectura is None:
+            self._engine_lectura = self.monitor.engine_lectura(self.primario, self.replica)
+        return self._engine_lectura
+
+    def commit(self):
+        super().commit()
+        self._engine_lectura = None
+
+    def rollback(self):
+        super().rollback()
+        self._engine_lectura = None
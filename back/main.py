@@ -1,5 +1,12 @@
+import asyncio
 from fastapi import FastAPI
-from config.db import Base, engine
+from config.db import Base, engine, SessionLocal, async_engine, async_replica_engine, monitor_replica
+from config.esquema import get_registro_esquema
+from config.eventos import iniciar_caducidad_periodica
+from models.Paradero import Paradero
+from models.Ruta import Ruta
+from models.RutaParadero import RutaParadero
+from models.UsuarioBase import UsuarioBase
 from fastapi.middleware.cors import CORSMiddleware
 from routes.ruta_routes import router as ruta_routes
 from routes.usuario_routes import router as usuario_routes
@@ -14,6 +21,18 @@ from routes.comentario_paradero_routes import router as comentario_paradero_rout
 from routes.feedback_routes import router as feedback_routes
 from routes.fcm_test_routes import router as fcm_test_routes
 from routes.shared_location_routes import router as shared_location_routes
+from routes.eta_routes import router as eta_routes
+from routes.metricas_routes import router as metricas_routes
+from routes.tiempo_real_routes import router as tiempo_real_routes
+from routes.buscar_routes import router as buscar_routes
+from services.red_rutas import get_red_rutas
+from services.velocidades_tramos import get_velocidades_tramos, iniciar_actualizacion_periodica
+from services.destinatarios_alertas import get_destinatarios_alertas, iniciar_recarga_periodica
+from services.ingesta_posiciones import get_ingesta_posiciones, iniciar_vaciado_periodico
+from services.shared_location_service import iniciar_limpieza_periodica
+from services.resumen_reportes import rellenar_si_vacio
+from services.despacho_notificaciones import get_despachador_notificaciones, TransporteFirebase
+from config.firebase import get_firebase_admin
 
 app = FastAPI(
     title="API de Inforrojo", 
@@ -35,6 +54,45 @@ app.add_middleware(
     allow_headers=["*"], 
 )
 
+@app.on_event("startup")
+def iniciar_tareas_de_fondo():
+    # Reflejar una sola vez las tablas que usan los servicios de reportes y paraderos
+    get_registro_esquema().precargar(engine, [
+        ("reporte", "reportes", "report"),
+        ("paradero", "paraderos"),
+        ("ruta_paradero", "ruta_paraderos", "public.ruta_paradero"),
+    ])
+    # Primer despliegue del resumen diario: rellenarlo desde reporte antes de servir el dashboard
+    rellenar_si_vacio(engine)
+    # Agregación incremental de velocidades por tramo (alimenta el ETA por ruta)
+    iniciar_actualizacion_periodica(get_velocidades_tramos(), SessionLocal, get_red_rutas())
+    # Tokens y viajes para dirigir las alertas: carga al arrancar y relectura periódica
+    iniciar_recarga_periodica(get_destinatarios_alertas(), SessionLocal)
+    # Escritura por lotes de las posiciones GPS de corredores
+    iniciar_vaciado_periodico(get_ingesta_posiciones())
+    # Limpieza de tokens de ubicación compartida expirados
+    iniciar_limpieza_periodica()
+    # Releer periódicamente las cachés de la red y la grilla de pasajeros (cambios de otras instancias o directos en la BD)
+    iniciar_caducidad_periodica((Ruta, RutaParadero, Paradero, UsuarioBase))
+    # Medición del retraso de la réplica de lectura (si hay una configurada)
+    monitor_replica.iniciar()
+    # Envío de notificaciones push desde el outbox
+    despachador = get_despachador_notificaciones()
+    despachador.iniciar()
+    # Credenciales y SDK de Firebase en segundo plano: el arranque no los espera
+    if isinstance(despachador.transporte, TransporteFirebase):
+        get_firebase_admin().inicializar_en_segundo_plano()
+
+@app.on_event("shutdown")
+async def detener_tareas_de_fondo():
+    # No perder las posiciones recibidas que aún no se escribieron (en un hilo: escribe en la BD)
+    await asyncio.to_thread(get_ingesta_posiciones().vaciar)
+    await asyncio.to_thread(monitor_replica.detener)
+    await asyncio.to_thread(get_despachador_notificaciones().detener)
+    await async_engine.dispose()
+    if async_replica_engine is not None:
+        await async_replica_engine.dispose()
+
 @app.get("/")
 def root():
     return {"msg": "Hello World probando"}
@@ -52,3 +110,7 @@ app.include_router(comentario_paradero_routes)
 app.include_router(feedback_routes)
 app.include_router(fcm_test_routes)
 app.include_router(shared_location_routes)
+app.include_router(eta_routes)
+app.include_router(metricas_routes)
+app.include_router(tiempo_real_routes)
+app.include_router(buscar_routes)
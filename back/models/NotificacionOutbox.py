@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Text, JSON, TIMESTAMP, Index
+from config.db import Base
+
+class NotificacionOutbox(Base):
+    """Notificación push pendiente de envío (ver services/despacho_notificaciones.py)"""
+    __tablename__ = "notificacion_outbox"
+    __table_args__ = (
+        Index("ix_notificacion_outbox_pendientes", "estado", "proximo_intento"),
+        {"schema": "public"},
+    )
+
+    id_notificacion = Column(Integer, primary_key=True, autoincrement=True)
+    creada_en = Column(TIMESTAMP(timezone=True), nullable=False)
+    topic = Column(String(100), nullable=True)
+    tokens = Column(JSON, nullable=True)
+    titulo = Column(Text, nullable=False)
+    cuerpo = Column(Text, nullable=True)
+    datos = Column(JSON, nullable=True)
+    id_reporte = Column(Integer, nullable=True)
+    estado = Column(String(16), nullable=False, default="pendiente")
+    intentos = Column(Integer, nullable=False, default=0)
+    proximo_intento = Column(TIMESTAMP(timezone=True), nullable=False)
+    enviada_en = Column(TIMESTAMP(timezone=True), nullable=True)
+    ultimo_error = Column(Text, nullable=True)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, Date
+from config.db import Base
+
+class ResumenReporteDia(Base):
+    """Reportes por (tipo, día, corredor, ruta); 0 = sin tipo/corredor/ruta (ver services/resumen_reportes.py)"""
+    __tablename__ = "reporte_resumen_dia"
+    __table_args__ = {"schema": "public"}
+
+    id_tipo_reporte = Column(Integer, primary_key=True)
+    dia = Column(Date, primary_key=True)
+    id_corredor = Column(Integer, primary_key=True)
+    id_ruta = Column(Integer, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, Boolean, TIMESTAMP
+from config.db import Base
+
+class TokenComparticion(Base):
+    __tablename__ = "token_comparticion"
+    __table_args__ = {"schema": "public"}
+
+    token = Column(String(64), primary_key=True)
+    usuario_id = Column(Integer, nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False, index=True)  # UTC sin zona horaria
+    is_active = Column(Boolean, nullable=False, default=True)
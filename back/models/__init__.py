@@ -10,3 +10,6 @@ from .HistorialUso import HistorialUso
 from .TipoReporte import TipoReporte
 from .Ruta import Ruta
 from .ComentarioUsuarioParadero import ComentarioUsuarioParadero
+from .TokenComparticion import TokenComparticion
+from .ResumenReporteDia import ResumenReporteDia
+from .NotificacionOutbox import NotificacionOutbox
\ No newline at end of file
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, status, Body, Header
+from fastapi import APIRouter, HTTPException, status, Body, Header, Request
 from typing import Optional, Dict
 from services.alerta_masiva_service import AlertaMasivaService
 from services.auth_service import AuthService
+from services.snapshot_red import get_snapshot_red
 import traceback
 
 service = AlertaMasivaService()
@@ -37,7 +38,7 @@ def health():
     return {"ok": True}
 
 @router.get("/datos-formulario/")
-def obtener_datos_formulario():
+def obtener_datos_formulario(request: Request):
     """
     Obtiene todos los datos necesarios para el formulario de alerta masiva:
     - Lista de corredores
@@ -45,11 +46,11 @@ def obtener_datos_formulario():
     - Lista de paraderos
     """
     try:
-        datos = service.obtener_datos_formulario()
-        return {
-            "success": True,
-            "data": datos
-        }
+        return get_snapshot_red().respuesta(
+            request,
+            "datos_formulario",
+            lambda: {"success": True, "data": service.obtener_datos_formulario()},
+        )
     except Exception as e:
         print(f"[ERROR] /datos-formulario: {e}")
         traceback.print_exc()
@@ -0,0 +1,24 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from config.db import get_db
+from services.indice_texto import get_indice_nombres
+
+router = APIRouter(
+    prefix="/buscar",
+    tags=["buscar"]
+)
+
+
+@router.get("")
+def buscar(
+    q: str = Query(..., min_length=1, description="Texto a buscar (parcial, sin distinguir tildes)"),
+    tipo: Optional[Literal["ruta", "paradero"]] = Query(None, description="Limitar a rutas o paraderos"),
+    limite: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """
+    Autocompletado de rutas y paraderos por nombre.
+    Respuesta: [ { tipo: "ruta" | "paradero", id, nombre } ] (más relevantes primero)
+    """
+    return get_indice_nombres().buscar(db, q, tipo=tipo, limite=limite)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Body, Header
 from sqlalchemy.orm import Session
-from config.db import get_db
+from config.db import get_db, get_db_lectura
 from services.comentario_paradero_service import ComentarioParaderoService
 
 router = APIRouter(
@@ -9,14 +9,14 @@ router = APIRouter(
 )
 
 @router.get("/perfil/{nombre_paradero}/")
-def obtener_paradero(nombre_paradero : str, db: Session = Depends(get_db)):
+def obtener_paradero(nombre_paradero : str, db: Session = Depends(get_db_lectura)):
    corredor = ComentarioParaderoService(db).obtener_paradero_perfil_nombre(nombre_paradero)
    if not corredor:
        raise HTTPException(status_code=404, detail="Corredor no encontrado")
    return corredor
 
 @router.get("/{id_paradero}/")
-def obtener_comentarios_paradero(id_paradero: int, db: Session = Depends(get_db)):
+def obtener_comentarios_paradero(id_paradero: int, db: Session = Depends(get_db_lectura)):
     comentarios = ComentarioParaderoService(db).obtener_comentarios(id_paradero)
     return comentarios
 
@@ -1,9 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from services.DiagramaClases.corredor_service import CorredorService
-from config.db import get_db
+from services.DiagramaClases.corredor_service_async import CorredorServiceAsync
+from services.ingesta_posiciones import get_ingesta_posiciones
+from services.posiciones_corredores import get_posiciones_corredores
+from config.db import get_db, get_async_db, get_async_db_lectura
 from fastapi import HTTPException
 
+MAX_PINGS_LOTE = 5000
+
+
+class PosicionCorredor(BaseModel):
+    id_corredor: int
+    ubicacion_lat: float
+    ubicacion_lng: float
+    estado: Optional[str] = None
+
 
 router = APIRouter(
    prefix="/corredor",
@@ -29,27 +44,44 @@ def crear_corredor(
 
 @router.get("")
 @router.get("/")
-def listar_corredores(db: Session = Depends(get_db)):
-   return CorredorService(db).get_corredores()
+async def listar_corredores(db: AsyncSession = Depends(get_async_db)):
+   return await CorredorServiceAsync(db).get_corredores()
+
+
+@router.get("/pasajeros")
+async def contar_pasajeros_corredores(
+   radio_km: float = Query(0.5, gt=0, description="Radio en km alrededor de cada corredor"),
+   db: AsyncSession = Depends(get_async_db)
+):
+   """
+   Devuelve el número de pasajeros cercanos a cada corredor con ubicación en una sola llamada.
+   Respuesta: [ { id_corredor, numero_pasajeros } ]
+   """
+   return await CorredorServiceAsync(db).get_pasajeros_por_corredor(radio_km=radio_km)
 
 
 @router.get("/{id_corredor}/")
-def obtener_corredor(id_corredor: int, db: Session = Depends(get_db)):
-   corredor = CorredorService(db).get_corredor_by_id(id_corredor)
+async def obtener_corredor(id_corredor: int, db: AsyncSession = Depends(get_async_db)):
+   corredor = await CorredorServiceAsync(db).get_corredor_by_id(id_corredor)
    if not corredor:
        raise HTTPException(status_code=404, detail="Corredor no encontrado")
    return corredor
 
 
 @router.get("/{id_corredor}/eta")
-def obtener_eta_corredor(id_corredor: int, paradero_id: int, db: Session = Depends(get_db)):
+async def obtener_eta_corredor(
+    id_corredor: int,
+    paradero_id: int,
+    ruta_id: Optional[int] = Query(None, description="Si se indica, la distancia se mide siguiendo la ruta"),
+    db: AsyncSession = Depends(get_async_db_lectura)
+):
     """
     Calcula y devuelve el ETA (minutos) desde el corredor dado hasta el paradero indicado.
     Respuesta: { corredor_id, paradero_id, distancia_km, eta_minutos }
     """
-    servicio = CorredorService(db)
+    servicio = CorredorServiceAsync(db)
     try:
-        result = servicio.calcular_eta(id_corredor=id_corredor, id_paradero=paradero_id)
+        result = await servicio.calcular_eta(id_corredor=id_corredor, id_paradero=paradero_id, id_ruta=ruta_id)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
@@ -66,41 +98,41 @@ def actualizar_ubicacion_corredor(
 ):
     """
     Actualiza la ubicación (ubicacion_lat, ubicacion_lng) y el estado del corredor.
+    La posición queda disponible al instante en memoria y se escribe en la BD en el próximo lote.
     """
-    corredor_service = CorredorService(db)
-    corredor = corredor_service.get_corredor_by_id(id_corredor)
-
-    if not corredor:
+    if not get_ingesta_posiciones().registrar(db, id_corredor, ubicacion_lat, ubicacion_lng, estado):
         raise HTTPException(status_code=404, detail="Corredor no encontrado")
 
-    corredor_service.actualizar_ubicacion(
-        id_corredor=id_corredor,
-        ubicacion_lat=ubicacion_lat,
-        ubicacion_lng=ubicacion_lng,
-        estado=estado
-    )
-
     return {"mensaje": "Ubicación y estado actualizados correctamente"}
 
+@router.post("/ubicaciones")
+def actualizar_ubicaciones_corredores(pings: List[PosicionCorredor] = Body(...), db: Session = Depends(get_db)):
+    """
+    Ingesta de varias posiciones en una sola llamada.
+    Respuesta: { aceptadas, rechazadas: [id_corredor] } (rechazadas = corredores inexistentes)
+    """
+    if len(pings) > MAX_PINGS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_PINGS_LOTE} posiciones por lote")
+    return get_ingesta_posiciones().registrar_lote(db, (p.model_dump() for p in pings))
+
 @router.get("/{id_corredor}/ubicacion")
 def obtener_ubicacion_corredor(id_corredor: int, db: Session = Depends(get_db)):
     """
     Retorna la ubicación actual (latitud, longitud, estado)
     de un corredor por su ID.
     """
-    corredor_service = CorredorService(db)
-    corredor = corredor_service.get_corredor_by_id(id_corredor)
+    posicion = get_posiciones_corredores().obtener(db, id_corredor)
 
-    if not corredor:
+    if posicion is None:
         raise HTTPException(status_code=404, detail="Corredor no encontrado")
 
-    if corredor.ubicacion_lat is None or corredor.ubicacion_lng is None:
+    latitud, longitud, estado = posicion
+    if latitud is None or longitud is None:
         raise HTTPException(status_code=404, detail="Corredor sin ubicación registrada")
 
     return {
-        "id_corredor": corredor.id_corredor,
-        "latitud": corredor.ubicacion_lat,
-        "longitud": corredor.ubicacion_lng,
-        "estado": corredor.estado
+        "id_corredor": id_corredor,
+        "latitud": latitud,
+        "longitud": longitud,
+        "estado": estado
     }
-
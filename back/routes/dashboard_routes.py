@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from config.db import get_db
-from services.dashboard_service import DashboardService
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.db import get_async_db_lectura
+from services.dashboard_service_async import DashboardServiceAsync
 
 router = APIRouter(
    prefix="/dashboard",
@@ -9,5 +9,5 @@ router = APIRouter(
 )
 
 @router.get("/{dias_cant}/")
-def obtenerDashboard(dias_cant: int,db: Session = Depends(get_db)):
-   return DashboardService(db).getDashboard(dias_serie=dias_cant)
\ No newline at end of file
+async def obtenerDashboard(dias_cant: int, db: AsyncSession = Depends(get_async_db_lectura)):
+   return await DashboardServiceAsync(db).getDashboard(dias_serie=dias_cant)
\ No newline at end of file
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from config.db import get_db_lectura
+from services.DiagramaClases.eta_service import EtaService
+
+MAX_PARADEROS_MATRIZ = 500
+
+router = APIRouter(
+    prefix="/eta",
+    tags=["eta"]
+)
+
+
+@router.get("/matrix")
+def obtener_matriz_eta(
+    paraderos: Optional[List[int]] = Query(None, description="Ids de paradero (?paraderos=1&paraderos=2)"),
+    min_lat: Optional[float] = Query(None, description="Bounding box: latitud mínima"),
+    min_lng: Optional[float] = Query(None, description="Bounding box: longitud mínima"),
+    max_lat: Optional[float] = Query(None, description="Bounding box: latitud máxima"),
+    max_lng: Optional[float] = Query(None, description="Bounding box: longitud máxima"),
+    top_k: int = Query(3, ge=1, le=20, description="Cantidad de corredores por paradero"),
+    db: Session = Depends(get_db_lectura)
+):
+    """
+    Devuelve el mejor ETA y los top-k corredores para cada paradero pedido,
+    por lista de ids o por bounding box, en una sola llamada.
+    Los ids repetidos se responden una vez; si alguno no existe responde 404.
+    Respuesta: [ { paradero_id, mejor: {corredor_id, eta_minutos, distancia_km} | null, top: [...] } ]
+    """
+    bbox = (min_lat, min_lng, max_lat, max_lng)
+    usa_bbox = all(v is not None for v in bbox)
+    if not paraderos and not usa_bbox:
+        raise HTTPException(status_code=400, detail="Debe indicar 'paraderos' o el bounding box completo (min_lat, min_lng, max_lat, max_lng)")
+    if paraderos:
+        paraderos = list(dict.fromkeys(paraderos))
+    if paraderos and len(paraderos) > MAX_PARADEROS_MATRIZ:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_PARADEROS_MATRIZ} paraderos por consulta")
+
+    try:
+        return EtaService(db=db).calcular_matriz(
+            ids_paradero=paraderos or None,
+            bbox=bbox if usa_bbox and not paraderos else None,
+            top_k=top_k,
+            max_paraderos=MAX_PARADEROS_MATRIZ,
+        )
+    except LookupError as le:
+        raise HTTPException(status_code=404, detail=str(le))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@router.get("/ruta/{id_ruta}/corredor/{id_corredor}")
+def obtener_etas_en_ruta(id_ruta: int, id_corredor: int, db: Session = Depends(get_db_lectura)):
+    """
+    ETA del corredor a cada paradero que le queda por delante en la ruta,
+    medido a lo largo de la ruta (orden de RutaParadero).
+    Respuesta: { ruta_id, corredor_id, avance_km, desvio_km, paraderos: [ { paradero_id, nombre, orden, distancia_km, eta_minutos } ] }
+    """
+    try:
+        return EtaService(db=db).etas_en_ruta(id_ruta, id_corredor)
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
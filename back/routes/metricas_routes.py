@@ -0,0 +1,92 @@
+from fastapi import APIRouter
+from config.db import monitor_replica
+from config.pool import metricas_pools
+from services.DiagramaClases.SistemaFiltros import get_estadisticas_filtros
+from services.despacho_notificaciones import get_despachador_notificaciones
+from services.tokens_fcm import get_limpieza_tokens_fcm
+from services.destinatarios_alertas import get_destinatarios_alertas
+from services.coalescencia_alertas import get_ventana_alertas
+from services.difusion_posiciones import get_difusion_posiciones
+from services.ingesta_posiciones import get_ingesta_posiciones
+from services.ubicaciones_usuarios import get_ubicaciones_usuarios
+
+router = APIRouter(
+    prefix="/metricas",
+    tags=["metricas"]
+)
+
+
+@router.get("/ingesta")
+def metricas_ingesta():
+    """
+    Métricas de la ingesta de posiciones de corredores.
+    Respuesta: { recibidas, fusionadas, rechazadas, escritas, lotes, errores, pendientes,
+                 tamano_lote: {promedio, maximo}, retraso_ingesta_s: {p50, p95, maximo} }
+    """
+    return get_ingesta_posiciones().metricas()
+
+
+@router.get("/tiempo-real")
+def metricas_tiempo_real():
+    """
+    Clientes conectados al canal push de posiciones y tasa de mensajes.
+    Respuesta: { clientes, clientes_por_tipo, publicados, mensajes_enviados,
+                 mensajes_por_segundo, descartados_por_contrapresion }
+    """
+    return get_difusion_posiciones().metricas()
+
+
+@router.get("/filtros")
+def metricas_filtros():
+    """
+    Acumulado por estrategia de filtro de rutas.
+    Respuesta: { estrategia: { ejecuciones, en_sql, omitidas, entrada, salida, ms,
+                               selectividad_observada } }
+    """
+    return get_estadisticas_filtros().resumen()
+
+
+@router.get("/ubicaciones")
+def metricas_ubicaciones():
+    """
+    Caché de últimas ubicaciones de usuarios.
+    Respuesta: { actualizaciones, aciertos, fallos, vencidas, persistidas, usuarios, ttl_s }
+    """
+    return get_ubicaciones_usuarios().metricas()
+
+
+@router.get("/db")
+def metricas_db():
+    """
+    Pools de conexiones a la BD (por engine).
+    Respuesta: { engine: { tamano, max_overflow, en_uso, en_reposo, overflow, utilizacion,
+                           checkouts, timeouts, max_en_uso, espera_ms: {p50, p95, maximo} } }
+    """
+    return metricas_pools()
+
+
+@router.get("/replica")
+def metricas_replica():
+    """
+    Réplica de lectura: retraso medido y a dónde fueron las lecturas.
+    Respuesta: { configurada, disponible, retraso_s, max_retraso_s, verificaciones, errores,
+                 lecturas_replica, lecturas_primario }
+    """
+    return monitor_replica.metricas()
+
+
+@router.get("/notificaciones")
+def metricas_notificaciones():
+    """
+    Despachador de notificaciones push (outbox).
+    Respuesta: { enviadas, reintentos, fallidas, lotes, errores, paralelismo,
+                 latencia_envio_s: {p50, p95}, tokens_fcm: {tokens_recibidos, usuarios_limpiados},
+                 destinatarios: {usuarios_con_token, resoluciones, destinatarios, ultima_resolucion_ms, ...},
+                 agrupacion: {abiertas, nuevas, agrupadas, ventana_s} }
+    """
+    return {
+        **get_despachador_notificaciones().metricas(),
+        "tokens_fcm": get_limpieza_tokens_fcm().metricas(),
+        "destinatarios": get_destinatarios_alertas().metricas(),
+        "agrupacion": get_ventana_alertas().metricas(),
+    }
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
-from config.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.db import get_db_lectura, get_async_db_lectura
 from services.DiagramaClases.paradero_service import Paradero_Service
+from services.DiagramaClases.paradero_service_async import ParaderoServiceAsync
 from services.DiagramaClases.eta_service import EtaService
+from services.indice_espacial import get_indice_paraderos
+from services.snapshot_red import get_snapshot_red
 from fastapi import HTTPException
 
 router = APIRouter(
@@ -12,23 +16,40 @@ router = APIRouter(
 
 @router.get("")
 @router.get("/")
-def listar_paraderos(db: Session = Depends(get_db)):
-    return Paradero_Service(db=db).get_paraderos()
+def listar_paraderos(request: Request, db: Session = Depends(get_db_lectura)):
+    return get_snapshot_red().respuesta(request, "paraderos", Paradero_Service(db=db).get_paraderos)
+
+
+@router.get("/cercanos")
+async def listar_paraderos_cercanos(
+    lat: float = Query(..., description="Latitud del punto de referencia"),
+    lng: float = Query(..., description="Longitud del punto de referencia"),
+    radio_km: float = Query(0.5, gt=0, description="Radio de búsqueda en km"),
+    db: AsyncSession = Depends(get_async_db_lectura)
+):
+    """
+    Devuelve los paraderos dentro de `radio_km` ordenados por distancia.
+    Si no hay ninguno en el radio, devuelve el más cercano.
+    """
+    servicio = ParaderoServiceAsync(db)
+    cercanos = await servicio.get_paraderos_cercanos(lat, lng, radio_km)
+    if cercanos:
+        return cercanos
+    mas_cercano = await servicio.get_paradero_mas_cercano(lat, lng)
+    return [mas_cercano] if mas_cercano else []
 
 
 @router.get("/{id_paradero}/eta")
-def obtener_eta_paradero(id_paradero: int, db: Session = Depends(get_db)):
+def obtener_eta_paradero(id_paradero: int, db: Session = Depends(get_db_lectura)):
     """
     Devuelve el ETA (en minutos) del corredor que llegará primero al paradero.
     Respuesta: { paradero_id, corredor_id, eta_minutos, distancia_km }
     """
-    # validar paradero
-    from models.Paradero import Paradero as ParaderoModel
-
-    paradero = db.query(ParaderoModel).filter(ParaderoModel.id_paradero == id_paradero).first()
+    # validar paradero (desde el índice en memoria, sin ir a la BD)
+    paradero = get_indice_paraderos().obtener(db, id_paradero)
     if not paradero:
         raise HTTPException(status_code=404, detail="Paradero no encontrado")
-    if paradero.coordenada_lat is None or paradero.coordenada_lng is None:
+    if paradero["coordenada_lat"] is None or paradero["coordenada_lng"] is None:
         raise HTTPException(status_code=404, detail="Paradero sin coordenadas")
 
     eta_service = EtaService(db=db)
@@ -1,5 +1,8 @@
 from services.DiagramaClases.reporte_service import ReporteService
 from services.DiagramaClases.paradero_service import Paradero_Service
+from services.DiagramaClases.reporte_service_async import ReporteServiceAsync
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.db import get_async_db
 from fastapi import APIRouter, HTTPException, status, Body, Depends, Request, Header
 import traceback
 from typing import Optional, Dict
@@ -47,7 +50,7 @@ def health():
     return {"ok": True}
 
 @router.post("/desvio")
-def crear_reporte_desvio(payload: Dict = Body(...), conductor_header_id: Optional[int] = Depends(get_user_id_from_headers)):
+async def crear_reporte_desvio(payload: Dict = Body(...), conductor_header_id: Optional[int] = Depends(get_user_id_from_headers), db: AsyncSession = Depends(get_async_db)):
     """
     Endpoint: mapea campos entrantes a los nombres esperados por el servicio
     y valida explícitamente que los campos numéricos no sean None.
@@ -113,7 +116,7 @@ def crear_reporte_desvio(payload: Dict = Body(...), conductor_header_id: Optiona
     print("[DEBUG] /reports/desvio mapped_payload:", mapped_payload)
 
     try:
-        saved = service.crear_reporte_desvio(mapped_payload)
+        saved = await ReporteServiceAsync(db, service).crear_reporte_desvio(mapped_payload)
         return {"ok": True, "reporte": saved}
     except ValueError as ve:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
@@ -126,7 +129,7 @@ def crear_reporte_desvio(payload: Dict = Body(...), conductor_header_id: Optiona
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
     
 @router.post("/retraso")
-def crear_reporte_retraso(payload: Dict = Body(...), conductor_header_id: Optional[int] = Depends(get_user_id_from_headers)):
+async def crear_reporte_retraso(payload: Dict = Body(...), conductor_header_id: Optional[int] = Depends(get_user_id_from_headers), db: AsyncSession = Depends(get_async_db)):
     """
     Crea un reporte de tipo 'retraso' (alerta por tráfico).
     """
@@ -167,14 +170,14 @@ def crear_reporte_retraso(payload: Dict = Body(...), conductor_header_id: Option
     print("[DEBUG] /reports/retraso mapped_payload:", mapped_payload)
 
     try:
-        saved = service.crear_reporte_retraso(mapped_payload)
+        saved = await ReporteServiceAsync(db, service).crear_reporte_retraso(mapped_payload)
         return {"ok": True, "reporte": saved}
     except Exception as e:
         print("[ERROR] crear_reporte_retraso exception:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/falla")
-def crear_reporte_falla(payload: Dict = Body(...), conductor_header_id: Optional[int] = Depends(get_user_id_from_headers)):
+async def crear_reporte_falla(payload: Dict = Body(...), conductor_header_id: Optional[int] = Depends(get_user_id_from_headers), db: AsyncSession = Depends(get_async_db)):
     """
     Crea un reporte de tipo 'falla'.
     El formulario envía: paradero (str), tipo_falla (str), requiere_mantenimiento (bool), unidad_afectada (str), motivo (str)
@@ -224,7 +227,7 @@ def crear_reporte_falla(payload: Dict = Body(...), conductor_header_id: Optional
     print("[DEBUG] /reports/falla mapped_payload:", mapped_payload)
 
     try:
-        saved = service.crear_reporte_falla(mapped_payload)
+        saved = await ReporteServiceAsync(db, service).crear_reporte_falla(mapped_payload)
         return {"ok": True, "reporte": saved}
     except Exception as e:
         print("[ERROR] crear_reporte_falla exception:", e)
@@ -232,7 +235,7 @@ def crear_reporte_falla(payload: Dict = Body(...), conductor_header_id: Optional
         raise HTTPException(status_code=500, detail=str(e))
         
 @router.get("/ultimo/{id_corredor}")
-def obtener_ultimo_reporte_por_corredor_id(id_corredor: int):
+async def obtener_ultimo_reporte_por_corredor_id(id_corredor: int, db: AsyncSession = Depends(get_async_db)):
     """
     Devuelve el último reporte de retraso (id_tipo_reporte = 2)
     filtrado por el id_corredor_afectado.
@@ -240,7 +243,7 @@ def obtener_ultimo_reporte_por_corredor_id(id_corredor: int):
 
     try:
         # Servicio devuelve lista o None
-        reporte = service.obtener_ultimo_reporte_por_corredor_id(id_corredor)
+        reporte = await ReporteServiceAsync(db, service).obtener_ultimo_reporte_por_corredor_id(id_corredor)
 
         if not reporte:
             return {
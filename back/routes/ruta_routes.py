@@ -1,7 +1,8 @@
 # routes/ruta_routes.py
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from services.DiagramaClases.ruta_service import RutaService
+from services.snapshot_red import get_snapshot_red
 from config.db import get_db
 from typing import Optional
 
@@ -16,15 +17,32 @@ def crear_ruta(nombre: str, db: Session = Depends(get_db)):
     return RutaService(db).create_ruta(nombre)
 
 @router.get("/obtenerRutas")
-def listar_rutas(db: Session = Depends(get_db)):
-    return RutaService(db).get_rutas()
+def listar_rutas(
+    request: Request,
+    nombre: Optional[str] = Query(None, description="Filtrar por nombre de ruta (texto, se resuelve en la BD)"),
+    db: Session = Depends(get_db)
+):
+    clave = ("rutas", nombre) if nombre else "rutas"
+    return get_snapshot_red().respuesta(request, clave, lambda: RutaService(db).get_rutas(nombre))
     
 @router.get("/filtrar")
 def filtrar_rutas(
+    request: Request,
     ruta: Optional[str] = Query(None, description="Filtrar por nombre de ruta (texto)"),
     ruta_id: Optional[int] = Query(None, description="Filtrar por id de ruta (use este parámetro si quiere devolver paraderos por id)"),
     distrito: Optional[str] = Query(None, description="Filtrar por distrito"),
     distancia: Optional[float] = Query(None, description="Filtrar por distancia máxima en km"),
+    usuario_id: Optional[int] = Query(None, description="Usuario cuya última ubicación se usa para el filtro por distancia"),
     db: Session = Depends(get_db)
 ):
-    return RutaService(db).filtrar_rutas(ruta, ruta_id, distrito, distancia)
+    if distancia and distancia > 0 and usuario_id is None:
+        # Sin usuario no hay ubicación: no devolver las rutas sin filtrar como si se hubiera aplicado
+        raise HTTPException(status_code=400, detail="El filtro por 'distancia' requiere 'usuario_id'")
+    # Con distancia el resultado depende de la ubicación del usuario: ETag sí, caché no
+    clave = None if distancia else ("filtrar", ruta, ruta_id, distrito)
+    try:
+        return get_snapshot_red().respuesta(
+            request, clave, lambda: RutaService(db).filtrar_rutas(ruta, ruta_id, distrito, distancia, usuario_id)
+        )
+    except LookupError as le:
+        raise HTTPException(status_code=404, detail=str(le))
@@ -0,0 +1,161 @@
+"""
+Canal push de posiciones de corredores (WebSocket y Server-Sent Events)
+
+Suscripción por uno de: ?corredor=ID, ?ruta=ID o bounding box
+(?min_lat=&min_lng=&max_lat=&max_lng=). El primer mensaje trae las posiciones
+actuales que cumplen el filtro ("inicial"); luego solo llegan cambios ("delta").
+La suscripción se registra antes de tomar las posiciones iniciales: un cambio
+que llega entre ambos pasos sale igual como delta (a lo sumo repetido).
+"""
+import asyncio
+import json
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from config.db import SessionLocal
+from services.difusion_posiciones import FiltroSuscripcion, get_difusion_posiciones
+from services.posiciones_corredores import get_posiciones_corredores
+from services.red_rutas import get_red_rutas
+
+# Comentario periódico para que proxies no cierren la conexión SSE inactiva
+KEEPALIVE_SSE_S = 15
+
+router = APIRouter(
+    prefix="/tiempo-real",
+    tags=["tiempo-real"]
+)
+
+
+def _preparar(
+    corredor: Optional[int],
+    ruta: Optional[int],
+    bbox: Tuple[Optional[float], ...],
+) -> FiltroSuscripcion:
+    """Arma el filtro de la suscripción (lanza ValueError si no es válido)."""
+    db = SessionLocal()
+    try:
+        geometria = None
+        if ruta is not None:
+            geometria = get_red_rutas().geometria(db, ruta)
+            if geometria is None:
+                raise ValueError("Ruta no encontrada o sin paraderos")
+        usa_bbox = any(v is not None for v in bbox)
+        if usa_bbox and not all(v is not None for v in bbox):
+            raise ValueError("El bounding box requiere min_lat, min_lng, max_lat y max_lng")
+        return FiltroSuscripcion(id_corredor=corredor, geometria=geometria, bbox=bbox if usa_bbox else None)
+    finally:
+        db.close()
+
+
+def _iniciales(filtro: FiltroSuscripcion) -> List[Dict]:
+    """Posiciones actuales que cumplen el filtro (tomar después de suscribirse)."""
+    db = SessionLocal()
+    try:
+        snapshot = get_posiciones_corredores().arreglos(db)
+        return [
+            {"id_corredor": int(id_corredor), "lat": float(lat), "lng": float(lng), "estado": estado}
+            for id_corredor, lat, lng, estado in zip(snapshot.ids, snapshot.lats, snapshot.lngs, snapshot.estados)
+            if filtro.coincide(int(id_corredor), float(lat), float(lng))
+        ]
+    finally:
+        db.close()
+
+
+async def _esperar_cierre(websocket: WebSocket):
+    """Consume lo que mande el cliente hasta que se desconecte."""
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.websocket("/corredores")
+async def ws_posiciones_corredores(
+    websocket: WebSocket,
+    corredor: Optional[int] = None,
+    ruta: Optional[int] = None,
+    min_lat: Optional[float] = None,
+    min_lng: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    max_lng: Optional[float] = None,
+):
+    """
+    WebSocket con las posiciones de corredores.
+    Mensajes: { tipo: "inicial" | "delta", posiciones: [ { id_corredor, lat, lng, estado, ts? } ] }
+    """
+    try:
+        filtro = await run_in_threadpool(_preparar, corredor, ruta, (min_lat, min_lng, max_lat, max_lng))
+    except ValueError as ve:
+        await websocket.close(code=1008, reason=str(ve))
+        return
+
+    await websocket.accept()
+    difusion = get_difusion_posiciones()
+    suscripcion = difusion.suscribir(filtro)
+    cierre = asyncio.create_task(_esperar_cierre(websocket))
+    try:
+        iniciales = await run_in_threadpool(_iniciales, filtro)
+        await websocket.send_json({"tipo": "inicial", "posiciones": iniciales})
+        difusion.registrar_envio(len(iniciales))
+        while True:
+            siguiente = asyncio.create_task(suscripcion.siguiente())
+            hechas, _ = await asyncio.wait({siguiente, cierre}, return_when=asyncio.FIRST_COMPLETED)
+            if cierre in hechas:
+                siguiente.cancel()
+                break
+            mensajes = siguiente.result()
+            await websocket.send_json({"tipo": "delta", "posiciones": mensajes})
+            difusion.registrar_envio(len(mensajes))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        difusion.desuscribir(suscripcion)
+        cierre.cancel()
+
+
+def _evento_sse(tipo: str, posiciones: List[Dict]) -> str:
+    return f"event: {tipo}\ndata: {json.dumps(posiciones)}\n\n"
+
+
+@router.get("/corredores/sse")
+async def sse_posiciones_corredores(
+    request: Request,
+    corredor: Optional[int] = None,
+    ruta: Optional[int] = None,
+    min_lat: Optional[float] = None,
+    min_lng: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    max_lng: Optional[float] = None,
+):
+    """
+    Server-Sent Events con las posiciones de corredores (mismos filtros que el WebSocket).
+    Eventos "inicial" y "delta" con data = [ { id_corredor, lat, lng, estado, ts? } ]
+    """
+    try:
+        filtro = await run_in_threadpool(_preparar, corredor, ruta, (min_lat, min_lng, max_lat, max_lng))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    async def eventos():
+        difusion = get_difusion_posiciones()
+        suscripcion = difusion.suscribir(filtro)
+        try:
+            iniciales = await run_in_threadpool(_iniciales, filtro)
+            yield _evento_sse("inicial", iniciales)
+            difusion.registrar_envio(len(iniciales))
+            while not await request.is_disconnected():
+                try:
+                    mensajes = await asyncio.wait_for(suscripcion.siguiente(), KEEPALIVE_SSE_S)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _evento_sse("delta", mensajes)
+                difusion.registrar_envio(len(mensajes))
+        finally:
+            difusion.desuscribir(suscripcion)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -1,13 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from services.usuario_service import UsuarioService
+from services.ubicaciones_usuarios import get_ubicaciones_usuarios
 from config.db import get_db
 
 class FCMTokenRequest(BaseModel):
     user_id: int
     fcm_token: str
 
+class UbicacionRequest(BaseModel):
+    latitud: float = Field(..., ge=-90, le=90)
+    longitud: float = Field(..., ge=-180, le=180)
+
 router = APIRouter(
     prefix="/usuario",
     tags=["usuario"]
@@ -111,6 +116,16 @@ def obtener_historial_usuario(user_id: int, db: Session = Depends(get_db)):
         return {"error": "Error interno del servidor al obtener historial"}
 @router.get("/{user_id}/ubicacion")
 def obtener_ubicacion_usuario(user_id: int, db: Session = Depends(get_db)):
+    # Primero la caché de ubicaciones (incluye edad de la ubicación)
+    ubicacion = get_ubicaciones_usuarios().obtener(user_id)
+    if ubicacion is not None:
+        return {
+            "id_usuario": user_id,
+            "latitud": ubicacion["lat"],
+            "longitud": ubicacion["lng"],
+            "edad_s": ubicacion["edad_s"]
+        }
+
     usuario_service = UsuarioService(db)
     usuario = usuario_service.get_ubicacion_usuario(user_id)
     if not usuario or usuario.ubicacion_actual_lat is None or usuario.ubicacion_actual_lng is None:
@@ -122,6 +137,16 @@ def obtener_ubicacion_usuario(user_id: int, db: Session = Depends(get_db)):
         "longitud": usuario.ubicacion_actual_lng
     }
 
+@router.put("/{user_id}/ubicacion")
+def actualizar_ubicacion_usuario(user_id: int, ubicacion: UbicacionRequest, db: Session = Depends(get_db)):
+    """
+    Actualiza la ubicación actual del usuario (la usa el filtro de rutas por distancia)
+    """
+    resultado = UsuarioService(db).actualizar_ubicacion(user_id, ubicacion.latitud, ubicacion.longitud)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return resultado
+
 # Endpoint para actualizar tiempos de subida y bajada en el historial
 @router.put("/{user_id}/historial/{historial_id}/tiempos")
 def actualizar_tiempos_viaje(
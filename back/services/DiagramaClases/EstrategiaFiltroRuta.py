@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional
+from sqlalchemy.sql.elements import ColumnElement
 from models.Ruta import Ruta
 
 class EstrategiaFiltroRuta(ABC):
@@ -9,8 +10,15 @@ class EstrategiaFiltroRuta(ABC):
     Permite implementar diferentes tipos de filtros (por nombre, cercanía, distrito, etc.)
     siguiendo el patrón Strategy, donde cada filtro es una estrategia independiente
     que puede combinarse con otras estrategias.
+    
+    Cada estrategia declara una estimación de su costo (relativo, por ruta
+    evaluada) y de su selectividad (fracción de rutas que deja pasar) para
+    que SistemaFiltros las ordene: primero las baratas y que más descartan.
     """
     
+    costo: float = 1.0
+    selectividad: float = 1.0
+    
     @abstractmethod
     def filtrar(self, rutas: List[Ruta]) -> List[Ruta]:
         """
@@ -23,3 +31,17 @@ class EstrategiaFiltroRuta(ABC):
             List[Ruta]: Lista de rutas que cumplen con los criterios del filtro
         """
         pass
+    
+    def condicion_sql(self) -> Optional[ColumnElement]:
+        """
+        Condición equivalente sobre el modelo Ruta, si el filtro se puede
+        expresar en SQL (se aplica en la consulta, antes de materializar rutas).
+        
+        Returns:
+            Optional[ColumnElement]: Condición para query.filter(), o None si no aplica
+        """
+        return None
+    
+    @property
+    def nombre(self) -> str:
+        return type(self).__name__
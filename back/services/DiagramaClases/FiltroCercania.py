@@ -1,7 +1,9 @@
 from .EstrategiaFiltroRuta import EstrategiaFiltroRuta
 from models.Ruta import Ruta
-from typing import List, Tuple
-import math
+from typing import List, Optional, Tuple
+import numpy as np
+from services.cobertura_rutas import CoberturaRutas
+from services.geo import coordenadas, distancia_km, mascara_radio
 
 class FiltroCercania(EstrategiaFiltroRuta):
     """
@@ -9,18 +11,27 @@ class FiltroCercania(EstrategiaFiltroRuta):
     
     Calcula la distancia entre la ubicación del usuario y los paraderos de cada ruta,
     devolviendo solo las rutas que tengan al menos un paradero dentro del radio especificado.
+    Es la más cara (una distancia por paradero de cada ruta): va después de los filtros por nombre.
+    Con una cobertura precalculada (cajas y celdas por ruta) solo calcula distancias
+    exactas para las rutas cuyas celdas y caja quedan cerca del usuario.
     """
     
-    def __init__(self, distancia_maxima: float, ubicacion_usuario: Tuple[float, float]):
+    costo = 10.0
+    selectividad = 0.5
+    
+    def __init__(self, distancia_maxima: float, ubicacion_usuario: Tuple[float, float],
+                 cobertura: Optional[CoberturaRutas] = None):
         """
         Inicializa el filtro de cercanía.
         
         Args:
             distancia_maxima (float): Distancia máxima en kilómetros
             ubicacion_usuario (Tuple[float, float]): (latitud, longitud) del usuario
+            cobertura (Optional[CoberturaRutas]): Cajas y celdas precalculadas de las rutas
         """
         self.distancia_maxima = distancia_maxima
         self.ubicacion_usuario = ubicacion_usuario
+        self.cobertura = cobertura
     
     def filtrar(self, rutas: List[Ruta]) -> List[Ruta]:
         """
@@ -35,49 +46,39 @@ class FiltroCercania(EstrategiaFiltroRuta):
         if not self.ubicacion_usuario or self.distancia_maxima <= 0:
             return rutas
         
-        rutas_cercanas = []
-        
-        for ruta in rutas:
-            # Verificar si algún paradero de la ruta está cerca
-            if self._ruta_tiene_paraderos_cercanos(ruta):
-                rutas_cercanas.append(ruta)
+        if self.cobertura is None:
+            return self._filtrar_exacto(rutas)
         
-        return rutas_cercanas
+        # Rutas de la cobertura: prefiltro por celdas y caja, distancia exacta solo a candidatas.
+        # Las que no estén en la cobertura (p. ej. creadas después) van por el cálculo completo.
+        lat, lng = self.ubicacion_usuario
+        cercanas = self.cobertura.rutas_cercanas(lat, lng, self.distancia_maxima)
+        sin_cobertura = {id(r) for r in self._filtrar_exacto([r for r in rutas if r.id_ruta not in self.cobertura])}
+        return [r for r in rutas if r.id_ruta in cercanas or id(r) in sin_cobertura]
     
-    def _ruta_tiene_paraderos_cercanos(self, ruta: Ruta) -> bool:
-        """
-        Verifica si una ruta tiene paraderos dentro del radio de cercanía.
+    def _filtrar_exacto(self, rutas: List[Ruta]) -> List[Ruta]:
+        """Distancia a todos los paraderos de todas las rutas (sin prefiltro)."""
+        # Aplanar los paraderos de todas las rutas en arreglos y calcular
+        # todas las distancias en una sola operación vectorizada
+        indices_ruta = []
+        puntos = []
+        for i, ruta in enumerate(rutas):
+            for paradero in ruta.paraderos:
+                indices_ruta.append(i)
+                puntos.append((paradero.coordenada_lat, paradero.coordenada_lng))
         
-        Args:
-            ruta (Ruta): Ruta a verificar
-            
-        Returns:
-            bool: True si tiene paraderos cercanos, False en caso contrario
-        """
-        for paradero in ruta.paraderos:
-            if self._paradero_esta_cerca(paradero):
-                return True
-        return False
-    
-    def _paradero_esta_cerca(self, paradero) -> bool:
-        """
-        Verifica si un paradero está dentro del radio de cercanía.
+        if not puntos:
+            return []
         
-        Args:
-            paradero: Objeto Paradero con coordenadas
-            
-        Returns:
-            bool: True si está cerca, False en caso contrario
-        """
-        if not paradero.coordenada_lat or not paradero.coordenada_lng:
-            return False
+        lat, lng = self.ubicacion_usuario
+        lats, lngs = coordenadas(puntos)
+        cerca = mascara_radio(lat, lng, lats, lngs, self.distancia_maxima)
         
-        distancia = self._calcular_distancia(
-            self.ubicacion_usuario,
-            (paradero.coordenada_lat, paradero.coordenada_lng)
-        )
+        # Una ruta queda si al menos uno de sus paraderos está dentro del radio
+        rutas_con_cercanos = np.zeros(len(rutas), dtype=bool)
+        rutas_con_cercanos[np.asarray(indices_ruta)[cerca]] = True
         
-        return distancia <= self.distancia_maxima
+        return [ruta for ruta, ok in zip(rutas, rutas_con_cercanos) if ok]
     
     def _calcular_distancia(self, punto1: Tuple[float, float], punto2: Tuple[float, float]) -> float:
         """
@@ -90,24 +91,4 @@ class FiltroCercania(EstrategiaFiltroRuta):
         Returns:
             float: Distancia en kilómetros
         """
-        lat1, lng1 = punto1
-        lat2, lng2 = punto2
-        
-        # Radio de la Tierra en kilómetros
-        R = 6371.0
-        
-        # Convertir a radianes
-        lat1_rad = math.radians(lat1)
-        lng1_rad = math.radians(lng1)
-        lat2_rad = math.radians(lat2)
-        lng2_rad = math.radians(lng2)
-        
-        # Diferencia de coordenadas
-        dlat = lat2_rad - lat1_rad
-        dlng = lng2_rad - lng1_rad
-        
-        # Fórmula de Haversine
-        a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlng/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
+        return distancia_km(punto1[0], punto1[1], punto2[0], punto2[1])
@@ -1,14 +1,19 @@
 from .EstrategiaFiltroRuta import EstrategiaFiltroRuta
 from models.Ruta import Ruta
-from typing import List
+from typing import List, Optional
+from sqlalchemy.sql.elements import ColumnElement
 
 class FiltroRuta(EstrategiaFiltroRuta):
     """
     Estrategia para filtrar rutas por nombre.
     
     Implementa búsqueda parcial case-insensitive del nombre de la ruta.
+    Se puede resolver en SQL (ILIKE) antes de cargar las rutas.
     """
     
+    costo = 1.0
+    selectividad = 0.2
+    
     def __init__(self, nombre_ruta: str):
         """
         Inicializa el filtro con el nombre de ruta a buscar.
@@ -39,3 +44,15 @@ class FiltroRuta(EstrategiaFiltroRuta):
             ruta for ruta in rutas 
             if nombre_buscar in ruta.nombre.lower()
         ]
+    
+    def condicion_sql(self) -> Optional[ColumnElement]:
+        """
+        Condición ILIKE '%nombre%' sobre Ruta.nombre (con % y _ escapados).
+        
+        Returns:
+            Optional[ColumnElement]: Condición, o None si no hay criterio de búsqueda
+        """
+        if not self.nombre_ruta or not self.nombre_ruta.strip():
+            return None
+        patron = self.nombre_ruta.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return Ruta.nombre.ilike(f"%{patron}%", escape="\\")
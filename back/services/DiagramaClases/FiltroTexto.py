@@ -0,0 +1,55 @@
+from .EstrategiaFiltroRuta import EstrategiaFiltroRuta
+from models.Ruta import Ruta
+from services.indice_texto import IndiceTexto
+from typing import List, Optional
+from sqlalchemy.sql.elements import ColumnElement
+
+class FiltroTexto(EstrategiaFiltroRuta):
+    """
+    Estrategia para filtrar rutas por nombre usando el índice de texto.
+    
+    Búsqueda parcial sin distinguir mayúsculas ni tildes ("peru" encuentra
+    "Av. Perú"); los candidatos salen del índice de trigramas en lugar de
+    comparar el texto contra cada ruta.
+    """
+    
+    costo = 0.05
+    selectividad = 0.1
+    
+    def __init__(self, texto: str, indice: IndiceTexto):
+        """
+        Inicializa el filtro con el texto a buscar.
+        
+        Args:
+            texto (str): Texto a buscar en el nombre de la ruta (búsqueda parcial)
+            indice (IndiceTexto): Índice de nombres de rutas indexado por id_ruta
+        """
+        self.texto = texto
+        self.indice = indice
+    
+    def filtrar(self, rutas: List[Ruta]) -> List[Ruta]:
+        """
+        Filtra las rutas cuyo nombre contiene el texto especificado.
+        
+        Args:
+            rutas (List[Ruta]): Lista de rutas a filtrar
+            
+        Returns:
+            List[Ruta]: Rutas cuyo nombre contiene el texto (en el orden recibido)
+        """
+        if not self.texto or not self.texto.strip():
+            return rutas
+        
+        ids = self.indice.claves(self.texto)
+        return [ruta for ruta in rutas if ruta.id_ruta in ids]
+    
+    def condicion_sql(self) -> Optional[ColumnElement]:
+        """
+        Condición id_ruta IN (...) con las rutas que el índice encontró.
+        
+        Returns:
+            Optional[ColumnElement]: Condición, o None si no hay criterio de búsqueda
+        """
+        if not self.texto or not self.texto.strip():
+            return None
+        return Ruta.id_ruta.in_(sorted(self.indice.claves(self.texto)))
@@ -1,13 +1,60 @@
-from typing import List
+import threading
+import time
+from typing import Dict, List
+from sqlalchemy.orm import Query
 from models.Ruta import Ruta
 from .EstrategiaFiltroRuta import EstrategiaFiltroRuta
 
+
+class EstadisticasFiltros:
+    """
+    Acumulado por estrategia de las ejecuciones de SistemaFiltros en el proceso:
+    veces, rutas de entrada/salida, tiempo y cuántas veces se resolvió en SQL.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_estrategia: Dict[str, Dict] = {}
+    
+    def registrar(self, paso: Dict) -> None:
+        with self._lock:
+            acumulado = self._por_estrategia.setdefault(paso["estrategia"], {
+                "ejecuciones": 0, "en_sql": 0, "omitidas": 0, "entrada": 0, "salida": 0, "ms": 0.0,
+            })
+            acumulado["ejecuciones"] += 1
+            if paso["en_sql"]:
+                acumulado["en_sql"] += 1
+            elif paso["omitida"]:
+                acumulado["omitidas"] += 1
+            else:
+                acumulado["entrada"] += paso["entrada"]
+                acumulado["salida"] += paso["salida"]
+                acumulado["ms"] += paso["ms"]
+    
+    def resumen(self) -> Dict[str, Dict]:
+        """{ estrategia: { ejecuciones, en_sql, omitidas, entrada, salida, ms, selectividad_observada } }"""
+        with self._lock:
+            resumen = {k: dict(v) for k, v in self._por_estrategia.items()}
+        for datos in resumen.values():
+            datos["ms"] = round(datos["ms"], 3)
+            datos["selectividad_observada"] = (
+                round(datos["salida"] / datos["entrada"], 4) if datos["entrada"] else None
+            )
+        return resumen
+
+
 class SistemaFiltros:
     """
     Contexto que maneja múltiples estrategias de filtrado.
     
     Permite combinar diferentes filtros aplicándolos secuencialmente
     a una lista de rutas, siguiendo el patrón Strategy.
+    
+    Las estrategias se ejecutan ordenadas por costo / (1 - selectividad)
+    (las baratas y que más descartan primero) y la cadena se corta en cuanto
+    no quedan rutas. Las que se pueden expresar en SQL se aplican en la
+    consulta con aplicar_a_consulta y ya no se repiten en memoria.
+    Cada paso queda en `pasos` (tiempo y cardinalidad de entrada/salida).
     """
     
     def __init__(self):
@@ -15,6 +62,8 @@ class SistemaFiltros:
         Inicializa el sistema de filtros con una lista vacía de estrategias.
         """
         self.estrategias: List[EstrategiaFiltroRuta] = []
+        self.pasos: List[Dict] = []
+        self._en_sql: set = set()
     
     def agregar_estrategia(self, estrategia: EstrategiaFiltroRuta):
         """
@@ -26,12 +75,56 @@ class SistemaFiltros:
         if estrategia is not None:
             self.estrategias.append(estrategia)
     
+    @staticmethod
+    def _rango(estrategia: EstrategiaFiltroRuta) -> float:
+        descarta = 1.0 - min(max(estrategia.selectividad, 0.0), 1.0)
+        return estrategia.costo / descarta if descarta > 0 else float("inf")
+    
+    def estrategias_ordenadas(self) -> List[EstrategiaFiltroRuta]:
+        """Estrategias en el orden en que se ejecutan (orden estable ante empates)."""
+        return sorted(self.estrategias, key=self._rango)
+    
+    def _registrar(self, estrategia: EstrategiaFiltroRuta, entrada=None, salida=None, ms=0.0,
+                   en_sql=False, omitida=False) -> None:
+        paso = {
+            "estrategia": estrategia.nombre,
+            "en_sql": en_sql,
+            "omitida": omitida,
+            "entrada": entrada,
+            "salida": salida,
+            "ms": round(ms, 3),
+        }
+        self.pasos.append(paso)
+        estadisticas_filtros.registrar(paso)
+    
+    def aplicar_a_consulta(self, consulta: Query) -> Query:
+        """
+        Agrega a la consulta las condiciones de las estrategias expresables en SQL.
+        Esas estrategias se marcan para no repetirse en aplicar_filtros.
+        
+        Args:
+            consulta (Query): Consulta sobre Ruta (o sus columnas)
+            
+        Returns:
+            Query: Consulta con los filtros empujados a la BD
+        """
+        for estrategia in self.estrategias_ordenadas():
+            if id(estrategia) in self._en_sql:
+                continue
+            condicion = estrategia.condicion_sql()
+            if condicion is not None:
+                consulta = consulta.filter(condicion)
+                self._en_sql.add(id(estrategia))
+                self._registrar(estrategia, en_sql=True)
+        return consulta
+    
     def aplicar_filtros(self, rutas: List[Ruta]) -> List[Ruta]:
         """
-        Aplica todas las estrategias de filtrado en secuencia.
+        Aplica las estrategias de filtrado (las no resueltas en SQL), de menor a mayor rango.
         
         Cada estrategia filtra el resultado de la estrategia anterior,
-        permitiendo combinar múltiples criterios de filtrado.
+        permitiendo combinar múltiples criterios de filtrado. Si una deja
+        la lista vacía, las siguientes no se ejecutan.
         
         Args:
             rutas (List[Ruta]): Lista inicial de rutas a filtrar
@@ -45,9 +138,16 @@ class SistemaFiltros:
         
         resultado = rutas
         
-        # Aplicar cada estrategia secuencialmente
-        for estrategia in self.estrategias:
+        for estrategia in self.estrategias_ordenadas():
+            if id(estrategia) in self._en_sql:
+                continue
+            if not resultado:
+                self._registrar(estrategia, entrada=0, salida=0, omitida=True)
+                continue
+            inicio = time.perf_counter()
+            entrada = len(resultado)
             resultado = estrategia.filtrar(resultado)
+            self._registrar(estrategia, entrada, len(resultado), (time.perf_counter() - inicio) * 1000)
         
         return resultado
     
@@ -56,6 +156,8 @@ class SistemaFiltros:
         Limpia todas las estrategias del sistema.
         """
         self.estrategias.clear()
+        self.pasos.clear()
+        self._en_sql.clear()
     
     def obtener_cantidad_estrategias(self) -> int:
         """
@@ -65,3 +167,15 @@ class SistemaFiltros:
             int: Número de estrategias en el sistema
         """
         return len(self.estrategias)
+
+
+# Singleton global
+estadisticas_filtros = EstadisticasFiltros()
+
+
+def get_estadisticas_filtros() -> EstadisticasFiltros:
+    """
+    Obtener las estadísticas acumuladas de los filtros de rutas
+    Uso: from services.DiagramaClases.SistemaFiltros import get_estadisticas_filtros
+    """
+    return estadisticas_filtros
@@ -1,9 +1,9 @@
 from sqlalchemy.orm import Session
 from models.Corredor import Corredor
 from models.Paradero import Paradero
-from models.UsuarioBase import UsuarioBase
-from sqlalchemy import and_
-from math import radians, sin, cos, sqrt, atan2
+from services.indice_espacial import get_indice_paraderos, get_indice_pasajeros
+from services.geo import distancia_km as geo_distancia_km
+from services.DiagramaClases.eta_service import EtaService
 
 class CorredorService:
    def __init__(self, db: Session):
@@ -50,107 +50,24 @@ class CorredorService:
     if not corredor:
         return None
 
-    # 2) Obtener paraderos
-    paraderos = self.db.query(Paradero).all()
-
-    # 3) Si no hay paraderos en BD, devolver fallback
-    if not paraderos:
-        # También calcularemos usuarios cercanos aunque no haya paraderos
-        usuarios_tipo1 = (
-            self.db.query(UsuarioBase)
-            .filter(
-                and_(
-                    UsuarioBase.id_tipo_usuario == 1,
-                    UsuarioBase.ubicacion_actual_lat.isnot(None),
-                    UsuarioBase.ubicacion_actual_lng.isnot(None),
-                )
-            )
-            .all()
-        )
-
-        def haversine(lat1, lon1, lat2, lon2):
-            R = 6371  # km
-            dlat = radians(lat2 - lat1)
-            dlon = radians(lon2 - lon1)
-            a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-            c = 2 * atan2(sqrt(a), sqrt(1 - a))
-            return R * c
-
-        numero_cercanos = 0
-        if corredor.ubicacion_lat is not None and corredor.ubicacion_lng is not None:
-            numero_cercanos = sum(
-                1
-                for u in usuarios_tipo1
-                if haversine(
-                    corredor.ubicacion_lat,
-                    corredor.ubicacion_lng,
-                    u.ubicacion_actual_lat,
-                    u.ubicacion_actual_lng,
-                )
-                <= radio_km
-            )
+    tiene_ubicacion = corredor.ubicacion_lat is not None and corredor.ubicacion_lng is not None
 
-        return {
-            "id_corredor": corredor.id_corredor,
-            "capacidad_max": corredor.capacidad_max,
-            "ubicacion_lat": corredor.ubicacion_lat,
-            "ubicacion_lng": corredor.ubicacion_lng,
-            "estado": corredor.estado,
-            "numero_pasajeros": numero_cercanos,  # ahora es el conteo real de cercanos tipo 1
-            "nombre_paradero": "Paradero no disponible",
-        }
-
-    # 4) Haversine
-    def haversine(lat1, lon1, lat2, lon2):
-        R = 6371  # km
-        dlat = radians(lat2 - lat1)
-        dlon = radians(lon2 - lon1)
-        a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        return R * c
-
-    # 5) Paradero más cercano
-    paradero_cercano = min(
-        paraderos,
-        key=lambda p: haversine(
-            corredor.ubicacion_lat,
-            corredor.ubicacion_lng,
-            p.coordenada_lat,
-            p.coordenada_lng,
+    # 2) Paradero más cercano desde el índice espacial en memoria
+    #    (si no hay paraderos o el corredor no tiene ubicación, se usa el fallback)
+    paradero_cercano = None
+    if tiene_ubicacion:
+        paradero_cercano = get_indice_paraderos().mas_cercano(
+            self.db, corredor.ubicacion_lat, corredor.ubicacion_lng
         )
-        if p.coordenada_lat is not None and p.coordenada_lng is not None
-        else float("inf"),
-    )
-
-    # 6) Usuarios tipo 1 con coordenadas válidas
-    usuarios_tipo1 = (
-        self.db.query(UsuarioBase)
-        .filter(
-            and_(
-                UsuarioBase.id_tipo_usuario == 1,
-                UsuarioBase.ubicacion_actual_lat.isnot(None),
-                UsuarioBase.ubicacion_actual_lng.isnot(None),
-            )
-        )
-        .all()
-    )
 
-    # 7) Conteo de usuarios cercanos al corredor dentro del radio_km
+    # 3) Conteo de pasajeros (usuarios tipo 1) dentro del radio_km usando la grilla viva
     numero_cercanos = 0
-    if corredor.ubicacion_lat is not None and corredor.ubicacion_lng is not None:
-        numero_cercanos = sum(
-            1
-            for u in usuarios_tipo1
-            if haversine(
-                corredor.ubicacion_lat,
-                corredor.ubicacion_lng,
-                u.ubicacion_actual_lat,
-                u.ubicacion_actual_lng,
-            )
-            <= radio_km
+    if tiene_ubicacion:
+        numero_cercanos = get_indice_pasajeros().contar_en_radio(
+            self.db, corredor.ubicacion_lat, corredor.ubicacion_lng, radio_km
         )
 
-    # 8) Retorno enriquecido
+    # 4) Retorno enriquecido
     return {
         "id_corredor": corredor.id_corredor,
         "capacidad_max": corredor.capacidad_max,
@@ -158,10 +75,30 @@ class CorredorService:
         "ubicacion_lng": corredor.ubicacion_lng,
         "estado": corredor.estado,
         "numero_pasajeros": numero_cercanos,
-        "nombre_paradero": getattr(paradero_cercano, "nombre", "Paradero no disponible"),
+        "nombre_paradero": paradero_cercano["nombre"] if paradero_cercano else "Paradero no disponible",
     }
 
 
+   def get_pasajeros_por_corredor(self, radio_km: float = 0.5):
+        """
+        Conteo de pasajeros cercanos para todos los corredores con ubicación en una sola llamada.
+        Devuelve lista de dicts: { id_corredor, numero_pasajeros }
+        """
+        corredores = (
+            self.db.query(Corredor.id_corredor, Corredor.ubicacion_lat, Corredor.ubicacion_lng)
+            .filter(Corredor.ubicacion_lat.isnot(None), Corredor.ubicacion_lng.isnot(None))
+            .all()
+        )
+        conteos = get_indice_pasajeros().contar_por_punto(
+            self.db,
+            {c.id_corredor: (c.ubicacion_lat, c.ubicacion_lng) for c in corredores},
+            radio_km,
+        )
+        return [
+            {"id_corredor": id_corredor, "numero_pasajeros": numero}
+            for id_corredor, numero in conteos.items()
+        ]
+
    def actualizar_ubicacion(self, id_corredor: int, ubicacion_lat: float, ubicacion_lng: float, estado: str):
         corredor = self.db.query(Corredor).filter(Corredor.id_corredor == id_corredor).first()
         if corredor:
@@ -173,12 +110,17 @@ class CorredorService:
             return corredor
         return None
 
-   def calcular_eta(self, id_corredor: int, id_paradero: int, default_speed_kmh: float = 25.0):
+   def calcular_eta(self, id_corredor: int, id_paradero: int, default_speed_kmh: float = 25.0, id_ruta: int = None):
             """
             Calcula el ETA (minutos) desde un corredor hasta un paradero.
+            Si se indica id_ruta, la distancia se mide a lo largo de la ruta
+            (orden de sus paraderos) en lugar de en línea recta.
             Lanza ValueError con mensajes claros si falta información.
             Devuelve dict: { corredor_id, paradero_id, distancia_km, eta_minutos }
             """
+            if id_ruta is not None:
+                return EtaService(self.db, default_speed_kmh).eta_en_ruta(id_ruta, id_corredor, id_paradero)
+
             # Validar corredor
             corredor = self.db.query(Corredor).filter(Corredor.id_corredor == id_corredor).first()
             if not corredor:
@@ -195,16 +137,7 @@ class CorredorService:
             if paradero.coordenada_lat is None or paradero.coordenada_lng is None:
                 raise ValueError("Paradero sin coordenadas")
 
-            # Haversine
-            def haversine(lat1, lon1, lat2, lon2):
-                R = 6371  # km
-                dlat = radians(lat2 - lat1)
-                dlon = radians(lon2 - lon1)
-                a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-                c = 2 * atan2(sqrt(a), sqrt(1 - a))
-                return R * c
-
-            distancia_km = haversine(
+            distancia_km = geo_distancia_km(
                 corredor.ubicacion_lat,
                 corredor.ubicacion_lng,
                 paradero.coordenada_lat,
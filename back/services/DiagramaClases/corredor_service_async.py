@@ -0,0 +1,105 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.db import en_hilo_con_sesion
+from models.Corredor import Corredor
+from models.Paradero import Paradero
+from services.indice_espacial import get_indice_paraderos, get_indice_pasajeros
+from services.geo import distancia_km as geo_distancia_km
+from services.DiagramaClases.eta_service import EtaService
+
+class CorredorServiceAsync:
+   """
+   Versión async de CorredorService (mismas respuestas) sobre AsyncSession.
+   Los índices en memoria se consultan con en_hilo_con_sesion: solo tocan la BD
+   al cargarse, y esa carga (y sus locks) queda fuera del event loop.
+   """
+
+   def __init__(self, db: AsyncSession):
+       self.db = db
+
+   async def get_corredores(self):
+       """Retorna lista serializada de corredores sin cálculos complejos"""
+       filas = await self.db.execute(
+           select(Corredor.id_corredor, Corredor.capacidad_max, Corredor.ubicacion_lat, Corredor.ubicacion_lng, Corredor.estado)
+           .where(Corredor.estado.isnot(None))
+       )
+       return [dict(f) for f in filas.mappings()]
+
+   async def get_corredor_by_id(self, id_corredor: int, radio_km: float = 0.5):
+       corredor = await self.db.get(Corredor, id_corredor)
+       if not corredor:
+           return None
+
+       paradero_cercano = None
+       numero_cercanos = 0
+       if corredor.ubicacion_lat is not None and corredor.ubicacion_lng is not None:
+           lat, lng = corredor.ubicacion_lat, corredor.ubicacion_lng
+           paradero_cercano = await en_hilo_con_sesion(lambda s: get_indice_paraderos().mas_cercano(s, lat, lng))
+           numero_cercanos = await en_hilo_con_sesion(lambda s: get_indice_pasajeros().contar_en_radio(s, lat, lng, radio_km))
+
+       return {
+           "id_corredor": corredor.id_corredor,
+           "capacidad_max": corredor.capacidad_max,
+           "ubicacion_lat": corredor.ubicacion_lat,
+           "ubicacion_lng": corredor.ubicacion_lng,
+           "estado": corredor.estado,
+           "numero_pasajeros": numero_cercanos,
+           "nombre_paradero": paradero_cercano["nombre"] if paradero_cercano else "Paradero no disponible",
+       }
+
+   async def get_pasajeros_por_corredor(self, radio_km: float = 0.5):
+       """Conteo de pasajeros cercanos para todos los corredores con ubicación: [{ id_corredor, numero_pasajeros }]"""
+       filas = await self.db.execute(
+           select(Corredor.id_corredor, Corredor.ubicacion_lat, Corredor.ubicacion_lng)
+           .where(Corredor.ubicacion_lat.isnot(None), Corredor.ubicacion_lng.isnot(None))
+       )
+       puntos = {f.id_corredor: (f.ubicacion_lat, f.ubicacion_lng) for f in filas}
+       conteos = await en_hilo_con_sesion(lambda s: get_indice_pasajeros().contar_por_punto(s, puntos, radio_km))
+       return [
+           {"id_corredor": id_corredor, "numero_pasajeros": numero}
+           for id_corredor, numero in conteos.items()
+       ]
+
+   async def calcular_eta(self, id_corredor: int, id_paradero: int, default_speed_kmh: float = 25.0, id_ruta: int = None):
+       """
+       Igual que CorredorService.calcular_eta: { corredor_id, paradero_id, distancia_km, eta_minutos }
+       Lanza ValueError con mensajes claros si falta información.
+       """
+       if id_ruta is not None:
+           return await en_hilo_con_sesion(
+               lambda s: EtaService(s, default_speed_kmh).eta_en_ruta(id_ruta, id_corredor, id_paradero)
+           )
+
+       corredor = await self.db.get(Corredor, id_corredor)
+       if not corredor:
+           raise ValueError("Corredor no encontrado")
+
+       paradero = await self.db.get(Paradero, id_paradero)
+       if not paradero:
+           raise ValueError("Paradero no encontrado")
+
+       if corredor.ubicacion_lat is None or corredor.ubicacion_lng is None:
+           raise ValueError("Corredor sin ubicación registrada")
+
+       if paradero.coordenada_lat is None or paradero.coordenada_lng is None:
+           raise ValueError("Paradero sin coordenadas")
+
+       distancia_km = geo_distancia_km(
+           corredor.ubicacion_lat,
+           corredor.ubicacion_lng,
+           paradero.coordenada_lat,
+           paradero.coordenada_lng,
+       )
+
+       speed = getattr(corredor, 'velocidad_kmh', default_speed_kmh) or default_speed_kmh
+       minutos = round((distancia_km / speed) * 60) if speed > 0 else None
+
+       if minutos is None:
+           raise ValueError("No es posible calcular ETA con los datos disponibles")
+
+       return {
+           "corredor_id": corredor.id_corredor,
+           "paradero_id": paradero.id_paradero,
+           "distancia_km": distancia_km,
+           "eta_minutos": max(0, minutos),
+       }
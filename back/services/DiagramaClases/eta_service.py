@@ -1,8 +1,13 @@
 from sqlalchemy.orm import Session
 from models.Paradero import Paradero
 from models.Corredor import Corredor
-from math import radians, sin, cos, sqrt, atan2
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Sequence
+import numpy as np
+from services.geo import coordenadas, distancia_km, distancias_uno_a_muchos, matriz_distancias
+from services.indice_espacial import get_indice_paraderos
+from services.posiciones_corredores import get_posiciones_corredores
+from services.red_rutas import get_red_rutas
+from services.velocidades_tramos import get_velocidades_tramos, hora_local
 
 
 class EtaService:
@@ -11,16 +16,18 @@ class EtaService:
         self.default_speed_kmh = default_speed_kmh
 
     def _haversine_km(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        R = 6371.0  # Earth radius in km
-        dlat = radians(lat2 - lat1)
-        dlon = radians(lon2 - lon1)
-        a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        return R * c
-
-    def get_best_eta_for_paradero(self, id_paradero: int) -> Optional[Dict]:
+        return distancia_km(lat1, lon1, lat2, lon2)
+
+    def _velocidades(self, ids_paradero: Sequence[int], hora: Optional[int]) -> np.ndarray:
+        """Velocidad aprendida alrededor de cada paradero (default_speed_kmh si no hay datos)."""
+        return get_velocidades_tramos().velocidades_paraderos(
+            ids_paradero, hora_local() if hora is None else hora, self.default_speed_kmh
+        )
+
+    def get_best_eta_for_paradero(self, id_paradero: int, hora: Optional[int] = None) -> Optional[Dict]:
         """
         Calcula el ETA (en minutos) del corredor que vaya a llegar primero al paradero.
+        La velocidad es la aprendida en los tramos del paradero para la hora.
         Devuelve diccionario con keys: paradero_id, corredor_id, eta_minutos, distancia_km
         Si no hay corredores con ubicación, devuelve None.
         """
@@ -41,36 +48,198 @@ class EtaService:
         if not corredores:
             return None
 
-        best = None
-        for corredor in corredores:
-            try:
-                dist_km = self._haversine_km(
-                    corredor.ubicacion_lat, corredor.ubicacion_lng,
-                    paradero.coordenada_lat, paradero.coordenada_lng,
-                )
-            except Exception:
-                continue
-
-            # velocidad (si en el futuro se añade al modelo, se puede leer aquí)
-            speed = getattr(corredor, 'velocidad_kmh', self.default_speed_kmh) or self.default_speed_kmh
+        # distancias a todos los corredores en una sola operación
+        lats, lngs = coordenadas((c.ubicacion_lat, c.ubicacion_lng) for c in corredores)
+        dist_km = distancias_uno_a_muchos(paradero.coordenada_lat, paradero.coordenada_lng, lats, lngs)
 
-            # minutos estimados
-            minutos = round((dist_km / speed) * 60) if speed > 0 else None
-
-            if minutos is None:
-                continue
+        # velocidad del corredor si el modelo la tuviera; si no, la aprendida cerca del paradero
+        velocidad = float(self._velocidades([paradero.id_paradero], hora)[0])
+        speeds = np.array(
+            [getattr(c, 'velocidad_kmh', None) or velocidad for c in corredores],
+            dtype=np.float64,
+        )
 
-            entry = {
-                'paradero_id': paradero.id_paradero,
-                'corredor_id': corredor.id_corredor,
-                'eta_minutos': max(0, minutos),
-                'distancia_km': dist_km,
-            }
+        # minutos estimados; corredores sin distancia o velocidad válida quedan fuera
+        with np.errstate(divide='ignore', invalid='ignore'):
+            minutos = np.round((dist_km / speeds) * 60)
+        validos = np.isfinite(minutos) & (speeds > 0)
+        if not validos.any():
+            return None
 
-            if best is None or entry['eta_minutos'] < best['eta_minutos']:
-                best = entry
+        i = int(np.argmin(np.where(validos, minutos, np.inf)))
+        best = {
+            'paradero_id': paradero.id_paradero,
+            'corredor_id': corredores[i].id_corredor,
+            'eta_minutos': max(0, int(minutos[i])),
+            'distancia_km': float(dist_km[i]),
+        }
 
         return best
 
+    def calcular_matriz(
+        self,
+        ids_paradero: Optional[Sequence[int]] = None,
+        bbox: Optional[Sequence[float]] = None,
+        top_k: int = 3,
+        max_paraderos: Optional[int] = None,
+        hora: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        ETA de todos los corredores hacia un conjunto de paraderos en una sola pasada.
+
+        Los paraderos salen del índice espacial (por ids o por bounding box
+        `(min_lat, min_lng, max_lat, max_lng)`) y los corredores del snapshot de
+        posiciones en memoria; las distancias se calculan como una sola matriz y
+        los minutos usan la velocidad aprendida alrededor de cada paradero.
+
+        Devuelve por paradero: { paradero_id, mejor, top } donde `mejor` es el
+        corredor con menor ETA (o None) y `top` los `top_k` mejores ordenados.
+        Los ids repetidos se consideran una vez y un paradero sin coordenadas
+        aparece con `mejor` None. Lanza LookupError si algún id no existe y
+        ValueError si hay más de `max_paraderos` paraderos (no se trunca).
+        """
+        indice = get_indice_paraderos()
+        if ids_paradero is not None:
+            pedidos = {i: indice.obtener(self.db, i) for i in dict.fromkeys(ids_paradero)}
+            faltantes = [i for i, p in pedidos.items() if p is None]
+            if faltantes:
+                raise LookupError(f"Paraderos no encontrados: {faltantes}")
+            paraderos = list(pedidos.values())
+        elif bbox is not None:
+            paraderos = indice.en_caja(self.db, *bbox)
+        else:
+            raise ValueError("Debe indicar ids de paradero o un bounding box")
+
+        if max_paraderos is not None and len(paraderos) > max_paraderos:
+            raise ValueError(
+                f"La consulta abarca {len(paraderos)} paraderos; máximo {max_paraderos} (reduzca el bounding box)"
+            )
+        sin_eta = {p["id_paradero"]: {"paradero_id": p["id_paradero"], "mejor": None, "top": []} for p in paraderos}
+        por_id = self._matriz(
+            [p for p in paraderos if p["coordenada_lat"] is not None and p["coordenada_lng"] is not None], top_k, hora
+        )
+        return [por_id.get(i, fila) for i, fila in sin_eta.items()]
+
+    def _matriz(self, paraderos: List[Dict], top_k: int, hora: Optional[int]) -> Dict[int, Dict]:
+        """{id_paradero: { paradero_id, mejor, top }} para paraderos con coordenadas."""
+        if not paraderos:
+            return {}
+        corredores = get_posiciones_corredores().arreglos(self.db)
+        if len(corredores) == 0:
+            return {}
+
+        lats_p, lngs_p = coordenadas((p["coordenada_lat"], p["coordenada_lng"]) for p in paraderos)
+        dist = matriz_distancias(lats_p, lngs_p, corredores.lats, corredores.lngs)
+        velocidades = self._velocidades([p["id_paradero"] for p in paraderos], hora)
+        minutos = np.maximum(np.round(dist / velocidades[:, None] * 60), 0).astype(np.int64)
+
+        # top-k por fila: argpartition (O(C)) y luego ordenar solo esos k
+        k = max(1, min(top_k, len(corredores)))
+        if k < len(corredores):
+            candidatos = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            candidatos = np.broadcast_to(np.arange(len(corredores)), dist.shape)
+        filas = np.arange(len(paraderos))[:, None]
+        orden = np.argsort(dist[filas, candidatos], axis=1, kind="stable")
+        top_idx = candidatos[filas, orden]
+
+        resultado = {}
+        for i, p in enumerate(paraderos):
+            top = [
+                {
+                    "corredor_id": int(corredores.ids[j]),
+                    "eta_minutos": int(minutos[i, j]),
+                    "distancia_km": float(dist[i, j]),
+                }
+                for j in top_idx[i]
+            ]
+            resultado[p["id_paradero"]] = {"paradero_id": p["id_paradero"], "mejor": top[0], "top": top}
+        return resultado
+
+    def etas_en_ruta(self, id_ruta: int, id_corredor: int, hora: Optional[int] = None) -> Dict:
+        """
+        ETA de un corredor a todos los paraderos que le quedan por delante en una ruta.
+
+        La posición del corredor se proyecta sobre la polilínea de la ruta
+        (paraderos en orden de RutaParadero.orden) y la distancia a cada
+        paradero es la diferencia de distancias acumuladas, más el desvío del
+        corredor respecto a la ruta. El tiempo usa la velocidad aprendida de
+        cada tramo para la hora (services.velocidades_tramos) y, sin datos,
+        default_speed_kmh. Todo se resuelve en una sola pasada.
+
+        Devuelve: { ruta_id, corredor_id, avance_km, desvio_km,
+                    paraderos: [ { paradero_id, nombre, orden, distancia_km, eta_minutos } ] }
+        Lanza ValueError si falta la ruta, el corredor o su ubicación.
+        """
+        geometria = get_red_rutas().geometria(self.db, id_ruta)
+        if geometria is None:
+            raise ValueError("Ruta no encontrada o sin paraderos")
+
+        posicion = get_posiciones_corredores().obtener(self.db, id_corredor)
+        if posicion is None:
+            raise ValueError("Corredor no encontrado")
+        lat, lng, _ = posicion
+        if lat is None or lng is None:
+            raise ValueError("Corredor sin ubicación registrada")
+
+        proyeccion = geometria.proyectar(lat, lng)
+        if proyeccion is None:
+            raise ValueError("La ruta necesita al menos dos paraderos con coordenadas")
+
+        restante = geometria.acumulado_km - proyeccion["avance_km"]
+        # tolerancia numérica: un paradero justo en la posición del corredor sigue por delante
+        siguientes = np.nonzero(restante >= -1e-9)[0]
+        dist = np.maximum(restante[siguientes], 0.0) + proyeccion["desvio_km"]
+
+        # minutos acumulados a lo largo de la ruta con la velocidad de cada tramo
+        velocidades = get_velocidades_tramos().velocidades_ruta(
+            self.db, get_red_rutas(), geometria, hora_local() if hora is None else hora, self.default_speed_kmh
+        )
+        acumulado_min = np.concatenate(([0.0], np.cumsum(geometria.tramo_km / velocidades * 60)))
+        tramo = proyeccion["tramo"]
+        largo_tramo = geometria.tramo_km[tramo]
+        fraccion = (proyeccion["avance_km"] - geometria.acumulado_km[tramo]) / largo_tramo if largo_tramo > 0 else 0.0
+        avance_min = acumulado_min[tramo] + fraccion * (acumulado_min[tramo + 1] - acumulado_min[tramo])
+        minutos = np.maximum(acumulado_min[siguientes] - avance_min, 0.0)
+        minutos = np.round(minutos + proyeccion["desvio_km"] / self.default_speed_kmh * 60).astype(np.int64)
+
+        return {
+            "ruta_id": id_ruta,
+            "corredor_id": id_corredor,
+            "avance_km": proyeccion["avance_km"],
+            "desvio_km": proyeccion["desvio_km"],
+            "paraderos": [
+                {
+                    "paradero_id": int(geometria.ids_paradero[i]),
+                    "nombre": geometria.nombres[i],
+                    "orden": geometria.ordenes[i],
+                    "distancia_km": float(d),
+                    "eta_minutos": int(m),
+                }
+                for i, d, m in zip(siguientes, dist, minutos)
+            ],
+        }
+
+    def eta_en_ruta(self, id_ruta: int, id_corredor: int, id_paradero: int) -> Dict:
+        """
+        ETA de un corredor a un paradero siguiendo la ruta.
+        Devuelve dict: { corredor_id, paradero_id, ruta_id, distancia_km, eta_minutos }
+        """
+        geometria = get_red_rutas().geometria(self.db, id_ruta)
+        if geometria is not None and geometria.posicion_de(id_paradero) is None:
+            raise ValueError("El paradero no pertenece a la ruta")
+
+        etas = self.etas_en_ruta(id_ruta, id_corredor)
+        for p in etas["paraderos"]:
+            if p["paradero_id"] == id_paradero:
+                return {
+                    "corredor_id": id_corredor,
+                    "paradero_id": id_paradero,
+                    "ruta_id": id_ruta,
+                    "distancia_km": p["distancia_km"],
+                    "eta_minutos": p["eta_minutos"],
+                }
+        raise ValueError("El corredor ya pasó el paradero en esta ruta")
+
 
 __all__ = ["EtaService"]
@@ -1,11 +1,13 @@
 from typing import Optional, Iterable, Dict
-from sqlalchemy import MetaData, Table, select
+from sqlalchemy import Table, select
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
 from models.Paradero import Paradero
 from sqlalchemy.orm import Session
 
 from config.db import engine as shared_engine
+from config.esquema import get_registro_esquema
+from services.indice_espacial import get_indice_paraderos
 
 class Paradero_Service:
     """
@@ -20,41 +22,32 @@ class Paradero_Service:
         self.db = db
 
     def _reflect_table(self, candidates: Iterable[str]) -> Table:
-        meta = MetaData()
-        last_err = None
-        for name in candidates:
-            try:
-                tbl = Table(name, meta, autoload_with=self.engine)
-                return tbl
-            except Exception as e:
-                last_err = e
-                continue
-        raise RuntimeError(f"No se encontró tabla paradero entre: {list(candidates)}. Error: {last_err}")
+        # Reflejada una sola vez por engine (ver config/esquema.py)
+        return get_registro_esquema().tabla(self.engine, candidates)
 
     def _choose_id_column(self, table: Table, candidates=("id_paradero", "id", "paradero_id")):
-        cols = set(table.columns.keys())
-        for c in candidates:
-            if c in cols:
-                return table.c[c]
-        pkcols = list(table.primary_key.columns)
-        if pkcols:
-            return pkcols[0]
-        return None
+        def elegir(t: Table):
+            cols = set(t.columns.keys())
+            for c in candidates:
+                if c in cols:
+                    return t.c[c]
+            pkcols = list(t.primary_key.columns)
+            if pkcols:
+                return pkcols[0]
+            return None
+        return get_registro_esquema().elegido(table, ("id", tuple(candidates)), elegir)
     
     def get_paraderos(self) -> list[Dict]:
-        """Retorna lista serializada de paraderos sin reflexión ni lógica compleja"""
-        paraderos = self.db.query(Paradero).all()
-        return [
-            {
-                "id_paradero": p.id_paradero,
-                "nombre": p.nombre,
-                "coordenada_lat": p.coordenada_lat,
-                "coordenada_lng": p.coordenada_lng,
-                "colapso_actual": p.colapso_actual,
-                "imagen_url": p.imagen_url
-            }
-            for p in paraderos
-        ]
+        """Retorna lista serializada de paraderos desde el índice en memoria"""
+        return get_indice_paraderos().listar(self.db)
+
+    def get_paraderos_cercanos(self, lat: float, lng: float, radio_km: float) -> list[Dict]:
+        """Paraderos dentro de `radio_km` de (lat, lng), del más cercano al más lejano"""
+        return get_indice_paraderos().en_radio(self.db, lat, lng, radio_km)
+
+    def get_paradero_mas_cercano(self, lat: float, lng: float) -> Optional[Dict]:
+        """Paradero más cercano a (lat, lng) con su distancia_km, o None si no hay paraderos"""
+        return get_indice_paraderos().mas_cercano(self.db, lat, lng)
 
     def get_paradero_by_id(self, id_paradero: int) -> Optional[Dict]:
         table = self._reflect_table(("paradero", "paraderos"))
@@ -0,0 +1,40 @@
+import asyncio
+from typing import Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.db import en_hilo_con_sesion
+from services.indice_espacial import get_indice_paraderos
+from .paradero_service import Paradero_Service
+
+
+class ParaderoServiceAsync:
+    """
+    Versión async de Paradero_Service sobre AsyncSession.
+    La tabla reflejada se toma del servicio sync (registro de esquema) y los
+    paraderos en memoria se leen con en_hilo_con_sesion; ambos en un hilo, así
+    una reflexión o carga de caché (la primera vez o tras invalidar) no
+    bloquea el event loop.
+    """
+
+    def __init__(self, db: AsyncSession, base: Paradero_Service = None):
+        self.db = db
+        self.base = base or Paradero_Service()
+
+    async def get_paraderos(self) -> list[Dict]:
+        return await en_hilo_con_sesion(lambda s: get_indice_paraderos().listar(s))
+
+    async def get_paraderos_cercanos(self, lat: float, lng: float, radio_km: float) -> list[Dict]:
+        return await en_hilo_con_sesion(lambda s: get_indice_paraderos().en_radio(s, lat, lng, radio_km))
+
+    async def get_paradero_mas_cercano(self, lat: float, lng: float) -> Optional[Dict]:
+        return await en_hilo_con_sesion(lambda s: get_indice_paraderos().mas_cercano(s, lat, lng))
+
+    async def get_paradero_by_id(self, id_paradero: int) -> Optional[Dict]:
+        table = await asyncio.to_thread(self.base._reflect_table, ("paradero", "paraderos"))
+        id_col = self.base._choose_id_column(table, ("id_paradero", "id", "paradero_id"))
+        if id_col is None:
+            raise RuntimeError(f"No se encontró columna ID en la tabla {table.name}")
+        res = await self.db.execute(select(table).where(id_col == id_paradero).limit(1))
+        row = res.mappings().first()
+        return dict(row) if row is not None else None
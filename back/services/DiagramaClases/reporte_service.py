@@ -1,15 +1,20 @@
 import os
-from typing import Dict, Optional, Iterable
-from sqlalchemy import MetaData, Table, insert, select
+from typing import Dict, List, Optional, Iterable
+from sqlalchemy import Table, insert, select
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 from datetime import datetime
 
 from config.db import engine as shared_engine
+from config.esquema import get_registro_esquema
+from services import resumen_reportes
 from .paradero_service import Paradero_Service
 from .reporte_factory import CreadorReportes
 from services.usuario_service import UsuarioService
-from config.firebase import get_firebase_admin, FirebaseAdmin
+from services.despacho_notificaciones import encolar, get_despachador_notificaciones, notificacion
+from services.destinatarios_alertas import get_destinatarios_alertas, notificaciones_dirigidas
+from services.coalescencia_alertas import agrupar, get_ventana_alertas
 from config.db import SessionLocal
 from models.UsuarioBase import UsuarioBase
 
@@ -22,25 +27,32 @@ class ReporteService:
         # instancia factory si la usas (ajusta según tu implementación)
         self.reporte_factory = CreadorReportes()
 
+    TABLA_REPORTE = ("reporte", "reportes", "report")
+    COLUMNAS_CLIENTE = ("id_reporte_cliente", "id_reporte_externo", "external_id", "uuid", "uuid_cliente")
+
     def _reflect_table(self, candidates: Iterable[str]) -> Table:
-        meta = MetaData()
-        last_err = None
-        for name in candidates:
-            try:
-                tbl = Table(name, meta, autoload_with=self.engine)
-                return tbl
-            except Exception as e:
-                last_err = e
-                continue
-        raise RuntimeError(f"No se encontró ninguna tabla entre: {list(candidates)}. Error último: {last_err}")
+        # Reflejada una sola vez por engine (ver config/esquema.py)
+        return get_registro_esquema().tabla(self.engine, candidates)
 
     def _is_identity_col(self, col) -> bool:
         return getattr(col, "identity", None) is not None
 
+    def _columnas_reporte(self, table: Table) -> Dict:
+        """Columnas de la tabla reporte resueltas una vez: todas, identity, cliente e idempotencia."""
+        def elegir(t: Table) -> Dict:
+            identity = {c.name for c in t.columns if self._is_identity_col(c)}
+            candidates = ("id_reporte_cliente","id_reporte_externo","external_id","uuid","uuid_cliente","id_reporte","reporte_id","id")
+            return {
+                "cols": set(t.columns.keys()),
+                "identity": identity,
+                "cliente": next((cc for cc in self.COLUMNAS_CLIENTE if cc in t.c), None),
+                "idempotencia": next((t.c[n] for n in candidates if n in t.c and n not in identity), None),
+            }
+        return get_registro_esquema().elegido(table, "columnas_reporte", elegir)
+
     def find_report_by_id_reporte(self, id_reporte: str) -> Optional[Dict]:
-        table = self._reflect_table(("reporte", "reportes", "report"))
-        candidates = ("id_reporte_cliente","id_reporte_externo","external_id","uuid","uuid_cliente","id_reporte","reporte_id","id")
-        id_col = next((table.c[name] for name in candidates if name in table.c and not self._is_identity_col(table.c[name])), None)
+        table = self._reflect_table(self.TABLA_REPORTE)
+        id_col = self._columnas_reporte(table)["idempotencia"]
         if id_col is None:
             # no hay columna usable para idempotencia; devolvemos None
             return None
@@ -54,47 +66,72 @@ class ReporteService:
             print("[DB ERROR] ReporteService.find_report_by_id_reporte:", e)
             raise
 
-    def save_report(self, record: Dict) -> Dict:
-        table = self._reflect_table(("reporte", "reportes", "report"))
-        cols = set(table.columns.keys())
+    def save_report(self, record: Dict, notificaciones: Iterable[Dict] = ()) -> Dict:
+        """Inserta el reporte y, en la misma transacción, su resumen diario y sus notificaciones (outbox)."""
+        table, allowed = self._preparar_insert(record)
+        try:
+            with self.engine.begin() as conn:
+                stmt = insert(table).values(**allowed).returning(*table.c)
+                res = conn.execute(stmt)
+                row = res.mappings().first()
+                if row is None: # Corrected from === None
+                    raise Exception("Fallo al insertar reporte")
+                # Contador diario del dashboard, en la misma transacción
+                resumen_reportes.registrar(conn, dict(row))
+                encolar(conn, notificaciones, id_reporte=row.get("id_reporte"))
+                return dict(row)
+        except SQLAlchemyError as e:
+            print("[DB ERROR] ReporteService.save_report:", e)
+            raise
+
+    def _guardar_agrupando(self, record: Dict, notificaciones: Iterable[Dict] = ()) -> Dict:
+        """
+        Guarda el reporte o, si repite una alerta abierta con la misma
+        (tipo, ruta, paradero, corredor), actualiza la original y difiere
+        una sola notificación de actualización (ver services.coalescencia_alertas).
+        """
+        ventana = get_ventana_alertas()
+        alerta = ventana.repetir(record)
+        if alerta is None:
+            try:
+                saved = self.save_report(record, notificaciones=notificaciones)
+            except Exception:
+                ventana.descartar(record)
+                raise
+            ventana.abrir(saved, record)
+            return saved
+        try:
+            with self.engine.begin() as conn:
+                saved = agrupar(conn, alerta, record, list(notificaciones))
+        except SQLAlchemyError as e:
+            print("[DB ERROR] ReporteService._guardar_agrupando:", e)
+            raise
+        ventana.confirmar(alerta, saved)
+        return saved
+
+    def _preparar_insert(self, record: Dict):
+        """Tabla reporte y valores insertables del record (compartido con ReporteServiceAsync)."""
+        table = self._reflect_table(self.TABLA_REPORTE)
+        columnas = self._columnas_reporte(table)
+        cols, identity = columnas["cols"], columnas["identity"]
         rec = dict(record)
 
         # si id_reporte es identity, mover valor enviado a columna cliente si existe
-        if "id_reporte" in rec and "id_reporte" in cols and self._is_identity_col(table.c["id_reporte"]):
-            client_cols = ("id_reporte_cliente","id_reporte_externo","external_id","uuid","uuid_cliente")
-            for cc in client_cols:
-                if cc in cols:
-                    rec[cc] = rec.pop("id_reporte")
-                    break
+        if "id_reporte" in rec and "id_reporte" in identity:
+            if columnas["cliente"] is not None:
+                rec[columnas["cliente"]] = rec.pop("id_reporte")
             else:
                 rec.pop("id_reporte", None)
 
         # eliminar columnas identity del insert
-        allowed = {}
-        for k,v in rec.items():
-            if k in cols:
-                col = table.c[k]
-                if self._is_identity_col(col):
-                    continue
-                allowed[k] = v
+        allowed = {k: v for k, v in rec.items() if k in cols and k not in identity}
 
         if "fecha" in cols and "fecha" not in allowed:
             allowed["fecha"] = datetime.utcnow()
 
         if not allowed:
             raise RuntimeError(f"Ninguna key del record coincide con columnas insertables de {table.name}. Columnas: {sorted(list(cols))}")
-
-        try:
-            with self.engine.begin() as conn:
-                stmt = insert(table).values(**allowed).returning(*table.c)
-                res = conn.execute(stmt)
-                row = res.mappings().first()
-                if row is None: # Corrected from === None
-                    raise Exception("Fallo al insertar reporte")
-                return dict(row)
-        except SQLAlchemyError as e:
-            print("[DB ERROR] ReporteService.save_report:", e)
-            raise
+        return table, allowed
 
     def crear_reporte_desvio(self, payload: Dict) -> Dict:
         """
@@ -104,20 +141,7 @@ class ReporteService:
         - usa factory para transformar payload
         - persiste y devuelve fila insertada
         """
-        # 1. Usar la factory para crear un objeto de reporte estandarizado
-        reporte_obj = self.reporte_factory.crear("desvio", payload)
-
-        # 2. Construir un diccionario limpio para la base de datos
-        record = {
-            "id_reporte": reporte_obj.id_reporte,
-            "id_emisor": reporte_obj.conductor_id,
-            "id_tipo_reporte": payload.get("id_tipo_reporte"), # El tipo viene en el payload original
-            "id_ruta_afectada": reporte_obj.ruta_id,
-            "id_paradero_inicial": reporte_obj.paradero_afectado_id,
-            "id_paradero_final": reporte_obj.paradero_alterna_id,
-            "descripcion": reporte_obj.descripcion,
-            "mensaje": reporte_obj.generar_mensaje(),
-        }
+        reporte_obj, record = self._record_desvio(payload)
 
         # 3. Validar paradero
         if not self.paradero_service.get_paradero_by_id(record["id_paradero_inicial"]):
@@ -130,23 +154,11 @@ class ReporteService:
             if existing:
                 return existing # Devuelve el reporte existente si se reenvía
 
-        # 5. Persistir en la base de datos
-        saved = self.save_report(record)
-        
-        # 6. Enviar notificación a reguladores
-        try:
-            firebase_admin_instance = get_firebase_admin()
-            # Enviar notificación a un tema específico para reguladores
-            firebase_admin_instance.send_to_topic(
-                topic="reguladores_alerts", # Nuevo tema para reguladores
-                title="Alerta de Desvío",
-                body=reporte_obj.generar_mensaje()
-            )
-            print("✅ Notificación de desvío enviada al tema 'reguladores_alerts'")
-        except Exception as e:
-            print(f"❌ Error al enviar notificación de desvío a reguladores: {e}")
-        finally:
-            pass # No hay db.close() porque no se abre una nueva sesión en este bloque
+        # 5. Persistir en la base de datos junto con las notificaciones a reguladores y a
+        #    los pasajeros de la zona (las envía el despachador en segundo plano, no esta petición)
+        #    Un desvío repetido en la ventana actualiza el original en lugar de duplicarlo
+        saved = self._guardar_agrupando(record, notificaciones=self._notificaciones_desvio(reporte_obj, self._destinatarios(record)))
+        get_despachador_notificaciones().despertar()
 
         return saved
     
@@ -177,32 +189,11 @@ class ReporteService:
         if id_corredor_asignado is None:
             raise ValueError("El conductor no tiene un corredor asignado en usuario_base")
 
-        # 3️⃣ Crear el record según si existe factory
-        if self.reporte_factory:
-            reporte_obj = self.reporte_factory.crear("retraso", payload)
-            record = getattr(reporte_obj, "to_dict", None)
-            record = record() if callable(record) else None
-            if record is None: # Corrected from === None
-                record = {
-                    "id_reporte": reporte_obj.id_reporte,
-                    "id_tipo_reporte": payload.get("id_tipo_reporte"),
-                    "id_emisor": conductor_id,
-                    "id_ruta_afectada": reporte_obj.ruta_id,
-                    "id_paradero_inicial": reporte_obj.paradero_inicial_id,
-                    "id_paradero_final": reporte_obj.paradero_final_id,
-                    "tiempo_retraso_min": reporte_obj.tiempo_retraso_min,
-                    "descripcion": reporte_obj.descripcion,
-                    "mensaje": reporte_obj.generar_mensaje(),
-                }
-        else:
-            record = dict(payload)
-            record.setdefault(
-                "mensaje",
-                f"Retraso en ruta {payload.get('ruta_id')} de paradero {payload.get('paradero_inicial_id')} "
-                f"a {payload.get('paradero_final_id')} ({payload.get('tiempo_retraso_min')} min)",
-            )
+        # 3️⃣ Crear el record según si existe factory (con el corredor asignado)
+        record = self._record_retraso(payload, conductor_id, id_corredor_asignado)
 
-        saved = self.save_report(record)
+        # 4️⃣ Guardar (un retraso reenviado dentro de la ventana actualiza el original)
+        saved = self._guardar_agrupando(record)
         return saved
     
     def obtener_ultimo_reporte_por_corredor_id(self, id_corredor: int):
@@ -211,7 +202,7 @@ class ReporteService:
         filtrado por id_corredor_afectado
         """
 
-        table = self._reflect_table(("reporte", "reportes", "report"))
+        table = self._reflect_table(self.TABLA_REPORTE)
         cols = table.c
 
         if "id_corredor_afectado" not in cols or "id_tipo_reporte" not in cols or "fecha" not in cols:
@@ -260,7 +251,79 @@ class ReporteService:
         if id_corredor_asignado is None: # Corrected from === None
             raise ValueError("El conductor no tiene un corredor asignado en usuario_base")
 
-        # 3️⃣ Crear el record según si existe factory
+        # 3️⃣ Crear el record según si existe factory (con el corredor asignado)
+        record = self._record_falla(payload, id_corredor_asignado)
+
+        # 5️⃣ Guardar
+        saved = self.save_report(record)
+        return saved
+
+    def _notificaciones_desvio(self, reporte_obj, tokens: List[str]) -> List[Dict]:
+        """Notificación al tema de reguladores y, por token, a los pasajeros afectados por el desvío"""
+        mensaje = reporte_obj.generar_mensaje()
+        return [
+            notificacion(titulo="Alerta de Desvío", cuerpo=mensaje, topic="reguladores_alerts"),
+            *notificaciones_dirigidas("Desvío en tu ruta", mensaje, tokens),
+        ]
+
+    def _destinatarios(self, record: Dict) -> List[str]:
+        """Tokens de los pasajeros cerca de la ruta/paraderos del reporte o que suelen usarlos"""
+        try:
+            with Session(self.engine) as db:
+                return get_destinatarios_alertas().para_reporte(db, record)
+        except Exception as e:
+            # Sin destinatarios el reporte igual se guarda y los reguladores reciben la alerta
+            print("[ERROR] No se pudieron resolver los destinatarios del reporte:", e)
+            return []
+
+    def _record_desvio(self, payload: Dict):
+        """(objeto de reporte, record para la BD) de un desvío."""
+        # 1. Usar la factory para crear un objeto de reporte estandarizado
+        reporte_obj = self.reporte_factory.crear("desvio", payload)
+
+        # 2. Construir un diccionario limpio para la base de datos
+        record = {
+            "id_reporte": reporte_obj.id_reporte,
+            "id_emisor": reporte_obj.conductor_id,
+            "id_tipo_reporte": payload.get("id_tipo_reporte"), # El tipo viene en el payload original
+            "id_ruta_afectada": reporte_obj.ruta_id,
+            "id_paradero_inicial": reporte_obj.paradero_afectado_id,
+            "id_paradero_final": reporte_obj.paradero_alterna_id,
+            "descripcion": reporte_obj.descripcion,
+            "mensaje": reporte_obj.generar_mensaje(),
+        }
+        return reporte_obj, record
+
+    def _record_retraso(self, payload: Dict, conductor_id, id_corredor_asignado) -> Dict:
+        """Record para la BD de un retraso, con el corredor asignado del conductor."""
+        if self.reporte_factory:
+            reporte_obj = self.reporte_factory.crear("retraso", payload)
+            record = getattr(reporte_obj, "to_dict", None)
+            record = record() if callable(record) else None
+            if record is None: # Corrected from === None
+                record = {
+                    "id_reporte": reporte_obj.id_reporte,
+                    "id_tipo_reporte": payload.get("id_tipo_reporte"),
+                    "id_emisor": conductor_id,
+                    "id_ruta_afectada": reporte_obj.ruta_id,
+                    "id_paradero_inicial": reporte_obj.paradero_inicial_id,
+                    "id_paradero_final": reporte_obj.paradero_final_id,
+                    "tiempo_retraso_min": reporte_obj.tiempo_retraso_min,
+                    "descripcion": reporte_obj.descripcion,
+                    "mensaje": reporte_obj.generar_mensaje(),
+                }
+        else:
+            record = dict(payload)
+            record.setdefault(
+                "mensaje",
+                f"Retraso en ruta {payload.get('ruta_id')} de paradero {payload.get('paradero_inicial_id')} "
+                f"a {payload.get('paradero_final_id')} ({payload.get('tiempo_retraso_min')} min)",
+            )
+        record["id_corredor_afectado"] = id_corredor_asignado
+        return record
+
+    def _record_falla(self, payload: Dict, id_corredor_asignado) -> Dict:
+        """Record para la BD de una falla, con el corredor asignado del conductor."""
         if self.reporte_factory:
             reporte_obj = self.reporte_factory.crear("falla", payload)
             record = getattr(reporte_obj, "to_dict", lambda: None)()
@@ -292,7 +355,4 @@ class ReporteService:
         
         # 4️⃣ Insertar corredor asignado automáticamente
         record["id_corredor_afectado"] = id_corredor_asignado
-
-        # 5️⃣ Guardar
-        saved = self.save_report(record)
-        return saved
+        return record
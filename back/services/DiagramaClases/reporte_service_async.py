@@ -0,0 +1,141 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.db import en_hilo_con_sesion
+from services import resumen_reportes
+from services.despacho_notificaciones import encolar_async, get_despachador_notificaciones
+from services.destinatarios_alertas import get_destinatarios_alertas
+from services.coalescencia_alertas import agrupar_async, get_ventana_alertas
+from models.UsuarioBase import UsuarioBase
+from .paradero_service_async import ParaderoServiceAsync
+from .reporte_service import ReporteService
+
+
+class ReporteServiceAsync:
+    """
+    Versión async de ReporteService sobre AsyncSession.
+    La tabla reporte, las columnas insertables y el armado de cada record
+    vienen del servicio sync; la reflexión (si la tabla no está en el registro)
+    corre en un hilo para no bloquear el event loop.
+    """
+
+    def __init__(self, db: AsyncSession, base: ReporteService = None):
+        self.db = db
+        self.base = base or ReporteService()
+        self.paraderos = ParaderoServiceAsync(db, self.base.paradero_service)
+
+    async def find_report_by_id_reporte(self, id_reporte: str) -> Optional[Dict]:
+        table = await asyncio.to_thread(self.base._reflect_table, ReporteService.TABLA_REPORTE)
+        id_col = self.base._columnas_reporte(table)["idempotencia"]
+        if id_col is None:
+            return None
+        res = await self.db.execute(select(table).where(id_col == id_reporte).limit(1))
+        row = res.mappings().first()
+        return dict(row) if row is not None else None
+
+    async def save_report(self, record: Dict, notificaciones: Iterable[Dict] = ()) -> Dict:
+        table, allowed = await asyncio.to_thread(self.base._preparar_insert, record)
+        try:
+            res = await self.db.execute(insert(table).values(**allowed).returning(*table.c))
+            row = res.mappings().first()
+            if row is None:
+                raise Exception("Fallo al insertar reporte")
+            conexion = await self.db.connection()
+            await resumen_reportes.registrar_async(conexion, dict(row))
+            await encolar_async(conexion, notificaciones, id_reporte=row.get("id_reporte"))
+            await self.db.commit()
+            return dict(row)
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            print("[DB ERROR] ReporteServiceAsync.save_report:", e)
+            raise
+
+    async def _guardar_agrupando(self, record: Dict, notificaciones: Iterable[Dict] = ()) -> Dict:
+        """Igual que ReporteService._guardar_agrupando, sobre la AsyncSession."""
+        ventana = get_ventana_alertas()
+        # repetir puede esperar a que otra petición termine de guardar el original
+        alerta = await asyncio.to_thread(ventana.repetir, record)
+        if alerta is None:
+            try:
+                saved = await self.save_report(record, notificaciones=notificaciones)
+            except Exception:
+                ventana.descartar(record)
+                raise
+            ventana.abrir(saved, record)
+            return saved
+        try:
+            saved = await agrupar_async(await self.db.connection(), alerta, record, list(notificaciones))
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            print("[DB ERROR] ReporteServiceAsync._guardar_agrupando:", e)
+            raise
+        ventana.confirmar(alerta, saved)
+        return saved
+
+    async def _corredor_asignado(self, payload: Dict):
+        """(conductor_id, id_corredor_asignado) del emisor; ValueError si falta algo."""
+        conductor_id = payload.get("id_emisor") or payload.get("conductor_id")
+        if conductor_id is None:
+            raise ValueError("No se recibió conductor (id_emisor) en el payload")
+        res = await self.db.execute(
+            select(UsuarioBase.id_corredor_asignado).where(UsuarioBase.id_usuario == int(conductor_id))
+        )
+        fila = res.first()
+        if fila is None:
+            raise ValueError(f"El usuario {conductor_id} no existe")
+        if fila.id_corredor_asignado is None:
+            raise ValueError("El conductor no tiene un corredor asignado en usuario_base")
+        return conductor_id, fila.id_corredor_asignado
+
+    async def _destinatarios(self, record: Dict) -> List[str]:
+        """Igual que ReporteService._destinatarios; las estructuras en memoria se consultan en un hilo."""
+        try:
+            return await en_hilo_con_sesion(lambda s: get_destinatarios_alertas().para_reporte(s, record))
+        except Exception as e:
+            print("[ERROR] No se pudieron resolver los destinatarios del reporte:", e)
+            return []
+
+    async def crear_reporte_desvio(self, payload: Dict) -> Dict:
+        reporte_obj, record = self.base._record_desvio(payload)
+
+        if not await self.paraderos.get_paradero_by_id(record["id_paradero_inicial"]):
+            raise ValueError(f"Paradero afectado no encontrado: {record['id_paradero_inicial']}")
+
+        id_cliente = str(record.get("id_reporte"))
+        if id_cliente:
+            existing = await self.find_report_by_id_reporte(id_cliente)
+            if existing:
+                return existing
+
+        # Las notificaciones quedan en el outbox con el reporte; las envía el despachador
+        tokens = await self._destinatarios(record)
+        saved = await self._guardar_agrupando(record, notificaciones=self.base._notificaciones_desvio(reporte_obj, tokens))
+        get_despachador_notificaciones().despertar()
+        return saved
+
+    async def crear_reporte_retraso(self, payload: Dict) -> Dict:
+        conductor_id, id_corredor_asignado = await self._corredor_asignado(payload)
+        return await self._guardar_agrupando(self.base._record_retraso(payload, conductor_id, id_corredor_asignado))
+
+    async def crear_reporte_falla(self, payload: Dict) -> Dict:
+        _, id_corredor_asignado = await self._corredor_asignado(payload)
+        return await self.save_report(self.base._record_falla(payload, id_corredor_asignado))
+
+    async def obtener_ultimo_reporte_por_corredor_id(self, id_corredor: int):
+        """Último reporte de retraso (id_tipo_reporte = 2) del corredor, o None"""
+        table = await asyncio.to_thread(self.base._reflect_table, ReporteService.TABLA_REPORTE)
+        cols = table.c
+        if "id_corredor_afectado" not in cols or "id_tipo_reporte" not in cols or "fecha" not in cols:
+            raise ValueError("Las columnas necesarias no existen en la tabla reporte")
+        res = await self.db.execute(
+            select(table)
+            .where(cols.id_corredor_afectado == id_corredor, cols.id_tipo_reporte == 2)
+            .order_by(cols.fecha.desc())
+            .limit(1)
+        )
+        row = res.mappings().first()
+        return dict(row) if row else None
@@ -1,12 +1,13 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
 from models.Ruta import Ruta
-from models.RutaParadero import RutaParadero
+from models.UsuarioBase import UsuarioBase
 from .SistemaFiltros import SistemaFiltros
 from .FiltroRuta import FiltroRuta
+from .FiltroTexto import FiltroTexto
 from .FiltroCercania import FiltroCercania
-from .paradero_service import Paradero_Service
-from config.db import engine as shared_engine
+from services.catalogo_rutas import get_catalogo_rutas
+from services.indice_texto import get_indice_nombres
+from services.ubicaciones_usuarios import get_ubicaciones_usuarios
 from typing import Optional, List, Dict
 
 
@@ -21,11 +22,16 @@ class RutaService:
         self.db.refresh(nueva_ruta)
         return nueva_ruta
 
-    def get_rutas(self) -> List[Dict]:
-        rutas = self.db.query(Ruta).all()
+    def get_rutas(self, nombre: Optional[str] = None) -> List[Dict]:
+        # El filtro por nombre se resuelve en la consulta (ILIKE), no sobre la lista cargada
+        sistema_filtros = SistemaFiltros()
+        if nombre and nombre.strip():
+            sistema_filtros.agregar_estrategia(FiltroRuta(nombre))
+        consulta = sistema_filtros.aplicar_a_consulta(self.db.query(Ruta.id_ruta, Ruta.nombre))
+        rutas = sistema_filtros.aplicar_filtros(consulta.all())
         return [{'id_ruta': r.id_ruta, 'nombre': r.nombre} for r in rutas]
 
-    def filtrar_rutas(self, ruta: Optional[str] = None, ruta_id: Optional[int] = None, distrito: Optional[str] = None, distancia: Optional[float] = None) -> List[Dict]:
+    def filtrar_rutas(self, ruta: Optional[str] = None, ruta_id: Optional[int] = None, distrito: Optional[str] = None, distancia: Optional[float] = None, usuario_id: Optional[int] = None) -> List[Dict]:
         """
         Filtra rutas usando el patrón Strategy y adjunta paraderos.
 
@@ -34,15 +40,18 @@ class RutaService:
           asociados a esa ruta (lista de dicts).
         - En caso contrario, aplica los filtros sobre rutas y devuelve una lista
           de dicts {id_ruta, nombre, paraderos: [...]}
+        - El filtro por `distancia` usa la última ubicación conocida de `usuario_id`
+          (la ruta HTTP exige `usuario_id`); sin ubicación lanza LookupError.
         """
-        paradero_svc = Paradero_Service(shared_engine)
+        catalogo = get_catalogo_rutas()
 
-        # Si se pidió por id explícito, devolver sólo los paraderos
+        # Si se pidió por id explícito, devolver sólo los paraderos (en orden de la ruta)
         if ruta_id is not None:
-            return paradero_svc.get_paraderos_by_ruta(ruta_id)
+            ruta_obj = catalogo.obtener(self.db, ruta_id)
+            return list(ruta_obj.serializada['paraderos']) if ruta_obj else []
 
-        # Obtener todas las rutas con paraderos cargados para evitar lazy loads
-        todas_rutas = self.db.query(Ruta).options(joinedload(Ruta.ruta_paraderos).joinedload(RutaParadero.paradero)).all()
+        # Rutas con sus paraderos ya ordenados y serializados (snapshot en memoria)
+        todas_rutas = catalogo.rutas(self.db)
 
         # Nota: El modelo Ruta no tiene campo distrito actualmente.
         # Si en el futuro se agrega, aquí se podría filtrar antes de aplicar estrategias:
@@ -51,48 +60,41 @@ class RutaService:
 
         sistema_filtros = SistemaFiltros()
         if ruta and ruta.strip():
-            sistema_filtros.agregar_estrategia(FiltroRuta(ruta))
+            sistema_filtros.agregar_estrategia(FiltroTexto(ruta, get_indice_nombres().rutas(self.db)))
 
         if distancia and distancia > 0:
-            ubicacion_usuario = self._obtener_ubicacion_usuario()
-            if ubicacion_usuario:
-                sistema_filtros.agregar_estrategia(FiltroCercania(distancia, ubicacion_usuario))
+            ubicacion_usuario = self._obtener_ubicacion_usuario(usuario_id)
+            if not ubicacion_usuario:
+                # Sin ubicación no se puede filtrar: no devolver todas las rutas como si se hubiera aplicado
+                raise LookupError(f"El usuario {usuario_id} no existe o no tiene ubicación registrada")
+            sistema_filtros.agregar_estrategia(
+                FiltroCercania(distancia, ubicacion_usuario, catalogo.cobertura(self.db))
+            )
 
         rutas_filtradas = sistema_filtros.aplicar_filtros(todas_rutas)
 
-        resultado: List[Dict] = []
-        for ruta_obj in rutas_filtradas:
-            # Intentar obtener paraderos vía servicio (más consistente)
-            try:
-                paraderos = paradero_svc.get_paraderos_by_ruta(getattr(ruta_obj, 'id_ruta', None))
-            except Exception:
-                # Fallback: serializar desde la relación cargada
-                paraderos = []
-                if hasattr(ruta_obj, 'paraderos') and ruta_obj.paraderos:
-                    for p in ruta_obj.paraderos:
-                        paraderos.append({
-                            'id_paradero': getattr(p, 'id_paradero', None),
-                            'nombre': getattr(p, 'nombre', None),
-                            'coordenada_lat': getattr(p, 'coordenada_lat', None),
-                            'coordenada_lng': getattr(p, 'coordenada_lng', None),
-                            'colapso_actual': getattr(p, 'colapso_actual', None),
-                        })
-
-            resultado.append({
-                'id_ruta': getattr(ruta_obj, 'id_ruta', None),
-                'nombre': getattr(ruta_obj, 'nombre', None),
-                'paraderos': paraderos
-            })
-
-        # Log de depuración: mostrar el payload que se devolverá
-        try:
-            print('[DEBUG] Rutas filtradas payload:', resultado)
-        except Exception:
-            pass
+        return [ruta_obj.serializada for ruta_obj in rutas_filtradas]
 
-        return resultado
-
-    def _obtener_ubicacion_usuario(self) -> Optional[tuple]:
-        """Ubicación de ejemplo (placeholder)."""
-        return (-12.0464, -77.0428)
+    def _obtener_ubicacion_usuario(self, usuario_id: Optional[int]) -> Optional[tuple]:
+        """
+        (lat, lng) del usuario desde la caché de ubicaciones; si no está, se lee
+        una vez de usuario_base y queda en la caché para las siguientes llamadas
+        (con edad desconocida: usuario_base no guarda cuándo se registró).
+        """
+        if usuario_id is None:
+            return None
+        ubicaciones = get_ubicaciones_usuarios()
+        ubicacion = ubicaciones.obtener(usuario_id)
+        if ubicacion is not None:
+            return (ubicacion["lat"], ubicacion["lng"])
+        fila = (
+            self.db.query(UsuarioBase.ubicacion_actual_lat, UsuarioBase.ubicacion_actual_lng, UsuarioBase.id_tipo_usuario)
+            .filter(UsuarioBase.id_usuario == usuario_id)
+            .first()
+        )
+        if fila is None or fila.ubicacion_actual_lat is None or fila.ubicacion_actual_lng is None:
+            return None
+        ubicaciones.registrar(usuario_id, fila.ubicacion_actual_lat, fila.ubicacion_actual_lng,
+                              fuente="bd", id_tipo_usuario=fila.id_tipo_usuario, edad_conocida=False)
+        return (fila.ubicacion_actual_lat, fila.ubicacion_actual_lng)
 
@@ -9,7 +9,10 @@ from models.Ruta import Ruta
 from models.Paradero import Paradero
 from datetime import datetime, timezone
 from models.UsuarioBase import UsuarioBase
-from config.firebase import get_firebase_admin
+from services import resumen_reportes
+from services.despacho_notificaciones import encolar, get_despachador_notificaciones, notificacion
+from services.destinatarios_alertas import get_destinatarios_alertas, notificaciones_dirigidas, tiene_zona
+from services.coalescencia_alertas import agrupar, get_ventana_alertas
 
 class AlertaMasivaService:
     def __init__(self, engine=None):
@@ -42,14 +45,16 @@ class AlertaMasivaService:
                     "corredores": [
                         {
                             "id_corredor": c.id_corredor,
-                            "nombre": c.nombre
+                            # El modelo Corredor no tiene nombre
+                            "nombre": f"Corredor {c.id_corredor}"
                         }
                         for c in corredores
                     ],
                     "rutas": [
                         {
                             "id_ruta": r.id_ruta,
-                            "codigo": r.codigo,
+                            # El modelo Ruta no tiene código
+                            "codigo": None,
                             "nombre": r.nombre
                         }
                         for r in rutas
@@ -70,7 +75,12 @@ class AlertaMasivaService:
         """
         Crea un nuevo reporte tipo "Otro" (id_tipo_reporte = 4) para alertas masivas.
         Guarda todos los campos del reporte en la base de datos.
-        Si se especifica, envía una notificación masiva a un tema.
+        Si se especifica, envía una notificación: a los pasajeros de la zona afectada
+        (ruta, paraderos o corredor) o, si la alerta no indica zona o trae
+        alcance = "todos", al tema "all_users".
+        Una alerta que repite la misma (tipo, ruta, paradero, corredor) dentro de la
+        ventana de services.coalescencia_alertas actualiza la anterior en lugar de
+        crear otro reporte y otro push.
         """
         try:
             with Session(self.engine) as session:
@@ -89,26 +99,49 @@ class AlertaMasivaService:
                     "tiempo_retraso_min": payload.get("tiempo_retraso_min")
                 }
                 
-                # Insertar el nuevo reporte
-                stmt = insert(Reporte).values(**datos_reporte).returning(Reporte)
-                result = session.execute(stmt)
-                nuevo_reporte = result.scalar_one()
-                
-                session.commit()
+                ventana = get_ventana_alertas()
+                alerta = ventana.repetir(datos_reporte)
+                if alerta is not None:
+                    notificaciones = (
+                        self._notificaciones(session, payload, datos_reporte) if payload.get("send_notification") else []
+                    )
+                    agrupada = agrupar(session.connection(), alerta, datos_reporte, notificaciones)
+                    session.commit()
+                    ventana.confirmar(alerta, agrupada)
+                    return {
+                        "id_reporte": agrupada["id_reporte"],
+                        "fecha": agrupada["fecha"].isoformat() if agrupada.get("fecha") else None,
+                        "descripcion": agrupada["descripcion"],
+                        "id_emisor": agrupada["id_emisor"],
+                        "id_tipo_reporte": agrupada["id_tipo_reporte"],
+                        "es_critica": agrupada["es_critica"],
+                        "requiere_intervencion": agrupada["requiere_intervencion"],
+                        "repeticiones": agrupada["repeticiones"],
+                        "mensaje": "Alerta masiva agrupada con una alerta reciente de la misma zona"
+                    }
+
+                try:
+                    # Insertar el nuevo reporte
+                    stmt = insert(Reporte).values(**datos_reporte).returning(Reporte)
+                    result = session.execute(stmt)
+                    nuevo_reporte = result.scalar_one()
+                    # Contador diario del dashboard, en la misma transacción
+                    resumen_reportes.registrar(session.connection(), datos_reporte)
+
+                    # Si se solicita, encolar la notificación en la misma transacción;
+                    # la envía el despachador en segundo plano
+                    if payload.get("send_notification"):
+                        encolar(session.connection(), self._notificaciones(session, payload, datos_reporte),
+                                id_reporte=nuevo_reporte.id_reporte)
 
-                # Si se solicita, enviar notificación al tema "all_users"
+                    session.commit()
+                except Exception:
+                    # Liberar la clave reservada por repetir: otra alerta igual puede guardarse
+                    ventana.descartar(datos_reporte)
+                    raise
+                ventana.abrir({**datos_reporte, "id_reporte": nuevo_reporte.id_reporte})
                 if payload.get("send_notification"):
-                    try:
-                        firebase_admin = get_firebase_admin()
-                        firebase_admin.send_to_topic(
-                            topic="all_users",
-                            title="Alerta General",
-                            body=payload.get("descripcion")
-                        )
-                        print("✅ Notificación de alerta masiva enviada al tema 'all_users'")
-                    except Exception as e:
-                        # Log del error pero no fallar la solicitud, ya que la alerta fue creada
-                        print(f"❌ [ERROR] Al enviar notificación de alerta masiva al tema: {e}")
+                    get_despachador_notificaciones().despertar()
                 
                 return {
                     "id_reporte": nuevo_reporte.id_reporte,
@@ -122,4 +155,13 @@ class AlertaMasivaService:
                 }
         except Exception as e:
             print(f"[ERROR] AlertaMasivaService.crear_alerta_masiva: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def _notificaciones(self, session: Session, payload: Dict, datos_reporte: Dict) -> List[Dict]:
+        """Notificaciones de la alerta: dirigidas a la zona afectada o al tema general."""
+        titulo, cuerpo = "Alerta General", payload.get("descripcion")
+        if payload.get("alcance") == "todos" or not tiene_zona(datos_reporte):
+            return [notificacion(titulo=titulo, cuerpo=cuerpo, topic="all_users")]
+        tokens = get_destinatarios_alertas().para_reporte(session, datos_reporte)
+        print(f"📍 Alerta masiva dirigida a {len(tokens)} dispositivos de la zona afectada")
+        return notificaciones_dirigidas(titulo, cuerpo, tokens)
@@ -0,0 +1,116 @@
+"""
+Catálogo de rutas con sus paraderos ordenados, precalculado en memoria.
+
+Se arma con dos consultas por conjunto (rutas y ruta_paradero ordenado por
+`orden`) más los paraderos del índice espacial, y cada ruta guarda ya su
+forma serializada. Filtrar o listar rutas no vuelve a tocar la BD: el costo
+por petición es recorrer las rutas en memoria, no una consulta por ruta.
+Junto con las rutas se arma su cobertura espacial (cajas y celdas, ver
+services.cobertura_rutas) para el filtro de cercanía.
+Se invalida cuando se confirman cambios sobre rutas, paraderos o ruta_paradero,
+y caduca periódicamente para tomar cambios hechos fuera de este proceso
+(config.eventos.iniciar_caducidad_periodica).
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from config.db import sesion_primaria
+from config.eventos import al_confirmar_cambios
+from models.Paradero import Paradero
+from models.Ruta import Ruta
+from models.RutaParadero import RutaParadero
+from services.cobertura_rutas import CoberturaRutas
+from services.indice_espacial import get_indice_paraderos
+
+
+class ParaderoCatalogo:
+    """Paradero de solo lectura (atributos como el modelo, para las estrategias de filtro)."""
+
+    __slots__ = ("id_paradero", "nombre", "coordenada_lat", "coordenada_lng", "colapso_actual", "imagen_url")
+
+    def __init__(self, datos: Dict):
+        for campo in self.__slots__:
+            setattr(self, campo, datos.get(campo))
+
+
+class RutaCatalogo:
+    """
+    Ruta de solo lectura: id_ruta, nombre, paraderos (en orden) y su forma
+    serializada { id_ruta, nombre, paraderos: [...] } lista para responder.
+    """
+
+    __slots__ = ("id_ruta", "nombre", "paraderos", "serializada")
+
+    def __init__(self, id_ruta: int, nombre: str, paraderos: List[Dict]):
+        self.id_ruta = id_ruta
+        self.nombre = nombre
+        self.paraderos = [ParaderoCatalogo(p) for p in paraderos]
+        self.serializada = {"id_ruta": id_ruta, "nombre": nombre, "paraderos": paraderos}
+
+
+class CatalogoRutas:
+    """Catálogo compartido por el proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (rutas por id, cobertura espacial), reemplazados juntos
+        self._datos: Optional[Tuple[Dict[int, RutaCatalogo], CoberturaRutas]] = None
+        self.version = 0
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._datos = None
+            self.version += 1
+
+    def _cargar(self, db: Session) -> Tuple[Dict[int, RutaCatalogo], CoberturaRutas]:
+        datos = self._datos
+        if datos is not None:
+            return datos
+        with self._lock:
+            if self._datos is not None:
+                return self._datos
+            with sesion_primaria(db) as db:
+                paraderos = {p["id_paradero"]: p for p in get_indice_paraderos().listar(db)}
+                filas_rutas = db.query(Ruta.id_ruta, Ruta.nombre).order_by(Ruta.id_ruta).all()
+                enlaces = (
+                    db.query(RutaParadero.id_ruta, RutaParadero.id_paradero)
+                    .order_by(RutaParadero.id_ruta, RutaParadero.orden.asc().nullslast(), RutaParadero.id_ruta_paradero)
+                    .all()
+                )
+            por_ruta: Dict[int, List[Dict]] = {}
+            for e in enlaces:
+                p = paraderos.get(e.id_paradero)
+                if p is not None:
+                    por_ruta.setdefault(e.id_ruta, []).append(p)
+            rutas = {
+                r.id_ruta: RutaCatalogo(r.id_ruta, r.nombre, por_ruta.get(r.id_ruta, []))
+                for r in filas_rutas
+            }
+            self._datos = (rutas, CoberturaRutas(rutas.values()))
+            return self._datos
+
+    def rutas(self, db: Session) -> List[RutaCatalogo]:
+        """Todas las rutas, ordenadas por id."""
+        return list(self._cargar(db)[0].values())
+
+    def obtener(self, db: Session, id_ruta: int) -> Optional[RutaCatalogo]:
+        return self._cargar(db)[0].get(id_ruta)
+
+    def cobertura(self, db: Session) -> CoberturaRutas:
+        """Cajas y celdas de las rutas del catálogo actual."""
+        return self._cargar(db)[1]
+
+
+# Singleton global
+catalogo_rutas = CatalogoRutas()
+al_confirmar_cambios((Ruta, RutaParadero, Paradero), lambda cambios: catalogo_rutas.invalidar())
+
+
+def get_catalogo_rutas() -> CatalogoRutas:
+    """
+    Obtener el catálogo de rutas compartido
+    Uso: from services.catalogo_rutas import get_catalogo_rutas
+    """
+    return catalogo_rutas
@@ -0,0 +1,249 @@
+"""
+Agrupación de alertas repetidas en una ventana deslizante.
+
+Un conductor puede reenviar el mismo retraso o desvío varias veces y un
+regulador puede repetir una alerta masiva: antes cada envío era otra fila en
+reporte y otro push. Ahora las alertas se identifican por
+(tipo, ruta, paradero, corredor) y, mientras lleguen repeticiones con
+menos de ALERTAS_VENTANA_S entre una y otra, se tratan como el mismo incidente
+(aunque las envíen emisores distintos: es el mismo retraso o desvío):
+
+  - la primera se guarda y notifica normalmente. Su clave queda reservada
+    desde `repetir` hasta `abrir` (o `descartar` si no se pudo guardar): una
+    petición idéntica que llega mientras tanto espera al original y se agrupa
+    con él en lugar de insertar otro reporte;
+  - las repeticiones no insertan otro reporte: actualizan el original
+    (descripción, minutos de retraso, ...) y no cuentan en el resumen diario.
+    Solo se cuentan (`confirmar`) cuando su transacción hizo commit;
+  - si la alerta notifica, las repeticiones dejan UNA notificación de
+    actualización en el outbox, diferida ALERTAS_RETARDO_ACTUALIZACION_S. Las
+    repeticiones siguientes reescriben esa misma fila mientras el despachador
+    no la haya tomado, así una ráfaga termina en un solo push con el último
+    mensaje y el número de reportes.
+
+La ventana vive en memoria de cada proceso, como las demás cachés: con varios
+workers una ráfaga repartida entre ellos genera a lo sumo una alerta por worker.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+
+from models.Reporte import Reporte
+from services.despacho_notificaciones import encolar_diferidas, encolar_diferidas_async, reescribir_pendientes
+
+VENTANA_S = float(os.getenv("ALERTAS_VENTANA_S", "300"))
+# Máximo que una repetición espera a que se guarde el reporte original reservado
+ESPERA_ORIGINAL_S = 30.0
+RETARDO_ACTUALIZACION_S = float(os.getenv("ALERTAS_RETARDO_ACTUALIZACION_S", "60"))
+MAX_ABIERTAS = 10_000
+# Columnas del reporte original que toman el valor de la última repetición
+ACTUALIZABLES = ("descripcion", "tiempo_retraso_min", "id_paradero_final", "es_critica", "requiere_intervencion")
+
+Clave = Tuple[Optional[int], Optional[int], Optional[int], Optional[int]]
+
+_tabla = Reporte.__table__
+
+
+def clave_alerta(reporte: Dict) -> Clave:
+    """(tipo, ruta, paradero, corredor) de un reporte."""
+    return (
+        reporte.get("id_tipo_reporte"),
+        reporte.get("id_ruta_afectada"),
+        reporte.get("id_paradero_inicial"),
+        reporte.get("id_corredor_afectado"),
+    )
+
+
+class AlertaAbierta:
+    """
+    Incidente dentro de la ventana: su reporte original y las repeticiones
+    recibidas. `reporte` es None mientras el original se está guardando.
+    """
+
+    __slots__ = ("clave", "reporte", "repeticiones", "ultima", "pendientes", "resuelta")
+
+    def __init__(self, clave: Clave, reporte: Optional[Dict], ahora: float):
+        self.clave = clave
+        self.reporte = reporte
+        self.repeticiones = 0
+        self.ultima = ahora
+        # id_notificacion de la actualización diferida que aún se puede reescribir
+        self.pendientes: List[int] = []
+        # Se marca cuando la reserva termina (original guardado o descartado)
+        self.resuelta = threading.Event()
+        if reporte is not None:
+            self.resuelta.set()
+
+    @property
+    def id_reporte(self) -> Optional[int]:
+        return self.reporte.get("id_reporte")
+
+
+class VentanaAlertas:
+    """Alertas abiertas por clave; una clave se cierra tras `ventana_s` sin repeticiones."""
+
+    def __init__(self, ventana_s: float = VENTANA_S, max_abiertas: int = MAX_ABIERTAS, reloj=time.monotonic,
+                 espera_original_s: float = ESPERA_ORIGINAL_S):
+        self.ventana_s = ventana_s
+        self.max_abiertas = max_abiertas
+        self.espera_original_s = espera_original_s
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        # Ordenado de la repetición más vieja a la más reciente
+        self._abiertas: "OrderedDict[Clave, AlertaAbierta]" = OrderedDict()
+        # Métricas
+        self.nuevas = 0
+        self.agrupadas = 0
+
+    def _purgar(self, ahora: float) -> None:
+        while self._abiertas:
+            _, alerta = next(iter(self._abiertas.items()))
+            if ahora - alerta.ultima <= self.ventana_s and len(self._abiertas) <= self.max_abiertas:
+                break
+            _, alerta = self._abiertas.popitem(last=False)
+            alerta.resuelta.set()  # quien esperaba esta reserva vuelve a mirar la ventana
+
+    def repetir(self, reporte: Dict) -> Optional[AlertaAbierta]:
+        """
+        Si hay una alerta abierta con la misma clave, extiende la ventana y la
+        devuelve; la repetición se cuenta con `confirmar` una vez aplicada con
+        `agrupar` y hecho el commit. Si el reporte es un incidente nuevo,
+        reserva su clave y devuelve None: el llamador debe guardar el reporte y
+        llamar a `abrir` (o a `descartar` si falla).
+        Si el original de la clave aún se está guardando, espera a que termine.
+        """
+        clave = clave_alerta(reporte)
+        while True:
+            ahora = self._reloj()
+            with self._lock:
+                self._purgar(ahora)
+                alerta = self._abiertas.get(clave)
+                if alerta is None:
+                    self._abiertas[clave] = AlertaAbierta(clave, None, ahora)
+                    self.nuevas += 1
+                    return None
+                if alerta.reporte is not None:
+                    alerta.ultima = ahora
+                    self._abiertas.move_to_end(clave)
+                    return alerta
+            if not alerta.resuelta.wait(self.espera_original_s):
+                # El original no termina de guardarse: este reporte se guarda aparte
+                with self._lock:
+                    self.nuevas += 1
+                return None
+
+    def abrir(self, reporte_guardado: Dict, reporte: Optional[Dict] = None) -> None:
+        """
+        Registra el reporte recién guardado como inicio de un incidente y libera
+        la reserva. `reporte` es el que se pasó a `repetir` (por defecto, el guardado).
+        """
+        clave = clave_alerta(reporte if reporte is not None else reporte_guardado)
+        ahora = self._reloj()
+        with self._lock:
+            alerta = self._abiertas.get(clave)
+            if alerta is None or alerta.reporte is not None:
+                alerta = self._abiertas[clave] = AlertaAbierta(clave, None, ahora)
+            alerta.reporte = dict(reporte_guardado)
+            alerta.ultima = ahora
+            self._abiertas.move_to_end(clave)
+            alerta.resuelta.set()
+            self._purgar(ahora)
+
+    def confirmar(self, alerta: AlertaAbierta, agrupada: Dict) -> None:
+        """Cuenta una repetición ya guardada; `agrupada` es lo que devolvió `agrupar`."""
+        with self._lock:
+            alerta.repeticiones += 1
+            alerta.reporte = {k: v for k, v in agrupada.items() if k not in ("agrupado", "repeticiones")}
+            self.agrupadas += 1
+
+    def descartar(self, reporte: Dict) -> None:
+        """Libera la reserva de un reporte que no se pudo guardar."""
+        clave = clave_alerta(reporte)
+        with self._lock:
+            alerta = self._abiertas.get(clave)
+            if alerta is not None and alerta.reporte is None:
+                del self._abiertas[clave]
+                alerta.resuelta.set()
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            return {
+                "abiertas": len(self._abiertas),
+                "nuevas": self.nuevas,
+                "agrupadas": self.agrupadas,
+                "ventana_s": self.ventana_s,
+            }
+
+
+def _actualizar_reporte(alerta: AlertaAbierta, record: Dict):
+    valores = {c: record[c] for c in ACTUALIZABLES if c in record and record[c] is not None}
+    stmt = update(_tabla).where(_tabla.c.id_reporte == alerta.id_reporte)
+    if valores:
+        stmt = stmt.values(**valores)
+    else:
+        stmt = stmt.values(id_reporte=_tabla.c.id_reporte)
+    return stmt.returning(*_tabla.c)
+
+
+def _actualizacion(alerta: AlertaAbierta, notificaciones: List[Dict]) -> Tuple[List[Dict], str]:
+    """Notificaciones de actualización (mismos destinatarios) y su cuerpo con el conteo."""
+    # Original + repeticiones confirmadas + la que se está aplicando
+    cuerpo = f"{notificaciones[0]['cuerpo'] or ''} ({alerta.repeticiones + 2} reportes)".strip()
+    return [{**n, "titulo": f"Actualización: {n['titulo']}", "cuerpo": cuerpo} for n in notificaciones], cuerpo
+
+
+def _resultado(alerta: AlertaAbierta, fila) -> Dict:
+    reporte = dict(fila) if fila is not None else dict(alerta.reporte)
+    return {**reporte, "agrupado": True, "repeticiones": alerta.repeticiones + 1}
+
+
+def agrupar(conexion, alerta: AlertaAbierta, record: Dict, notificaciones: List[Dict] = ()) -> Dict:
+    """
+    Aplica una repetición dentro de la transacción de `conexion`: actualiza el
+    reporte original y deja una sola notificación de actualización pendiente.
+    Devuelve el reporte original actualizado con `agrupado` y `repeticiones`;
+    tras el commit, el llamador lo pasa a `VentanaAlertas.confirmar`.
+    """
+    fila = conexion.execute(_actualizar_reporte(alerta, record)).mappings().first()
+    notificaciones = list(notificaciones)
+    if notificaciones:
+        nuevas, cuerpo = _actualizacion(alerta, notificaciones)
+        reescritas = 0
+        if alerta.pendientes:
+            reescritas = conexion.execute(reescribir_pendientes(alerta.pendientes, cuerpo=cuerpo)).rowcount
+        if not alerta.pendientes or reescritas < len(alerta.pendientes):
+            # La actualización anterior ya salió (o no hubo): diferir una nueva
+            alerta.pendientes = encolar_diferidas(conexion, nuevas, alerta.id_reporte, RETARDO_ACTUALIZACION_S)
+    return _resultado(alerta, fila)
+
+
+async def agrupar_async(conexion, alerta: AlertaAbierta, record: Dict, notificaciones: List[Dict] = ()) -> Dict:
+    """Igual que `agrupar`, sobre una AsyncConnection."""
+    fila = (await conexion.execute(_actualizar_reporte(alerta, record))).mappings().first()
+    notificaciones = list(notificaciones)
+    if notificaciones:
+        nuevas, cuerpo = _actualizacion(alerta, notificaciones)
+        reescritas = 0
+        if alerta.pendientes:
+            reescritas = (await conexion.execute(reescribir_pendientes(alerta.pendientes, cuerpo=cuerpo))).rowcount
+        if not alerta.pendientes or reescritas < len(alerta.pendientes):
+            alerta.pendientes = await encolar_diferidas_async(
+                conexion, nuevas, alerta.id_reporte, RETARDO_ACTUALIZACION_S
+            )
+    return _resultado(alerta, fila)
+
+
+# Singleton global
+ventana_alertas = VentanaAlertas()
+
+
+def get_ventana_alertas() -> VentanaAlertas:
+    """
+    Obtener la ventana de agrupación de alertas compartida
+    Uso: from services.coalescencia_alertas import get_ventana_alertas
+    """
+    return ventana_alertas
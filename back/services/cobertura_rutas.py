@@ -0,0 +1,100 @@
+"""
+Cobertura espacial precalculada de las rutas: caja envolvente y celdas de grilla.
+
+Para cada ruta se guardan sus paraderos como arreglos, su caja (min/max de
+lat y lng) y el conjunto de celdas de la grilla (mismo tamaño que el índice
+de paraderos) que tocan sus paraderos, más el índice invertido celda -> rutas.
+"¿Qué rutas tienen un paradero a <= d km?" se responde así:
+  1. celdas que intersectan el rectángulo del círculo -> rutas candidatas
+  2. descartar las candidatas cuya caja queda a más de d km
+  3. distancia exacta (vectorizada) solo a los paraderos de las que quedan
+El costo depende de las celdas y rutas cercanas, no del total de paraderos.
+"""
+import math
+from typing import Dict, FrozenSet, Iterable, Set, Tuple
+
+import numpy as np
+
+from services.geo import coordenadas, distancia_km, mascara_radio
+from services.indice_espacial import KM_POR_GRADO, Celda
+
+# Tolerancia de la cota por caja (la caja es en grados, la distancia en la esfera)
+HOLGURA_CAJA = 1.01
+
+
+class CoberturaRuta:
+    """Paraderos (con coordenadas), caja y celdas de una ruta."""
+
+    __slots__ = ("id_ruta", "lats", "lngs", "caja", "celdas")
+
+    def __init__(self, id_ruta: int, lats: np.ndarray, lngs: np.ndarray, tam_celda_deg: float):
+        self.id_ruta = id_ruta
+        self.lats = lats
+        self.lngs = lngs
+        # (min_lat, min_lng, max_lat, max_lng)
+        self.caja: Tuple[float, float, float, float] = (
+            float(lats.min()), float(lngs.min()), float(lats.max()), float(lngs.max())
+        )
+        self.celdas: FrozenSet[Celda] = frozenset(
+            zip(np.floor(lats / tam_celda_deg).astype(int).tolist(), np.floor(lngs / tam_celda_deg).astype(int).tolist())
+        )
+
+    def distancia_minima_caja_km(self, lat: float, lng: float) -> float:
+        """Cota inferior (aprox.) de la distancia desde el punto a cualquier paradero de la ruta."""
+        min_lat, min_lng, max_lat, max_lng = self.caja
+        return distancia_km(lat, lng, min(max(lat, min_lat), max_lat), min(max(lng, min_lng), max_lng))
+
+
+class CoberturaRutas:
+    """Coberturas de todas las rutas más el índice invertido celda -> rutas."""
+
+    def __init__(self, rutas: Iterable, tam_celda_km: float = 0.5):
+        """
+        Args:
+            rutas: Objetos con id_ruta y paraderos (con coordenada_lat/coordenada_lng)
+            tam_celda_km (float): Lado aproximado de cada celda en kilómetros
+        """
+        self.tam_celda_deg = tam_celda_km / KM_POR_GRADO
+        self.rutas: Dict[int, CoberturaRuta] = {}
+        self._rutas_por_celda: Dict[Celda, Set[int]] = {}
+        for ruta in rutas:
+            lats, lngs = coordenadas((p.coordenada_lat, p.coordenada_lng) for p in ruta.paraderos)
+            validos = ~(np.isnan(lats) | np.isnan(lngs))
+            if not validos.any():
+                continue
+            cobertura = CoberturaRuta(ruta.id_ruta, lats[validos], lngs[validos], self.tam_celda_deg)
+            self.rutas[ruta.id_ruta] = cobertura
+            for c in cobertura.celdas:
+                self._rutas_por_celda.setdefault(c, set()).add(ruta.id_ruta)
+
+    def __contains__(self, id_ruta: int) -> bool:
+        return id_ruta in self.rutas
+
+    def _celda(self, lat: float, lng: float) -> Celda:
+        return (math.floor(lat / self.tam_celda_deg), math.floor(lng / self.tam_celda_deg))
+
+    def candidatas(self, lat: float, lng: float, radio_km: float) -> Set[int]:
+        """Rutas con algún paradero en una celda que intersecta el rectángulo del círculo."""
+        dlat = radio_km / KM_POR_GRADO
+        dlng = radio_km / (KM_POR_GRADO * max(math.cos(math.radians(lat)), 1e-6))
+        i0, j0 = self._celda(lat - dlat, lng - dlng)
+        i1, j1 = self._celda(lat + dlat, lng + dlng)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._rutas_por_celda):
+            celdas = [c for c in self._rutas_por_celda if i0 <= c[0] <= i1 and j0 <= c[1] <= j1]
+        else:
+            celdas = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1) if (i, j) in self._rutas_por_celda]
+        candidatas: Set[int] = set()
+        for c in celdas:
+            candidatas |= self._rutas_por_celda[c]
+        return candidatas
+
+    def rutas_cercanas(self, lat: float, lng: float, radio_km: float) -> Set[int]:
+        """Ids de las rutas con al menos un paradero a <= radio_km (distancia exacta)."""
+        cercanas = set()
+        for id_ruta in self.candidatas(lat, lng, radio_km):
+            cobertura = self.rutas[id_ruta]
+            if cobertura.distancia_minima_caja_km(lat, lng) > radio_km * HOLGURA_CAJA:
+                continue
+            if mascara_radio(lat, lng, cobertura.lats, cobertura.lngs, radio_km).any():
+                cercanas.add(id_ruta)
+        return cercanas
@@ -3,6 +3,7 @@ from models.Paradero import Paradero
 from models.ComentarioUsuarioParadero import ComentarioUsuarioParadero
 from models.UsuarioBase import UsuarioBase
 from services.auth_service import AuthService
+from services.indice_texto import get_indice_nombres
 from fastapi import HTTPException, status
 from datetime import datetime, timezone
 
@@ -33,7 +34,15 @@ class ComentarioParaderoService:
         }
     
     def obtener_paradero_perfil_nombre(self, nombre_paradero:str):
-        paradero = self.db.query(Paradero).filter(Paradero.nombre==nombre_paradero).first()
+        # Resolver el nombre en el índice de texto (sin distinguir mayúsculas ni tildes);
+        # si no hay coincidencia exacta se acepta una parcial solo si es única
+        indice = get_indice_nombres().paraderos(self.db)
+        ids = indice.exacto(nombre_paradero)
+        if not ids:
+            ids = [clave for clave, _ in indice.buscar(nombre_paradero, limite=2)]
+            if len(ids) != 1:
+                ids = []
+        paradero = self.db.query(Paradero).filter(Paradero.id_paradero==ids[0]).first() if ids else None
         if paradero is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Paradero no encontrado")
         comentarios = self.obtener_comentarios(paradero.id_paradero)
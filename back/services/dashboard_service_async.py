@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.dashboard_service import TIPO_DESVIO, TIPO_FALLA, _armar_dashboard, _retrasos_por_dia
+from services.resumen_reportes import conteo_tipo
+
+class DashboardServiceAsync:
+    """Mismas consultas que DashboardService sobre AsyncSession."""
+
+    def __init__(self, db: AsyncSession):
+       self.db = db
+
+    async def getDashboard(self, dias_serie: int = 30):
+        hoy = datetime.now().date()
+        numero_fallas = (await self.db.execute(conteo_tipo(TIPO_FALLA))).scalar()
+        numero_desvios = (await self.db.execute(conteo_tipo(TIPO_DESVIO))).scalar()
+        rows = (await self.db.execute(_retrasos_por_dia(hoy, dias_serie))).all()
+        return _armar_dashboard(numero_fallas, numero_desvios, rows, hoy, dias_serie)
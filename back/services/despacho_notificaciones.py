@@ -0,0 +1,388 @@
+"""
+Outbox de notificaciones push y su despachador en segundo plano.
+
+Los servicios no llaman a FCM dentro de la petición: `encolar` inserta la
+notificación en notificacion_outbox en la misma transacción que el reporte,
+y la API responde apenas se confirma ese commit. Un hilo de fondo toma las
+pendientes por lotes, las envía en paralelo (con un máximo de envíos
+simultáneos) y reintenta las que fallan con espera exponencial.
+
+Cada lote se reclama adelantando `proximo_intento` (un arriendo) dentro de
+una transacción con FOR UPDATE SKIP LOCKED: varios workers no envían la
+misma fila y, si el proceso muere a mitad de un envío, la fila vuelve a
+estar disponible cuando vence el arriendo (entrega al menos una vez).
+Mientras un lote sigue enviándose, el arriendo de las filas en curso se
+renueva cada tercio de su duración, así un lote lento no vuelve a quedar
+disponible para otro worker a mitad del envío.
+
+El transporte es intercambiable: `TransporteFirebase` en producción y
+`TransporteFalso` en tests (o para levantar la API sin credenciales). El del
+despachador compartido se elige con NOTIFICACIONES_TRANSPORTE ("firebase" o
+"falso"); TransporteFirebase no carga el SDK hasta el primer envío.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import insert, select, update
+from sqlalchemy.engine import Engine
+
+from models.NotificacionOutbox import NotificacionOutbox
+from services import tokens_fcm  # noqa: F401  registra la limpieza de tokens inválidos
+
+TAM_LOTE = int(os.getenv("NOTIFICACIONES_TAM_LOTE", "100"))
+PARALELISMO = int(os.getenv("NOTIFICACIONES_PARALELISMO", "8"))
+MAX_INTENTOS = int(os.getenv("NOTIFICACIONES_MAX_INTENTOS", "6"))
+INTERVALO_S = float(os.getenv("NOTIFICACIONES_INTERVALO_S", "1"))
+TRANSPORTE = os.getenv("NOTIFICACIONES_TRANSPORTE", "firebase")
+BACKOFF_BASE_S = 2.0
+BACKOFF_MAX_S = 300.0
+# Tiempo durante el cual una fila reclamada no la toma otro despachador
+ARRIENDO_S = 60.0
+VENTANA_METRICAS = 1000
+
+PENDIENTE = "pendiente"
+ENVIADA = "enviada"
+FALLIDA = "fallida"
+
+_tabla = NotificacionOutbox.__table__
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def notificacion(titulo: str, cuerpo: Optional[str], topic: Optional[str] = None,
+                 tokens: Optional[List[str]] = None, datos: Optional[Dict] = None) -> Dict:
+    """Notificación a encolar: a un tema FCM o a una lista de tokens."""
+    if not topic and not tokens:
+        raise ValueError("La notificación necesita 'topic' o 'tokens'")
+    return {"titulo": titulo, "cuerpo": cuerpo, "topic": topic, "tokens": tokens, "datos": datos}
+
+
+def _filas(notificaciones: Iterable[Dict], id_reporte: Optional[int], retraso_s: float = 0.0) -> List[Dict]:
+    ahora = _ahora()
+    proximo = ahora + timedelta(seconds=retraso_s)
+    return [
+        {**n, "id_reporte": id_reporte, "creada_en": ahora, "proximo_intento": proximo,
+         "estado": PENDIENTE, "intentos": 0}
+        for n in notificaciones
+    ]
+
+
+def encolar(conexion, notificaciones: Iterable[Dict], id_reporte: Optional[int] = None) -> int:
+    """Inserta las notificaciones en el outbox dentro de la transacción de `conexion`."""
+    filas = _filas(notificaciones, id_reporte)
+    if filas:
+        conexion.execute(insert(_tabla), filas)
+    return len(filas)
+
+
+async def encolar_async(conexion, notificaciones: Iterable[Dict], id_reporte: Optional[int] = None) -> int:
+    """Igual que `encolar`, sobre una AsyncConnection."""
+    filas = _filas(notificaciones, id_reporte)
+    if filas:
+        await conexion.execute(insert(_tabla), filas)
+    return len(filas)
+
+
+def encolar_diferidas(conexion, notificaciones: Iterable[Dict], id_reporte: Optional[int] = None,
+                      retraso_s: float = 0.0) -> List[int]:
+    """
+    Encola notificaciones que el despachador no tomará antes de `retraso_s`.
+    Devuelve sus id_notificacion para reescribirlas mientras sigan pendientes.
+    """
+    filas = _filas(notificaciones, id_reporte, retraso_s)
+    if not filas:
+        return []
+    return list(conexion.execute(insert(_tabla).returning(_tabla.c.id_notificacion), filas).scalars())
+
+
+async def encolar_diferidas_async(conexion, notificaciones: Iterable[Dict], id_reporte: Optional[int] = None,
+                                  retraso_s: float = 0.0) -> List[int]:
+    """Igual que `encolar_diferidas`, sobre una AsyncConnection."""
+    filas = _filas(notificaciones, id_reporte, retraso_s)
+    if not filas:
+        return []
+    res = await conexion.execute(insert(_tabla).returning(_tabla.c.id_notificacion), filas)
+    return list(res.scalars())
+
+
+def reescribir_pendientes(ids: List[int], **valores):
+    """UPDATE de las notificaciones `ids` que ningún despachador reclamó todavía."""
+    return (
+        update(_tabla)
+        .where(_tabla.c.id_notificacion.in_(ids), _tabla.c.estado == PENDIENTE, _tabla.c.intentos == 0)
+        .values(**valores)
+    )
+
+
+class EnvioParcial(Exception):
+    """Quedaron tokens con fallos transitorios: se reintenta solo a esos tokens."""
+
+    def __init__(self, mensaje: str, tokens: List[str]):
+        super().__init__(mensaje)
+        self.tokens = tokens
+
+
+class TransporteFirebase:
+    """
+    Envía por Firebase Admin: tema con send_to_topic, tokens con send_multicast
+    (en bloques paralelos; los tokens muertos se limpian en services.tokens_fcm).
+    """
+
+    def enviar(self, n: Dict) -> None:
+        from config.firebase import get_firebase_admin
+
+        admin = get_firebase_admin()
+        if n.get("topic"):
+            admin.send_to_topic(title=n["titulo"], body=n["cuerpo"], topic=n["topic"], data=n.get("datos"))
+            return
+        stats = admin.send_multicast(title=n["titulo"], body=n["cuerpo"], tokens=n["tokens"], data=n.get("datos"))
+        if stats["tokens_reintentables"]:
+            raise EnvioParcial(
+                f"{len(stats['tokens_reintentables'])} tokens con fallo transitorio: {stats['failure_responses'][:3]}",
+                stats["tokens_reintentables"],
+            )
+
+
+class TransporteFalso:
+    """Transporte en memoria: guarda lo enviado y puede fallar las primeras `fallos` veces."""
+
+    def __init__(self, fallos: int = 0, latencia_s: float = 0.0):
+        self._lock = threading.Lock()
+        self.fallos_restantes = fallos
+        self.latencia_s = latencia_s
+        self.enviadas: List[Dict] = []
+
+    def enviar(self, n: Dict) -> None:
+        if self.latencia_s:
+            time.sleep(self.latencia_s)
+        with self._lock:
+            if self.fallos_restantes > 0:
+                self.fallos_restantes -= 1
+                raise ConnectionError("Fallo simulado del transporte")
+            self.enviadas.append(n)
+
+
+def crear_transporte(nombre: str = TRANSPORTE):
+    """Transporte por nombre: "firebase" (FCM) o "falso" (en memoria, sin credenciales)."""
+    nombre = nombre.strip().lower()
+    if nombre == "firebase":
+        return TransporteFirebase()
+    if nombre == "falso":
+        return TransporteFalso()
+    raise ValueError(f"NOTIFICACIONES_TRANSPORTE inválido: {nombre}")
+
+
+def espera_reintento(intentos: int) -> float:
+    """Segundos hasta el siguiente intento: exponencial con tope y jitter."""
+    base = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (intentos - 1))
+    return base * random.uniform(0.5, 1.0)
+
+
+class DespachadorNotificaciones:
+    """Vacía el outbox por lotes con envíos en paralelo y reintentos."""
+
+    def __init__(self, motor: Optional[Engine] = None, transporte=None, tam_lote: int = TAM_LOTE,
+                 paralelismo: int = PARALELISMO, max_intentos: int = MAX_INTENTOS,
+                 intervalo_s: float = INTERVALO_S, arriendo_s: float = ARRIENDO_S):
+        self._motor = motor
+        self._transporte = transporte
+        self.tam_lote = tam_lote
+        self.paralelismo = paralelismo
+        self.max_intentos = max_intentos
+        self.intervalo_s = intervalo_s
+        self.arriendo_s = arriendo_s
+        self._ejecutor: Optional[ThreadPoolExecutor] = None
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Métricas
+        self.enviadas = 0
+        self.reintentos = 0
+        self.fallidas = 0
+        self.lotes = 0
+        self.errores = 0
+        self._latencias_s = deque(maxlen=VENTANA_METRICAS)
+
+    @property
+    def motor(self) -> Engine:
+        if self._motor is None:
+            from config.db import engine
+            self._motor = engine
+        return self._motor
+
+    @property
+    def transporte(self):
+        if self._transporte is None:
+            self._transporte = crear_transporte()
+        return self._transporte
+
+    @transporte.setter
+    def transporte(self, transporte) -> None:
+        self._transporte = transporte
+
+    def _reclamar(self) -> List[Dict]:
+        ahora = _ahora()
+        with self.motor.begin() as conn:
+            filas = conn.execute(
+                select(_tabla)
+                .where(_tabla.c.estado == PENDIENTE, _tabla.c.proximo_intento <= ahora)
+                .order_by(_tabla.c.id_notificacion)
+                .limit(self.tam_lote)
+                .with_for_update(skip_locked=True)
+            ).mappings().all()
+            if not filas:
+                return []
+            conn.execute(
+                update(_tabla)
+                .where(_tabla.c.id_notificacion.in_([f["id_notificacion"] for f in filas]))
+                .values(proximo_intento=ahora + timedelta(seconds=self.arriendo_s), intentos=_tabla.c.intentos + 1)
+            )
+        return [{**f, "intentos": f["intentos"] + 1} for f in filas]
+
+    def _renovar(self, filas: List[Dict]) -> None:
+        """Extiende el arriendo de las filas que siguen enviándose."""
+        try:
+            with self.motor.begin() as conn:
+                conn.execute(
+                    update(_tabla)
+                    .where(_tabla.c.id_notificacion.in_([f["id_notificacion"] for f in filas]),
+                           _tabla.c.estado == PENDIENTE)
+                    .values(proximo_intento=_ahora() + timedelta(seconds=self.arriendo_s))
+                )
+        except Exception as e:
+            print(f"⚠️ No se pudo renovar el arriendo de {len(filas)} notificaciones: {e}")
+
+    def _enviar(self, fila: Dict) -> Optional[Exception]:
+        try:
+            self.transporte.enviar(fila)
+            return None
+        except Exception as e:
+            return e
+
+    def despachar(self) -> int:
+        """Reclama y envía un lote. Devuelve la cantidad de notificaciones procesadas."""
+        filas = self._reclamar()
+        if not filas:
+            return 0
+        if self._ejecutor is None:
+            self._ejecutor = ThreadPoolExecutor(max_workers=self.paralelismo, thread_name_prefix="notificaciones")
+        futuros = [self._ejecutor.submit(self._enviar, f) for f in filas]
+        en_curso = dict(zip(futuros, filas))
+        while en_curso:
+            _, pendientes = wait(en_curso, timeout=self.arriendo_s / 3)
+            en_curso = {fut: en_curso[fut] for fut in pendientes}
+            if en_curso:
+                self._renovar(list(en_curso.values()))
+        errores = [fut.result() for fut in futuros]
+
+        ahora = _ahora()
+        enviadas = [f for f, error in zip(filas, errores) if error is None]
+        with self.motor.begin() as conn:
+            if enviadas:
+                conn.execute(
+                    update(_tabla)
+                    .where(_tabla.c.id_notificacion.in_([f["id_notificacion"] for f in enviadas]))
+                    .values(estado=ENVIADA, enviada_en=ahora, ultimo_error=None)
+                )
+            for fila, error in zip(filas, errores):
+                if error is None:
+                    continue
+                definitiva = fila["intentos"] >= self.max_intentos
+                valores = {
+                    "estado": FALLIDA if definitiva else PENDIENTE,
+                    "ultimo_error": (str(error) or type(error).__name__)[:500],
+                    "proximo_intento": ahora + timedelta(seconds=espera_reintento(fila["intentos"])),
+                }
+                if isinstance(error, EnvioParcial):
+                    # Los demás tokens ya recibieron la notificación
+                    valores["tokens"] = error.tokens
+                conn.execute(
+                    update(_tabla).where(_tabla.c.id_notificacion == fila["id_notificacion"]).values(**valores)
+                )
+                print(f"⚠️ Notificación {fila['id_notificacion']} falló (intento {fila['intentos']}): {error}")
+
+        with self._lock:
+            self.lotes += 1
+            self.enviadas += len(enviadas)
+            fallos = [f for f, error in zip(filas, errores) if error is not None]
+            self.fallidas += sum(1 for f in fallos if f["intentos"] >= self.max_intentos)
+            self.reintentos += sum(1 for f in fallos if f["intentos"] < self.max_intentos)
+            for f in enviadas:
+                creada = f["creada_en"]
+                if creada.tzinfo is None:
+                    creada = creada.replace(tzinfo=timezone.utc)
+                self._latencias_s.append((ahora - creada).total_seconds())
+        return len(filas)
+
+    def despertar(self) -> None:
+        """Avisar que hay notificaciones nuevas (tras el commit que las encoló)."""
+        self._despertar.set()
+
+    def _bucle(self) -> None:
+        while not self._detener.is_set():
+            # Antes de despachar: un despertar() que llegue durante el lote no se pierde
+            self._despertar.clear()
+            try:
+                procesadas = self.despachar()
+            except Exception as e:
+                with self._lock:
+                    self.errores += 1
+                print(f"❌ Error despachando notificaciones: {e}")
+                procesadas = 0
+            if procesadas >= self.tam_lote:
+                continue  # quedan más pendientes
+            self._despertar.wait(self.intervalo_s)
+
+    def iniciar(self) -> threading.Thread:
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, name="despacho-notificaciones", daemon=True)
+            self._hilo.start()
+        return self._hilo
+
+    def detener(self) -> None:
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+        if self._ejecutor is not None:
+            self._ejecutor.shutdown(wait=False)
+            self._ejecutor = None
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            latencias = np.array(self._latencias_s, dtype=np.float64)
+            return {
+                "enviadas": self.enviadas,
+                "reintentos": self.reintentos,
+                "fallidas": self.fallidas,
+                "lotes": self.lotes,
+                "errores": self.errores,
+                "paralelismo": self.paralelismo,
+                "latencia_envio_s": {
+                    "p50": float(np.percentile(latencias, 50)) if len(latencias) else None,
+                    "p95": float(np.percentile(latencias, 95)) if len(latencias) else None,
+                },
+            }
+
+
+# Singleton global
+despachador_notificaciones = DespachadorNotificaciones()
+
+
+def get_despachador_notificaciones() -> DespachadorNotificaciones:
+    """
+    Obtener el despachador de notificaciones compartido
+    Uso: from services.despacho_notificaciones import get_despachador_notificaciones
+    """
+    return despachador_notificaciones
@@ -0,0 +1,313 @@
+"""
+Destinatarios de una alerta según dónde ocurre.
+
+En lugar de publicar desvíos y alertas masivas a un tema global (que despierta
+todos los dispositivos), se notifica solo a los pasajeros afectados:
+
+  - los que están cerca del paradero afectado, de los paraderos de la ruta
+    afectada o de la posición actual del corredor (grilla de pasajeros de
+    services.indice_espacial, alimentada junto con la caché de ubicaciones);
+  - los que suelen viajar por ahí según historial_uso (subieron o bajaron en
+    esos paraderos, o viajaron en ese corredor en los últimos DIAS_HISTORIAL).
+
+Los tokens FCM por usuario y los viajes del historial se cargan desde la BD
+en un hilo de fondo al arrancar y se mantienen con los commits sobre
+usuario_base e historial_uso; los tokens que FCM rechaza se quitan al
+limpiarlos (config.firebase). Ese hilo vuelve a leerlos cada
+ALERTAS_RECARGA_S segundos para recoger lo escrito por otras instancias.
+Resolver los destinatarios de una alerta no consulta la BD: son unas
+consultas por radio a la grilla y uniones de conjuntos.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from config.db import sesion_primaria
+from config.eventos import al_confirmar_cambios
+from config.firebase import al_invalidar_tokens
+from models.HistorialUso import HistorialUso
+from models.UsuarioBase import UsuarioBase
+from services.catalogo_rutas import get_catalogo_rutas
+from services.despacho_notificaciones import notificacion
+from services.indice_espacial import get_indice_paraderos, get_indice_pasajeros
+from services.posiciones_corredores import get_posiciones_corredores
+
+RADIO_PARADERO_KM = float(os.getenv("ALERTAS_RADIO_PARADERO_KM", "1.0"))
+RADIO_RUTA_KM = float(os.getenv("ALERTAS_RADIO_RUTA_KM", "0.5"))
+RADIO_CORREDOR_KM = float(os.getenv("ALERTAS_RADIO_CORREDOR_KM", "1.0"))
+DIAS_HISTORIAL = int(os.getenv("ALERTAS_DIAS_HISTORIAL", "90"))
+RECARGA_S = float(os.getenv("ALERTAS_RECARGA_S", "300"))
+# Tokens por fila del outbox: cada fila se envía en bloques de 500 en paralelo
+# y, si falla, se reintenta sola sin repetir el resto de la alerta
+TOKENS_POR_NOTIFICACION = 2000
+
+# (id_usuario, id_corredor, id_paradero_sube, id_paradero_baja)
+Viaje = Tuple[Optional[int], Optional[int], Optional[int], Optional[int]]
+
+
+class DestinatariosAlertas:
+    """Resuelve los tokens FCM a notificar para un reporte con ruta, paradero y/o corredor."""
+
+    def __init__(self, dias_historial: int = DIAS_HISTORIAL):
+        self.dias_historial = dias_historial
+        self._lock = threading.Lock()
+        self._cargado = False
+        self._tokens: Dict[int, str] = {}
+        self._usuario_por_token: Dict[str, int] = {}
+        self._por_paradero: Dict[int, Set[int]] = {}
+        self._por_corredor: Dict[int, Set[int]] = {}
+        # Cambios confirmados mientras se lee la BD en una recarga: se reaplican al reemplazar
+        self._durante_recarga: Optional[List] = None
+        self._recarga_lock = threading.Lock()
+        # Métricas
+        self.resoluciones = 0
+        self.destinatarios = 0
+        self._ultima_ms: Optional[float] = None
+
+    # --- Estado en memoria ---
+
+    def reemplazar(self, tokens: Dict[int, str], viajes: Iterable[Viaje]) -> None:
+        """Reemplaza tokens y patrones de viaje completos (carga inicial o tests)."""
+        with self._lock:
+            self._llenar(tokens, viajes)
+
+    def _llenar(self, tokens: Dict[int, str], viajes: Iterable[Viaje]) -> None:
+        self._tokens = {}
+        self._usuario_por_token = {}
+        self._por_paradero = {}
+        self._por_corredor = {}
+        for id_usuario, token in tokens.items():
+            self._poner_token(id_usuario, token)
+        for viaje in viajes:
+            self._agregar_viaje(*viaje)
+        self._cargado = True
+
+    def _poner_token(self, id_usuario: int, token: Optional[str]) -> None:
+        anterior = self._tokens.pop(id_usuario, None)
+        if anterior is not None:
+            self._usuario_por_token.pop(anterior, None)
+        if token:
+            self._tokens[id_usuario] = token
+            self._usuario_por_token[token] = id_usuario
+
+    def _agregar_viaje(self, id_usuario, id_corredor, id_paradero_sube, id_paradero_baja) -> None:
+        if id_usuario is None:
+            return
+        if id_corredor is not None:
+            self._por_corredor.setdefault(id_corredor, set()).add(id_usuario)
+        for id_paradero in (id_paradero_sube, id_paradero_baja):
+            if id_paradero is not None:
+                self._por_paradero.setdefault(id_paradero, set()).add(id_usuario)
+
+    def _cargar(self, db: Session) -> None:
+        """Carga en frío si el hilo de fondo aún no lo hizo (p. ej. sin startup en tests)."""
+        if not self._cargado:
+            self.recargar(db, solo_si_vacio=True)
+
+    def recargar(self, db: Session, solo_si_vacio: bool = False) -> None:
+        """
+        Vuelve a leer tokens y viajes desde la BD y los reemplaza. Las consultas
+        corren sin tomar el lock de las resoluciones; los commits que llegan
+        mientras tanto se reaplican sobre el estado nuevo.
+        """
+        with self._recarga_lock:
+            if solo_si_vacio and self._cargado:
+                return
+            with self._lock:
+                self._durante_recarga = []
+            try:
+                desde = datetime.now(timezone.utc) - timedelta(days=self.dias_historial)
+                with sesion_primaria(db) as db:
+                    tokens = dict(db.execute(
+                        select(UsuarioBase.id_usuario, UsuarioBase.fcm_token).where(UsuarioBase.fcm_token.is_not(None))
+                    ).all())
+                    viajes = db.execute(
+                        select(
+                            HistorialUso.id_usuario, HistorialUso.id_corredor,
+                            HistorialUso.id_paradero_sube, HistorialUso.id_paradero_baja,
+                        )
+                        .where(HistorialUso.id_usuario.is_not(None), HistorialUso.fecha_hora_subida >= desde)
+                        .distinct()
+                    ).all()
+                with self._lock:
+                    self._llenar(tokens, viajes)
+                    for aplicar, cambios in self._durante_recarga:
+                        aplicar(cambios)
+            finally:
+                with self._lock:
+                    self._durante_recarga = None
+
+    def _aplicar(self, aplicar, cambios) -> None:
+        """Aplica `cambios` con el lock tomado y los guarda si hay una recarga en curso."""
+        with self._lock:
+            if self._durante_recarga is not None:
+                self._durante_recarga.append((aplicar, cambios))
+            aplicar(cambios)
+
+    def aplicar_cambios_usuarios(self, cambios) -> None:
+        """Callback de config.eventos: tokens registrados, cambiados o usuarios eliminados."""
+        self._aplicar(self._aplicar_usuarios, cambios)
+
+    def _aplicar_usuarios(self, cambios) -> None:
+        for accion, _, valores in cambios:
+            id_usuario = valores.get("id_usuario")
+            if id_usuario is None:
+                continue
+            self._poner_token(id_usuario, None if accion == "delete" else valores.get("fcm_token"))
+
+    def aplicar_cambios_historial(self, cambios) -> None:
+        """Callback de config.eventos: los viajes nuevos se suman a los patrones."""
+        self._aplicar(self._aplicar_historial, cambios)
+
+    def _aplicar_historial(self, cambios) -> None:
+        for accion, _, valores in cambios:
+            if accion == "delete":
+                continue  # un viaje borrado no cambia por dónde suele moverse el usuario
+            self._agregar_viaje(valores.get("id_usuario"), valores.get("id_corredor"),
+                                valores.get("id_paradero_sube"), valores.get("id_paradero_baja"))
+
+    def quitar_tokens(self, tokens: List[str]) -> None:
+        """Callback de config.firebase: tokens que FCM rechazó."""
+        self._aplicar(self._quitar_tokens, tokens)
+
+    def _quitar_tokens(self, tokens: List[str]) -> None:
+        for token in tokens:
+            id_usuario = self._usuario_por_token.pop(token, None)
+            if id_usuario is not None:
+                self._tokens.pop(id_usuario, None)
+
+    # --- Resolución ---
+
+    def _puntos_cercanos(self, db: Session, id_paraderos: List[int], ruta,
+                         id_corredor: Optional[int]) -> List[Tuple[List[Tuple[float, float]], float]]:
+        """[(puntos, radio_km)] alrededor de los que buscar pasajeros."""
+        consultas = []
+        paraderos = get_indice_paraderos()
+        puntos = []
+        for id_paradero in id_paraderos:
+            p = paraderos.obtener(db, id_paradero)
+            if p and p["coordenada_lat"] is not None and p["coordenada_lng"] is not None:
+                puntos.append((p["coordenada_lat"], p["coordenada_lng"]))
+        if puntos:
+            consultas.append((puntos, RADIO_PARADERO_KM))
+        if ruta is not None:
+            consultas.append(([
+                (p.coordenada_lat, p.coordenada_lng) for p in ruta.paraderos
+                if p.coordenada_lat is not None and p.coordenada_lng is not None
+            ], RADIO_RUTA_KM))
+        if id_corredor is not None:
+            posicion = get_posiciones_corredores().obtener(db, id_corredor)
+            if posicion and posicion[0] is not None and posicion[1] is not None:
+                consultas.append(([(posicion[0], posicion[1])], RADIO_CORREDOR_KM))
+        return consultas
+
+    def usuarios(self, db: Session, id_ruta: Optional[int] = None, id_paraderos: Iterable[int] = (),
+                 id_corredor: Optional[int] = None) -> Set[int]:
+        """Usuarios cerca de la zona afectada o que suelen viajar por ella."""
+        self._cargar(db)
+        id_paraderos = [p for p in id_paraderos if p is not None]
+        ruta = get_catalogo_rutas().obtener(db, id_ruta) if id_ruta is not None else None
+
+        afectados: Set[int] = set()
+        pasajeros = get_indice_pasajeros()
+        for puntos, radio_km in self._puntos_cercanos(db, id_paraderos, ruta, id_corredor):
+            afectados |= pasajeros.usuarios_cerca(db, puntos, radio_km)
+
+        paraderos_ruta = [p.id_paradero for p in ruta.paraderos] if ruta is not None else []
+        with self._lock:
+            for id_paradero in (*id_paraderos, *paraderos_ruta):
+                afectados |= self._por_paradero.get(id_paradero, set())
+            if id_corredor is not None:
+                afectados |= self._por_corredor.get(id_corredor, set())
+        return afectados
+
+    def tokens(self, db: Session, id_ruta: Optional[int] = None, id_paraderos: Iterable[int] = (),
+               id_corredor: Optional[int] = None) -> List[str]:
+        """Tokens FCM de los usuarios afectados (sin repetir, en orden estable)."""
+        inicio = time.perf_counter()
+        afectados = self.usuarios(db, id_ruta, id_paraderos, id_corredor)
+        with self._lock:
+            tokens = sorted({self._tokens[u] for u in afectados if u in self._tokens})
+            self.resoluciones += 1
+            self.destinatarios += len(tokens)
+            self._ultima_ms = (time.perf_counter() - inicio) * 1000
+        return tokens
+
+    def para_reporte(self, db: Session, reporte: Dict) -> List[str]:
+        """Tokens a notificar para un reporte (dict con las columnas de reporte)."""
+        return self.tokens(
+            db,
+            id_ruta=reporte.get("id_ruta_afectada"),
+            id_paraderos=(reporte.get("id_paradero_inicial"), reporte.get("id_paradero_final")),
+            id_corredor=reporte.get("id_corredor_afectado"),
+        )
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            return {
+                "cargado": self._cargado,
+                "usuarios_con_token": len(self._tokens),
+                "paraderos_con_historial": len(self._por_paradero),
+                "corredores_con_historial": len(self._por_corredor),
+                "resoluciones": self.resoluciones,
+                "destinatarios": self.destinatarios,
+                "ultima_resolucion_ms": round(self._ultima_ms, 3) if self._ultima_ms is not None else None,
+            }
+
+
+def tiene_zona(reporte: Dict) -> bool:
+    """True si el reporte indica ruta, paradero o corredor afectado."""
+    return any(reporte.get(c) is not None for c in (
+        "id_ruta_afectada", "id_paradero_inicial", "id_paradero_final", "id_corredor_afectado"
+    ))
+
+
+def notificaciones_dirigidas(titulo: str, cuerpo: Optional[str], tokens: List[str],
+                             datos: Optional[Dict] = None) -> List[Dict]:
+    """Notificaciones del outbox para una lista de tokens, de a TOKENS_POR_NOTIFICACION."""
+    return [
+        notificacion(titulo=titulo, cuerpo=cuerpo, tokens=tokens[i:i + TOKENS_POR_NOTIFICACION], datos=datos)
+        for i in range(0, len(tokens), TOKENS_POR_NOTIFICACION)
+    ]
+
+
+def iniciar_recarga_periodica(destinatarios: DestinatariosAlertas, fabrica_sesion,
+                              intervalo_s: float = RECARGA_S) -> threading.Thread:
+    """
+    Hilo de fondo que carga tokens y viajes al arrancar (la primera alerta no
+    paga la carga en frío) y los vuelve a leer cada intervalo_s segundos.
+    """
+    def ciclo():
+        while True:
+            db = fabrica_sesion()
+            try:
+                destinatarios.recargar(db)
+            except Exception as e:
+                print(f"❌ Error recargando destinatarios de alertas: {e}")
+            finally:
+                db.close()
+            time.sleep(intervalo_s)
+
+    hilo = threading.Thread(target=ciclo, name="destinatarios-alertas", daemon=True)
+    hilo.start()
+    return hilo
+
+
+# Singleton global
+destinatarios_alertas = DestinatariosAlertas()
+al_confirmar_cambios((UsuarioBase,), destinatarios_alertas.aplicar_cambios_usuarios)
+al_confirmar_cambios((HistorialUso,), destinatarios_alertas.aplicar_cambios_historial)
+al_invalidar_tokens(destinatarios_alertas.quitar_tokens)
+
+
+def get_destinatarios_alertas() -> DestinatariosAlertas:
+    """
+    Obtener el resolvedor de destinatarios de alertas compartido
+    Uso: from services.destinatarios_alertas import get_destinatarios_alertas
+    """
+    return destinatarios_alertas
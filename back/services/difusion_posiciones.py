@@ -0,0 +1,184 @@
+"""
+Difusión en tiempo real de posiciones de corredores (fan-out en memoria).
+
+Los clientes (WebSocket o SSE) se suscriben a un corredor, a una ruta o a un
+bounding box y reciben solo los cambios de posición que llegan por la ingesta
+(services.ingesta_posiciones), sin consultar la BD.
+
+Contrapresión: cada suscriptor guarda como máximo la última posición pendiente
+por corredor. Si el cliente es lento, las posiciones intermedias se reemplazan
+por la más nueva (y se cuentan como descartadas) en lugar de acumularse.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Set
+
+from services.red_rutas import GeometriaRuta
+
+# Distancia máxima de un corredor a la polilínea de la ruta para considerarlo en ella
+TOLERANCIA_RUTA_KM = 0.3
+# Ventana (s) para calcular la tasa de mensajes
+VENTANA_TASA_S = 60.0
+
+
+class FiltroSuscripcion:
+    """Qué posiciones le interesan a un suscriptor: un corredor, una ruta o un bounding box."""
+
+    def __init__(
+        self,
+        id_corredor: Optional[int] = None,
+        geometria: Optional[GeometriaRuta] = None,
+        bbox: Optional[Sequence[float]] = None,
+    ):
+        if sum(x is not None for x in (id_corredor, geometria, bbox)) != 1:
+            raise ValueError("Indique exactamente uno: corredor, ruta o bounding box")
+        self.id_corredor = id_corredor
+        self.geometria = geometria
+        self.bbox = tuple(bbox) if bbox is not None else None
+
+    @property
+    def tipo(self) -> str:
+        if self.id_corredor is not None:
+            return "corredor"
+        return "ruta" if self.geometria is not None else "bbox"
+
+    def coincide(self, id_corredor: int, lat: Optional[float], lng: Optional[float]) -> bool:
+        if self.id_corredor is not None:
+            return id_corredor == self.id_corredor
+        if lat is None or lng is None:
+            return False
+        if self.bbox is not None:
+            min_lat, min_lng, max_lat, max_lng = self.bbox
+            return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+        proyeccion = self.geometria.proyectar(lat, lng)
+        return proyeccion is not None and proyeccion["desvio_km"] <= TOLERANCIA_RUTA_KM
+
+
+class Suscripcion:
+    """Un cliente conectado con su buffer de últimas posiciones pendientes."""
+
+    def __init__(self, filtro: FiltroSuscripcion, loop: asyncio.AbstractEventLoop):
+        self.filtro = filtro
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._evento = asyncio.Event()
+        # {id_corredor: mensaje}
+        self._pendientes: Dict[int, Dict] = {}
+        self.descartados = 0
+
+    def ofrecer(self, mensaje: Dict) -> bool:
+        """
+        Encola un mensaje (desde cualquier hilo); reemplaza el pendiente del mismo corredor.
+        Devuelve False si el loop del cliente ya se cerró (la suscripción está muerta).
+        """
+        with self._lock:
+            if mensaje["id_corredor"] in self._pendientes:
+                self.descartados += 1
+            self._pendientes[mensaje["id_corredor"]] = mensaje
+        try:
+            self._loop.call_soon_threadsafe(self._evento.set)
+        except RuntimeError:
+            return False
+        return True
+
+    async def siguiente(self) -> List[Dict]:
+        """Espera y devuelve los mensajes pendientes (uno por corredor)."""
+        await self._evento.wait()
+        self._evento.clear()
+        with self._lock:
+            mensajes, self._pendientes = list(self._pendientes.values()), {}
+        return mensajes
+
+
+class DifusionPosiciones:
+    """Registro de suscriptores y publicación de posiciones, compartido por el proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones: Set[Suscripcion] = set()
+        self.publicados = 0
+        self.entregados = 0
+        self._entregas = deque()  # (instante, cantidad) dentro de la ventana
+
+    def suscribir(self, filtro: FiltroSuscripcion, loop: Optional[asyncio.AbstractEventLoop] = None) -> Suscripcion:
+        suscripcion = Suscripcion(filtro, loop or asyncio.get_running_loop())
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion: Suscripcion) -> None:
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def publicar(self, id_corredor: int, lat: Optional[float], lng: Optional[float], estado: Optional[str] = None) -> int:
+        """Entrega una posición a los suscriptores interesados. Devuelve a cuántos."""
+        with self._lock:
+            self.publicados += 1
+            suscripciones = list(self._suscripciones)
+        if not suscripciones:
+            return 0
+
+        mensaje = {"id_corredor": id_corredor, "lat": lat, "lng": lng, "estado": estado, "ts": time.time()}
+        # Una ruta con varios suscriptores se evalúa una sola vez por posición
+        por_ruta: Dict[int, bool] = {}
+        entregados = 0
+        muertas = []
+        for s in suscripciones:
+            geometria = s.filtro.geometria
+            if geometria is not None:
+                if geometria.id_ruta not in por_ruta:
+                    por_ruta[geometria.id_ruta] = s.filtro.coincide(id_corredor, lat, lng)
+                coincide = por_ruta[geometria.id_ruta]
+            else:
+                coincide = s.filtro.coincide(id_corredor, lat, lng)
+            if coincide:
+                if s.ofrecer(mensaje):
+                    entregados += 1
+                else:
+                    muertas.append(s)
+        if muertas:
+            # Clientes cuyo loop terminó sin desuscribirse: no frenar al hilo de ingesta
+            with self._lock:
+                self._suscripciones.difference_update(muertas)
+        return entregados
+
+    def registrar_envio(self, cantidad: int) -> None:
+        """Lo llaman los transportes al enviar mensajes (para la tasa de mensajes)."""
+        ahora = time.monotonic()
+        with self._lock:
+            self.entregados += cantidad
+            self._entregas.append((ahora, cantidad))
+            while self._entregas and self._entregas[0][0] < ahora - VENTANA_TASA_S:
+                self._entregas.popleft()
+
+    def metricas(self) -> Dict:
+        ahora = time.monotonic()
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+            recientes = sum(n for t, n in self._entregas if t >= ahora - VENTANA_TASA_S)
+            publicados, entregados = self.publicados, self.entregados
+        por_tipo: Dict[str, int] = {}
+        for s in suscripciones:
+            por_tipo[s.filtro.tipo] = por_tipo.get(s.filtro.tipo, 0) + 1
+        return {
+            "clientes": len(suscripciones),
+            "clientes_por_tipo": por_tipo,
+            "publicados": publicados,
+            "mensajes_enviados": entregados,
+            "mensajes_por_segundo": recientes / VENTANA_TASA_S,
+            "descartados_por_contrapresion": sum(s.descartados for s in suscripciones),
+        }
+
+
+# Singleton global
+difusion_posiciones = DifusionPosiciones()
+
+
+def get_difusion_posiciones() -> DifusionPosiciones:
+    """
+    Obtener el canal de difusión de posiciones compartido
+    Uso: from services.difusion_posiciones import get_difusion_posiciones
+    """
+    return difusion_posiciones
@@ -1,11 +1,13 @@
 from typing import Optional, List, Dict
 from sqlalchemy import text
-from config.db import engine as db_engine
+from config.db import engine as db_engine, engine_lectura
 from datetime import datetime
 
 class FeedbackService:
-    def __init__(self, engine=db_engine):
+    def __init__(self, engine=db_engine, lectura=None):
         self.engine = engine
+        # Devuelve el engine para listar: réplica si está al día, si no el primario
+        self.lectura = lectura or (engine_lectura if engine is db_engine else (lambda: engine))
 
     def save_feedback(self, comentario: str, id_usuario: Optional[int] = None) -> Dict:
         """
@@ -32,7 +34,7 @@ class FeedbackService:
 
     def list_feedback(self, limit: int = 200) -> List[Dict]:
         sql = text("SELECT id_feedback, comentario, id_usuario, fecha FROM feedback ORDER BY fecha DESC LIMIT :lim")
-        with self.engine.connect() as conn:
+        with self.lectura().connect() as conn:
             res = conn.execute(sql, {"lim": limit})
             rows = [dict(r._mapping) for r in res.fetchall()]
             return rows
@@ -0,0 +1,78 @@
+"""
+Kernels de distancia geográfica (Haversine) compartidos por los servicios.
+
+Las funciones vectorizadas trabajan sobre arreglos NumPy de coordenadas en
+grados, de modo que calcular la distancia a miles de paraderos o usuarios es
+una sola operación de arreglos en lugar de miles de llamadas en Python.
+Las coordenadas faltantes se representan con NaN y nunca cumplen un radio.
+"""
+import math
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+RADIO_TIERRA_KM = 6371.0
+
+
+def distancia_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Distancia Haversine entre dos puntos escalares (en km).
+
+    Para un solo par de puntos es más rápida que la versión vectorizada.
+    """
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def haversine_km(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """
+    Distancia Haversine con broadcasting de NumPy (en km).
+
+    Acepta escalares o arreglos de formas compatibles.
+    """
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlng = np.radians(lng2) - np.radians(lng1)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def coordenadas(puntos: Iterable[Tuple[Optional[float], Optional[float]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convierte pares (lat, lng) a dos arreglos float64; None se vuelve NaN.
+
+    Returns:
+        (lats, lngs)
+    """
+    arr = np.array(
+        [(np.nan if lat is None else lat, np.nan if lng is None else lng) for lat, lng in puntos],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    return arr[:, 0], arr[:, 1]
+
+
+def distancias_uno_a_muchos(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Distancias (km) desde un punto a cada punto de los arreglos."""
+    return haversine_km(lat, lng, np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64))
+
+
+def matriz_distancias(lats_a: np.ndarray, lngs_a: np.ndarray, lats_b: np.ndarray, lngs_b: np.ndarray) -> np.ndarray:
+    """
+    Matriz de distancias (km) de forma (len(a), len(b)).
+
+    El elemento [i, j] es la distancia entre a[i] y b[j].
+    """
+    lats_a = np.asarray(lats_a, dtype=np.float64)[:, None]
+    lngs_a = np.asarray(lngs_a, dtype=np.float64)[:, None]
+    lats_b = np.asarray(lats_b, dtype=np.float64)[None, :]
+    lngs_b = np.asarray(lngs_b, dtype=np.float64)[None, :]
+    return haversine_km(lats_a, lngs_a, lats_b, lngs_b)
+
+
+def mascara_radio(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray, radio_km: float) -> np.ndarray:
+    """Máscara booleana de los puntos a distancia <= radio_km (NaN -> False)."""
+    with np.errstate(invalid="ignore"):
+        return distancias_uno_a_muchos(lat, lng, lats, lngs) <= radio_km
@@ -0,0 +1,424 @@
+"""
+Índice espacial en memoria basado en una grilla de celdas lat/lng.
+
+Responde consultas de "más cercano" y "dentro de un radio" revisando solo
+las celdas vecinas al punto consultado, en lugar de recorrer todos los puntos.
+Incluye los índices de paraderos y de pasajeros compartidos por todo el proceso.
+"""
+import math
+import threading
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from config.db import sesion_primaria
+from config.eventos import al_confirmar_cambios, solo_externos
+from models.Paradero import Paradero
+from models.UsuarioBase import UsuarioBase
+from services.geo import distancia_km, distancias_uno_a_muchos
+
+KM_POR_GRADO = 111.32
+TIPO_PASAJERO = 1
+
+Celda = Tuple[int, int]
+
+
+class IndiceEspacial:
+    """
+    Grilla uniforme de celdas cuadradas (en grados) que agrupa puntos por id.
+
+    No es thread-safe para escrituras concurrentes; quien lo comparta entre
+    hilos debe protegerlo o reemplazarlo atómicamente.
+    """
+
+    def __init__(self, tam_celda_km: float = 0.5):
+        """
+        Args:
+            tam_celda_km (float): Lado aproximado de cada celda en kilómetros
+        """
+        self.tam_celda_km = tam_celda_km
+        self.tam_celda_deg = tam_celda_km / KM_POR_GRADO
+        self._celdas: Dict[Celda, Dict[Hashable, Tuple[float, float]]] = {}
+        self._puntos: Dict[Hashable, Tuple[float, float, Celda]] = {}
+
+    def __len__(self) -> int:
+        return len(self._puntos)
+
+    def __contains__(self, id_punto: Hashable) -> bool:
+        return id_punto in self._puntos
+
+    def celda(self, lat: float, lng: float) -> Celda:
+        return (math.floor(lat / self.tam_celda_deg), math.floor(lng / self.tam_celda_deg))
+
+    def insertar(self, id_punto: Hashable, lat: float, lng: float) -> None:
+        """Inserta o mueve un punto."""
+        anterior = self._puntos.get(id_punto)
+        nueva = self.celda(lat, lng)
+        if anterior is not None and anterior[2] != nueva:
+            self._quitar_de_celda(id_punto, anterior[2])
+        self._celdas.setdefault(nueva, {})[id_punto] = (lat, lng)
+        self._puntos[id_punto] = (lat, lng, nueva)
+
+    def eliminar(self, id_punto: Hashable) -> bool:
+        anterior = self._puntos.pop(id_punto, None)
+        if anterior is None:
+            return False
+        self._quitar_de_celda(id_punto, anterior[2])
+        return True
+
+    def posicion(self, id_punto: Hashable) -> Optional[Tuple[float, float]]:
+        punto = self._puntos.get(id_punto)
+        return (punto[0], punto[1]) if punto else None
+
+    def _quitar_de_celda(self, id_punto: Hashable, celda: Celda) -> None:
+        bucket = self._celdas.get(celda)
+        if bucket is None:
+            return
+        bucket.pop(id_punto, None)
+        if not bucket:
+            del self._celdas[celda]
+
+    def _celdas_en_radio(self, lat: float, lng: float, radio_km: float) -> Iterator[Celda]:
+        """Celdas ocupadas que intersectan el rectángulo que envuelve al círculo."""
+        dlat = radio_km / KM_POR_GRADO
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        dlng = radio_km / (KM_POR_GRADO * cos_lat)
+        i0, j0 = self.celda(lat - dlat, lng - dlng)
+        i1, j1 = self.celda(lat + dlat, lng + dlng)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._celdas):
+            # Radio más grande que la zona ocupada: recorrer solo las celdas con puntos
+            for (i, j) in self._celdas:
+                if i0 <= i <= i1 and j0 <= j <= j1:
+                    yield (i, j)
+            return
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                if (i, j) in self._celdas:
+                    yield (i, j)
+
+    def en_radio(self, lat: float, lng: float, radio_km: float) -> List[Tuple[Hashable, float]]:
+        """
+        Puntos a una distancia <= radio_km, ordenados del más cercano al más lejano.
+
+        Returns:
+            Lista de tuplas (id_punto, distancia_km)
+        """
+        ids = []
+        coords = []
+        for c in self._celdas_en_radio(lat, lng, radio_km):
+            bucket = self._celdas[c]
+            ids.extend(bucket.keys())
+            coords.extend(bucket.values())
+        if not ids:
+            return []
+        arr = np.asarray(coords, dtype=np.float64)
+        dist = distancias_uno_a_muchos(lat, lng, arr[:, 0], arr[:, 1])
+        dentro = np.flatnonzero(dist <= radio_km)
+        orden = dentro[np.argsort(dist[dentro], kind="stable")]
+        return [(ids[i], float(dist[i])) for i in orden]
+
+    def contar_en_radio(self, lat: float, lng: float, radio_km: float) -> int:
+        return len(self.en_radio(lat, lng, radio_km))
+
+    def en_caja(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> List[Hashable]:
+        """Ids de los puntos dentro del rectángulo [min_lat, max_lat] x [min_lng, max_lng]."""
+        i0, j0 = self.celda(min_lat, min_lng)
+        i1, j1 = self.celda(max_lat, max_lng)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._celdas):
+            celdas = [c for c in self._celdas if i0 <= c[0] <= i1 and j0 <= c[1] <= j1]
+        else:
+            celdas = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1) if (i, j) in self._celdas]
+        return [
+            id_punto
+            for c in celdas
+            for id_punto, (lat, lng) in self._celdas[c].items()
+            if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+        ]
+
+    def mas_cercano(self, lat: float, lng: float, radio_max_km: Optional[float] = None) -> Optional[Tuple[Hashable, float]]:
+        """
+        Punto más cercano usando búsqueda por anillos de celdas.
+
+        Se expande anillo a anillo desde la celda del punto consultado y se
+        detiene cuando ningún anillo restante puede contener un punto más cercano.
+
+        Returns:
+            (id_punto, distancia_km) o None si el índice está vacío
+            o no hay puntos dentro de radio_max_km
+        """
+        if not self._puntos:
+            return None
+
+        ci, cj = self.celda(lat, lng)
+        ocupadas = self._celdas.keys()
+        # Ancho mínimo de celda en km (en longitud se angosta con la latitud)
+        ancho_km = self.tam_celda_km * max(math.cos(math.radians(lat)), 1e-6)
+
+        mejor: Optional[Tuple[Hashable, float]] = None
+        r = 0
+        while True:
+            if 8 * r > len(self._celdas):
+                # El anillo ya tiene más celdas que las ocupadas: recorrer las
+                # ocupadas que faltan, ordenadas por anillo
+                restantes = sorted(
+                    (max(abs(i - ci), abs(j - cj)), (i, j)) for (i, j) in ocupadas
+                    if max(abs(i - ci), abs(j - cj)) >= r
+                )
+                for rr, c in restantes:
+                    if self._fuera_de_cota(rr, ancho_km, mejor, radio_max_km):
+                        break
+                    mejor = self._mejor_en_celda(c, lat, lng, mejor)
+                break
+            if self._fuera_de_cota(r, ancho_km, mejor, radio_max_km):
+                break
+            for c in self._anillo(ci, cj, r):
+                mejor = self._mejor_en_celda(c, lat, lng, mejor)
+            r += 1
+
+        if mejor is not None and radio_max_km is not None and mejor[1] > radio_max_km:
+            return None
+        return mejor
+
+    @staticmethod
+    def _fuera_de_cota(r: int, ancho_km: float, mejor, radio_max_km: Optional[float]) -> bool:
+        """True si ningún punto del anillo r puede mejorar el resultado actual."""
+        cota = (r - 1) * ancho_km
+        if mejor is not None and cota > mejor[1]:
+            return True
+        return radio_max_km is not None and cota > radio_max_km
+
+    def _mejor_en_celda(self, c: Celda, lat: float, lng: float, mejor):
+        for id_punto, (plat, plng) in self._celdas.get(c, {}).items():
+            d = distancia_km(lat, lng, plat, plng)
+            if mejor is None or d < mejor[1]:
+                mejor = (id_punto, d)
+        return mejor
+
+    def _anillo(self, ci: int, cj: int, r: int) -> Iterator[Celda]:
+        if r == 0:
+            yield (ci, cj)
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield (ci - r, j)
+            yield (ci + r, j)
+        for i in range(ci - r + 1, ci + r):
+            yield (i, cj - r)
+            yield (i, cj + r)
+
+
+class IndiceParaderos:
+    """
+    Índice de paraderos compartido por el proceso.
+
+    Se carga de forma perezosa desde la BD en la primera consulta y se
+    invalida cuando se confirman cambios sobre la tabla paradero o cuando
+    caduca (config.eventos.iniciar_caducidad_periodica).
+    """
+
+    def __init__(self, tam_celda_km: float = 0.5):
+        self.tam_celda_km = tam_celda_km
+        self._lock = threading.Lock()
+        # (indice, paraderos por id); se reemplaza completo para que los lectores no necesiten lock
+        self._estado: Optional[Tuple[IndiceEspacial, Dict[int, Dict]]] = None
+        self.version = 0
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._estado = None
+            self.version += 1
+
+    def _cargar(self, db: Session) -> Tuple[IndiceEspacial, Dict[int, Dict]]:
+        estado = self._estado
+        if estado is not None:
+            return estado
+        with self._lock:
+            if self._estado is not None:
+                return self._estado
+            version = self.version
+            with sesion_primaria(db) as db:
+                filas = db.query(
+                    Paradero.id_paradero,
+                    Paradero.nombre,
+                    Paradero.coordenada_lat,
+                    Paradero.coordenada_lng,
+                    Paradero.colapso_actual,
+                    Paradero.imagen_url,
+                ).all()
+            indice = IndiceEspacial(self.tam_celda_km)
+            paraderos: Dict[int, Dict] = {}
+            for f in filas:
+                paraderos[f.id_paradero] = {
+                    "id_paradero": f.id_paradero,
+                    "nombre": f.nombre,
+                    "coordenada_lat": f.coordenada_lat,
+                    "coordenada_lng": f.coordenada_lng,
+                    "colapso_actual": f.colapso_actual,
+                    "imagen_url": f.imagen_url,
+                }
+                if f.coordenada_lat is not None and f.coordenada_lng is not None:
+                    indice.insertar(f.id_paradero, f.coordenada_lat, f.coordenada_lng)
+            estado = (indice, paraderos)
+            # Si se invalidó mientras cargábamos, no dejar el estado viejo en caché
+            if version == self.version:
+                self._estado = estado
+            return estado
+
+    def listar(self, db: Session) -> List[Dict]:
+        _, paraderos = self._cargar(db)
+        return [dict(p) for p in paraderos.values()]
+
+    def obtener(self, db: Session, id_paradero: int) -> Optional[Dict]:
+        _, paraderos = self._cargar(db)
+        p = paraderos.get(id_paradero)
+        return dict(p) if p else None
+
+    def mas_cercano(self, db: Session, lat: float, lng: float, radio_max_km: Optional[float] = None) -> Optional[Dict]:
+        """Paradero más cercano (dict serializado + distancia_km) o None."""
+        indice, paraderos = self._cargar(db)
+        encontrado = indice.mas_cercano(lat, lng, radio_max_km)
+        if encontrado is None:
+            return None
+        id_paradero, distancia = encontrado
+        return {**paraderos[id_paradero], "distancia_km": distancia}
+
+    def en_radio(self, db: Session, lat: float, lng: float, radio_km: float) -> List[Dict]:
+        """Paraderos dentro del radio, del más cercano al más lejano."""
+        indice, paraderos = self._cargar(db)
+        return [
+            {**paraderos[id_paradero], "distancia_km": distancia}
+            for id_paradero, distancia in indice.en_radio(lat, lng, radio_km)
+        ]
+
+    def en_caja(self, db: Session, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> List[Dict]:
+        """Paraderos con coordenadas dentro del rectángulo dado."""
+        indice, paraderos = self._cargar(db)
+        return [dict(paraderos[i]) for i in indice.en_caja(min_lat, min_lng, max_lat, max_lng)]
+
+
+class IndicePasajeros:
+    """
+    Grilla viva con la ubicación actual de los pasajeros (usuarios tipo 1).
+
+    Se carga desde la BD y luego se mantiene incrementalmente con cada cambio
+    confirmado sobre usuario_base (o con `actualizar_ubicacion`), así contar
+    pasajeros cerca de un corredor no consulta la BD. Con un aviso "externo"
+    (caducidad periódica de config.eventos) se vuelve a construir en la
+    siguiente consulta, para recoger las ubicaciones escritas por otros
+    workers o directo en la BD.
+    """
+
+    def __init__(self, tam_celda_km: float = 0.5):
+        self._lock = threading.Lock()
+        self._indice = IndiceEspacial(tam_celda_km)
+        self._cargado = False
+
+    def _cargar(self, db: Session) -> None:
+        if self._cargado:
+            return
+        with self._lock:
+            if self._cargado:
+                return
+            with sesion_primaria(db) as db:
+                filas = (
+                    db.query(UsuarioBase.id_usuario, UsuarioBase.ubicacion_actual_lat, UsuarioBase.ubicacion_actual_lng)
+                    .filter(
+                        UsuarioBase.id_tipo_usuario == TIPO_PASAJERO,
+                        UsuarioBase.ubicacion_actual_lat.isnot(None),
+                        UsuarioBase.ubicacion_actual_lng.isnot(None),
+                    )
+                    .all()
+                )
+            indice = IndiceEspacial(self._indice.tam_celda_km)
+            for f in filas:
+                indice.insertar(f.id_usuario, f.ubicacion_actual_lat, f.ubicacion_actual_lng)
+            self._indice = indice
+            self._cargado = True
+
+    def invalidar(self) -> None:
+        """La próxima consulta reconstruye la grilla desde la BD (la actual se sigue usando hasta entonces)."""
+        self._cargado = False
+
+    def actualizar_ubicacion(self, id_usuario: int, lat: Optional[float], lng: Optional[float], id_tipo_usuario: Optional[int] = TIPO_PASAJERO) -> None:
+        """Mueve, agrega o quita a un usuario de la grilla según sus datos actuales."""
+        with self._lock:
+            if id_tipo_usuario == TIPO_PASAJERO and lat is not None and lng is not None:
+                self._indice.insertar(id_usuario, lat, lng)
+            else:
+                self._indice.eliminar(id_usuario)
+
+    def eliminar(self, id_usuario: int) -> None:
+        with self._lock:
+            self._indice.eliminar(id_usuario)
+
+    def aplicar_cambios(self, cambios) -> None:
+        """Callback de config.eventos para cambios confirmados en UsuarioBase."""
+        if solo_externos(cambios):
+            self.invalidar()
+            return
+        for accion, _, valores in cambios:
+            if valores.get("id_usuario") is None:
+                continue
+            if accion == "delete":
+                self.eliminar(valores["id_usuario"])
+            else:
+                self.actualizar_ubicacion(
+                    valores["id_usuario"],
+                    valores.get("ubicacion_actual_lat"),
+                    valores.get("ubicacion_actual_lng"),
+                    valores.get("id_tipo_usuario"),
+                )
+
+    def contar_en_radio(self, db: Session, lat: float, lng: float, radio_km: float) -> int:
+        """Cantidad de pasajeros a distancia <= radio_km de (lat, lng)."""
+        self._cargar(db)
+        with self._lock:
+            return self._indice.contar_en_radio(lat, lng, radio_km)
+
+    def usuarios_cerca(self, db: Session, puntos: Iterable[Tuple[float, float]], radio_km: float) -> Set[int]:
+        """Ids de los pasajeros a distancia <= radio_km de alguno de los puntos (lock tomado una vez)."""
+        self._cargar(db)
+        encontrados: Set[int] = set()
+        with self._lock:
+            for lat, lng in puntos:
+                encontrados.update(id_usuario for id_usuario, _ in self._indice.en_radio(lat, lng, radio_km))
+        return encontrados
+
+    def contar_por_punto(self, db: Session, puntos: Dict[Hashable, Tuple[float, float]], radio_km: float) -> Dict[Hashable, int]:
+        """
+        Variante masiva: conteo de pasajeros cercanos para varios puntos a la vez
+        (por ejemplo, todos los corredores) tomando el lock una sola vez.
+
+        Args:
+            puntos: {clave: (lat, lng)}
+        """
+        self._cargar(db)
+        with self._lock:
+            return {
+                clave: self._indice.contar_en_radio(lat, lng, radio_km)
+                for clave, (lat, lng) in puntos.items()
+            }
+
+
+# Singletons globales
+indice_paraderos = IndiceParaderos()
+al_confirmar_cambios((Paradero,), lambda cambios: indice_paraderos.invalidar())
+
+indice_pasajeros = IndicePasajeros()
+al_confirmar_cambios((UsuarioBase,), indice_pasajeros.aplicar_cambios)
+
+
+def get_indice_paraderos() -> IndiceParaderos:
+    """
+    Obtener el índice de paraderos compartido
+    Uso: from services.indice_espacial import get_indice_paraderos
+    """
+    return indice_paraderos
+
+
+def get_indice_pasajeros() -> IndicePasajeros:
+    """
+    Obtener la grilla de pasajeros compartida
+    Uso: from services.indice_espacial import get_indice_pasajeros
+    """
+    return indice_pasajeros
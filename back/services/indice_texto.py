@@ -0,0 +1,171 @@
+"""
+Índice de texto en memoria para nombres de rutas y paraderos.
+
+Los nombres se normalizan (minúsculas, sin tildes ni diéresis, ñ -> n, solo
+letras y dígitos) y se indexan por trigramas: una búsqueda parcial intersecta
+las listas de los trigramas de la consulta (empezando por la más corta) y
+solo verifica esos candidatos, en lugar de recorrer todos los nombres.
+Las consultas de 1-2 caracteres (autocompletado al empezar a escribir) usan
+un índice de prefijos de palabra.
+"""
+import re
+import threading
+import unicodedata
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from services.catalogo_rutas import get_catalogo_rutas
+from services.indice_espacial import get_indice_paraderos
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar(texto: Optional[str]) -> str:
+    """'Av. Perú - Ñaña' -> 'av peru nana'"""
+    if not texto:
+        return ""
+    sin_tildes = "".join(
+        c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c)
+    )
+    return _NO_ALFANUMERICO.sub(" ", sin_tildes.lower()).strip()
+
+
+def _trigramas(texto: str) -> Set[str]:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceTexto:
+    """Índice de trigramas sobre (clave, texto)."""
+
+    def __init__(self, documentos: Iterable[Tuple[Hashable, str]] = ()):
+        # {clave: (texto original, texto normalizado)}
+        self._textos: Dict[Hashable, Tuple[str, str]] = {}
+        self._trigramas: Dict[str, Set[Hashable]] = {}
+        self._prefijos: Dict[str, Set[Hashable]] = {}
+        self._exactos: Dict[str, List[Hashable]] = {}
+        for clave, texto in documentos:
+            self.agregar(clave, texto)
+
+    def __len__(self) -> int:
+        return len(self._textos)
+
+    def agregar(self, clave: Hashable, texto: Optional[str]) -> None:
+        norm = normalizar(texto)
+        if not norm:
+            return
+        self._textos[clave] = (texto, norm)
+        self._exactos.setdefault(norm, []).append(clave)
+        for t in _trigramas(norm):
+            self._trigramas.setdefault(t, set()).add(clave)
+        for palabra in norm.split():
+            for n in (1, 2):
+                if len(palabra) >= n:
+                    self._prefijos.setdefault(palabra[:n], set()).add(clave)
+
+    def _candidatos(self, q: str) -> Set[Hashable]:
+        if len(q) < 3:
+            return self._prefijos.get(q, set())
+        listas = [self._trigramas.get(t) for t in _trigramas(q)]
+        if any(lista is None for lista in listas):
+            return set()
+        listas.sort(key=len)
+        candidatos = set(listas[0])
+        for lista in listas[1:]:
+            candidatos &= lista
+            if not candidatos:
+                break
+        return candidatos
+
+    def buscar(self, consulta: str, limite: Optional[int] = 10) -> List[Tuple[Hashable, str]]:
+        """
+        Claves cuyo texto contiene la consulta (sin distinguir tildes ni mayúsculas).
+        Orden: empieza con la consulta, alguna palabra empieza con ella, la contiene;
+        a igualdad, el texto más corto primero. Devuelve [(clave, texto original)].
+        """
+        q = normalizar(consulta)
+        if not q:
+            return []
+        encontrados = []
+        for clave in self._candidatos(q):
+            texto, norm = self._textos[clave]
+            if len(q) < 3:
+                rango = 0 if norm.startswith(q) else 1
+            else:
+                pos = norm.find(q)
+                if pos < 0:
+                    continue  # los trigramas coinciden pero no en secuencia
+                rango = 0 if pos == 0 else (1 if norm[pos - 1] == " " else 2)
+            encontrados.append((rango, len(norm), norm, clave, texto))
+        encontrados.sort(key=lambda e: e[:3])
+        if limite is not None:
+            encontrados = encontrados[:limite]
+        return [(clave, texto) for _, _, _, clave, texto in encontrados]
+
+    def claves(self, consulta: str) -> Set[Hashable]:
+        """Todas las claves que coinciden con la consulta (sin ordenar)."""
+        return {clave for clave, _ in self.buscar(consulta, limite=None)}
+
+    def exacto(self, texto: str) -> List[Hashable]:
+        """Claves cuyo texto normalizado es igual al de `texto`."""
+        return list(self._exactos.get(normalizar(texto), ()))
+
+
+class IndiceNombres:
+    """
+    Índices de nombres de rutas y paraderos, compartidos por el proceso.
+    Se reconstruyen cuando cambia la versión del catálogo de rutas o del
+    índice de paraderos (que ya se invalidan con los commits).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rutas: Optional[Tuple[int, IndiceTexto]] = None
+        self._paraderos: Optional[Tuple[int, IndiceTexto]] = None
+
+    def rutas(self, db: Session) -> IndiceTexto:
+        catalogo = get_catalogo_rutas()
+        estado = self._rutas
+        if estado is None or estado[0] != catalogo.version:
+            version = catalogo.version
+            indice = IndiceTexto((r.id_ruta, r.nombre) for r in catalogo.rutas(db))
+            with self._lock:
+                self._rutas = estado = (version, indice)
+        return estado[1]
+
+    def paraderos(self, db: Session) -> IndiceTexto:
+        indice_paraderos = get_indice_paraderos()
+        estado = self._paraderos
+        if estado is None or estado[0] != indice_paraderos.version:
+            version = indice_paraderos.version
+            indice = IndiceTexto((p["id_paradero"], p["nombre"]) for p in indice_paraderos.listar(db))
+            with self._lock:
+                self._paraderos = estado = (version, indice)
+        return estado[1]
+
+    def buscar(self, db: Session, consulta: str, tipo: Optional[str] = None, limite: int = 10) -> List[Dict]:
+        """Resultados mezclados de rutas y paraderos: [{ tipo, id, nombre }]."""
+        resultado = []
+        if tipo in (None, "ruta"):
+            resultado += [{"tipo": "ruta", "id": i, "nombre": n} for i, n in self.rutas(db).buscar(consulta, limite)]
+        if tipo in (None, "paradero"):
+            resultado += [{"tipo": "paradero", "id": i, "nombre": n} for i, n in self.paraderos(db).buscar(consulta, limite)]
+        if tipo is None:
+            # Intercalar por relevancia dentro de cada tipo: rutas y paraderos alternados
+            rutas = [r for r in resultado if r["tipo"] == "ruta"]
+            paraderos = [r for r in resultado if r["tipo"] == "paradero"]
+            resultado = [r for par in zip(rutas, paraderos) for r in par]
+            resultado += rutas[len(paraderos):] + paraderos[len(rutas):]
+        return resultado[:limite]
+
+
+# Singleton global
+indice_nombres = IndiceNombres()
+
+
+def get_indice_nombres() -> IndiceNombres:
+    """
+    Obtener los índices de nombres compartidos
+    Uso: from services.indice_texto import get_indice_nombres
+    """
+    return indice_nombres
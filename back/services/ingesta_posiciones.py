@@ -0,0 +1,193 @@
+"""
+Ingesta de posiciones GPS de corredores con escrituras agrupadas.
+
+Cada ping solo actualiza memoria: la última posición por corredor queda en
+el snapshot compartido (services.posiciones_corredores, que ya usan los ETA),
+se publica a los clientes en tiempo real (services.difusion_posiciones) y
+queda en un buffer de pendientes donde los pings repetidos de un mismo corredor
+se fusionan. Un hilo de fondo vacía el buffer periódicamente con un único
+`UPDATE ... FROM (VALUES ...)` por bloque, en lugar de una carga ORM, commit
+y refresh por ping.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from services.difusion_posiciones import get_difusion_posiciones
+from services.posiciones_corredores import get_posiciones_corredores
+
+INTERVALO_VACIADO_S = float(os.getenv("INGESTA_INTERVALO_S", "1"))
+FILAS_POR_SENTENCIA = 1000
+# Ventana de muestras para las métricas (últimos N lotes / filas)
+VENTANA_METRICAS = 1000
+
+
+class IngestaPosiciones:
+    """Buffer de últimas posiciones por corredor y su vaciado por lotes."""
+
+    def __init__(self, motor: Optional[Engine] = None):
+        self._motor = motor
+        self._lock = threading.Lock()
+        # {id_corredor: (lat, lng, estado, recibido_en)}
+        self._pendientes: Dict[int, Tuple[float, float, Optional[str], float]] = {}
+        # Métricas
+        self.recibidas = 0
+        self.fusionadas = 0
+        self.rechazadas = 0
+        self.escritas = 0
+        self.lotes = 0
+        self.errores = 0
+        self._tamanos_lote = deque(maxlen=VENTANA_METRICAS)
+        self._retrasos_s = deque(maxlen=VENTANA_METRICAS)
+
+    @property
+    def motor(self) -> Engine:
+        if self._motor is None:
+            from config.db import engine
+            self._motor = engine
+        return self._motor
+
+    def registrar(self, db: Session, id_corredor: int, lat: float, lng: float, estado: Optional[str] = None) -> bool:
+        """
+        Registra un ping. Devuelve False si el corredor no existe.
+        La existencia se valida contra el snapshot en memoria, sin consultar la BD por ping.
+        """
+        posiciones = get_posiciones_corredores()
+        if posiciones.obtener(db, id_corredor) is None:
+            with self._lock:
+                self.rechazadas += 1
+            return False
+        posiciones.actualizar_posicion(id_corredor, lat, lng, estado)
+        with self._lock:
+            self.recibidas += 1
+            anterior = self._pendientes.get(id_corredor)
+            if anterior is not None:
+                self.fusionadas += 1
+                # Conservar la hora del ping más antiguo sin escribir (mide el retraso real)
+                recibido_en = anterior[3]
+                if estado is None:
+                    estado = anterior[2]
+            else:
+                recibido_en = time.monotonic()
+            self._pendientes[id_corredor] = (lat, lng, estado, recibido_en)
+        # Empujar el cambio a los clientes suscritos (WebSocket / SSE)
+        get_difusion_posiciones().publicar(id_corredor, lat, lng, estado)
+        return True
+
+    def registrar_lote(self, db: Session, pings: Iterable[Dict]) -> Dict:
+        """
+        Registra varios pings: [{ id_corredor, ubicacion_lat, ubicacion_lng, estado? }].
+        Devuelve { aceptadas, rechazadas: [ids] }.
+        """
+        aceptadas, rechazadas = 0, []
+        for p in pings:
+            if self.registrar(db, p["id_corredor"], p["ubicacion_lat"], p["ubicacion_lng"], p.get("estado")):
+                aceptadas += 1
+            else:
+                rechazadas.append(p["id_corredor"])
+        return {"aceptadas": aceptadas, "rechazadas": rechazadas}
+
+    def pendientes(self) -> int:
+        return len(self._pendientes)
+
+    @staticmethod
+    def _sentencia(n: int):
+        valores = ", ".join(
+            f"(CAST(:id{i} AS integer), CAST(:lat{i} AS double precision), "
+            f"CAST(:lng{i} AS double precision), CAST(:estado{i} AS varchar))"
+            for i in range(n)
+        )
+        return text(
+            "UPDATE public.corredor AS c "
+            "SET ubicacion_lat = v.lat, ubicacion_lng = v.lng, estado = COALESCE(v.estado, c.estado) "
+            f"FROM (VALUES {valores}) AS v(id, lat, lng, estado) "
+            "WHERE c.id_corredor = v.id"
+        )
+
+    def vaciar(self) -> int:
+        """Escribe todas las posiciones pendientes en la BD. Devuelve la cantidad de filas."""
+        with self._lock:
+            lote, self._pendientes = self._pendientes, {}
+        if not lote:
+            return 0
+
+        filas = list(lote.items())
+        try:
+            with self.motor.begin() as conn:
+                for inicio in range(0, len(filas), FILAS_POR_SENTENCIA):
+                    bloque = filas[inicio:inicio + FILAS_POR_SENTENCIA]
+                    params = {}
+                    for i, (id_corredor, (lat, lng, estado, _)) in enumerate(bloque):
+                        params.update({f"id{i}": id_corredor, f"lat{i}": lat, f"lng{i}": lng, f"estado{i}": estado})
+                    conn.execute(self._sentencia(len(bloque)), params)
+        except Exception as e:
+            # Devolver al buffer lo que no se escribió, salvo que ya haya un ping más nuevo
+            with self._lock:
+                self.errores += 1
+                for id_corredor, valor in lote.items():
+                    self._pendientes.setdefault(id_corredor, valor)
+            print(f"❌ Error escribiendo posiciones de corredores: {e}")
+            return 0
+
+        ahora = time.monotonic()
+        with self._lock:
+            self.lotes += 1
+            self.escritas += len(filas)
+            self._tamanos_lote.append(len(filas))
+            self._retrasos_s.extend(ahora - recibido_en for _, (_, _, _, recibido_en) in filas)
+        return len(filas)
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            tamanos = np.array(self._tamanos_lote, dtype=np.float64)
+            retrasos = np.array(self._retrasos_s, dtype=np.float64)
+            resumen = {
+                "recibidas": self.recibidas,
+                "fusionadas": self.fusionadas,
+                "rechazadas": self.rechazadas,
+                "escritas": self.escritas,
+                "lotes": self.lotes,
+                "errores": self.errores,
+                "pendientes": len(self._pendientes),
+            }
+        resumen["tamano_lote"] = {
+            "promedio": float(tamanos.mean()) if len(tamanos) else None,
+            "maximo": int(tamanos.max()) if len(tamanos) else None,
+        }
+        resumen["retraso_ingesta_s"] = {
+            "p50": float(np.percentile(retrasos, 50)) if len(retrasos) else None,
+            "p95": float(np.percentile(retrasos, 95)) if len(retrasos) else None,
+            "maximo": float(retrasos.max()) if len(retrasos) else None,
+        }
+        return resumen
+
+
+def iniciar_vaciado_periodico(ingesta: IngestaPosiciones, intervalo_s: float = INTERVALO_VACIADO_S) -> threading.Thread:
+    """Hilo de fondo que escribe las posiciones pendientes cada intervalo_s segundos."""
+    def ciclo():
+        while True:
+            time.sleep(intervalo_s)
+            ingesta.vaciar()
+
+    hilo = threading.Thread(target=ciclo, name="ingesta-posiciones", daemon=True)
+    hilo.start()
+    return hilo
+
+
+# Singleton global
+ingesta_posiciones = IngestaPosiciones()
+
+
+def get_ingesta_posiciones() -> IngestaPosiciones:
+    """
+    Obtener la ingesta de posiciones compartida
+    Uso: from services.ingesta_posiciones import get_ingesta_posiciones
+    """
+    return ingesta_posiciones
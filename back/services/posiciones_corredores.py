@@ -0,0 +1,139 @@
+"""
+Snapshot en memoria de las posiciones de los corredores.
+
+Guarda la última posición conocida de cada corredor y expone arreglos NumPy
+listos para los kernels de services.geo. Se recarga desde la BD cuando vence
+su TTL (para ver cambios hechos por otros workers) y se actualiza en caliente
+con los commits locales sobre la tabla corredor.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from config.db import sesion_primaria
+from config.eventos import al_confirmar_cambios
+from models.Corredor import Corredor
+
+TTL_SNAPSHOT_S = float(os.getenv("CORREDORES_SNAPSHOT_TTL_S", "5"))
+# Tiempo durante el cual una posición recibida en memoria prevalece sobre la BD
+# al recargar (cubre las posiciones aún no escritas por la ingesta por lotes)
+RETENCION_LOCAL_S = float(os.getenv("CORREDORES_RETENCION_LOCAL_S", "30"))
+
+
+class SnapshotArreglos:
+    """Vista inmutable del snapshot: ids, lats, lngs y estados alineados por índice."""
+
+    def __init__(self, ids: np.ndarray, lats: np.ndarray, lngs: np.ndarray, estados: list):
+        self.ids = ids
+        self.lats = lats
+        self.lngs = lngs
+        self.estados = estados
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class PosicionesCorredores:
+    """Última posición por corredor, compartida por el proceso."""
+
+    def __init__(self, ttl_s: float = TTL_SNAPSHOT_S):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        # {id_corredor: (lat, lng, estado)}
+        self._posiciones: Dict[int, Tuple[Optional[float], Optional[float], Optional[str]]] = {}
+        self._cargado_en: Optional[float] = None
+        self._arreglos: Optional[SnapshotArreglos] = None
+        # {id_corredor: instante (monotonic) de la última posición recibida en memoria}
+        self._locales: Dict[int, float] = {}
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._cargado_en = None
+
+    def _vencido(self) -> bool:
+        return self._cargado_en is None or time.monotonic() - self._cargado_en > self.ttl_s
+
+    def _cargar(self, db: Session) -> None:
+        if not self._vencido():
+            return
+        with self._lock:
+            if not self._vencido():
+                return
+            with sesion_primaria(db) as db:
+                filas = db.query(Corredor.id_corredor, Corredor.ubicacion_lat, Corredor.ubicacion_lng, Corredor.estado).all()
+            posiciones = {f.id_corredor: (f.ubicacion_lat, f.ubicacion_lng, f.estado) for f in filas}
+            # Las posiciones recientes en memoria pueden no estar todavía en la BD
+            limite = time.monotonic() - RETENCION_LOCAL_S
+            self._locales = {i: t for i, t in self._locales.items() if t > limite and i in posiciones}
+            for id_corredor in self._locales:
+                posiciones[id_corredor] = self._posiciones.get(id_corredor, posiciones[id_corredor])
+            self._posiciones = posiciones
+            self._arreglos = None
+            self._cargado_en = time.monotonic()
+
+    def actualizar_posicion(self, id_corredor: int, lat: Optional[float], lng: Optional[float], estado: Optional[str] = None) -> None:
+        """Registra la última posición conocida de un corredor sin tocar la BD."""
+        with self._lock:
+            anterior = self._posiciones.get(id_corredor)
+            if estado is None and anterior is not None:
+                estado = anterior[2]
+            self._posiciones[id_corredor] = (lat, lng, estado)
+            self._locales[id_corredor] = time.monotonic()
+            self._arreglos = None
+
+    def aplicar_cambios(self, cambios) -> None:
+        """Callback de config.eventos para cambios confirmados en Corredor."""
+        with self._lock:
+            for accion, _, valores in cambios:
+                id_corredor = valores.get("id_corredor")
+                if id_corredor is None:
+                    continue
+                if accion == "delete":
+                    self._posiciones.pop(id_corredor, None)
+                else:
+                    self._posiciones[id_corredor] = (
+                        valores.get("ubicacion_lat"), valores.get("ubicacion_lng"), valores.get("estado")
+                    )
+            self._arreglos = None
+
+    def obtener(self, db: Session, id_corredor: int) -> Optional[Tuple[Optional[float], Optional[float], Optional[str]]]:
+        self._cargar(db)
+        return self._posiciones.get(id_corredor)
+
+    def arreglos(self, db: Session) -> SnapshotArreglos:
+        """Corredores con ubicación como arreglos alineados (se reconstruyen solo si hubo cambios)."""
+        self._cargar(db)
+        arreglos = self._arreglos
+        if arreglos is not None:
+            return arreglos
+        with self._lock:
+            con_ubicacion = [
+                (id_corredor, lat, lng, estado)
+                for id_corredor, (lat, lng, estado) in self._posiciones.items()
+                if lat is not None and lng is not None
+            ]
+            arreglos = SnapshotArreglos(
+                ids=np.array([c[0] for c in con_ubicacion], dtype=np.int64),
+                lats=np.array([c[1] for c in con_ubicacion], dtype=np.float64),
+                lngs=np.array([c[2] for c in con_ubicacion], dtype=np.float64),
+                estados=[c[3] for c in con_ubicacion],
+            )
+            self._arreglos = arreglos
+            return arreglos
+
+
+# Singleton global
+posiciones_corredores = PosicionesCorredores()
+al_confirmar_cambios((Corredor,), posiciones_corredores.aplicar_cambios)
+
+
+def get_posiciones_corredores() -> PosicionesCorredores:
+    """
+    Obtener el snapshot de posiciones de corredores compartido
+    Uso: from services.posiciones_corredores import get_posiciones_corredores
+    """
+    return posiciones_corredores
@@ -0,0 +1,189 @@
+"""
+Geometría de la red de rutas precalculada en memoria.
+
+Para cada Ruta se guardan sus paraderos en el orden de RutaParadero.orden y
+las distancias acumuladas a lo largo de la ruta, de modo que la distancia
+entre dos puntos de una ruta es una resta y no un recorrido de paraderos.
+Se invalida cuando se confirman cambios sobre rutas, paraderos o ruta_paradero,
+y caduca periódicamente (config.eventos) para tomar cambios hechos fuera de
+este proceso; en ese caso la versión solo sube si la red releída es distinta.
+"""
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from config.db import sesion_primaria
+from config.eventos import al_confirmar_cambios, solo_externos
+from models.Paradero import Paradero
+from models.Ruta import Ruta
+from models.RutaParadero import RutaParadero
+from services.geo import haversine_km, RADIO_TIERRA_KM
+
+
+class GeometriaRuta:
+    """
+    Polilínea de una ruta definida por sus paraderos ordenados.
+
+    Atributos (arreglos alineados por índice de paradero):
+        ids_paradero, nombres, ordenes (RutaParadero.orden), lats, lngs
+        acumulado_km: distancia a lo largo de la ruta desde el primer paradero
+        tramo_km: largo de cada tramo i -> i+1 (len = n - 1)
+    """
+
+    def __init__(self, id_ruta: int, nombre: Optional[str], paraderos: List[Dict]):
+        self.id_ruta = id_ruta
+        self.nombre = nombre
+        self.ids_paradero = np.array([p["id_paradero"] for p in paraderos], dtype=np.int64)
+        self.nombres = [p["nombre"] for p in paraderos]
+        self.ordenes = [p.get("orden") for p in paraderos]
+        self.lats = np.array([p["coordenada_lat"] for p in paraderos], dtype=np.float64)
+        self.lngs = np.array([p["coordenada_lng"] for p in paraderos], dtype=np.float64)
+        self.tramo_km = haversine_km(self.lats[:-1], self.lngs[:-1], self.lats[1:], self.lngs[1:])
+        self.acumulado_km = np.concatenate(([0.0], np.cumsum(self.tramo_km)))
+        self._posicion = {int(i): k for k, i in enumerate(self.ids_paradero)}
+
+    def __len__(self) -> int:
+        return len(self.ids_paradero)
+
+    @property
+    def largo_km(self) -> float:
+        return float(self.acumulado_km[-1]) if len(self) else 0.0
+
+    def posicion_de(self, id_paradero: int) -> Optional[int]:
+        """Índice del paradero dentro de la ruta (None si no pertenece)."""
+        return self._posicion.get(id_paradero)
+
+    def proyectar(self, lat: float, lng: float) -> Optional[Dict]:
+        """
+        Proyecta un punto sobre la polilínea de la ruta.
+
+        Usa una proyección equirectangular local (precisa a escala urbana)
+        para elegir el tramo más cercano y la fracción recorrida de ese tramo.
+
+        Returns:
+            { tramo, avance_km, desvio_km } o None si la ruta no tiene tramos
+        """
+        if len(self) < 2:
+            return None
+        # Coordenadas planas en km relativas al punto consultado
+        x = np.radians(self.lngs - lng) * np.cos(np.radians(lat)) * RADIO_TIERRA_KM
+        y = np.radians(self.lats - lat) * RADIO_TIERRA_KM
+        ax, ay, bx, by = x[:-1], y[:-1], x[1:], y[1:]
+        dx, dy = bx - ax, by - ay
+        largo2 = dx * dx + dy * dy
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(largo2 > 0, -(ax * dx + ay * dy) / largo2, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        px, py = ax + t * dx, ay + t * dy
+        desvio = np.hypot(px, py)
+        tramo = int(np.argmin(desvio))
+        return {
+            "tramo": tramo,
+            "avance_km": float(self.acumulado_km[tramo] + t[tramo] * self.tramo_km[tramo]),
+            "desvio_km": float(desvio[tramo]),
+        }
+
+
+class RedRutas:
+    """Geometría de todas las rutas, compartida por el proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rutas: Optional[Dict[int, GeometriaRuta]] = None
+        # Geometría descartada por caducidad, para comparar con la releída
+        self._caducadas: Optional[Dict[int, GeometriaRuta]] = None
+        self.version = 0
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._rutas = None
+            self._caducadas = None
+            self.version += 1
+
+    def caducar(self) -> None:
+        """Descarta la geometría para releerla; la versión sube solo si cambió."""
+        with self._lock:
+            if self._rutas is not None:
+                self._caducadas = self._rutas
+                self._rutas = None
+
+    @staticmethod
+    def _misma_red(a: Dict[int, GeometriaRuta], b: Dict[int, GeometriaRuta]) -> bool:
+        return a.keys() == b.keys() and all(
+            a[i].nombre == b[i].nombre
+            and a[i].ordenes == b[i].ordenes
+            and np.array_equal(a[i].ids_paradero, b[i].ids_paradero)
+            and np.array_equal(a[i].lats, b[i].lats)
+            and np.array_equal(a[i].lngs, b[i].lngs)
+            for i in a
+        )
+
+    def _cargar(self, db: Session) -> Dict[int, GeometriaRuta]:
+        rutas = self._rutas
+        if rutas is not None:
+            return rutas
+        with self._lock:
+            if self._rutas is not None:
+                return self._rutas
+            # Una sola consulta con todas las rutas y sus paraderos ya ordenados
+            with sesion_primaria(db) as db:
+                filas = (
+                    db.query(
+                        Ruta.id_ruta,
+                        Ruta.nombre.label("nombre_ruta"),
+                        Paradero.id_paradero,
+                        Paradero.nombre,
+                        Paradero.coordenada_lat,
+                        Paradero.coordenada_lng,
+                        RutaParadero.orden,
+                    )
+                    .join(RutaParadero, RutaParadero.id_ruta == Ruta.id_ruta)
+                    .join(Paradero, Paradero.id_paradero == RutaParadero.id_paradero)
+                    .filter(Paradero.coordenada_lat.isnot(None), Paradero.coordenada_lng.isnot(None))
+                    .order_by(Ruta.id_ruta, RutaParadero.orden.asc().nullslast(), RutaParadero.id_ruta_paradero)
+                    .all()
+                )
+            por_ruta: Dict[int, List] = {}
+            nombres: Dict[int, Optional[str]] = {}
+            for f in filas:
+                nombres[f.id_ruta] = f.nombre_ruta
+                por_ruta.setdefault(f.id_ruta, []).append({
+                    "id_paradero": f.id_paradero,
+                    "nombre": f.nombre,
+                    "coordenada_lat": f.coordenada_lat,
+                    "coordenada_lng": f.coordenada_lng,
+                    "orden": f.orden,
+                })
+            self._rutas = {
+                id_ruta: GeometriaRuta(id_ruta, nombres[id_ruta], paraderos)
+                for id_ruta, paraderos in por_ruta.items()
+            }
+            if self._caducadas is not None:
+                if not self._misma_red(self._caducadas, self._rutas):
+                    self.version += 1
+                self._caducadas = None
+            return self._rutas
+
+    def geometria(self, db: Session, id_ruta: int) -> Optional[GeometriaRuta]:
+        return self._cargar(db).get(id_ruta)
+
+    def todas(self, db: Session) -> Dict[int, GeometriaRuta]:
+        return self._cargar(db)
+
+
+# Singleton global
+red_rutas = RedRutas()
+al_confirmar_cambios(
+    (Ruta, RutaParadero, Paradero),
+    lambda cambios: red_rutas.caducar() if solo_externos(cambios) else red_rutas.invalidar(),
+)
+
+
+def get_red_rutas() -> RedRutas:
+    """
+    Obtener la geometría de rutas compartida
+    Uso: from services.red_rutas import get_red_rutas
+    """
+    return red_rutas
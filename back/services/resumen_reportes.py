@@ -0,0 +1,180 @@
+"""
+Resumen diario de reportes para el dashboard.
+
+La tabla reporte_resumen_dia guarda cuántos reportes hay por
+(tipo, día, corredor, ruta). Cada inserción de reporte (ReporteService,
+ReporteServiceAsync y AlertaMasivaService) suma 1 a su fila con un upsert en
+la misma transacción del INSERT, así el resumen nunca queda adelantado ni
+atrasado respecto de reporte. El dashboard lee O(días) filas del resumen en
+lugar de contar y agrupar toda la tabla reporte en cada petición.
+
+Los reportes sin tipo, corredor o ruta se cuentan con 0 en esa columna (las
+columnas son parte de la clave). El día es la fecha UTC del reporte, igual que
+`cast(fecha, Date)` en la sesión de Supabase.
+
+Al arrancar, si el resumen está vacío (primer despliegue) se rellena desde
+reporte antes de servir el dashboard. Para rehacerlo después (p. ej. tras
+cambios hechos fuera de la API):
+    python -m services.resumen_reportes [--desde AAAA-MM-DD]
+"""
+from datetime import date, datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import Date, cast, delete, func, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+from models.Reporte import Reporte
+from models.ResumenReporteDia import ResumenReporteDia
+
+SIN_VALOR = 0
+
+
+def _dia(fecha) -> Optional[date]:
+    if fecha is None:
+        return None
+    if isinstance(fecha, datetime):
+        if fecha.tzinfo is not None:
+            fecha = fecha.astimezone(timezone.utc)
+        return fecha.date()
+    return fecha
+
+
+def fila_resumen(reporte: Dict) -> Optional[Dict]:
+    """Clave del resumen para un reporte insertado (None si no tiene fecha)."""
+    dia = _dia(reporte.get("fecha"))
+    if dia is None:
+        return None
+    return {
+        "id_tipo_reporte": reporte.get("id_tipo_reporte") or SIN_VALOR,
+        "dia": dia,
+        "id_corredor": reporte.get("id_corredor_afectado") or SIN_VALOR,
+        "id_ruta": reporte.get("id_ruta_afectada") or SIN_VALOR,
+        "total": 1,
+    }
+
+
+def incremento(reporte: Dict, dialecto: str = "postgresql"):
+    """Upsert que suma 1 a la fila del reporte; None si el reporte no tiene fecha."""
+    fila = fila_resumen(reporte)
+    if fila is None:
+        return None
+    modulo = sqlite if dialecto == "sqlite" else postgresql
+    stmt = modulo.insert(ResumenReporteDia).values(**fila)
+    return stmt.on_conflict_do_update(
+        index_elements=["id_tipo_reporte", "dia", "id_corredor", "id_ruta"],
+        set_={"total": ResumenReporteDia.total + stmt.excluded.total},
+    )
+
+
+def registrar(conexion: Connection, reporte: Dict) -> None:
+    """Suma el reporte al resumen dentro de la transacción de `conexion`."""
+    stmt = incremento(reporte, conexion.dialect.name)
+    if stmt is not None:
+        conexion.execute(stmt)
+
+
+async def registrar_async(conexion, reporte: Dict) -> None:
+    """Igual que `registrar`, sobre una AsyncConnection."""
+    stmt = incremento(reporte, conexion.dialect.name)
+    if stmt is not None:
+        await conexion.execute(stmt)
+
+
+def conteo_tipo(tipo: int):
+    """Total histórico de reportes de un tipo."""
+    return select(func.coalesce(func.sum(ResumenReporteDia.total), 0)).where(
+        ResumenReporteDia.id_tipo_reporte == tipo
+    )
+
+
+def totales_por_dia(tipo: int, desde: date, hasta: date):
+    """(dia, total) de un tipo entre `desde` y `hasta` inclusive, solo días con reportes."""
+    return (
+        select(ResumenReporteDia.dia.label("dia"), func.sum(ResumenReporteDia.total).label("total"))
+        .where(
+            ResumenReporteDia.id_tipo_reporte == tipo,
+            ResumenReporteDia.dia >= desde,
+            ResumenReporteDia.dia <= hasta,
+        )
+        .group_by(ResumenReporteDia.dia)
+    )
+
+
+def _bloquear(conexion: Connection) -> None:
+    """
+    Excluye los upserts de `registrar` hasta el fin de la transacción. SHARE ROW
+    EXCLUSIVE espera a las transacciones que ya sumaron (su reporte queda
+    visible para el recálculo) y hace esperar a las siguientes, que suman
+    después sobre el resumen ya recalculado: ningún reporte se pierde ni se
+    cuenta dos veces.
+    """
+    if conexion.dialect.name == "postgresql":
+        conexion.execute(text(f"LOCK TABLE {ResumenReporteDia.__table__.fullname} IN SHARE ROW EXCLUSIVE MODE"))
+
+
+def reconstruir(conexion: Connection, desde: Optional[date] = None) -> int:
+    """
+    Recalcula el resumen desde la tabla reporte (todo, o desde el día `desde`).
+    Bloquea el resumen durante la transacción de `conexion`.
+    Devuelve la cantidad de filas del resumen escritas.
+    """
+    _bloquear(conexion)
+    # SQLite (tests) no tiene tipo fecha: CAST AS DATE daría el año
+    dia = func.date(Reporte.fecha) if conexion.dialect.name == "sqlite" else cast(Reporte.fecha, Date)
+    borrar = delete(ResumenReporteDia)
+    origen = (
+        select(
+            func.coalesce(Reporte.id_tipo_reporte, SIN_VALOR),
+            dia,
+            func.coalesce(Reporte.id_corredor_afectado, SIN_VALOR),
+            func.coalesce(Reporte.id_ruta_afectada, SIN_VALOR),
+            func.count(Reporte.id_reporte),
+        )
+        .where(Reporte.fecha.is_not(None))
+        .group_by(
+            func.coalesce(Reporte.id_tipo_reporte, SIN_VALOR),
+            dia,
+            func.coalesce(Reporte.id_corredor_afectado, SIN_VALOR),
+            func.coalesce(Reporte.id_ruta_afectada, SIN_VALOR),
+        )
+    )
+    if desde is not None:
+        borrar = borrar.where(ResumenReporteDia.dia >= desde)
+        origen = origen.where(Reporte.fecha >= datetime.combine(desde, datetime.min.time(), timezone.utc))
+    conexion.execute(borrar)
+    res = conexion.execute(
+        insert(ResumenReporteDia).from_select(
+            ["id_tipo_reporte", "dia", "id_corredor", "id_ruta", "total"], origen
+        )
+    )
+    return res.rowcount
+
+
+def rellenar_si_vacio(engine: Engine) -> Optional[int]:
+    """
+    Reconstruye el resumen completo si está vacío (primer arranque con la tabla
+    recién creada), para que el dashboard no muestre 0 en todo el histórico.
+    Devuelve las filas escritas, o None si el resumen ya tenía datos.
+    """
+    with engine.begin() as conexion:
+        if conexion.execute(select(ResumenReporteDia.dia).limit(1)).first() is not None:
+            return None
+        filas = reconstruir(conexion)
+    print(f"✅ Resumen de reportes rellenado desde reporte: {filas} filas")
+    return filas
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from config.db import engine
+
+    parser = argparse.ArgumentParser(description="Recalcula reporte_resumen_dia desde la tabla reporte")
+    parser.add_argument("--desde", type=date.fromisoformat, help="Solo desde este día (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    ResumenReporteDia.__table__.create(bind=engine, checkfirst=True)
+    with engine.begin() as conexion:
+        filas = reconstruir(conexion, args.desde)
+    print(f"✅ Resumen de reportes reconstruido: {filas} filas")
@@ -1,14 +1,34 @@
 """
-Servicio de compartición de ubicación - Almacenamiento en memoria
+Servicio de compartición de ubicación
 Tokens expiran en 3 horas
+Almacenamiento pluggable (services.token_store): en memoria o SQL
 """
 
 from datetime import datetime, timedelta
+import os
 import secrets
+import threading
+import time
 from typing import Optional, Dict
+from services.token_store import TokenStore, crear_token_store
 
-# Caché en memoria: {token -> {usuario_id, expires_at}}
+INTERVALO_LIMPIEZA_S = float(os.getenv("SHARED_LOCATION_LIMPIEZA_S", "60"))
+
+# Caché en memoria: {token -> {usuario_id, expires_at, is_active}}
+# (es el almacén cuando SHARED_LOCATION_STORE=memoria)
 _shared_locations = {}
+_store: Optional[TokenStore] = None
+_store_lock = threading.Lock()
+
+
+def get_token_store() -> TokenStore:
+    """Almacén de tokens configurado (se crea en el primer uso)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = crear_token_store(_shared_locations)
+    return _store
 
 
 def generar_token_comparticion(usuario_id: int) -> Dict[str, str]:
@@ -24,11 +44,7 @@ def generar_token_comparticion(usuario_id: int) -> Dict[str, str]:
     """
     token = secrets.token_urlsafe(32)
     
-    _shared_locations[token] = {
-        "usuario_id": usuario_id,
-        "expires_at": datetime.utcnow() + timedelta(hours=3),
-        "is_active": True
-    }
+    get_token_store().guardar(token, usuario_id, datetime.utcnow() + timedelta(hours=3))
     
     print(f"✅ Token generado para usuario {usuario_id}: {token[:20]}...")
     
@@ -44,16 +60,14 @@ def validar_token(token: str) -> Optional[int]:
     Valida un token y retorna el usuario_id si es válido
     Retorna None si expiró o no existe
     """
-    if token not in _shared_locations:
+    data = get_token_store().obtener(token)
+    if data is None:
         print(f"⚠️ Token no encontrado: {token[:20]}...")
         return None
     
-    data = _shared_locations[token]
-    
-    # Verificar expiración
+    # Verificar expiración (el borrado lo hace la limpieza periódica)
     if datetime.utcnow() > data["expires_at"]:
         print(f"⏱️ Token expirado: {token[:20]}...")
-        del _shared_locations[token]
         return None
     
     # Verificar si está activo
@@ -69,8 +83,7 @@ def revocar_token(token: str) -> bool:
     """
     Revoca un token (lo desactiva)
     """
-    if token in _shared_locations:
-        _shared_locations[token]["is_active"] = False
+    if get_token_store().desactivar(token):
         print(f"🔒 Token revocado: {token[:20]}...")
         return True
     
@@ -82,14 +95,12 @@ def obtener_token_info(token: str) -> Optional[Dict]:
     """
     Obtiene info del token (usuario_id, tiempo restante)
     """
-    if token not in _shared_locations:
+    data = get_token_store().obtener(token)
+    if data is None:
         return None
     
-    data = _shared_locations[token]
-    
     # Verificar expiración
     if datetime.utcnow() > data["expires_at"]:
-        del _shared_locations[token]
         return None
     
     tiempo_restante = data["expires_at"] - datetime.utcnow()
@@ -105,18 +116,28 @@ def obtener_token_info(token: str) -> Optional[Dict]:
 
 def limpiar_expirados():
     """
-    Limpia tokens expirados del caché (ejecutar periódicamente)
+    Limpia tokens expirados del almacén (lo ejecuta iniciar_limpieza_periodica)
     """
-    ahora = datetime.utcnow()
-    tokens_a_eliminar = [
-        token for token, data in _shared_locations.items()
-        if ahora > data["expires_at"]
-    ]
+    eliminados = get_token_store().purgar_expirados(datetime.utcnow())
     
-    for token in tokens_a_eliminar:
-        del _shared_locations[token]
+    if eliminados:
+        print(f"🧹 Limpiados {eliminados} tokens expirados")
     
-    if tokens_a_eliminar:
-        print(f"🧹 Limpiados {len(tokens_a_eliminar)} tokens expirados")
-    
-    return len(tokens_a_eliminar)
+    return eliminados
+
+
+def iniciar_limpieza_periodica(intervalo_s: float = INTERVALO_LIMPIEZA_S) -> threading.Thread:
+    """
+    Hilo de fondo que limpia los tokens expirados cada intervalo_s segundos
+    """
+    def ciclo():
+        while True:
+            time.sleep(intervalo_s)
+            try:
+                limpiar_expirados()
+            except Exception as e:
+                print(f"❌ Error limpiando tokens expirados: {e}")
+
+    hilo = threading.Thread(target=ciclo, name="limpieza-tokens", daemon=True)
+    hilo.start()
+    return hilo
@@ -0,0 +1,110 @@
+"""
+Snapshot versionado de la red (rutas, paraderos, ruta_paradero) para respuestas HTTP.
+
+Las respuestas de lectura de la red se guardan ya serializadas (bytes JSON)
+junto con su ETag. Un contador de versión sube con cada commit sobre esas
+tablas (y con altas/bajas de corredores, que aparecen en el formulario de
+alertas) y con la caducidad periódica de las cachés de la red, que recoge
+cambios de otras instancias o hechos directo en la BD. Mientras no cambie,
+servir la respuesta es devolver bytes y un `If-None-Match` que coincide se
+responde con 304 sin construir nada.
+
+El ETag es un hash del contenido, así distintos workers producen el mismo
+ETag para los mismos datos aunque sus contadores de versión difieran.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from config.eventos import al_confirmar_cambios
+from models.Corredor import Corredor
+from models.Paradero import Paradero
+from models.Ruta import Ruta
+from models.RutaParadero import RutaParadero
+
+# Máximo de respuestas parametrizadas (p. ej. /ruta/filtrar?ruta=...) guardadas
+MAX_RESPUESTAS = 256
+
+
+def serializar(datos: Any) -> Tuple[bytes, str]:
+    """JSON compacto en bytes y su ETag (hash del contenido)."""
+    cuerpo = json.dumps(jsonable_encoder(datos), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return cuerpo, '"' + hashlib.blake2b(cuerpo, digest_size=12).hexdigest() + '"'
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara la cabecera If-None-Match (lista, comodín o ETags débiles) con el ETag."""
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip() for e in if_none_match.split(",")]
+    return "*" in etiquetas or any(e.removeprefix("W/") == etag for e in etiquetas)
+
+
+class SnapshotRed:
+    """Respuestas serializadas de la red, válidas mientras no cambie la versión."""
+
+    def __init__(self, max_respuestas: int = MAX_RESPUESTAS):
+        self._lock = threading.Lock()
+        self.version = 0
+        self.max_respuestas = max_respuestas
+        # {clave: (version, cuerpo, etag)}
+        self._respuestas: "OrderedDict[Hashable, Tuple[int, bytes, str]]" = OrderedDict()
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self.version += 1
+            self._respuestas.clear()
+
+    def aplicar_cambios(self, cambios) -> None:
+        """Callback de config.eventos: cualquier cambio de red, o altas/bajas de corredores."""
+        if any(modelo is not Corredor or accion != "update" for accion, modelo, _ in cambios):
+            self.invalidar()
+
+    def obtener(self, clave: Optional[Hashable], construir: Callable[[], Any]) -> Tuple[bytes, str]:
+        """
+        (cuerpo, etag) de la respuesta `clave` para la versión actual.
+        Con clave None no se guarda (respuestas que dependen de algo fuera de la red).
+        """
+        if clave is None:
+            return serializar(construir())
+        version = self.version
+        with self._lock:
+            guardada = self._respuestas.get(clave)
+            if guardada is not None and guardada[0] == version:
+                self._respuestas.move_to_end(clave)
+                return guardada[1], guardada[2]
+        cuerpo, etag = serializar(construir())
+        with self._lock:
+            # Si la red cambió mientras se construía, no guardar datos viejos
+            if self.version == version:
+                self._respuestas[clave] = (version, cuerpo, etag)
+                self._respuestas.move_to_end(clave)
+                while len(self._respuestas) > self.max_respuestas:
+                    self._respuestas.popitem(last=False)
+        return cuerpo, etag
+
+    def respuesta(self, request: Request, clave: Optional[Hashable], construir: Callable[[], Any]) -> Response:
+        """Response JSON con ETag, o 304 si el cliente ya tiene esa versión."""
+        cuerpo, etag = self.obtener(clave, construir)
+        cabeceras = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_coincide(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=cabeceras)
+        return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
+
+
+# Singleton global
+snapshot_red = SnapshotRed()
+al_confirmar_cambios((Ruta, RutaParadero, Paradero, Corredor), snapshot_red.aplicar_cambios)
+
+
+def get_snapshot_red() -> SnapshotRed:
+    """
+    Obtener el snapshot de respuestas de la red compartido
+    Uso: from services.snapshot_red import get_snapshot_red
+    """
+    return snapshot_red
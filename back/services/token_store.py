@@ -0,0 +1,143 @@
+"""
+Almacenes de tokens de compartición de ubicación.
+
+- MemoriaTokenStore: diccionario en el proceso con un min-heap de expiraciones,
+  así la limpieza de expirados cuesta O(k log n) en lugar de recorrer todo.
+- SqlTokenStore: tabla token_comparticion; los tokens sobreviven reinicios y
+  los ven todos los workers. Con SHARED_LOCATION_DB_URL se puede apuntar a una
+  base local (por ejemplo sqlite:///tokens.db) en lugar de la BD principal.
+
+Se elige con SHARED_LOCATION_STORE = "memoria" (por defecto) | "sql".
+La expiración se valida al leer; borrar los expirados es tarea del hilo de
+limpieza, nunca de la petición.
+"""
+import heapq
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, delete, select, update
+from sqlalchemy.engine import Engine
+
+from models.TokenComparticion import TokenComparticion
+
+
+class TokenStore(ABC):
+    """
+    Interface de almacenamiento de tokens.
+    Cada token guarda: { usuario_id, expires_at (UTC), is_active }
+    """
+
+    @abstractmethod
+    def guardar(self, token: str, usuario_id: int, expires_at: datetime) -> None:
+        pass
+
+    @abstractmethod
+    def obtener(self, token: str) -> Optional[Dict]:
+        """Datos del token o None si no existe (no valida expiración)."""
+        pass
+
+    @abstractmethod
+    def desactivar(self, token: str) -> bool:
+        """Marca el token como inactivo. Devuelve False si no existe."""
+        pass
+
+    @abstractmethod
+    def purgar_expirados(self, ahora: datetime) -> int:
+        """Elimina los tokens con expires_at <= ahora. Devuelve cuántos."""
+        pass
+
+
+class MemoriaTokenStore(TokenStore):
+    """Tokens en memoria del proceso con expiración indexada por un min-heap."""
+
+    def __init__(self, tokens: Optional[Dict[str, Dict]] = None):
+        self._lock = threading.Lock()
+        # {token: {usuario_id, expires_at, is_active}}
+        self.tokens: Dict[str, Dict] = tokens if tokens is not None else {}
+        # (expires_at, token); las entradas obsoletas se descartan al sacarlas
+        self._expiraciones: List[Tuple[datetime, str]] = []
+
+    def guardar(self, token: str, usuario_id: int, expires_at: datetime) -> None:
+        with self._lock:
+            self.tokens[token] = {"usuario_id": usuario_id, "expires_at": expires_at, "is_active": True}
+            heapq.heappush(self._expiraciones, (expires_at, token))
+
+    def obtener(self, token: str) -> Optional[Dict]:
+        return self.tokens.get(token)
+
+    def desactivar(self, token: str) -> bool:
+        datos = self.tokens.get(token)
+        if datos is None:
+            return False
+        datos["is_active"] = False
+        return True
+
+    def purgar_expirados(self, ahora: datetime) -> int:
+        eliminados = 0
+        with self._lock:
+            # Tokens que ya no están en el heap (p. ej. dict modificado desde fuera)
+            if len(self._expiraciones) < len(self.tokens):
+                self._expiraciones = [(d["expires_at"], t) for t, d in self.tokens.items()]
+                heapq.heapify(self._expiraciones)
+            while self._expiraciones and self._expiraciones[0][0] <= ahora:
+                _, token = heapq.heappop(self._expiraciones)
+                datos = self.tokens.get(token)
+                if datos is not None and datos["expires_at"] <= ahora:
+                    del self.tokens[token]
+                    eliminados += 1
+                elif datos is not None:
+                    # Se extendió la expiración: volver a indexarlo con la nueva fecha
+                    heapq.heappush(self._expiraciones, (datos["expires_at"], token))
+        return eliminados
+
+
+class SqlTokenStore(TokenStore):
+    """Tokens en la tabla token_comparticion (compartidos entre workers y reinicios)."""
+
+    def __init__(self, motor: Engine):
+        if motor.dialect.name == "sqlite":
+            # SQLite no tiene esquemas: la tabla public.token_comparticion va sin prefijo
+            motor = motor.execution_options(schema_translate_map={"public": None})
+        self.motor = motor
+        TokenComparticion.__table__.create(motor, checkfirst=True)
+
+    def guardar(self, token: str, usuario_id: int, expires_at: datetime) -> None:
+        with self.motor.begin() as conn:
+            conn.execute(TokenComparticion.__table__.insert().values(
+                token=token, usuario_id=usuario_id, expires_at=expires_at, is_active=True
+            ))
+
+    def obtener(self, token: str) -> Optional[Dict]:
+        tabla = TokenComparticion.__table__
+        with self.motor.connect() as conn:
+            fila = conn.execute(
+                select(tabla.c.usuario_id, tabla.c.expires_at, tabla.c.is_active).where(tabla.c.token == token)
+            ).first()
+        return dict(fila._mapping) if fila else None
+
+    def desactivar(self, token: str) -> bool:
+        tabla = TokenComparticion.__table__
+        with self.motor.begin() as conn:
+            resultado = conn.execute(update(tabla).where(tabla.c.token == token).values(is_active=False))
+        return resultado.rowcount > 0
+
+    def purgar_expirados(self, ahora: datetime) -> int:
+        tabla = TokenComparticion.__table__
+        with self.motor.begin() as conn:
+            resultado = conn.execute(delete(tabla).where(tabla.c.expires_at <= ahora))
+        return resultado.rowcount
+
+
+def crear_token_store(tokens_memoria: Optional[Dict[str, Dict]] = None) -> TokenStore:
+    """Crea el almacén configurado por SHARED_LOCATION_STORE."""
+    tipo = os.getenv("SHARED_LOCATION_STORE", "memoria").lower()
+    if tipo == "sql":
+        url = os.getenv("SHARED_LOCATION_DB_URL")
+        if url:
+            return SqlTokenStore(create_engine(url))
+        from config.db import engine
+        return SqlTokenStore(engine)
+    return MemoriaTokenStore(tokens_memoria)
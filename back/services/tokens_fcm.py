@@ -0,0 +1,71 @@
+"""
+Higiene de tokens FCM.
+
+Cuando un envío multicast informa tokens no registrados o inválidos
+(app desinstalada, token rotado), se borran de usuario_base.fcm_token para
+no volver a enviarles: esos envíos cuestan cuota y tiempo y nunca llegan.
+Se registra en config.firebase con `al_invalidar_tokens` al importar el módulo.
+"""
+import threading
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import update
+from sqlalchemy.engine import Engine
+
+from config.firebase import al_invalidar_tokens
+from models.UsuarioBase import UsuarioBase
+
+TOKENS_POR_SENTENCIA = 1000
+
+
+class LimpiezaTokensFcm:
+    """Borra de usuario_base los tokens que FCM dio por muertos."""
+
+    def __init__(self, motor: Optional[Engine] = None):
+        self._motor = motor
+        self._lock = threading.Lock()
+        self.tokens_recibidos = 0
+        self.usuarios_limpiados = 0
+
+    @property
+    def motor(self) -> Engine:
+        if self._motor is None:
+            from config.db import engine
+            self._motor = engine
+        return self._motor
+
+    def limpiar(self, tokens: Iterable[str]) -> int:
+        """Pone fcm_token = NULL en los usuarios con esos tokens. Devuelve los usuarios afectados."""
+        tokens = list(dict.fromkeys(tokens))
+        if not tokens:
+            return 0
+        afectados = 0
+        tabla = UsuarioBase.__table__
+        with self.motor.begin() as conn:
+            for inicio in range(0, len(tokens), TOKENS_POR_SENTENCIA):
+                bloque = tokens[inicio:inicio + TOKENS_POR_SENTENCIA]
+                afectados += conn.execute(
+                    update(tabla).where(tabla.c.fcm_token.in_(bloque)).values(fcm_token=None)
+                ).rowcount
+        with self._lock:
+            self.tokens_recibidos += len(tokens)
+            self.usuarios_limpiados += afectados
+        print(f"🧹 Tokens FCM inválidos borrados: {afectados} usuarios ({len(tokens)} tokens)")
+        return afectados
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            return {"tokens_recibidos": self.tokens_recibidos, "usuarios_limpiados": self.usuarios_limpiados}
+
+
+# Singleton global
+limpieza_tokens_fcm = LimpiezaTokensFcm()
+al_invalidar_tokens(limpieza_tokens_fcm.limpiar)
+
+
+def get_limpieza_tokens_fcm() -> LimpiezaTokensFcm:
+    """
+    Obtener la limpieza de tokens FCM compartida
+    Uso: from services.tokens_fcm import get_limpieza_tokens_fcm
+    """
+    return limpieza_tokens_fcm
@@ -0,0 +1,181 @@
+"""
+Caché de la última ubicación conocida de cada usuario.
+
+Se alimenta con PUT /usuario/{id}/ubicacion y con los commits sobre
+usuario_base, y la leen los filtros por cercanía sin ir a la BD. Cada
+entrada guarda cuándo se recibió: al leerla se informa su edad y las que
+superan el TTL se descartan. Las leídas de usuario_base (que no guarda
+cuándo se registró la ubicación) tienen edad desconocida: `edad_s` es None.
+
+La caché ahorra la lectura, no la escritura: cada ubicación se escribe en la
+BD, así otros workers y las cachés que se releen de ella la ven al instante.
+Espaciar las escrituras es opcional: con USUARIOS_UBICACION_PERSISTIR_S > 0
+se escribe una vez cada ese tiempo por usuario (o si se movió más de
+PERSISTIR_DISTANCIA_KM).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config.eventos import al_confirmar_cambios
+from models.UsuarioBase import UsuarioBase
+from services.geo import distancia_km
+
+TTL_S = float(os.getenv("USUARIOS_UBICACION_TTL_S", "600"))
+PERSISTIR_CADA_S = float(os.getenv("USUARIOS_UBICACION_PERSISTIR_S", "0"))
+PERSISTIR_DISTANCIA_KM = 0.2
+MAX_ENTRADAS = 200_000
+
+
+class UbicacionesUsuarios:
+    """Última ubicación por usuario, con TTL y metadatos de antigüedad."""
+
+    def __init__(self, ttl_s: float = TTL_S, max_entradas: int = MAX_ENTRADAS, reloj=time.monotonic,
+                 persistir_cada_s: float = PERSISTIR_CADA_S):
+        # Reentrante: aplicar_cambios decide y actualiza bajo el mismo lock
+        self._lock = threading.RLock()
+        self.ttl_s = ttl_s
+        self.persistir_cada_s = persistir_cada_s
+        self.max_entradas = max_entradas
+        self._reloj = reloj
+        # {id_usuario: {lat, lng, recibida, edad_conocida, fuente, id_tipo_usuario,
+        #               persistida, lat_persistida, lng_persistida}}
+        # Ordenado de la actualización más vieja a la más reciente
+        self._ubicaciones: "OrderedDict[int, Dict]" = OrderedDict()
+        self._metricas = {"actualizaciones": 0, "aciertos": 0, "fallos": 0, "vencidas": 0, "persistidas": 0}
+
+    def __len__(self) -> int:
+        return len(self._ubicaciones)
+
+    def _purgar(self, ahora: float) -> None:
+        """Descarta desde el frente (las más viejas) las vencidas y el exceso sobre max_entradas."""
+        while self._ubicaciones:
+            _, entrada = next(iter(self._ubicaciones.items()))
+            if ahora - entrada["recibida"] <= self.ttl_s and len(self._ubicaciones) <= self.max_entradas:
+                break
+            self._ubicaciones.popitem(last=False)
+
+    def registrar(self, id_usuario: int, lat: float, lng: float, fuente: str = "cliente",
+                  id_tipo_usuario: Optional[int] = None, edad_conocida: bool = True) -> bool:
+        """
+        Guarda la ubicación recibida ahora. Con edad_conocida=False (leída de la
+        BD sin saber cuándo se registró) se informa con `edad_s` None.
+
+        Returns:
+            bool: True si hay que persistirla en la BD: siempre, salvo que se haya
+                  configurado persistir_cada_s y no haya pasado ese tiempo desde la
+                  última escritura ni el usuario se haya movido más de PERSISTIR_DISTANCIA_KM
+        """
+        ahora = self._reloj()
+        with self._lock:
+            anterior = self._ubicaciones.pop(id_usuario, None)
+            entrada = {
+                "lat": lat,
+                "lng": lng,
+                "recibida": ahora,
+                "edad_conocida": edad_conocida,
+                "fuente": fuente,
+                "id_tipo_usuario": id_tipo_usuario if id_tipo_usuario is not None else (anterior or {}).get("id_tipo_usuario"),
+                "persistida": None,
+                "lat_persistida": None,
+                "lng_persistida": None,
+            }
+            if anterior is not None:
+                for clave in ("persistida", "lat_persistida", "lng_persistida"):
+                    entrada[clave] = anterior[clave]
+            if fuente == "bd":
+                entrada.update(persistida=ahora, lat_persistida=lat, lng_persistida=lng)
+            self._ubicaciones[id_usuario] = entrada
+            self._metricas["actualizaciones"] += 1
+            self._purgar(ahora)
+            if self.persistir_cada_s <= 0:
+                return True
+            if entrada["persistida"] is None or ahora - entrada["persistida"] >= self.persistir_cada_s:
+                return True
+            return distancia_km(lat, lng, entrada["lat_persistida"], entrada["lng_persistida"]) > PERSISTIR_DISTANCIA_KM
+
+    def marcar_persistida(self, id_usuario: int) -> None:
+        """Anota que la ubicación actual del usuario ya está escrita en la BD."""
+        with self._lock:
+            entrada = self._ubicaciones.get(id_usuario)
+            if entrada is not None:
+                entrada.update(persistida=self._reloj(), lat_persistida=entrada["lat"], lng_persistida=entrada["lng"])
+                self._metricas["persistidas"] += 1
+
+    def obtener(self, id_usuario: int, max_edad_s: Optional[float] = None) -> Optional[Dict]:
+        """
+        Última ubicación del usuario si no tiene más de max_edad_s (por defecto el TTL).
+        Si se pide max_edad_s, las de edad desconocida no la cumplen.
+
+        Returns:
+            { id_usuario, lat, lng, edad_s (None si es desconocida), fuente, id_tipo_usuario } o None
+        """
+        limite = self.ttl_s if max_edad_s is None else min(max_edad_s, self.ttl_s)
+        ahora = self._reloj()
+        with self._lock:
+            entrada = self._ubicaciones.get(id_usuario)
+            if entrada is None:
+                self._metricas["fallos"] += 1
+                return None
+            edad = ahora - entrada["recibida"]
+            if edad > limite or (max_edad_s is not None and not entrada["edad_conocida"]):
+                if edad > self.ttl_s:
+                    del self._ubicaciones[id_usuario]
+                self._metricas["vencidas"] += 1
+                return None
+            self._metricas["aciertos"] += 1
+            return {
+                "id_usuario": id_usuario,
+                "lat": entrada["lat"],
+                "lng": entrada["lng"],
+                "edad_s": round(edad, 3) if entrada["edad_conocida"] else None,
+                "fuente": entrada["fuente"],
+                "id_tipo_usuario": entrada["id_tipo_usuario"],
+            }
+
+    def eliminar(self, id_usuario: int) -> None:
+        with self._lock:
+            self._ubicaciones.pop(id_usuario, None)
+
+    def aplicar_cambios(self, cambios) -> None:
+        """Callback de config.eventos: las ubicaciones confirmadas en usuario_base también alimentan la caché."""
+        with self._lock:
+            for accion, _, valores in cambios:
+                id_usuario = valores.get("id_usuario")
+                if id_usuario is None:
+                    continue
+                lat, lng = valores.get("ubicacion_actual_lat"), valores.get("ubicacion_actual_lng")
+                if accion == "delete" or lat is None or lng is None:
+                    self.eliminar(id_usuario)
+                    continue
+                actual = self._ubicaciones.get(id_usuario)
+                if actual is not None and (actual["lat"], actual["lng"]) == (lat, lng):
+                    # Es la ubicación que acaba de persistir este mismo proceso
+                    self.marcar_persistida(id_usuario)
+                    continue
+                if actual is not None and (actual["lat_persistida"], actual["lng_persistida"]) == (lat, lng):
+                    # Commit de otra columna: la BD trae la ubicación ya conocida, más vieja que la de memoria
+                    continue
+                self.registrar(id_usuario, lat, lng, fuente="bd", id_tipo_usuario=valores.get("id_tipo_usuario"))
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            datos = dict(self._metricas)
+            datos["usuarios"] = len(self._ubicaciones)
+        datos["ttl_s"] = self.ttl_s
+        return datos
+
+
+# Singleton global
+ubicaciones_usuarios = UbicacionesUsuarios()
+al_confirmar_cambios((UsuarioBase,), ubicaciones_usuarios.aplicar_cambios)
+
+
+def get_ubicaciones_usuarios() -> UbicacionesUsuarios:
+    """
+    Obtener la caché de ubicaciones de usuarios compartida
+    Uso: from services.ubicaciones_usuarios import get_ubicaciones_usuarios
+    """
+    return ubicaciones_usuarios
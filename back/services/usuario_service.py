@@ -1,5 +1,7 @@
 from sqlalchemy.orm import Session
 from models.UsuarioBase import UsuarioBase  # tu modelo que mostraste
+from services.indice_espacial import get_indice_pasajeros
+from services.ubicaciones_usuarios import get_ubicaciones_usuarios
 
 class UsuarioService:
     def __init__(self, db: Session):
@@ -56,6 +58,35 @@ class UsuarioService:
         """
         return self.db.query(UsuarioBase).filter(UsuarioBase.id_usuario == user_id).first()
     
+    def actualizar_ubicacion(self, user_id: int, lat: float, lng: float) -> dict | None:
+        """
+        Registra la ubicación actual del usuario en la caché de ubicaciones y la
+        escribe en usuario_base (salvo que se haya configurado espaciar las
+        escrituras, ver services.ubicaciones_usuarios); retorna None si el usuario no existe.
+        """
+        ubicaciones = get_ubicaciones_usuarios()
+        conocida = ubicaciones.obtener(user_id)
+        usuario = None
+        if conocida is None:
+            usuario = self.get_usuario_by_id(user_id)
+            if usuario is None:
+                return None
+            id_tipo_usuario = usuario.id_tipo_usuario
+        else:
+            id_tipo_usuario = conocida["id_tipo_usuario"]
+
+        persistir = ubicaciones.registrar(user_id, lat, lng, id_tipo_usuario=id_tipo_usuario)
+        if id_tipo_usuario is not None:
+            get_indice_pasajeros().actualizar_ubicacion(user_id, lat, lng, id_tipo_usuario)
+
+        if persistir:
+            usuario = usuario or self.get_usuario_by_id(user_id)
+            if usuario is not None:
+                usuario.ubicacion_actual_lat = lat
+                usuario.ubicacion_actual_lng = lng
+                self.db.commit()
+        return {"id_usuario": user_id, "latitud": lat, "longitud": lng, "persistida": persistir}
+    
     def actualizar_tiempos_viaje(self, user_id: int, historial_id: int, fecha_subida: str = None, fecha_bajada: str = None):
         """
         Actualiza los tiempos de subida y bajada de un viaje específico
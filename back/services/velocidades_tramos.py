@@ -0,0 +1,338 @@
+"""
+Velocidades aprendidas por tramo de ruta y hora del día.
+
+Un tramo es el par de paraderos consecutivos (i -> i+1) de una ruta. Las
+observaciones salen de:
+  - HistorialUso: viajes con subida y bajada registradas; el tiempo del viaje
+    se reparte entre los tramos recorridos en proporción a su largo.
+  - Reporte.tiempo_retraso_min: el retraso reportado entre dos paraderos de una
+    ruta se suma al tiempo nominal (a velocidad de referencia) de esos tramos.
+
+Por cada (tramo, hora) se acumulan km y horas en arreglos NumPy de forma
+(n_tramos, 24); la velocidad es km / horas. La agregación es incremental y
+corre fuera de las peticiones, en un hilo de fondo; el cálculo de ETA solo
+lee los arreglos publicados. Si la red de rutas cambió, el ETA sigue usando
+la última tabla publicada y despierta al hilo para que la reconstruya.
+
+Cada pasada vuelve a leer los últimos VELOCIDADES_RELECTURA_S segundos antes
+de la marca de agua y descarta por id las filas ya contadas: así no se
+pierden las filas con la misma marca de tiempo que la última leída ni las
+que se confirman tarde con una fecha (o id) anterior a la marca.
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models.HistorialUso import HistorialUso
+from models.Reporte import Reporte
+from services.red_rutas import GeometriaRuta, RedRutas
+
+HORAS_DIA = 24
+ZONA_HORARIA = ZoneInfo(os.getenv("ZONA_HORARIA", "America/Lima"))
+INTERVALO_ACTUALIZACION_S = float(os.getenv("VELOCIDADES_INTERVALO_S", "300"))
+RELECTURA_S = float(os.getenv("VELOCIDADES_RELECTURA_S", "900"))
+VELOCIDAD_REFERENCIA_KMH = 25.0
+# Observaciones fuera de este rango se consideran ruido (viajes mal cerrados, GPS, etc.)
+VELOCIDAD_MIN_KMH = 2.0
+VELOCIDAD_MAX_KMH = 90.0
+
+
+def hora_local(fecha: Optional[datetime] = None) -> int:
+    """Hora del día (0-23) en la zona horaria del servicio."""
+    if fecha is None:
+        return datetime.now(ZONA_HORARIA).hour
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(ZONA_HORARIA)
+    return fecha.hour
+
+
+class TablaVelocidades:
+    """Tabla (tramo, hora) -> velocidad km/h, compartida por el proceso."""
+
+    def __init__(self, velocidad_referencia_kmh: float = VELOCIDAD_REFERENCIA_KMH,
+                 relectura_s: float = RELECTURA_S):
+        self.velocidad_referencia_kmh = velocidad_referencia_kmh
+        self.relectura = timedelta(seconds=relectura_s)
+        self._lock = threading.Lock()
+        # Lo activa el ETA cuando ve otra versión de la red: el hilo de fondo reconstruye
+        self._reconstruir = threading.Event()
+        self._version_red: Optional[int] = None
+        # {(id_paradero_desde, id_paradero_hasta): fila}
+        self._tramos: Dict[Tuple[int, int], int] = {}
+        # {id_ruta: filas de sus tramos en orden}
+        self._filas_ruta: Dict[int, np.ndarray] = {}
+        self._ids_ruta: Dict[int, np.ndarray] = {}
+        self._rutas_por_paradero: Dict[int, List[GeometriaRuta]] = {}
+        self._km = np.zeros((0, HORAS_DIA))
+        self._horas = np.zeros((0, HORAS_DIA))
+        # Vista de solo lectura que usa el ETA: ({id_ruta: (ids_paradero, filas)},
+        # {id_paradero: filas de sus tramos}, por_hora, todo_el_dia); se reemplaza
+        # completa al final de cada pasada
+        self._vista = ({}, {}, np.zeros((0, HORAS_DIA), dtype=np.float32), np.zeros(0, dtype=np.float32))
+        # Marcas de agua para la agregación incremental y los ids ya contados
+        # dentro de la ventana de relectura ({id: fecha})
+        self._ultima_bajada: Optional[datetime] = None
+        self._ultima_fecha_reporte: Optional[datetime] = None
+        self._historial_vistos: Dict[int, datetime] = {}
+        self._reportes_vistos: Dict[int, datetime] = {}
+        self.observaciones = 0
+
+    def _indexar_red(self, rutas: Dict[int, GeometriaRuta]) -> None:
+        """Asigna una fila a cada tramo de la red y reinicia los acumulados."""
+        tramos: Dict[Tuple[int, int], int] = {}
+        filas_ruta: Dict[int, np.ndarray] = {}
+        rutas_por_paradero: Dict[int, List[GeometriaRuta]] = {}
+        self._ids_ruta = {id_ruta: geometria.ids_paradero for id_ruta, geometria in rutas.items()}
+        for id_ruta, geometria in rutas.items():
+            ids = geometria.ids_paradero.tolist()
+            filas_ruta[id_ruta] = np.array(
+                [tramos.setdefault(par, len(tramos)) for par in zip(ids[:-1], ids[1:])],
+                dtype=np.int64,
+            )
+            for id_paradero in ids:
+                rutas_por_paradero.setdefault(id_paradero, []).append(geometria)
+        self._tramos = tramos
+        self._filas_ruta = filas_ruta
+        self._rutas_por_paradero = rutas_por_paradero
+        self._km = np.zeros((len(tramos), HORAS_DIA))
+        self._horas = np.zeros((len(tramos), HORAS_DIA))
+        self._ultima_bajada = None
+        self._ultima_fecha_reporte = None
+        self._historial_vistos = {}
+        self._reportes_vistos = {}
+        self.observaciones = 0
+
+    def _desde(self, marca: Optional[datetime]) -> Optional[datetime]:
+        """Inicio de la relectura: la ventana antes de la marca de agua."""
+        return None if marca is None else marca - self.relectura
+
+    def _podar(self, vistos: Dict[int, datetime], marca: Optional[datetime]) -> None:
+        """Olvida los ids que ya quedaron antes de la ventana (no se vuelven a leer)."""
+        desde = self._desde(marca)
+        if desde is None:
+            return
+        for clave in [c for c, fecha in vistos.items() if fecha < desde]:
+            del vistos[clave]
+
+    def _ubicar_viaje(self, id_sube: int, id_baja: int) -> Optional[Tuple[GeometriaRuta, int, int]]:
+        """Ruta (la más corta) en la que se puede ir de id_sube a id_baja en orden."""
+        mejor = None
+        for geometria in self._rutas_por_paradero.get(id_sube, ()):
+            a, b = geometria.posicion_de(id_sube), geometria.posicion_de(id_baja)
+            if b is None or b <= a:
+                continue
+            largo = geometria.acumulado_km[b] - geometria.acumulado_km[a]
+            if mejor is None or largo < mejor[0]:
+                mejor = (largo, geometria, a, b)
+        return mejor[1:] if mejor else None
+
+    def _registrar(self, geometria: GeometriaRuta, a: int, b: int, horas: float, hora: int) -> bool:
+        """Reparte un recorrido de a hasta b (posiciones en la ruta) entre sus tramos."""
+        km_tramos = geometria.tramo_km[a:b]
+        total_km = float(km_tramos.sum())
+        if total_km <= 0 or horas <= 0:
+            return False
+        if not VELOCIDAD_MIN_KMH <= total_km / horas <= VELOCIDAD_MAX_KMH:
+            return False
+        filas = self._filas_ruta[geometria.id_ruta][a:b]
+        np.add.at(self._km, (filas, hora), km_tramos)
+        np.add.at(self._horas, (filas, hora), horas * km_tramos / total_km)
+        self.observaciones += 1
+        return True
+
+    def _publicar(self) -> None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            por_hora = np.where(self._horas > 0, self._km / self._horas, np.nan)
+            todo_el_dia = np.where(
+                self._horas.sum(axis=1) > 0, self._km.sum(axis=1) / self._horas.sum(axis=1), np.nan
+            )
+        filas_ruta = {id_ruta: (self._ids_ruta[id_ruta], filas) for id_ruta, filas in self._filas_ruta.items()}
+        filas_paradero: Dict[int, List[int]] = {}
+        for (desde, hasta), fila in self._tramos.items():
+            filas_paradero.setdefault(desde, []).append(fila)
+            filas_paradero.setdefault(hasta, []).append(fila)
+        filas_paradero = {i: np.array(filas, dtype=np.int64) for i, filas in filas_paradero.items()}
+        self._vista = (filas_ruta, filas_paradero, por_hora.astype(np.float32), todo_el_dia.astype(np.float32))
+
+    def actualizar(self, db: Session, red: RedRutas) -> int:
+        """
+        Incorpora los viajes y reportes de retraso nuevos desde la última pasada
+        (relee la ventana de relectura y descarta por id los ya contados).
+        Si la red de rutas cambió, reconstruye la tabla desde cero.
+        Devuelve la cantidad de observaciones nuevas.
+        """
+        with self._lock:
+            rutas = red.todas(db)
+            if self._version_red != red.version:
+                self._indexar_red(rutas)
+                self._version_red = red.version
+            antes = self.observaciones
+
+            consulta = db.query(
+                HistorialUso.id_historial,
+                HistorialUso.id_paradero_sube,
+                HistorialUso.id_paradero_baja,
+                HistorialUso.fecha_hora_subida,
+                HistorialUso.fecha_hora_bajada,
+            ).filter(
+                HistorialUso.id_paradero_sube.isnot(None),
+                HistorialUso.id_paradero_baja.isnot(None),
+                HistorialUso.fecha_hora_subida.isnot(None),
+                HistorialUso.fecha_hora_bajada.isnot(None),
+            )
+            desde = self._desde(self._ultima_bajada)
+            if desde is not None:
+                consulta = consulta.filter(HistorialUso.fecha_hora_bajada >= desde)
+            for v in consulta.all():
+                if v.id_historial in self._historial_vistos:
+                    continue
+                self._historial_vistos[v.id_historial] = v.fecha_hora_bajada
+                if self._ultima_bajada is None or v.fecha_hora_bajada > self._ultima_bajada:
+                    self._ultima_bajada = v.fecha_hora_bajada
+                ubicado = self._ubicar_viaje(v.id_paradero_sube, v.id_paradero_baja)
+                if ubicado is None:
+                    continue
+                horas = (v.fecha_hora_bajada - v.fecha_hora_subida).total_seconds() / 3600
+                self._registrar(*ubicado, horas, hora_local(v.fecha_hora_subida))
+
+            self._podar(self._historial_vistos, self._ultima_bajada)
+
+            reportes = db.query(
+                Reporte.id_reporte,
+                Reporte.fecha,
+                Reporte.id_ruta_afectada,
+                Reporte.id_paradero_inicial,
+                Reporte.id_paradero_final,
+                Reporte.tiempo_retraso_min,
+            ).filter(
+                Reporte.tiempo_retraso_min.isnot(None),
+                Reporte.id_ruta_afectada.isnot(None),
+                Reporte.id_paradero_inicial.isnot(None),
+                Reporte.id_paradero_final.isnot(None),
+                Reporte.fecha.isnot(None),
+            )
+            desde = self._desde(self._ultima_fecha_reporte)
+            if desde is not None:
+                reportes = reportes.filter(Reporte.fecha >= desde)
+            for r in reportes.all():
+                if r.id_reporte in self._reportes_vistos:
+                    continue
+                self._reportes_vistos[r.id_reporte] = r.fecha
+                if self._ultima_fecha_reporte is None or r.fecha > self._ultima_fecha_reporte:
+                    self._ultima_fecha_reporte = r.fecha
+                geometria = rutas.get(r.id_ruta_afectada)
+                if geometria is None:
+                    continue
+                a, b = geometria.posicion_de(r.id_paradero_inicial), geometria.posicion_de(r.id_paradero_final)
+                if a is None or b is None or b <= a:
+                    continue
+                nominal_h = (geometria.acumulado_km[b] - geometria.acumulado_km[a]) / self.velocidad_referencia_kmh
+                self._registrar(geometria, a, b, nominal_h + r.tiempo_retraso_min / 60, hora_local(r.fecha))
+            self._podar(self._reportes_vistos, self._ultima_fecha_reporte)
+
+            self._publicar()
+            return self.observaciones - antes
+
+    def velocidades_ruta(self, db: Session, red: RedRutas, geometria: GeometriaRuta,
+                         hora: int, velocidad_defecto: float) -> np.ndarray:
+        """
+        Velocidad (km/h) de cada tramo de la ruta para la hora dada.
+        Sin datos de esa hora se usa el promedio del día del tramo, y sin
+        datos del tramo, velocidad_defecto. Nunca consulta la BD: si la red
+        cambió (o la tabla aún no se construyó) pide la reconstrucción al hilo
+        de fondo y responde con la última tabla publicada; una ruta cuyos
+        paraderos cambiaron usa velocidad_defecto hasta entonces.
+        """
+        if self._version_red != red.version:
+            self._reconstruir.set()
+        filas_ruta, _, por_hora, todo_el_dia = self._vista
+        ids, filas = filas_ruta.get(geometria.id_ruta, (None, None))
+        if filas is None or len(filas) == 0 or not np.array_equal(ids, geometria.ids_paradero):
+            return np.full(max(len(geometria) - 1, 0), velocidad_defecto)
+        return self._con_respaldo(por_hora, todo_el_dia, filas, hora, velocidad_defecto)
+
+    @staticmethod
+    def _con_respaldo(por_hora: np.ndarray, todo_el_dia: np.ndarray, filas: np.ndarray, hora: int,
+                      velocidad_defecto: float) -> np.ndarray:
+        """Velocidad de las filas a esa hora; si no hay, la del día; si no, la de defecto."""
+        velocidades = por_hora[filas, hora].astype(np.float64)
+        velocidades = np.where(np.isnan(velocidades), todo_el_dia[filas], velocidades)
+        return np.where(np.isnan(velocidades), velocidad_defecto, velocidades)
+
+    def velocidades_paraderos(self, ids_paradero, hora: int, velocidad_defecto: float) -> np.ndarray:
+        """
+        Velocidad típica (km/h) alrededor de cada paradero a la hora dada: el
+        promedio de los tramos que llegan o salen de él, para los ETA en línea
+        recta (sin ruta). Sin datos, velocidad_defecto. Nunca consulta la BD.
+        """
+        _, filas_paradero, por_hora, todo_el_dia = self._vista
+        velocidades = np.full(len(ids_paradero), velocidad_defecto, dtype=np.float64)
+        for i, id_paradero in enumerate(ids_paradero):
+            filas = filas_paradero.get(id_paradero)
+            if filas is not None and len(filas):
+                velocidades[i] = float(self._con_respaldo(por_hora, todo_el_dia, filas, hora, velocidad_defecto).mean())
+        return velocidades
+
+    def resumen(self) -> Dict:
+        _, _, _, todo_el_dia = self._vista
+        return {
+            "tramos": len(self._tramos),
+            "tramos_con_datos": int(np.count_nonzero(~np.isnan(todo_el_dia))),
+            "observaciones": self.observaciones,
+        }
+
+
+def iniciar_actualizacion_periodica(tabla: TablaVelocidades, fabrica_sesion, red: RedRutas,
+                                    intervalo_s: float = INTERVALO_ACTUALIZACION_S) -> threading.Thread:
+    """
+    Hilo de fondo que construye la tabla al arrancar y luego agrega las
+    observaciones nuevas cada intervalo_s segundos, o antes si el ETA pidió
+    reconstruirla porque cambió la red.
+    """
+    def ciclo():
+        while True:
+            tabla._reconstruir.clear()
+            db = fabrica_sesion()
+            try:
+                nuevas = tabla.actualizar(db, red)
+                if nuevas:
+                    print(f"🚏 Velocidades por tramo: {nuevas} observaciones nuevas")
+            except Exception as e:
+                print(f"❌ Error actualizando velocidades por tramo: {e}")
+            finally:
+                db.close()
+            tabla._reconstruir.wait(intervalo_s)
+
+    hilo = threading.Thread(target=ciclo, name="velocidades-tramos", daemon=True)
+    hilo.start()
+    return hilo
+
+
+# Singleton global
+velocidades_tramos = TablaVelocidades()
+
+
+def get_velocidades_tramos() -> TablaVelocidades:
+    """
+    Obtener la tabla de velocidades por tramo compartida
+    Uso: from services.velocidades_tramos import get_velocidades_tramos
+    """
+    return velocidades_tramos
+
+
+if __name__ == "__main__":
+    # Agregación completa fuera de línea: python -m services.velocidades_tramos
+    from config.db import SessionLocal
+    from services.red_rutas import get_red_rutas
+
+    sesion = SessionLocal()
+    try:
+        velocidades_tramos.actualizar(sesion, get_red_rutas())
+        print(f"✅ Velocidades por tramo: {velocidades_tramos.resumen()}")
+    finally:
+        sesion.close()
@@ -0,0 +1,74 @@
+"""
+Benchmark del arranque de la API: tiempo de `import main` (no lo recoge pytest).
+
+Cada repetición importa main en un proceso nuevo (sin caché de módulos) y
+mide el tiempo total del import y, dentro de él, el de config.firebase:
+    python -m tests.arranque_import --repeticiones 10
+
+Sin una BD accesible, `--sin-bd` omite el Base.metadata.create_all que main
+ejecuta al importarse, para medir solo la carga de la app:
+    python -m tests.arranque_import --sin-bd
+
+Reporta p50/p95/mínimo (ms) del import de main y del de config.firebase.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+BACK = Path(__file__).resolve().parent.parent
+
+_MEDICION = """
+import json, sys, time
+if {sin_bd}:
+    import sqlalchemy
+    sqlalchemy.MetaData.create_all = lambda *a, **k: None
+inicio = time.perf_counter()
+import config.firebase
+firebase_ms = (time.perf_counter() - inicio) * 1000
+import main
+total_ms = (time.perf_counter() - inicio) * 1000
+sys.stderr.flush()
+print(json.dumps({{"import_main_ms": total_ms, "config_firebase_ms": firebase_ms}}))
+"""
+
+
+def medir_una_vez(sin_bd: bool) -> Dict[str, float]:
+    proceso = subprocess.run(
+        [sys.executable, "-c", _MEDICION.format(sin_bd=sin_bd)],
+        cwd=BACK, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "0"},
+        capture_output=True, text=True,
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"import main falló:\n{proceso.stderr[-2000:]}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def _resumen(valores: List[float]) -> Dict[str, float]:
+    arr = np.array(valores)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 1),
+        "p95": round(float(np.percentile(arr, 95)), 1),
+        "min": round(float(arr.min()), 1),
+    }
+
+
+def medir(repeticiones: int, sin_bd: bool) -> Dict[str, Dict[str, float]]:
+    medir_una_vez(sin_bd)  # calentar la caché de bytecode y del sistema de archivos
+    muestras = [medir_una_vez(sin_bd) for _ in range(repeticiones)]
+    return {clave: _resumen([m[clave] for m in muestras]) for clave in ("import_main_ms", "config_firebase_ms")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiempo de arranque (import main) de la API")
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--sin-bd", action="store_true", help="No ejecutar Base.metadata.create_all al importar main")
+    args = parser.parse_args()
+
+    for clave, valores in medir(args.repeticiones, args.sin_bd).items():
+        print(f"{clave:>20}: p50 {valores['p50']:8.1f}  p95 {valores['p95']:8.1f}  min {valores['min']:8.1f}")
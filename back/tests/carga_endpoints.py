@@ -0,0 +1,96 @@
+"""
+Prueba de carga de endpoints (no la recoge pytest).
+
+Contra un servidor levantado (uvicorn main:app):
+    python -m tests.carga_endpoints --url http://localhost:8000 \\
+        --ruta /corredor/ --ruta /dashboard/30/ --concurrencia 200 --peticiones 5000
+
+Comparación sync vs async sin BD: un endpoint `def` y uno `async def` que
+esperan la misma latencia simulada de BD, servidos en el mismo proceso:
+    python -m tests.carga_endpoints --simulado --latencia-ms 50
+
+Reporta por ruta: peticiones/s, p50/p95/p99 (ms) y errores.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+
+async def _medir(cliente: httpx.AsyncClient, ruta: str, concurrencia: int, peticiones: int) -> Dict:
+    latencias: List[float] = []
+    errores = 0
+    pendientes = iter(range(peticiones))
+
+    async def trabajador():
+        nonlocal errores
+        for _ in pendientes:
+            inicio = time.perf_counter()
+            try:
+                respuesta = await cliente.get(ruta)
+                if respuesta.status_code >= 500:
+                    errores += 1
+            except httpx.HTTPError:
+                errores += 1
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    total_s = time.perf_counter() - inicio
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+    return {
+        "ruta": ruta,
+        "peticiones_s": round(peticiones / total_s, 1),
+        "p50_ms": round(float(p50), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+        "errores": errores,
+    }
+
+
+def _app_simulada(latencia_s: float):
+    """Dos endpoints con la misma espera: uno ocupa un hilo del threadpool, el otro no."""
+    from fastapi import FastAPI
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    def sync():
+        time.sleep(latencia_s)
+        return {"ok": True}
+
+    @app.get("/async")
+    async def asincrono():
+        await asyncio.sleep(latencia_s)
+        return {"ok": True}
+
+    return app
+
+
+async def principal(args) -> None:
+    limites = httpx.Limits(max_connections=args.concurrencia, max_keepalive_connections=args.concurrencia)
+    if args.simulado:
+        transporte = httpx.ASGITransport(app=_app_simulada(args.latencia_ms / 1000))
+        cliente = httpx.AsyncClient(transport=transporte, base_url="http://simulado", limits=limites)
+        rutas = ["/sync", "/async"]
+    else:
+        cliente = httpx.AsyncClient(base_url=args.url, limits=limites, timeout=30)
+        rutas = args.ruta or ["/corredor/"]
+    async with cliente:
+        for ruta in rutas:
+            await _medir(cliente, ruta, min(args.concurrencia, 10), min(args.peticiones, 50))  # calentamiento
+            print(await _medir(cliente, ruta, args.concurrencia, args.peticiones))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de endpoints sync vs async")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--ruta", action="append", help="Ruta a medir (se puede repetir)")
+    parser.add_argument("--concurrencia", type=int, default=200)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--simulado", action="store_true", help="Comparar def vs async def con latencia simulada")
+    parser.add_argument("--latencia-ms", type=float, default=50.0)
+    asyncio.run(principal(parser.parse_args()))
@@ -0,0 +1,71 @@
+"""
+Tests del catálogo de rutas en memoria usado por RutaService.filtrar_rutas
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from services.catalogo_rutas import CatalogoRutas
+from services.DiagramaClases.ruta_service import RutaService
+from services.indice_espacial import IndiceParaderos
+from services.indice_texto import IndiceNombres
+
+
+def _red(mock_db, n_rutas):
+    """BD mockeada con n_rutas; la ruta i pasa por los paraderos 2i+1 y 2i (en ese orden)"""
+    filas = {
+        "Paradero": [
+            SimpleNamespace(id_paradero=i, nombre=f"P{i}", coordenada_lat=-12.0 - i * 0.01, coordenada_lng=-77.0,
+                            colapso_actual=False, imagen_url=None)
+            for i in range(2 * n_rutas + 2)
+        ],
+        "Ruta": [SimpleNamespace(id_ruta=i, nombre=f"Ruta {i}") for i in range(n_rutas)],
+        "RutaParadero": [
+            SimpleNamespace(id_ruta=i, id_paradero=p) for i in range(n_rutas) for p in (2 * i + 1, 2 * i)
+        ],
+    }
+
+    def query(*columnas):
+        consulta = MagicMock()
+        consulta.order_by.return_value = consulta
+        consulta.all.return_value = filas[columnas[0].class_.__name__]
+        return consulta
+
+    mock_db.query.side_effect = query
+    return mock_db
+
+
+@pytest.fixture
+def catalogo():
+    catalogo = CatalogoRutas()
+    with patch("services.catalogo_rutas.get_indice_paraderos", return_value=IndiceParaderos()), \
+         patch("services.DiagramaClases.ruta_service.get_catalogo_rutas", return_value=catalogo), \
+         patch("services.indice_texto.get_catalogo_rutas", return_value=catalogo), \
+         patch("services.DiagramaClases.ruta_service.get_indice_nombres", return_value=IndiceNombres()):
+        yield catalogo
+
+
+def test_filtrar_por_nombre_devuelve_paraderos_en_orden(mock_db, catalogo):
+    """TC1: El filtro por nombre devuelve cada ruta con sus paraderos en el orden de la ruta"""
+    servicio = RutaService(_red(mock_db, 3))
+
+    resultado = servicio.filtrar_rutas(ruta="ruta 2")
+    assert [r["id_ruta"] for r in resultado] == [2]
+    assert [p["id_paradero"] for p in resultado[0]["paraderos"]] == [5, 4]
+
+    assert [p["id_paradero"] for p in servicio.filtrar_rutas(ruta_id=1)] == [3, 2]
+    assert servicio.filtrar_rutas(ruta_id=99) == []
+
+
+def test_consultas_no_crecen_con_la_cantidad_de_rutas(mock_db, catalogo):
+    """TC2: 5 o 500 rutas se arman con las mismas consultas, y las siguientes llamadas no consultan"""
+    for n_rutas in (5, 500):
+        catalogo.invalidar()
+        mock_db.query.reset_mock()
+        servicio = RutaService(_red(mock_db, n_rutas))
+        with patch("services.catalogo_rutas.get_indice_paraderos", return_value=IndiceParaderos()):
+            assert len(servicio.filtrar_rutas()) == n_rutas
+            servicio.filtrar_rutas(ruta="Ruta")
+        # paraderos (índice), rutas y ruta_paradero
+        assert mock_db.query.call_count == 3
@@ -0,0 +1,165 @@
+"""
+Tests de la agrupación de alertas repetidas (ventana deslizante por tipo/ruta/paradero/corredor)
+"""
+import threading
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine, select, text, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.NotificacionOutbox import NotificacionOutbox
+from models.Reporte import Reporte
+from models.ResumenReporteDia import ResumenReporteDia
+from services.coalescencia_alertas import VentanaAlertas, clave_alerta
+from services.despacho_notificaciones import notificacion
+from services.DiagramaClases.reporte_service import ReporteService
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def _desvio(descripcion, paradero=201, emisor=1):
+    return {
+        "id_emisor": emisor, "id_tipo_reporte": 3, "id_ruta_afectada": 101, "id_paradero_inicial": paradero,
+        "descripcion": descripcion, "fecha": datetime(2025, 5, 1, 12, tzinfo=timezone.utc),
+    }
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """SQLite con reporte, el resumen diario y el outbox"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'alertas.db'}",
+                           execution_options={"schema_translate_map": {"public": None}})
+    for modelo in (ResumenReporteDia, NotificacionOutbox):
+        modelo.__table__.create(engine)
+    with engine.begin() as conn:
+        # Tabla reporte equivalente sin claves foráneas (ReporteService la refleja)
+        conn.execute(text(
+            "CREATE TABLE reporte (id_reporte INTEGER PRIMARY KEY AUTOINCREMENT, fecha TIMESTAMP, "
+            "descripcion TEXT, id_emisor INTEGER, id_tipo_reporte INTEGER, id_corredor_afectado INTEGER, "
+            "es_critica BOOLEAN, requiere_intervencion BOOLEAN, id_ruta_afectada INTEGER, "
+            "id_paradero_inicial INTEGER, id_paradero_final INTEGER, tiempo_retraso_min INTEGER)"
+        ))
+    return engine
+
+
+def test_ventana_deslizante_por_clave():
+    """TC1: Las repeticiones extienden la ventana; sin repeticiones por ventana_s la clave se cierra"""
+    reloj = Reloj()
+    ventana = VentanaAlertas(ventana_s=300, reloj=reloj)
+    assert ventana.repetir(_desvio("a")) is None
+    ventana.abrir({**_desvio("a"), "id_reporte": 7})
+
+    for t in (200, 400, 650):  # cada repetición a menos de 300 s de la anterior
+        reloj.t = t
+        alerta = ventana.repetir(_desvio("b", emisor=t))  # otro conductor, mismo incidente
+        assert alerta.id_reporte == 7
+        ventana.confirmar(alerta, {**alerta.reporte, "agrupado": True, "repeticiones": alerta.repeticiones + 1})
+    assert alerta.repeticiones == 3
+    assert ventana.repetir(_desvio("otro paradero", paradero=202)) is None
+
+    reloj.t = 651 + 300
+    assert ventana.repetir(_desvio("c")) is None
+    assert ventana.metricas()["agrupadas"] == 3
+
+
+def test_rafaga_de_desvios_un_reporte_y_una_actualizacion(engine):
+    """TC2: Una ráfaga guarda un reporte y deja una sola notificación de actualización diferida"""
+    servicio = ReporteService(engine=engine, paradero_service=MagicMock())
+    with patch("services.DiagramaClases.reporte_service.get_ventana_alertas", return_value=VentanaAlertas()):
+        for i in range(5):
+            resultado = servicio._guardar_agrupando(
+                _desvio(f"desvío {i}"), notificaciones=[notificacion("Alerta de Desvío", f"desvío {i}", topic="reguladores_alerts")]
+            )
+
+        assert resultado["agrupado"] and resultado["repeticiones"] == 4
+        with engine.connect() as conn:
+            reportes = conn.execute(select(Reporte.id_reporte, Reporte.descripcion)).all()
+            assert reportes == [(resultado["id_reporte"], "desvío 4")]
+            assert conn.execute(select(ResumenReporteDia.total)).scalar() == 1
+            outbox = conn.execute(
+                select(NotificacionOutbox.titulo, NotificacionOutbox.cuerpo, NotificacionOutbox.proximo_intento)
+                .order_by(NotificacionOutbox.id_notificacion)
+            ).all()
+        assert [(t, c) for t, c, _ in outbox] == [
+            ("Alerta de Desvío", "desvío 0"),
+            ("Actualización: Alerta de Desvío", "desvío 4 (5 reportes)"),
+        ]
+        assert outbox[1].proximo_intento > outbox[0].proximo_intento
+
+        # El despachador ya tomó la actualización: la siguiente repetición difiere otra
+        with engine.begin() as conn:
+            conn.execute(update(NotificacionOutbox).values(intentos=1))
+        servicio._guardar_agrupando(_desvio("desvío 5"), notificaciones=[notificacion("Alerta de Desvío", "desvío 5", topic="t")])
+        with engine.connect() as conn:
+            cuerpos = conn.execute(select(NotificacionOutbox.cuerpo).order_by(NotificacionOutbox.id_notificacion)).scalars().all()
+        assert cuerpos == ["desvío 0", "desvío 4 (5 reportes)", "desvío 5 (6 reportes)"]
+
+
+def test_peticiones_identicas_simultaneas_no_duplican(engine):
+    """TC3: Una repetición que llega mientras el original se guarda lo espera y se agrupa con él"""
+    ventana = VentanaAlertas()
+    assert ventana.repetir(_desvio("a")) is None  # reserva la clave
+
+    resultados = []
+    segunda = threading.Thread(target=lambda: resultados.append(ventana.repetir(_desvio("b"))))
+    segunda.start()
+    segunda.join(0.1)
+    assert segunda.is_alive()  # espera al original en lugar de insertar otro
+    ventana.abrir({**_desvio("a"), "id_reporte": 7}, _desvio("a"))
+    segunda.join(5)
+    assert resultados[0].id_reporte == 7 and resultados[0].repeticiones == 0  # se cuenta al confirmar
+
+    # Si el original no se pudo guardar, la reserva se libera y la siguiente se guarda
+    assert ventana.repetir(_desvio("c", paradero=202)) is None
+    ventana.descartar(_desvio("c", paradero=202))
+    assert ventana.repetir(_desvio("d", paradero=202)) is None
+
+    # A nivel del servicio: dos guardados simultáneos dejan un solo reporte
+    servicio = ReporteService(engine=engine, paradero_service=MagicMock())
+    barrera = threading.Barrier(2)
+    with patch("services.DiagramaClases.reporte_service.get_ventana_alertas", return_value=VentanaAlertas()):
+        hilos = [threading.Thread(target=lambda d=d: (barrera.wait(5), servicio._guardar_agrupando(_desvio(d))))
+                 for d in ("x", "y")]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join(5)
+    with engine.connect() as conn:
+        assert conn.execute(select(Reporte.id_reporte)).scalars().all() == [1]
+
+
+def test_retraso_lleva_el_corredor_del_conductor():
+    """TC4: El record de un retraso incluye el corredor asignado, que forma parte de la clave"""
+    servicio = ReporteService(engine=MagicMock(), paradero_service=MagicMock())
+    servicio.reporte_factory = None
+    record = servicio._record_retraso({"id_emisor": 202, "id_tipo_reporte": 2, "ruta_id": 101}, 202, 9)
+    assert record["id_corredor_afectado"] == 9
+    assert clave_alerta(record) == (2, None, None, 9)
+
+
+
+def test_repeticion_que_falla_no_se_cuenta(engine):
+    """TC5: Si la transacción de una repetición falla, no suma repeticiones y la siguiente cuenta bien"""
+    servicio = ReporteService(engine=engine, paradero_service=MagicMock())
+    ventana = VentanaAlertas()
+    with patch("services.DiagramaClases.reporte_service.get_ventana_alertas", return_value=ventana):
+        servicio._guardar_agrupando(_desvio("a"))
+        with patch("services.DiagramaClases.reporte_service.agrupar", side_effect=SQLAlchemyError("caída")):
+            with pytest.raises(SQLAlchemyError):
+                servicio._guardar_agrupando(_desvio("b"))
+        assert ventana.metricas()["agrupadas"] == 0
+
+        resultado = servicio._guardar_agrupando(
+            _desvio("c"), notificaciones=[notificacion("Alerta de Desvío", "c", topic="t")]
+        )
+    assert resultado["repeticiones"] == 1
+    with engine.connect() as conn:
+        assert conn.execute(select(NotificacionOutbox.cuerpo)).scalars().all() == ["c (2 reportes)"]
@@ -0,0 +1,51 @@
+"""
+Tests de la cobertura espacial de rutas (cajas y celdas) usada por FiltroCercania
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.cobertura_rutas import CoberturaRutas
+from services.DiagramaClases.FiltroCercania import FiltroCercania
+
+
+def _red(n_rutas, paraderos_por_ruta=20, semilla=7):
+    """Rutas como recorridos aleatorios en un área de ~40 km alrededor de Lima"""
+    rng = np.random.default_rng(semilla)
+    rutas = []
+    for i in range(n_rutas):
+        inicio = rng.uniform([-12.25, -77.15], [-11.9, -76.85])
+        pasos = np.cumsum(rng.normal(0, 0.004, size=(paraderos_por_ruta, 2)), axis=0) + inicio
+        paraderos = [SimpleNamespace(coordenada_lat=float(la), coordenada_lng=float(ln)) for la, ln in pasos]
+        rutas.append(SimpleNamespace(id_ruta=i, nombre=f"Ruta {i}", paraderos=paraderos))
+    return rutas
+
+
+@pytest.mark.parametrize("radio_km", [0.3, 1.0, 3.0, 50.0])
+def test_igual_que_el_calculo_completo(radio_km):
+    """TC1: Con cobertura se obtienen exactamente las mismas rutas que calculando todas las distancias"""
+    rutas = _red(300)
+    cobertura = CoberturaRutas(rutas)
+    for punto in [(-12.0464, -77.0428), (-12.12, -77.03), (-11.95, -76.9), (-13.0, -78.0)]:
+        esperado = FiltroCercania(radio_km, punto).filtrar(rutas)
+        assert FiltroCercania(radio_km, punto, cobertura).filtrar(rutas) == esperado
+
+
+def test_prefiltro_reduce_candidatas():
+    """TC2: Con un radio chico solo una fracción de las rutas llega al cálculo exacto"""
+    rutas = _red(300)
+    cobertura = CoberturaRutas(rutas)
+    candidatas = cobertura.candidatas(-12.0464, -77.0428, 0.5)
+    assert len(candidatas) < len(rutas) * 0.2
+    assert cobertura.rutas_cercanas(-12.0464, -77.0428, 0.5) <= candidatas
+
+
+def test_rutas_fuera_de_la_cobertura_usan_calculo_completo():
+    """TC3: Una ruta que no está en la cobertura (p. ej. recién creada) igual se evalúa"""
+    rutas = _red(10)
+    cobertura = CoberturaRutas(rutas[:5])
+    punto = (rutas[7].paraderos[0].coordenada_lat, rutas[7].paraderos[0].coordenada_lng)
+    resultado = FiltroCercania(0.1, punto, cobertura).filtrar(rutas)
+    assert rutas[7] in resultado
+    assert resultado == FiltroCercania(0.1, punto).filtrar(rutas)
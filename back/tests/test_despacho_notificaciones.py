@@ -0,0 +1,170 @@
+"""
+Tests del outbox de notificaciones y su despachador (con transporte falso)
+"""
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, select, text
+
+from config.esquema import get_registro_esquema
+from models.NotificacionOutbox import NotificacionOutbox
+from models.ResumenReporteDia import ResumenReporteDia
+from services import despacho_notificaciones
+from services.despacho_notificaciones import DespachadorNotificaciones, TransporteFalso, encolar, notificacion
+from services.DiagramaClases.reporte_service import ReporteService
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}",
+                           execution_options={"schema_translate_map": {"public": None}})
+    NotificacionOutbox.__table__.create(engine)
+    yield engine
+    engine.dispose()
+
+
+def _encolar(engine, n):
+    with engine.begin() as conn:
+        encolar(conn, [notificacion(f"Alerta {i}", "cuerpo", topic="reguladores_alerts") for i in range(n)])
+
+
+def _estados(engine):
+    with engine.connect() as conn:
+        return [tuple(f) for f in conn.execute(
+            select(NotificacionOutbox.estado, NotificacionOutbox.intentos).order_by(NotificacionOutbox.id_notificacion)
+        )]
+
+
+def test_despacha_por_lotes(engine):
+    """TC1: Las pendientes se envían por lotes del tamaño configurado y quedan como enviadas"""
+    transporte = TransporteFalso()
+    despachador = DespachadorNotificaciones(motor=engine, transporte=transporte, tam_lote=3)
+    _encolar(engine, 5)
+
+    assert despachador.despachar() == 3
+    assert despachador.despachar() == 2
+    assert despachador.despachar() == 0
+    assert [n["titulo"] for n in transporte.enviadas] == [f"Alerta {i}" for i in range(5)]
+    assert _estados(engine) == [("enviada", 1)] * 5
+    metricas = despachador.metricas()
+    assert metricas["enviadas"] == 5 and metricas["lotes"] == 2
+    assert metricas["latencia_envio_s"]["p50"] is not None
+
+
+def test_reintento_con_espera_y_fallo_definitivo(engine, monkeypatch):
+    """TC2: Un envío fallido se reprograma con espera; al agotar los intentos queda como fallida"""
+    despachador = DespachadorNotificaciones(motor=engine, transporte=TransporteFalso(fallos=10), max_intentos=3)
+    _encolar(engine, 1)
+
+    assert despachador.despachar() == 1
+    assert _estados(engine) == [("pendiente", 1)]
+    assert despachador.despachar() == 0  # todavía en espera de reintento
+
+    monkeypatch.setattr(despacho_notificaciones, "espera_reintento", lambda intentos: 0)
+    with engine.begin() as conn:
+        conn.execute(NotificacionOutbox.__table__.update().values(proximo_intento=despacho_notificaciones._ahora()))
+    despachador.despachar()
+    despachador.despachar()
+    assert _estados(engine) == [("fallida", 3)]
+    assert despachador.metricas()["fallidas"] == 1
+    assert despachador.metricas()["reintentos"] == 2
+
+    despachador.transporte = TransporteFalso(fallos=1)
+    _encolar(engine, 1)
+    despachador.despachar()
+    despachador.despachar()
+    assert _estados(engine)[-1] == ("enviada", 2)
+
+
+def test_paralelismo_acotado(engine):
+    """TC3: Los envíos de un lote corren en paralelo sin superar el máximo configurado"""
+    class TransporteLento(TransporteFalso):
+        def __init__(self):
+            super().__init__(latencia_s=0.05)
+            self.activos = 0
+            self.max_activos = 0
+            self._contador = threading.Lock()
+
+        def enviar(self, n):
+            with self._contador:
+                self.activos += 1
+                self.max_activos = max(self.max_activos, self.activos)
+            try:
+                super().enviar(n)
+            finally:
+                with self._contador:
+                    self.activos -= 1
+
+    transporte = TransporteLento()
+    despachador = DespachadorNotificaciones(motor=engine, transporte=transporte, tam_lote=16, paralelismo=4)
+    _encolar(engine, 16)
+
+    inicio = time.perf_counter()
+    despachador.despachar()
+    assert time.perf_counter() - inicio < 16 * 0.05 / 2
+    assert transporte.max_activos == 4
+    assert len(transporte.enviadas) == 16
+    despachador.detener()
+
+
+def test_arriendo_se_renueva_durante_envio_lento(engine):
+    """TC4: Mientras un envío sigue en curso, su arriendo se renueva y otro despachador no lo reclama"""
+    class TransporteBloqueado(TransporteFalso):
+        def __init__(self):
+            super().__init__()
+            self.entro = threading.Event()
+            self.liberar = threading.Event()
+
+        def enviar(self, n):
+            self.entro.set()
+            assert self.liberar.wait(5)
+            super().enviar(n)
+
+    def proximo_intento():
+        with engine.connect() as conn:
+            return conn.execute(select(NotificacionOutbox.proximo_intento)).scalar_one()
+
+    def esperar_renovacion(anterior):
+        limite = time.monotonic() + 5
+        while proximo_intento() <= anterior:
+            assert time.monotonic() < limite, "el arriendo no se renovó"
+            time.sleep(0.01)
+        return proximo_intento()
+
+    transporte = TransporteBloqueado()
+    despachador = DespachadorNotificaciones(motor=engine, transporte=transporte, arriendo_s=0.3)
+    otro = DespachadorNotificaciones(motor=engine, transporte=TransporteFalso(), arriendo_s=0.3)
+    _encolar(engine, 1)
+
+    hilo = threading.Thread(target=despachador.despachar)
+    hilo.start()
+    assert transporte.entro.wait(5)
+    esperar_renovacion(esperar_renovacion(proximo_intento()))
+    assert otro.despachar() == 0
+    transporte.liberar.set()
+    hilo.join(5)
+
+    assert _estados(engine) == [("enviada", 1)]
+    assert len(transporte.enviadas) == 1 and otro.transporte.enviadas == []
+    despachador.detener()
+
+
+def test_reporte_y_notificacion_en_la_misma_transaccion(engine):
+    """TC5: save_report guarda la notificación con el id del reporte; si el INSERT falla no queda nada encolado"""
+    ResumenReporteDia.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE reporte (id_reporte INTEGER PRIMARY KEY AUTOINCREMENT, fecha TIMESTAMP, "
+                          "id_tipo_reporte INTEGER, id_emisor INTEGER NOT NULL)"))
+    servicio = ReporteService(engine=engine, paradero_service=MagicMock())
+    aviso = notificacion("Alerta de Desvío", "Desvío en ruta 101", topic="reguladores_alerts")
+
+    guardado = servicio.save_report({"id_tipo_reporte": 3, "id_emisor": 1}, notificaciones=[aviso])
+    with pytest.raises(Exception):
+        servicio.save_report({"id_tipo_reporte": 3, "id_emisor": None}, notificaciones=[aviso])
+
+    with engine.connect() as conn:
+        filas = conn.execute(select(NotificacionOutbox.id_reporte, NotificacionOutbox.topic)).all()
+    assert filas == [(guardado["id_reporte"], "reguladores_alerts")]
+    get_registro_esquema().invalidar(engine)
@@ -0,0 +1,186 @@
+"""
+Tests de los destinatarios de alertas por zona (ubicación + historial de viajes)
+"""
+import importlib.util
+import random
+import time
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import services.destinatarios_alertas as destinatarios
+from services.catalogo_rutas import RutaCatalogo
+from models.HistorialUso import HistorialUso
+from models.UsuarioBase import UsuarioBase
+from services.destinatarios_alertas import (
+    DestinatariosAlertas, TOKENS_POR_NOTIFICACION, iniciar_recarga_periodica, notificaciones_dirigidas,
+)
+from services.geo import distancia_km
+from services.indice_espacial import IndicePasajeros
+
+CENTRO = (-12.0464, -77.0428)
+
+
+def _paradero(id_paradero, lat, lng):
+    return {"id_paradero": id_paradero, "nombre": f"P{id_paradero}", "coordenada_lat": lat, "coordenada_lng": lng}
+
+
+@pytest.fixture
+def zona(monkeypatch):
+    """Paraderos 1-3 (ruta 7 = 2 y 3) y corredor 5, con una grilla de pasajeros vacía"""
+    paraderos = {
+        1: _paradero(1, *CENTRO),
+        2: _paradero(2, CENTRO[0] + 0.05, CENTRO[1]),
+        3: _paradero(3, CENTRO[0] + 0.06, CENTRO[1]),
+    }
+    indice_paraderos = MagicMock()
+    indice_paraderos.obtener.side_effect = lambda db, i: paraderos.get(i)
+    catalogo = MagicMock()
+    catalogo.obtener.side_effect = lambda db, i: RutaCatalogo(7, "Ruta 7", [paraderos[2], paraderos[3]]) if i == 7 else None
+    posiciones = MagicMock()
+    posiciones.obtener.side_effect = lambda db, i: (CENTRO[0] - 0.05, CENTRO[1], "activo") if i == 5 else None
+    pasajeros = IndicePasajeros()
+    pasajeros._cargado = True
+
+    monkeypatch.setattr(destinatarios, "get_indice_paraderos", lambda: indice_paraderos)
+    monkeypatch.setattr(destinatarios, "get_catalogo_rutas", lambda: catalogo)
+    monkeypatch.setattr(destinatarios, "get_posiciones_corredores", lambda: posiciones)
+    monkeypatch.setattr(destinatarios, "get_indice_pasajeros", lambda: pasajeros)
+    return pasajeros
+
+
+def test_destinatarios_por_ubicacion_e_historial(zona):
+    """TC1: Se notifica a quien está cerca de la zona o suele viajar por ella, y solo si tiene token"""
+    pasajeros = zona
+    pasajeros.actualizar_ubicacion(10, CENTRO[0] + 0.001, CENTRO[1])        # junto al paradero 1
+    pasajeros.actualizar_ubicacion(11, CENTRO[0] + 0.052, CENTRO[1])        # sobre la ruta 7
+    pasajeros.actualizar_ubicacion(12, CENTRO[0] - 0.049, CENTRO[1])        # junto al corredor 5
+    pasajeros.actualizar_ubicacion(13, CENTRO[0] + 0.3, CENTRO[1])          # lejos de todo
+    pasajeros.actualizar_ubicacion(14, CENTRO[0], CENTRO[1] + 0.001)        # cerca, pero sin token
+    resolvedor = DestinatariosAlertas()
+    resolvedor.reemplazar(
+        tokens={u: f"tok-{u}" for u in (10, 11, 12, 13, 20, 21, 22)},
+        viajes=[(20, None, 3, None), (21, 5, None, None), (22, 9, 8, 8)],
+    )
+
+    assert resolvedor.tokens(None, id_paraderos=[1]) == ["tok-10"]
+    assert resolvedor.tokens(None, id_ruta=7) == ["tok-11", "tok-20"]
+    assert resolvedor.tokens(None, id_corredor=5) == ["tok-12", "tok-21"]
+    assert resolvedor.para_reporte(None, {
+        "id_ruta_afectada": 7, "id_paradero_inicial": 1, "id_paradero_final": None, "id_corredor_afectado": 5,
+    }) == ["tok-10", "tok-11", "tok-12", "tok-20", "tok-21"]
+    assert resolvedor.metricas()["resoluciones"] == 4
+
+
+def test_tokens_y_viajes_se_mantienen_con_los_cambios(zona):
+    """TC2: Los commits y los tokens rechazados por FCM actualizan el estado sin recargar"""
+    resolvedor = DestinatariosAlertas()
+    resolvedor.reemplazar(tokens={1: "viejo"}, viajes=[])
+
+    resolvedor.aplicar_cambios_historial([("insert", None, {"id_usuario": 1, "id_corredor": None,
+                                                             "id_paradero_sube": 2, "id_paradero_baja": 3})])
+    resolvedor.aplicar_cambios_usuarios([("update", None, {"id_usuario": 1, "fcm_token": "nuevo"})])
+    assert resolvedor.tokens(None, id_paraderos=[3]) == ["nuevo"]
+
+    resolvedor.quitar_tokens(["viejo", "nuevo"])
+    assert resolvedor.tokens(None, id_paraderos=[3]) == []
+    assert notificaciones_dirigidas("t", "c", []) == []
+    bloques = notificaciones_dirigidas("t", "c", [f"t{i}" for i in range(TOKENS_POR_NOTIFICACION + 1)])
+    assert [len(n["tokens"]) for n in bloques] == [TOKENS_POR_NOTIFICACION, 1]
+
+
+def _resolvedor_100k(pasajeros):
+    """100k pasajeros con token repartidos en ~50x50 km y 300k viajes de historial"""
+    rnd = random.Random(3)
+    ubicaciones = {}
+    for u in range(100_000):
+        ubicaciones[u] = (CENTRO[0] + rnd.uniform(-0.25, 0.25), CENTRO[1] + rnd.uniform(-0.25, 0.25))
+        pasajeros.actualizar_ubicacion(u, *ubicaciones[u])
+    resolvedor = DestinatariosAlertas()
+    resolvedor.reemplazar(
+        tokens={u: f"tok-{u}" for u in range(100_000)},
+        viajes=[(rnd.randrange(100_000), rnd.randrange(50), rnd.randrange(1, 500), None) for _ in range(300_000)],
+    )
+    return resolvedor, ubicaciones
+
+
+REPORTE_100K = {"id_ruta_afectada": 7, "id_paradero_inicial": 1, "id_corredor_afectado": 5}
+
+
+def test_resolucion_con_100k_usuarios_recorre_solo_la_zona(zona):
+    """TC3: Con 100k pasajeros, resolver una alerta solo examina las celdas de la zona afectada"""
+    pasajeros = zona
+    resolvedor, ubicaciones = _resolvedor_100k(pasajeros)
+    indice = pasajeros._indice
+    celdas_en_radio = indice._celdas_en_radio
+    examinados = []  # candidatos (pasajeros en las celdas visitadas) por consulta
+
+    def contar(lat, lng, radio_km):
+        celdas = list(celdas_en_radio(lat, lng, radio_km))
+        examinados.append(sum(len(indice._celdas[c]) for c in celdas))
+        return iter(celdas)
+
+    indice._celdas_en_radio = contar
+    tokens = resolvedor.para_reporte(None, REPORTE_100K)
+
+    cerca_del_paradero = {f"tok-{u}" for u, (lat, lng) in ubicaciones.items()
+                          if distancia_km(lat, lng, *CENTRO) <= destinatarios.RADIO_PARADERO_KM}
+    assert cerca_del_paradero <= set(tokens)
+    assert len(tokens) < 20_000
+    # Una consulta por punto de la zona (paradero, 2 de la ruta, corredor), no un recorrido de los 100k
+    assert len(examinados) == 4
+    assert sum(examinados) < 10_000
+
+
+@pytest.mark.skipif(importlib.util.find_spec("pytest_benchmark") is None, reason="requiere pytest-benchmark")
+@pytest.mark.benchmark(group="destinatarios_alertas")
+def test_benchmark_resolucion_con_100k_usuarios(benchmark, zona):
+    """Benchmark: resolver los destinatarios de una alerta con 100k pasajeros"""
+    resolvedor, _ = _resolvedor_100k(zona)
+    benchmark.pedantic(resolvedor.para_reporte, args=(None, REPORTE_100K), rounds=20, warmup_rounds=1)
+
+
+def test_recarga_periodica_recoge_cambios_de_otras_instancias(zona, tmp_path):
+    """TC4: El hilo de fondo carga al arrancar, relee lo escrito fuera y no pierde commits durante la recarga"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'alertas.db'}",
+                           execution_options={"schema_translate_map": {"public": None}})
+    UsuarioBase.__table__.create(engine)
+    HistorialUso.__table__.create(engine)
+    ahora = datetime.now(timezone.utc)
+
+    def escribir(id_usuario, token):
+        # Otra instancia: escribe directo en la BD, sin pasar por config.eventos
+        with engine.begin() as conn:
+            conn.execute(UsuarioBase.__table__.insert(), {"id_usuario": id_usuario, "fcm_token": token})
+            conn.execute(HistorialUso.__table__.insert(),
+                         {"id_usuario": id_usuario, "id_paradero_sube": 3, "fecha_hora_subida": ahora})
+
+    def esperar(condicion):
+        limite = time.monotonic() + 5
+        while not condicion():
+            assert time.monotonic() < limite
+            time.sleep(0.01)
+
+    fabrica = sessionmaker(bind=engine)
+    resolvedor = DestinatariosAlertas()
+    escribir(1, "tok-1")
+    try:
+        iniciar_recarga_periodica(resolvedor, fabrica, intervalo_s=3600)
+        esperar(lambda: resolvedor.metricas()["cargado"])
+        assert resolvedor.tokens(None, id_paraderos=[3]) == ["tok-1"]
+
+        escribir(2, "tok-2")
+        assert resolvedor.tokens(None, id_paraderos=[3]) == ["tok-1"]
+
+        @event.listens_for(engine, "before_cursor_execute", once=True)
+        def commit_local_durante_la_lectura(*args):
+            resolvedor.aplicar_cambios_usuarios([("update", None, {"id_usuario": 1, "fcm_token": "tok-1b"})])
+
+        with fabrica() as db:
+            resolvedor.recargar(db)
+        assert resolvedor.tokens(None, id_paraderos=[3]) == ["tok-1b", "tok-2"]
+    finally:
+        engine.dispose()
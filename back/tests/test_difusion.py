@@ -0,0 +1,102 @@
+"""
+Tests del canal de difusión en memoria de posiciones de corredores
+"""
+import asyncio
+
+import pytest
+
+from services.difusion_posiciones import DifusionPosiciones, FiltroSuscripcion
+from services.red_rutas import GeometriaRuta
+
+
+def _ruta_horizontal():
+    paraderos = [
+        {"id_paradero": i, "nombre": f"P{i}", "coordenada_lat": 0.0, "coordenada_lng": lng}
+        for i, lng in enumerate((0.0, 0.05, 0.1), start=1)
+    ]
+    return GeometriaRuta(7, "Ruta 7", paraderos)
+
+
+def test_cada_suscriptor_recibe_solo_lo_que_filtra():
+    """TC1: Suscripciones por corredor, ruta y bounding box reciben solo sus posiciones"""
+    async def escenario():
+        difusion = DifusionPosiciones()
+        por_corredor = difusion.suscribir(FiltroSuscripcion(id_corredor=1))
+        por_ruta = difusion.suscribir(FiltroSuscripcion(geometria=_ruta_horizontal()))
+        por_caja = difusion.suscribir(FiltroSuscripcion(bbox=(-1.0, 1.0, 1.0, 2.0)))
+
+        difusion.publicar(1, 0.001, 0.02)   # sobre la ruta
+        difusion.publicar(2, 0.5, 1.5)      # dentro de la caja
+        difusion.publicar(3, 0.5, 0.05)     # lejos de todo
+
+        assert [m["id_corredor"] for m in await por_corredor.siguiente()] == [1]
+        assert [m["id_corredor"] for m in await por_ruta.siguiente()] == [1]
+        assert [m["id_corredor"] for m in await por_caja.siguiente()] == [2]
+        assert difusion.metricas()["clientes_por_tipo"] == {"corredor": 1, "ruta": 1, "bbox": 1}
+
+    asyncio.run(escenario())
+
+
+def test_suscriptor_lento_recibe_la_ultima_posicion():
+    """TC2: Si el cliente no lee, las posiciones del mismo corredor se reemplazan (contrapresión)"""
+    async def escenario():
+        difusion = DifusionPosiciones()
+        suscripcion = difusion.suscribir(FiltroSuscripcion(id_corredor=1))
+        for i in range(100):
+            difusion.publicar(1, float(i), 0.0)
+
+        mensajes = await suscripcion.siguiente()
+        assert [m["lat"] for m in mensajes] == [99.0]
+        assert difusion.metricas()["descartados_por_contrapresion"] == 99
+
+        difusion.desuscribir(suscripcion)
+        assert difusion.publicar(1, 0.0, 0.0) == 0
+        assert difusion.metricas()["clientes"] == 0
+
+    asyncio.run(escenario())
+
+
+def test_suscripcion_con_loop_cerrado_se_descarta():
+    """TC3: Publicar a un cliente cuyo loop ya cerró no lanza error y lo quita del registro"""
+    difusion = DifusionPosiciones()
+    loop = asyncio.new_event_loop()
+    difusion.suscribir(FiltroSuscripcion(id_corredor=1), loop=loop)
+    loop.close()
+
+    assert difusion.publicar(1, 0.0, 0.0) == 0
+    assert difusion.metricas()["clientes"] == 0
+
+
+def test_filtro_requiere_un_solo_criterio():
+    """TC4: Un filtro sin criterio o con varios es inválido"""
+    with pytest.raises(ValueError):
+        FiltroSuscripcion()
+    with pytest.raises(ValueError):
+        FiltroSuscripcion(id_corredor=1, bbox=(0, 0, 1, 1))
+
+
+def test_websocket_no_pierde_posiciones_durante_el_snapshot():
+    """TC5: Una posición que llega mientras se arma el mensaje inicial sale como delta"""
+    from unittest.mock import patch
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from routes import tiempo_real_routes
+
+    difusion = DifusionPosiciones()
+
+    def iniciales_con_ping(filtro):
+        # El ping se ingiere después de suscribirse y antes de que el snapshot lo vea
+        difusion.publicar(5, 0.001, 0.002, "activo")
+        return []
+
+    app = FastAPI()
+    app.include_router(tiempo_real_routes.router)
+    with patch.object(tiempo_real_routes, "_preparar", return_value=FiltroSuscripcion(id_corredor=5)), \
+         patch.object(tiempo_real_routes, "_iniciales", side_effect=iniciales_con_ping), \
+         patch.object(tiempo_real_routes, "get_difusion_posiciones", return_value=difusion):
+        with TestClient(app).websocket_connect("/tiempo-real/corredores?corredor=5") as ws:
+            assert ws.receive_json() == {"tipo": "inicial", "posiciones": []}
+            delta = ws.receive_json()
+    assert delta["tipo"] == "delta" and [p["id_corredor"] for p in delta["posiciones"]] == [5]
@@ -0,0 +1,217 @@
+"""
+Tests de los cálculos de ETA en lote
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from services.DiagramaClases.eta_service import EtaService
+from services.indice_espacial import IndiceParaderos
+from services.posiciones_corredores import PosicionesCorredores
+
+
+def _fila_paradero(id_paradero, lat, lng):
+    return SimpleNamespace(id_paradero=id_paradero, nombre=f"P{id_paradero}", coordenada_lat=lat,
+                           coordenada_lng=lng, colapso_actual=False, imagen_url=None)
+
+
+def _fila_corredor(id_corredor, lat, lng):
+    return SimpleNamespace(id_corredor=id_corredor, ubicacion_lat=lat, ubicacion_lng=lng, estado="activo")
+
+
+@pytest.fixture
+def red_en_memoria(mock_db):
+    """Índice de paraderos y snapshot de corredores cargados desde una BD mockeada"""
+    filas = {
+        "Paradero": [_fila_paradero(1, 0.0, 0.0), _fila_paradero(2, 0.0, 1.0), _fila_paradero(3, None, None)],
+        "Corredor": [
+            _fila_corredor(10, 0.0, 0.1),    # ≈ 11 km del paradero 1
+            _fila_corredor(20, 0.0, 0.9),    # ≈ 11 km del paradero 2
+            _fila_corredor(30, None, None),  # sin ubicación: se ignora
+        ],
+    }
+
+    def query(*columnas):
+        consulta = MagicMock()
+        consulta.all.return_value = filas[columnas[0].class_.__name__]
+        return consulta
+
+    mock_db.query.side_effect = query
+    with patch("services.DiagramaClases.eta_service.get_indice_paraderos", return_value=IndiceParaderos()), \
+         patch("services.DiagramaClases.eta_service.get_posiciones_corredores", return_value=PosicionesCorredores()):
+        yield mock_db
+
+
+def test_matriz_por_ids_devuelve_mejor_y_top_k(red_en_memoria):
+    """TC1: Cada paradero recibe su corredor más cercano y el top-k ordenado"""
+    servicio = EtaService(red_en_memoria, default_speed_kmh=30.0)
+    resultado = servicio.calcular_matriz(ids_paradero=[1, 2, 3, 1], top_k=2)
+
+    assert [r["paradero_id"] for r in resultado] == [1, 2, 3]  # sin repetir el 1
+    por_paradero = {r["paradero_id"]: r for r in resultado}
+    assert por_paradero[3] == {"paradero_id": 3, "mejor": None, "top": []}  # sin coordenadas
+    assert por_paradero[1]["mejor"]["corredor_id"] == 10
+    assert por_paradero[2]["mejor"]["corredor_id"] == 20
+    assert [t["corredor_id"] for t in por_paradero[1]["top"]] == [10, 20]
+    assert por_paradero[1]["mejor"]["eta_minutos"] == 22  # 11.1 km a 30 km/h
+
+    # Un id inexistente no se omite en silencio
+    with pytest.raises(LookupError, match=r"\[99\]"):
+        servicio.calcular_matriz(ids_paradero=[1, 99])
+
+
+def test_matriz_por_bounding_box(red_en_memoria):
+    """TC2: Con bounding box solo se consideran los paraderos dentro del rectángulo"""
+    resultado = EtaService(red_en_memoria).calcular_matriz(bbox=(-0.1, 0.5, 0.1, 1.5), top_k=1)
+
+    assert [r["paradero_id"] for r in resultado] == [2]
+    assert len(resultado[0]["top"]) == 1
+    with pytest.raises(ValueError):  # más paraderos que el máximo: error, no respuesta truncada
+        EtaService(red_en_memoria).calcular_matriz(bbox=(-1, -1, 1, 3), max_paraderos=1)
+
+
+def test_matriz_sin_criterio_lanza_error(red_en_memoria):
+    """TC3: Sin ids ni bounding box es un error del llamador"""
+    with pytest.raises(ValueError):
+        EtaService(red_en_memoria).calcular_matriz()
+
+
+def _fila_ruta(id_paradero, lat, lng):
+    return SimpleNamespace(id_ruta=7, nombre_ruta="Ruta 7", id_paradero=id_paradero, nombre=f"P{id_paradero}",
+                           coordenada_lat=lat, coordenada_lng=lng, orden=id_paradero * 10)
+
+
+@pytest.fixture
+def ruta_en_memoria(mock_db):
+    """Ruta en L (paraderos 1 -> 2 -> 3) y un corredor sobre el primer tramo, desde una BD mockeada"""
+    from services.red_rutas import RedRutas
+    from services.velocidades_tramos import TablaVelocidades
+
+    filas = {
+        "Ruta": [_fila_ruta(1, 0.0, 0.0), _fila_ruta(2, 0.0, 0.1), _fila_ruta(3, 0.1, 0.1)],
+        "Corredor": [_fila_corredor(10, 0.0, 0.05)],
+        "HistorialUso": [],
+        "Reporte": [],
+    }
+    mock_db.filas = filas
+
+    def query(*columnas):
+        consulta = MagicMock()
+        consulta.join.return_value = consulta
+        consulta.filter.return_value = consulta
+        consulta.order_by.return_value = consulta
+        consulta.all.return_value = filas[columnas[0].class_.__name__]
+        return consulta
+
+    mock_db.query.side_effect = query
+    with patch("services.DiagramaClases.eta_service.get_red_rutas", return_value=RedRutas()), \
+         patch("services.DiagramaClases.eta_service.get_velocidades_tramos", return_value=TablaVelocidades()), \
+         patch("services.DiagramaClases.eta_service.get_posiciones_corredores", return_value=PosicionesCorredores()):
+        yield mock_db
+
+
+def test_etas_en_ruta_sigue_el_orden_de_paraderos(ruta_en_memoria):
+    """TC4: Solo se listan los paraderos por delante y la distancia sigue la ruta, no la línea recta"""
+    resultado = EtaService(ruta_en_memoria, default_speed_kmh=30.0).etas_en_ruta(id_ruta=7, id_corredor=10, hora=8)
+
+    assert [p["paradero_id"] for p in resultado["paraderos"]] == [2, 3]
+    assert [p["orden"] for p in resultado["paraderos"]] == [20, 30]  # RutaParadero.orden, no la posición
+    assert resultado["desvio_km"] == pytest.approx(0.0, abs=1e-6)
+    tramo = 11.12  # ≈ 0.1° a lo largo de cada tramo
+    assert resultado["paraderos"][0]["distancia_km"] == pytest.approx(tramo / 2, rel=0.01)
+    # al paradero 3 se llega doblando en el paradero 2 (≈ 16.7 km), no en diagonal (≈ 12.4 km)
+    assert resultado["paraderos"][1]["distancia_km"] == pytest.approx(tramo * 1.5, rel=0.01)
+    assert resultado["paraderos"][1]["eta_minutos"] == 33
+
+
+def test_eta_en_ruta_valida_paradero(ruta_en_memoria):
+    """TC5: Paraderos ya pasados o fuera de la ruta son errores claros"""
+    servicio = EtaService(ruta_en_memoria)
+    assert servicio.eta_en_ruta(7, 10, 3)["paradero_id"] == 3
+    with pytest.raises(ValueError, match="ya pasó"):
+        servicio.eta_en_ruta(7, 10, 1)
+    with pytest.raises(ValueError, match="no pertenece"):
+        servicio.eta_en_ruta(7, 10, 99)
+
+
+def test_eta_en_ruta_usa_velocidades_aprendidas(ruta_en_memoria):
+    """TC6: Viajes lentos registrados en HistorialUso para una hora alargan el ETA de esa hora"""
+    from datetime import datetime, timedelta, timezone
+    from services.DiagramaClases import eta_service
+
+    # Viaje del paradero 1 al 2 (≈ 11.1 km) en 60 minutos a las 8:00 hora local (UTC-5)
+    subida = datetime(2025, 3, 3, 13, 0, tzinfo=timezone.utc)
+    ruta_en_memoria.filas["HistorialUso"] = [
+        SimpleNamespace(id_historial=1, id_paradero_sube=1, id_paradero_baja=2,
+                        fecha_hora_subida=subida, fecha_hora_bajada=subida + timedelta(minutes=60)),
+    ]
+    servicio = EtaService(ruta_en_memoria, default_speed_kmh=30.0)
+
+    # El ETA no agrega en la petición: usa la tabla publicada y pide la reconstrucción
+    assert [p["eta_minutos"] for p in servicio.etas_en_ruta(7, 10, hora=8)["paraderos"]] == [11, 33]
+    tabla = eta_service.get_velocidades_tramos()
+    assert tabla._reconstruir.is_set()
+    tabla.actualizar(ruta_en_memoria, eta_service.get_red_rutas())  # lo que hace el hilo de fondo
+
+    a_las_8 = servicio.etas_en_ruta(7, 10, hora=8)["paraderos"]
+    # medio tramo a ≈ 11.1 km/h (30 min) + tramo 2 -> 3 sin datos a 30 km/h (≈ 22 min)
+    assert [p["eta_minutos"] for p in a_las_8] == [30, 52]
+    # en otra hora se usa el promedio del día del tramo
+    assert servicio.etas_en_ruta(7, 10, hora=15)["paraderos"][0]["eta_minutos"] == 30
+
+
+def test_red_caducada_cambia_de_version_solo_si_cambio(ruta_en_memoria):
+    """TC7: Al caducar, la red se relee; la versión solo sube si cambió la ruta"""
+    from services.DiagramaClases import eta_service
+    red = eta_service.get_red_rutas()
+    red.todas(ruta_en_memoria)
+
+    red.caducar()
+    red.todas(ruta_en_memoria)
+    assert red.version == 0
+
+    ruta_en_memoria.filas["Ruta"][2] = _fila_ruta(3, 0.2, 0.1)
+    red.caducar()
+    assert red.geometria(ruta_en_memoria, 7).lats[2] == 0.2
+    assert red.version == 1
+
+
+def test_agregacion_relee_la_ventana_sin_contar_dos_veces(ruta_en_memoria):
+    """TC8: Las filas con la misma marca o confirmadas tarde se cuentan una vez; el ETA sin ruta usa la tabla"""
+    from datetime import datetime, timedelta, timezone
+    from services.DiagramaClases import eta_service
+
+    subida = datetime(2025, 3, 3, 13, 0, tzinfo=timezone.utc)
+
+    def viaje(id_historial, minutos_antes=0):
+        inicio = subida - timedelta(minutes=minutos_antes)
+        return SimpleNamespace(id_historial=id_historial, id_paradero_sube=1, id_paradero_baja=2,
+                               fecha_hora_subida=inicio, fecha_hora_bajada=inicio + timedelta(minutes=60))
+
+    historial = ruta_en_memoria.filas["HistorialUso"]
+    tabla, red = eta_service.get_velocidades_tramos(), eta_service.get_red_rutas()
+    historial.append(viaje(1))
+    assert tabla.actualizar(ruta_en_memoria, red) == 1
+    # Misma bajada que la marca de agua y un viaje anterior confirmado después
+    historial.extend([viaje(2), viaje(3, minutos_antes=5)])
+    assert tabla.actualizar(ruta_en_memoria, red) == 2
+    assert tabla.actualizar(ruta_en_memoria, red) == 0
+    assert tabla.observaciones == 3
+
+    # Paradero 1: tramo 1 -> 2 a ≈ 11.1 km/h a las 8; paradero 3 sin datos; 99 fuera de la red
+    velocidades = tabla.velocidades_paraderos([1, 3, 99], 8, 30.0)
+    assert velocidades[0] == pytest.approx(11.1, abs=0.1)
+    assert velocidades[2] == 30.0
+
+
+def test_matriz_usa_velocidades_aprendidas(red_en_memoria):
+    """TC9: La matriz de ETA usa la velocidad aprendida de cada paradero en lugar de la de defecto"""
+    tabla = MagicMock()
+    tabla.velocidades_paraderos.side_effect = lambda ids, hora, defecto: np.where(np.array(ids) == 1, 15.0, defecto)
+    with patch("services.DiagramaClases.eta_service.get_velocidades_tramos", return_value=tabla):
+        resultado = EtaService(red_en_memoria, default_speed_kmh=30.0).calcular_matriz(ids_paradero=[1], hora=8)
+    assert resultado[0]["mejor"]["eta_minutos"] == 44  # 11.1 km a 15 km/h
+    assert tabla.velocidades_paraderos.call_args.args[1] == 8
+
@@ -8,6 +8,7 @@ from sqlalchemy.exc import SQLAlchemyError
 # Importar el servicio que vamos a probar
 from services.DiagramaClases.reporte_service import ReporteService
 from services.alerta_masiva_service import AlertaMasivaService
+from services.coalescencia_alertas import VentanaAlertas
 
 
 # ==============================================================================
@@ -31,7 +32,9 @@ def mocked_deviation_report_service():
     with patch('services.DiagramaClases.reporte_service.Paradero_Service') as MockParaderoService, \
          patch('services.DiagramaClases.reporte_service.CreadorReportes') as MockCreadorReportes, \
          patch('services.DiagramaClases.reporte_service.SessionLocal') as MockSessionLocal_class, \
-         patch('services.DiagramaClases.reporte_service.get_firebase_admin') as mock_get_firebase:
+         patch('services.DiagramaClases.reporte_service.get_despachador_notificaciones') as mock_get_despachador, \
+         patch('services.DiagramaClases.reporte_service.get_destinatarios_alertas') as mock_get_destinatarios, \
+         patch('services.DiagramaClases.reporte_service.get_ventana_alertas', return_value=VentanaAlertas()):
 
         # Configurar mocks de dependencias
         mock_paradero_service_instance = MockParaderoService.return_value
@@ -57,6 +60,9 @@ def mocked_deviation_report_service():
         mock_regulador.fcm_token = "token-regulador-1"
         mock_db_session_instance.query.return_value.filter.return_value.all.return_value = [mock_regulador]
         
+        # Pasajeros de la zona del desvío
+        mock_get_destinatarios.return_value.para_reporte.return_value = ["token-pasajero-1", "token-pasajero-2"]
+
         # Crear la instancia del servicio a probar
         service = ReporteService(engine=MagicMock(), paradero_service=mock_paradero_service_instance)
         
@@ -69,30 +75,35 @@ def mocked_deviation_report_service():
             "creador_reportes": mock_creador_reportes_instance,
             "session_local_class": MockSessionLocal_class,
             "db_session_instance": mock_db_session_instance,
-            "get_firebase": mock_get_firebase
+            "despachador": mock_get_despachador.return_value,
+            "destinatarios": mock_get_destinatarios.return_value,
         }
 
 def test_crear_reporte_desvio_happy_path(mocked_deviation_report_service):
     """
-    Prueba 1: "Camino Feliz" - Reporte de desvío creado y notificación enviada
-    correctamente a reguladores.
+    Prueba 1: "Camino Feliz" - Reporte de desvío creado y notificaciones a
+    reguladores (tema) y a los pasajeros de la zona (tokens) guardadas en el
+    outbox junto con el reporte.
     """
     service, mocks = mocked_deviation_report_service
     
     # Configurar mocks para este escenario
     mocks["paradero_service"].get_paradero_by_id.return_value = {"id": 201, "nombre": "Paradero A"}
-    mock_firebase_instance = mocks["get_firebase"].return_value
     
     # Ejecutar la función
     result = service.crear_reporte_desvio(BASE_DEVIATION_PAYLOAD)
     
     # Afirmaciones
     service.save_report.assert_called_once()
-    mock_firebase_instance.send_to_topic.assert_called_once_with(
-        topic="reguladores_alerts",
-        title="Alerta de Desvío",
-        body=service.reporte_factory.crear.return_value.generar_mensaje.return_value
-    )
+    [notificacion, dirigida] = service.save_report.call_args.kwargs["notificaciones"]
+    assert notificacion["topic"] == "reguladores_alerts"
+    assert notificacion["titulo"] == "Alerta de Desvío"
+    assert notificacion["cuerpo"] == service.reporte_factory.crear.return_value.generar_mensaje.return_value
+    record = mocks["destinatarios"].para_reporte.call_args.args[1]
+    assert (record["id_ruta_afectada"], record["id_paradero_inicial"]) == (101, 201)
+    assert dirigida["topic"] is None
+    assert dirigida["tokens"] == ["token-pasajero-1", "token-pasajero-2"]
+    mocks["despachador"].despertar.assert_called_once()
     assert result["id_reporte"] == BASE_DEVIATION_PAYLOAD["id_reporte"]
 
 
@@ -111,7 +122,7 @@ def test_crear_reporte_desvio_paradero_invalido(mocked_deviation_report_service)
     
     # Afirmaciones
     service.save_report.assert_not_called()
-    mocks["get_firebase"].return_value.send_to_topic.assert_not_called()
+    mocks["despachador"].despertar.assert_not_called()
 
 
 def test_crear_reporte_desvio_reporte_duplicado(mocked_deviation_report_service):
@@ -131,27 +142,26 @@ def test_crear_reporte_desvio_reporte_duplicado(mocked_deviation_report_service)
     # Afirmaciones
     service.find_report_by_id_reporte.assert_called_once_with(BASE_DEVIATION_PAYLOAD["id_reporte"])
     service.save_report.assert_not_called() # No debe guardar de nuevo
-    mocks["get_firebase"].return_value.send_to_topic.assert_not_called() # No debe enviar notificación
+    mocks["despachador"].despertar.assert_not_called() # No debe encolar notificación
     assert result["id"] == 99 # Debe devolver el reporte existente
 
 
 def test_crear_reporte_desvio_notificacion_falla_no_crashea_app(mocked_deviation_report_service):
     """
-    Prueba 4: Verifica que si el envío de la notificación falla, el reporte
-    aún se crea exitosamente.
+    Prueba 4: Verifica que la petición no depende de Firebase: aunque FCM
+    falle, el reporte se crea porque el envío lo hace el despachador.
     """
     service, mocks = mocked_deviation_report_service
     
     # Configurar mocks: todo válido, pero Firebase lanza una excepción al enviar
     mocks["paradero_service"].get_paradero_by_id.return_value = {"id": 201, "nombre": "Paradero A"}
-    mocks["get_firebase"].return_value.send_to_topic.side_effect = Exception("Firebase is down")
-    
-    # Ejecutar la función (no debe lanzar una excepción, solo loguear el error)
-    result = service.crear_reporte_desvio(BASE_DEVIATION_PAYLOAD)
+    with patch('config.firebase.get_firebase_admin') as mock_get_firebase:
+        mock_get_firebase.return_value.send_to_topic.side_effect = Exception("Firebase is down")
+        result = service.crear_reporte_desvio(BASE_DEVIATION_PAYLOAD)
     
     # Afirmaciones
     service.save_report.assert_called_once()
-    mocks["get_firebase"].return_value.send_to_topic.assert_called_once()
+    mock_get_firebase.assert_not_called()
     assert result["id_reporte"] == BASE_DEVIATION_PAYLOAD["id_reporte"] # La función debe completar y devolver el reporte
 
 
@@ -172,7 +182,7 @@ def test_crear_reporte_desvio_falla_en_db(mocked_deviation_report_service):
     
     # Afirmaciones
     service.save_report.assert_called_once()
-    mocks["get_firebase"].return_value.send_to_topic.assert_not_called() # No debe enviar notificación
+    mocks["despachador"].despertar.assert_not_called() # No debe avisar al despachador
 
 # ==============================================================================
 # PRUEBAS UNITARIAS PARA `crear_alerta_masiva`
@@ -195,8 +205,11 @@ BASE_ALERTA_PAYLOAD = {
 # --- Fixture para inicializar el servicio de AlertaMasivaService con mocks ---
 @pytest.fixture
 def mocked_alerta_masiva_service():
-    with patch('services.alerta_masiva_service.get_firebase_admin') as mock_get_firebase, \
-         patch('services.alerta_masiva_service.Session') as MockSession:
+    with patch('services.alerta_masiva_service.encolar') as mock_encolar, \
+         patch('services.alerta_masiva_service.get_despachador_notificaciones') as mock_get_despachador, \
+         patch('services.alerta_masiva_service.Session') as MockSession, \
+         patch('services.alerta_masiva_service.get_destinatarios_alertas') as mock_get_destinatarios, \
+         patch('services.alerta_masiva_service.get_ventana_alertas', return_value=VentanaAlertas()):
 
         mock_session_instance = MockSession.return_value.__enter__.return_value
         
@@ -210,89 +223,109 @@ def mocked_alerta_masiva_service():
         mock_reporte_creado.requiere_intervencion = False
         mock_session_instance.execute.return_value.scalar_one.return_value = mock_reporte_creado
         
+        mock_get_destinatarios.return_value.para_reporte.return_value = ["token-pasajero-1"]
+
         service = AlertaMasivaService(engine=MagicMock())
         
         yield service, {
-            "get_firebase": mock_get_firebase,
-            "session_instance": mock_session_instance
+            "encolar": mock_encolar,
+            "despachador": mock_get_despachador.return_value,
+            "session_instance": mock_session_instance,
+            "destinatarios": mock_get_destinatarios.return_value,
         }
 
 def test_crear_alerta_masiva_solo_guarda(mocked_alerta_masiva_service):
     """
-    Prueba 1/5 (Alerta Masiva): Verifica que la alerta se guarda pero NO se envía notificación
-    cuando `send_notification` es falso.
+    Prueba 1/5 (Alerta Masiva): Verifica que la alerta se guarda pero NO se encola
+    notificación cuando `send_notification` es falso.
     """
     service, mocks = mocked_alerta_masiva_service
-    mock_firebase_instance = mocks["get_firebase"].return_value
     
     result = service.crear_alerta_masiva(BASE_ALERTA_PAYLOAD)
     
     mocks["session_instance"].execute.assert_called_once()
     mocks["session_instance"].commit.assert_called_once()
-    mock_firebase_instance.send_to_topic.assert_not_called()
+    mocks["encolar"].assert_not_called()
     assert result["id_reporte"] == 123
 
 def test_crear_alerta_masiva_guarda_y_notifica(mocked_alerta_masiva_service):
     """
-    Prueba 2/5 (Alerta Masiva): Verifica que la alerta se guarda Y se envía una notificación
-    al tema 'all_users' cuando `send_notification` es verdadero.
+    Prueba 2/5 (Alerta Masiva): Verifica que la alerta se guarda Y se encola una
+    notificación al tema 'all_users', en la misma sesión, cuando `send_notification` es
+    verdadero y la alerta no indica zona afectada.
     """
     service, mocks = mocked_alerta_masiva_service
-    mock_firebase_instance = mocks["get_firebase"].return_value
     
-    payload_con_notificacion = {**BASE_ALERTA_PAYLOAD, "send_notification": True}
+    sin_zona = ("id_corredor_afectado", "id_ruta_afectada", "id_paradero_inicial", "id_paradero_final")
+    payload_con_notificacion = {**BASE_ALERTA_PAYLOAD, **dict.fromkeys(sin_zona), "send_notification": True}
     
     service.crear_alerta_masiva(payload_con_notificacion)
     
     mocks["session_instance"].commit.assert_called_once()
-    mock_firebase_instance.send_to_topic.assert_called_once_with(
-        topic="all_users",
-        title="Alerta General",
-        body=BASE_ALERTA_PAYLOAD["descripcion"]
-    )
+    conexion, [notificacion] = mocks["encolar"].call_args.args
+    assert conexion is mocks["session_instance"].connection.return_value
+    assert notificacion["topic"] == "all_users"
+    assert notificacion["titulo"] == "Alerta General"
+    assert notificacion["cuerpo"] == BASE_ALERTA_PAYLOAD["descripcion"]
+    assert mocks["encolar"].call_args.kwargs["id_reporte"] == 123
+    mocks["despachador"].despertar.assert_called_once()
+
+def test_crear_alerta_masiva_dirigida_a_la_zona(mocked_alerta_masiva_service):
+    """
+    Prueba 2b (Alerta Masiva): Con ruta, paraderos o corredor afectados la
+    notificación va por token solo a los pasajeros de esa zona.
+    """
+    service, mocks = mocked_alerta_masiva_service
+
+    service.crear_alerta_masiva({**BASE_ALERTA_PAYLOAD, "send_notification": True})
+
+    _, [notificacion] = mocks["encolar"].call_args.args
+    assert notificacion["topic"] is None
+    assert notificacion["tokens"] == ["token-pasajero-1"]
+    datos = mocks["destinatarios"].para_reporte.call_args.args[1]
+    assert datos["id_corredor_afectado"] == 10 and datos["id_ruta_afectada"] == 101
 
-def test_crear_alerta_masiva_maneja_error_notificacion(mocked_alerta_masiva_service):
+def test_crear_alerta_masiva_no_espera_a_firebase(mocked_alerta_masiva_service):
     """
-    Prueba 3/5 (Alerta Masiva): Verifica que la función no falla si el envío de
-    la notificación produce un error.
+    Prueba 3/5 (Alerta Masiva): Verifica que la petición no llama a Firebase:
+    aunque FCM falle, la alerta se crea y el envío queda para el despachador.
     """
     service, mocks = mocked_alerta_masiva_service
-    mock_firebase_instance = mocks["get_firebase"].return_value
-    mock_firebase_instance.send_to_topic.side_effect = Exception("Firebase Error")
     
     payload_con_notificacion = {**BASE_ALERTA_PAYLOAD, "send_notification": True}
     
-    result = service.crear_alerta_masiva(payload_con_notificacion)
+    with patch('config.firebase.get_firebase_admin') as mock_get_firebase:
+        mock_get_firebase.return_value.send_to_topic.side_effect = Exception("Firebase Error")
+        result = service.crear_alerta_masiva(payload_con_notificacion)
     
     mocks["session_instance"].commit.assert_called_once()
-    mock_firebase_instance.send_to_topic.assert_called_once()
+    mocks["encolar"].assert_called_once()
+    mock_get_firebase.assert_not_called()
     assert result["id_reporte"] == 123
 
 def test_crear_alerta_masiva_falla_si_db_falla(mocked_alerta_masiva_service):
     """
     Prueba 4/5 (Alerta Masiva): Verifica que se propaga una excepción de la BD
-    y no se intenta enviar una notificación.
+    y no se avisa al despachador (la notificación no quedó confirmada).
     """
     service, mocks = mocked_alerta_masiva_service
-    mock_firebase_instance = mocks["get_firebase"].return_value
     mocks["session_instance"].commit.side_effect = SQLAlchemyError("DB write failed")
     
     with pytest.raises(SQLAlchemyError, match="DB write failed"):
-        service.crear_alerta_masiva(BASE_ALERTA_PAYLOAD)
+        service.crear_alerta_masiva({**BASE_ALERTA_PAYLOAD, "send_notification": True})
     
-    mock_firebase_instance.send_to_topic.assert_not_called()
+    mocks["despachador"].despertar.assert_not_called()
 
 def test_crear_alerta_masiva_sin_flag_de_notificacion(mocked_alerta_masiva_service):
     """
-    Prueba 5/5 (Alerta Masiva): Verifica que por defecto no se envía notificación si
+    Prueba 5/5 (Alerta Masiva): Verifica que por defecto no se encola notificación si
     el flag 'send_notification' está ausente.
     """
     service, mocks = mocked_alerta_masiva_service
-    mock_firebase_instance = mocks["get_firebase"].return_value
     
     payload_sin_flag = {k: v for k, v in BASE_ALERTA_PAYLOAD.items() if k != "send_notification"}
     
     service.crear_alerta_masiva(payload_sin_flag)
     
     mocks["session_instance"].commit.assert_called_once()
-    mock_firebase_instance.send_to_topic.assert_not_called()
+    mocks["encolar"].assert_not_called()
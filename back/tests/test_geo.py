@@ -0,0 +1,65 @@
+"""
+Tests de los kernels vectorizados de distancia y de los servicios que los usan
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.geo import (
+    coordenadas,
+    distancia_km,
+    distancias_uno_a_muchos,
+    haversine_km,
+    mascara_radio,
+    matriz_distancias,
+)
+from services.DiagramaClases.FiltroCercania import FiltroCercania
+
+
+def test_vectorizado_coincide_con_escalar():
+    """TC1: La versión vectorizada da lo mismo que la escalar"""
+    rnd = np.random.default_rng(3)
+    lats = -12 + rnd.uniform(-0.5, 0.5, 200)
+    lngs = -77 + rnd.uniform(-0.5, 0.5, 200)
+
+    dist = distancias_uno_a_muchos(-12.05, -77.04, lats, lngs)
+
+    esperado = [distancia_km(-12.05, -77.04, la, ln) for la, ln in zip(lats, lngs)]
+    np.testing.assert_allclose(dist, esperado, rtol=1e-9)
+    assert float(haversine_km(0.0, 0.0, 0.0, 1.0)) == pytest.approx(111.19, rel=1e-3)
+
+
+def test_matriz_distancias_forma_y_valores():
+    """TC2: matriz[i, j] es la distancia entre a[i] y b[j]"""
+    lats_a, lngs_a = np.array([-12.0, -12.1]), np.array([-77.0, -77.1])
+    lats_b, lngs_b = np.array([-12.0, -12.2, -12.3]), np.array([-77.0, -77.2, -77.3])
+
+    m = matriz_distancias(lats_a, lngs_a, lats_b, lngs_b)
+
+    assert m.shape == (2, 3)
+    assert m[0, 0] == pytest.approx(0.0)
+    assert m[1, 2] == pytest.approx(distancia_km(-12.1, -77.1, -12.3, -77.3))
+
+
+def test_mascara_radio_ignora_coordenadas_faltantes():
+    """TC3: Puntos sin coordenadas (None -> NaN) nunca quedan dentro del radio"""
+    lats, lngs = coordenadas([(-12.0, -77.0), (None, None), (-13.0, -77.0)])
+
+    mascara = mascara_radio(-12.0, -77.0, lats, lngs, 1.0)
+
+    assert mascara.tolist() == [True, False, False]
+
+
+def test_filtro_cercania_vectorizado():
+    """TC4: FiltroCercania conserva solo rutas con algún paradero dentro del radio"""
+    def paradero(lat, lng):
+        return SimpleNamespace(coordenada_lat=lat, coordenada_lng=lng)
+
+    cerca = SimpleNamespace(nombre="Cerca", paraderos=[paradero(-13.0, -77.0), paradero(-12.001, -77.0)])
+    lejos = SimpleNamespace(nombre="Lejos", paraderos=[paradero(-13.0, -77.0)])
+    vacia = SimpleNamespace(nombre="Vacia", paraderos=[paradero(None, None)])
+
+    filtro = FiltroCercania(1.0, (-12.0, -77.0))
+
+    assert filtro.filtrar([cerca, lejos, vacia]) == [cerca]
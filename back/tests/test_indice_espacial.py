@@ -0,0 +1,152 @@
+"""
+Tests del índice espacial en memoria (grilla de celdas) y del índice de paraderos
+"""
+import random
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.Paradero import Paradero
+from services.geo import distancia_km
+from services.indice_espacial import IndiceEspacial, IndiceParaderos
+
+
+def _puntos_lima(n, semilla=7):
+    rnd = random.Random(semilla)
+    return {i: (-12.0464 + rnd.uniform(-0.2, 0.2), -77.0428 + rnd.uniform(-0.2, 0.2)) for i in range(n)}
+
+
+@pytest.fixture
+def sqlite_session():
+    """Sesión SQLite en memoria con la tabla paradero (sin esquema public)"""
+    engine = create_engine("sqlite://", execution_options={"schema_translate_map": {"public": None}})
+    Paradero.__table__.create(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    yield session
+    session.close()
+
+
+def test_mas_cercano_coincide_con_fuerza_bruta():
+    """TC1: El más cercano del índice es el mismo que recorriendo todos los puntos"""
+    puntos = _puntos_lima(500)
+    indice = IndiceEspacial(tam_celda_km=0.5)
+    for i, (lat, lng) in puntos.items():
+        indice.insertar(i, lat, lng)
+
+    rnd = random.Random(1)
+    for _ in range(50):
+        lat, lng = -12.0464 + rnd.uniform(-0.3, 0.3), -77.0428 + rnd.uniform(-0.3, 0.3)
+        esperado = min(puntos, key=lambda i: distancia_km(lat, lng, *puntos[i]))
+        encontrado, distancia = indice.mas_cercano(lat, lng)
+        assert encontrado == esperado
+        assert distancia == pytest.approx(distancia_km(lat, lng, *puntos[esperado]))
+
+
+def test_en_radio_coincide_con_fuerza_bruta():
+    """TC2: en_radio devuelve exactamente los puntos dentro del radio, ordenados"""
+    puntos = _puntos_lima(300)
+    indice = IndiceEspacial(tam_celda_km=0.3)
+    for i, (lat, lng) in puntos.items():
+        indice.insertar(i, lat, lng)
+
+    lat, lng, radio = -12.05, -77.04, 2.0
+    esperado = {i for i, p in puntos.items() if distancia_km(lat, lng, *p) <= radio}
+    resultado = indice.en_radio(lat, lng, radio)
+
+    assert {i for i, _ in resultado} == esperado
+    distancias = [d for _, d in resultado]
+    assert distancias == sorted(distancias)
+
+
+def test_mover_y_eliminar_puntos():
+    """TC3: Insertar de nuevo un id lo mueve; eliminar lo saca de las consultas"""
+    indice = IndiceEspacial()
+    indice.insertar("a", -12.0, -77.0)
+    indice.insertar("a", -12.5, -77.5)
+
+    assert len(indice) == 1
+    assert indice.contar_en_radio(-12.0, -77.0, 1.0) == 0
+    assert indice.mas_cercano(-12.5, -77.5)[0] == "a"
+
+    assert indice.eliminar("a") is True
+    assert indice.mas_cercano(-12.5, -77.5) is None
+
+
+def test_mas_cercano_respeta_radio_maximo():
+    """TC4: Con radio_max_km no devuelve puntos más lejanos"""
+    indice = IndiceEspacial()
+    indice.insertar(1, -12.0, -77.0)
+    assert indice.mas_cercano(-12.1, -77.0, radio_max_km=1.0) is None
+    assert indice.mas_cercano(-12.1, -77.0)[0] == 1
+
+
+def test_indice_paraderos_se_invalida_al_confirmar_cambios(sqlite_session):
+    """TC5: Un commit sobre paradero invalida el índice compartido"""
+    indice = IndiceParaderos()
+    from config.eventos import al_confirmar_cambios
+    al_confirmar_cambios((Paradero,), lambda cambios: indice.invalidar())
+
+    sqlite_session.add(Paradero(id_paradero=1, nombre="Central", coordenada_lat=-12.05, coordenada_lng=-77.04))
+    sqlite_session.commit()
+    assert indice.mas_cercano(sqlite_session, -12.05, -77.04)["nombre"] == "Central"
+
+    sqlite_session.add(Paradero(id_paradero=2, nombre="Norte", coordenada_lat=-12.0, coordenada_lng=-77.04))
+    sqlite_session.commit()
+
+    assert indice.mas_cercano(sqlite_session, -12.0, -77.04)["nombre"] == "Norte"
+    assert len(indice.listar(sqlite_session)) == 2
+
+
+def test_indice_pasajeros_se_mantiene_con_cambios(mock_db):
+    """TC6: La grilla de pasajeros se actualiza con los cambios confirmados de usuarios"""
+    from services.indice_espacial import IndicePasajeros
+
+    mock_db.query.return_value.filter.return_value.all.return_value = []
+    indice = IndicePasajeros()
+    assert indice.contar_en_radio(mock_db, -12.0, -77.0, 0.5) == 0
+
+    indice.aplicar_cambios([
+        ("insert", None, {"id_usuario": 1, "id_tipo_usuario": 1, "ubicacion_actual_lat": -12.0, "ubicacion_actual_lng": -77.0}),
+        ("insert", None, {"id_usuario": 2, "id_tipo_usuario": 1, "ubicacion_actual_lat": -12.001, "ubicacion_actual_lng": -77.0}),
+        # Conductores (tipo 2) no cuentan como pasajeros
+        ("insert", None, {"id_usuario": 3, "id_tipo_usuario": 2, "ubicacion_actual_lat": -12.0, "ubicacion_actual_lng": -77.0}),
+    ])
+    assert indice.contar_en_radio(mock_db, -12.0, -77.0, 0.5) == 2
+
+    indice.aplicar_cambios([
+        ("update", None, {"id_usuario": 2, "id_tipo_usuario": 1, "ubicacion_actual_lat": -12.5, "ubicacion_actual_lng": -77.0}),
+        ("delete", None, {"id_usuario": 1, "id_tipo_usuario": 1, "ubicacion_actual_lat": -12.0, "ubicacion_actual_lng": -77.0}),
+    ])
+    assert indice.contar_en_radio(mock_db, -12.0, -77.0, 0.5) == 0
+
+    conteos = indice.contar_por_punto(mock_db, {10: (-12.5, -77.0), 11: (-12.0, -77.0)}, 0.5)
+    assert conteos == {10: 1, 11: 0}
+    # La carga inicial desde la BD se hace una sola vez
+    assert mock_db.query.call_count == 1
+
+
+def test_indice_pasajeros_se_reconstruye_con_aviso_externo(mock_db):
+    """TC7: Un aviso de caducidad reconstruye la grilla con lo escrito fuera de este proceso"""
+    from types import SimpleNamespace
+
+    from models.UsuarioBase import UsuarioBase
+    from services.indice_espacial import IndicePasajeros
+
+    def fila(id_usuario, lat):
+        return SimpleNamespace(id_usuario=id_usuario, ubicacion_actual_lat=lat, ubicacion_actual_lng=-77.0)
+
+    filas = mock_db.query.return_value.filter.return_value.all
+    filas.return_value = [fila(1, -12.0)]
+    indice = IndicePasajeros()
+    assert indice.contar_en_radio(mock_db, -12.0, -77.0, 0.5) == 1
+
+    # Otro worker movió al usuario 1 lejos y registró al 2 cerca
+    filas.return_value = [fila(1, -12.5), fila(2, -12.001)]
+    assert indice.contar_en_radio(mock_db, -12.0, -77.0, 0.5) == 1
+    indice.aplicar_cambios([("externo", UsuarioBase, {})])
+    assert indice.contar_en_radio(mock_db, -12.0, -77.0, 0.5) == 1
+    assert indice.usuarios_cerca(mock_db, [(-12.0, -77.0)], 0.5) == {2}
+    assert mock_db.query.call_count == 2
+
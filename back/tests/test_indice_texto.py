@@ -0,0 +1,72 @@
+"""
+Tests del índice de texto (trigramas) para autocompletado de rutas y paraderos
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from services.comentario_paradero_service import ComentarioParaderoService
+from services.indice_texto import IndiceNombres, IndiceTexto, normalizar
+
+
+NOMBRES = {
+    1: "Av. Perú",
+    2: "Plaza San Martín",
+    3: "Ñaña",
+    4: "Perúgia",
+    5: "Estación Central",
+}
+
+
+def test_normalizar_y_buscar_sin_tildes():
+    """TC1: La búsqueda parcial ignora tildes, mayúsculas y puntuación, y ordena por prefijo"""
+    assert normalizar("Av. Perú - Ñaña") == "av peru nana"
+
+    indice = IndiceTexto(NOMBRES.items())
+    assert [c for c, _ in indice.buscar("peru")] == [4, 1]   # "perugia" empieza con la consulta
+    assert [c for c, _ in indice.buscar("MARTIN")] == [2]
+    assert [c for c, _ in indice.buscar("nana")] == [3]
+    assert indice.buscar("tral")[0] == (5, "Estación Central")
+    assert indice.buscar("xyz") == []
+    assert indice.exacto("av peru") == [1]
+
+
+def test_consultas_cortas_por_prefijo_de_palabra():
+    """TC2: Con 1-2 caracteres se usa el índice de prefijos de palabra"""
+    indice = IndiceTexto(NOMBRES.items())
+    assert [c for c, _ in indice.buscar("pe")] == [4, 1]
+    assert indice.claves("s") == {2}
+    assert indice.claves("ce") == {5}
+    assert [c for c, _ in indice.buscar("p", limite=1)] == [4]
+
+
+def test_coincide_con_busqueda_lineal():
+    """TC3: Los resultados del índice son los mismos que un recorrido lineal normalizado"""
+    nombres = {i: f"Paradero {i} Jr. Ucayali {i % 7}" for i in range(300)}
+    indice = IndiceTexto(nombres.items())
+    for consulta in ("ucayali 3", "dero 12", "jr", "1 jr", "999"):
+        q = normalizar(consulta)
+        esperado = {i for i, n in nombres.items() if q in normalizar(n)} if len(q) >= 3 else None
+        if esperado is not None:
+            assert indice.claves(consulta) == esperado
+
+
+def test_perfil_de_paradero_por_nombre_sin_tildes(mock_db):
+    """TC4: El perfil por nombre encuentra el paradero sin distinguir tildes ni mayúsculas"""
+    paraderos = [{"id_paradero": i, "nombre": n} for i, n in NOMBRES.items()]
+    indice_paraderos = MagicMock(version=0)
+    indice_paraderos.listar.return_value = paraderos
+    mock_db.query.return_value.filter.return_value.first.return_value = SimpleNamespace(id_paradero=2)
+    mock_db.query.return_value.filter.return_value.all.return_value = []
+    mock_db.query.return_value.all.return_value = []
+
+    with patch("services.indice_texto.get_indice_paraderos", return_value=indice_paraderos), \
+         patch("services.comentario_paradero_service.get_indice_nombres", return_value=IndiceNombres()):
+        servicio = ComentarioParaderoService(mock_db)
+        perfil = servicio.obtener_paradero_perfil_nombre("plaza san martin")
+        assert perfil["paradero"].id_paradero == 2
+        with pytest.raises(HTTPException) as exc:
+            servicio.obtener_paradero_perfil_nombre("Lima")
+        assert exc.value.status_code == 404
@@ -0,0 +1,79 @@
+"""
+Tests de la ingesta de posiciones de corredores con escritura por lotes
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from services.ingesta_posiciones import IngestaPosiciones
+from services.posiciones_corredores import PosicionesCorredores
+
+
+def _fila_corredor(id_corredor, lat=None, lng=None):
+    return SimpleNamespace(id_corredor=id_corredor, ubicacion_lat=lat, ubicacion_lng=lng, estado="activo")
+
+
+@pytest.fixture
+def posiciones(mock_db):
+    """Snapshot de corredores 1 y 2 cargado desde una BD mockeada"""
+    mock_db.query.return_value.all.return_value = [_fila_corredor(1), _fila_corredor(2)]
+    snapshot = PosicionesCorredores()
+    with patch("services.ingesta_posiciones.get_posiciones_corredores", return_value=snapshot):
+        yield snapshot
+
+
+def test_pings_se_fusionan_en_un_solo_update(mock_db, posiciones):
+    """TC1: Varios pings del mismo corredor terminan en una fila de un único UPDATE ... FROM (VALUES ...)"""
+    motor = MagicMock()
+    ingesta = IngestaPosiciones(motor=motor)
+
+    resultado = ingesta.registrar_lote(mock_db, [
+        {"id_corredor": 1, "ubicacion_lat": -12.0, "ubicacion_lng": -77.0, "estado": "en ruta"},
+        {"id_corredor": 1, "ubicacion_lat": -12.1, "ubicacion_lng": -77.1},
+        {"id_corredor": 2, "ubicacion_lat": -12.2, "ubicacion_lng": -77.2, "estado": "en ruta"},
+        {"id_corredor": 99, "ubicacion_lat": 0.0, "ubicacion_lng": 0.0},
+    ])
+    assert resultado == {"aceptadas": 3, "rechazadas": [99]}
+    # La posición nueva se ve al instante en memoria, antes de escribirse
+    assert posiciones.obtener(mock_db, 1) == (-12.1, -77.1, "en ruta")
+
+    assert ingesta.vaciar() == 2
+    conn = motor.begin.return_value.__enter__.return_value
+    conn.execute.assert_called_once()
+    sentencia, params = conn.execute.call_args.args
+    assert "FROM (VALUES" in str(sentencia)
+    assert params["id0"] == 1 and params["lat0"] == -12.1 and params["estado0"] == "en ruta"
+
+    metricas = ingesta.metricas()
+    assert metricas["fusionadas"] == 1
+    assert metricas["rechazadas"] == 1
+    assert metricas["tamano_lote"]["maximo"] == 2
+    assert metricas["pendientes"] == 0
+    # Sin pendientes no se abre transacción
+    assert ingesta.vaciar() == 0
+    assert motor.begin.call_count == 1
+
+
+def test_error_al_escribir_devuelve_pendientes(mock_db, posiciones):
+    """TC2: Si el UPDATE falla, las posiciones vuelven al buffer sin pisar pings más nuevos"""
+    motor = MagicMock()
+    motor.begin.return_value.__enter__.return_value.execute.side_effect = RuntimeError("sin conexión")
+    ingesta = IngestaPosiciones(motor=motor)
+
+    ingesta.registrar(mock_db, 1, -12.0, -77.0, "en ruta")
+    assert ingesta.vaciar() == 0
+    assert ingesta.pendientes() == 1
+    assert ingesta.metricas()["errores"] == 1
+
+
+def test_recarga_no_pisa_posiciones_sin_escribir(mock_db):
+    """TC3: Al vencer el TTL, la recarga desde la BD conserva las posiciones recibidas en memoria"""
+    mock_db.query.return_value.all.return_value = [_fila_corredor(1, -11.0, -76.0), _fila_corredor(2, -11.0, -76.0)]
+    snapshot = PosicionesCorredores(ttl_s=0)
+
+    snapshot.obtener(mock_db, 1)
+    snapshot.actualizar_posicion(1, -12.0, -77.0)
+    # ttl 0: cada lectura recarga desde la BD, que todavía tiene la posición vieja
+    assert snapshot.obtener(mock_db, 1)[:2] == (-12.0, -77.0)
+    assert snapshot.obtener(mock_db, 2)[:2] == (-11.0, -76.0)
@@ -0,0 +1,152 @@
+"""
+Tests del envío multicast por bloques y la limpieza de tokens FCM inválidos
+"""
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+from firebase_admin import exceptions, messaging
+from sqlalchemy import create_engine, select
+
+import config.firebase as firebase
+from config.firebase import MAX_TOKENS_MULTICAST, get_firebase_admin
+from models.NotificacionOutbox import NotificacionOutbox
+from models.UsuarioBase import UsuarioBase
+from services.despacho_notificaciones import DespachadorNotificaciones, TransporteFirebase, encolar, notificacion
+from services.tokens_fcm import LimpiezaTokensFcm
+
+
+def _respuesta_fcm(hilos, solapados=0):
+    """
+    send_each_for_multicast falso: 'muerto-*' no registrado, 'caido-*' no disponible.
+    Los primeros `solapados` bloques se esperan entre sí: solo pasan si corren a la vez.
+    """
+    barrera = threading.Barrier(solapados) if solapados else None
+    llegadas = iter(range(solapados))
+    lock = threading.Lock()
+
+    def enviar(mensaje):
+        hilos.add(threading.current_thread().name)
+        with lock:
+            esperar = next(llegadas, None) is not None
+        if esperar:
+            barrera.wait(timeout=5)  # BrokenBarrierError si los bloques no se solapan
+        respuestas = []
+        for token in mensaje.tokens:
+            if token.startswith("muerto"):
+                respuestas.append(messaging.SendResponse(None, messaging.UnregisteredError("not registered")))
+            elif token.startswith("caido"):
+                respuestas.append(messaging.SendResponse(None, exceptions.UnavailableError("unavailable")))
+            else:
+                respuestas.append(messaging.SendResponse({"name": f"mensaje/{token}"}, None))
+        assert len(mensaje.tokens) <= MAX_TOKENS_MULTICAST
+        return messaging.BatchResponse(respuestas)
+    return enviar
+
+
+@pytest.fixture
+def sin_credenciales(monkeypatch):
+    """El SDK no se inicializa (los envíos van a send_each_for_multicast parcheado)"""
+    monkeypatch.setattr(firebase.FirebaseAdmin, "_inicializar", lambda self: None)
+
+
+def test_bloques_en_paralelo_y_tokens_invalidos(monkeypatch, sin_credenciales):
+    """TC1: Los tokens se deduplican y parten en bloques de 500 enviados en paralelo; los muertos van a la limpieza"""
+    limpiados = []
+    monkeypatch.setattr(firebase, "_limpiezas_tokens", [limpiados.extend])
+    tokens = [f"ok-{i}" for i in range(1190)] + ["muerto-1", "muerto-2", "caido-1", "", "ok-1"]
+    hilos = set()
+    with patch.object(messaging, "send_each_for_multicast", side_effect=_respuesta_fcm(hilos, solapados=2)) as envio:
+        stats = get_firebase_admin().send_multicast(title="t", body="b", tokens=tokens)
+
+    assert envio.call_count == 3
+    assert len(hilos) > 1
+    assert stats["total"] == 1193 and stats["bloques"] == 3
+    assert stats["successful"] == 1190 and stats["failed"] == 3
+    assert stats["tokens_invalidos"] == ["muerto-1", "muerto-2"]
+    assert stats["tokens_reintentables"] == ["caido-1"]
+    assert limpiados == ["muerto-1", "muerto-2"]
+
+
+def test_limpieza_borra_tokens_de_usuario_base(tmp_path):
+    """TC2: Los tokens inválidos se borran de usuario_base en una sola transacción"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'usuarios.db'}",
+                           execution_options={"schema_translate_map": {"public": None}})
+    UsuarioBase.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(UsuarioBase.__table__.insert(), [
+            {"id_usuario": i, "nombre": f"u{i}", "correo": f"u{i}@x.pe", "contrasena": "x", "fcm_token": t}
+            for i, t in enumerate(["muerto-1", "vivo", "muerto-2", None], start=1)
+        ])
+
+    limpieza = LimpiezaTokensFcm(motor=engine)
+    assert limpieza.limpiar(["muerto-1", "muerto-2", "muerto-1"]) == 2
+    with engine.connect() as conn:
+        assert conn.execute(select(UsuarioBase.fcm_token).order_by(UsuarioBase.id_usuario)).scalars().all() == \
+            [None, "vivo", None, None]
+    assert limpieza.metricas() == {"tokens_recibidos": 2, "usuarios_limpiados": 2}
+
+
+def test_reintento_solo_a_tokens_con_fallo_transitorio(tmp_path, monkeypatch, sin_credenciales):
+    """TC3: Si quedan tokens con fallo transitorio, la notificación se reintenta solo a esos tokens"""
+    monkeypatch.setattr(firebase, "_limpiezas_tokens", [])
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}",
+                           execution_options={"schema_translate_map": {"public": None}})
+    NotificacionOutbox.__table__.create(engine)
+    with engine.begin() as conn:
+        encolar(conn, [notificacion("Desvío", "ruta 101", tokens=["ok-1", "caido-1", "muerto-1"])])
+
+    despachador = DespachadorNotificaciones(motor=engine, transporte=TransporteFirebase())
+    with patch.object(messaging, "send_each_for_multicast", side_effect=_respuesta_fcm(set())):
+        despachador.despachar()
+    with engine.connect() as conn:
+        fila = conn.execute(select(NotificacionOutbox.estado, NotificacionOutbox.tokens)).one()
+    assert fila == ("pendiente", ["caido-1"])
+
+
+def test_inicializacion_perezosa(monkeypatch):
+    """TC4: Importar config.firebase no carga el SDK; el primer envío lo inicializa una sola vez"""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    codigo = "import sys, config.firebase; print('firebase_admin' in sys.modules)"
+    importado = subprocess.run([sys.executable, "-c", codigo], cwd=Path(__file__).parent.parent,
+                               capture_output=True, text=True, check=True)
+    assert importado.stdout.strip() == "False"
+
+    monkeypatch.setenv("FIREBASE_PROJECT_ID", "demo")
+    monkeypatch.setenv("FIREBASE_PRIVATE_KEY", "clave")
+    monkeypatch.setattr(credentials, "Certificate", lambda datos: datos)
+    inicializar = MagicMock(return_value="app")
+    monkeypatch.setattr(firebase_admin, "initialize_app", inicializar)
+    monkeypatch.setattr(firebase.FirebaseAdmin, "_instance", None)
+
+    admin = firebase.FirebaseAdmin()
+    assert not admin.inicializado
+    with patch.object(messaging, "send_each_for_multicast", side_effect=_respuesta_fcm(set())):
+        admin.send_multicast(title="t", body="b", tokens=["ok-1"])
+        admin.send_multicast(title="t", body="b", tokens=["ok-2"])
+    inicializar.assert_called_once()
+    assert admin.get_app() == "app"
+
+
+def test_sin_tokens_y_fallos_de_bloque_no_transitorios(monkeypatch, sin_credenciales):
+    """TC5: Sin tokens no se inicializa el SDK; un bloque que falla por credenciales no se reintenta"""
+    monkeypatch.setattr(firebase, "_limpiezas_tokens", [])
+    inicializar = MagicMock()
+    monkeypatch.setattr(firebase.FirebaseAdmin, "_inicializar", inicializar)
+    admin = get_firebase_admin()
+
+    stats = admin.send_multicast(title="t", body="b", tokens=["", None])
+    assert stats["total"] == 0 and stats["bloques"] == 0 and stats["tokens_reintentables"] == []
+    inicializar.assert_not_called()
+
+    fallos = [exceptions.PermissionDeniedError("credenciales inválidas"), exceptions.UnavailableError("unavailable")]
+    with patch.object(messaging, "send_each_for_multicast", side_effect=fallos):
+        negado = admin.send_multicast(title="t", body="b", tokens=["ok-1"])
+        caido = admin.send_multicast(title="t", body="b", tokens=["ok-2"])
+    assert negado["failed"] == 1 and negado["tokens_reintentables"] == []
+    assert caido["tokens_reintentables"] == ["ok-2"]
@@ -0,0 +1,56 @@
+"""
+Tests de la configuración del pool de conexiones y sus métricas
+"""
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from config.pool import PoolMedido, PoolMedidoAsync, metricas_pools, modo_pooler, opciones_engine, preparar_engine
+
+
+def test_opciones_desde_entorno():
+    """TC1: Tamaño, overflow, recycle y pre-ping salen del entorno; en sesión el timeout va como parámetro de arranque"""
+    entorno = {"DB_POOL_SIZE": "3", "DB_MAX_OVERFLOW": "2", "DB_POOL_RECYCLE_S": "120",
+               "DB_POOL_PRE_PING": "false", "DB_STATEMENT_TIMEOUT_MS": "5000", "DB_PORT": "5432"}
+    opciones = opciones_engine(entorno=entorno)
+    assert opciones["poolclass"] is PoolMedido
+    assert (opciones["pool_size"], opciones["max_overflow"], opciones["pool_recycle"]) == (3, 2, 120)
+    assert opciones["pool_pre_ping"] is False
+    assert opciones["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+
+def test_modo_transaccion_sin_sentencias_preparadas():
+    """TC2: El puerto 6543 implica modo transacción: asyncpg sin caché de sentencias ni parámetros de arranque"""
+    entorno = {"DB_PORT": "6543", "DB_STATEMENT_TIMEOUT_MS": "5000"}
+    assert modo_pooler(entorno) == "transaccion"
+    assert modo_pooler({"DB_PORT": "6543", "DB_POOLER_MODE": "session"}) == "sesion"
+    opciones = opciones_engine(asincrono=True, entorno=entorno)
+    assert opciones["poolclass"] is PoolMedidoAsync
+    assert opciones["connect_args"]["statement_cache_size"] == 0
+    assert opciones["connect_args"]["prepared_statement_cache_size"] == 0
+    assert "server_settings" not in opciones["connect_args"]
+    with pytest.raises(ValueError):
+        modo_pooler({"DB_POOLER_MODE": "otro"})
+
+
+def test_metricas_de_checkout_y_timeout(tmp_path):
+    """TC3: Se cuentan checkouts, conexiones en uso, utilización y timeouts por pool agotado"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=PoolMedido,
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    preparar_engine("prueba", engine, entorno={})
+    with engine.connect() as conexion:
+        conexion.execute(text("select 1"))
+        metricas = metricas_pools()["prueba"]
+        assert metricas["en_uso"] == 1
+        assert metricas["utilizacion"] == 1.0
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    metricas = metricas_pools()["prueba"]
+    assert metricas["checkouts"] == 1
+    assert metricas["timeouts"] == 1
+    assert metricas["en_uso"] == 0
+    assert metricas["espera_ms"]["p50"] is not None
+
+    engine.dispose()
+    with engine.connect():
+        pass
+    assert metricas_pools()["prueba"]["checkouts"] == 2
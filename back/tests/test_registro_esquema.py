@@ -0,0 +1,71 @@
+"""
+Tests del registro de esquema (reflexión única) y benchmark de inserción de reportes
+"""
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from config.esquema import get_registro_esquema
+from models.ResumenReporteDia import ResumenReporteDia
+from services.DiagramaClases.reporte_service import ReporteService
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture
+def engine_reportes(tmp_path):
+    """SQLite con una tabla reporte equivalente (sin claves foráneas) y el resumen diario"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'reportes.db'}",
+                           execution_options={"schema_translate_map": {"public": None}})
+    ResumenReporteDia.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE reporte (id_reporte INTEGER PRIMARY KEY AUTOINCREMENT, fecha TIMESTAMP, "
+            "descripcion TEXT, id_emisor INTEGER, id_tipo_reporte INTEGER, id_corredor_afectado INTEGER, "
+            "id_ruta_afectada INTEGER, id_paradero_inicial INTEGER, id_paradero_final INTEGER, "
+            "tiempo_retraso_min INTEGER)"
+        ))
+    yield engine
+    get_registro_esquema().invalidar(engine)
+    engine.dispose()
+
+
+def _registro():
+    return {"id_tipo_reporte": 2, "id_emisor": 1, "id_ruta_afectada": 3, "tiempo_retraso_min": 5,
+            "descripcion": "Retraso", "mensaje": "no es columna"}
+
+
+def test_tabla_se_refleja_una_sola_vez(engine_reportes):
+    """TC1: Varias inserciones reflejan la tabla una vez; invalidar obliga a reflejar de nuevo"""
+    registro = get_registro_esquema()
+    servicio = ReporteService(engine=engine_reportes, paradero_service=MagicMock())
+    antes = registro.reflexiones
+
+    for _ in range(5):
+        guardado = servicio.save_report(_registro())
+    assert guardado["tiempo_retraso_min"] == 5
+    assert registro.reflexiones == antes + 1
+
+    registro.invalidar(engine_reportes)
+    servicio.save_report(_registro())
+    assert registro.reflexiones == antes + 2
+
+
+@pytest.mark.benchmark(group="insercion_reporte")
+def test_benchmark_insercion_reporte_con_registro(benchmark, engine_reportes):
+    """Benchmark: save_report con la tabla en caché (comportamiento actual)"""
+    servicio = ReporteService(engine=engine_reportes, paradero_service=MagicMock())
+    benchmark.pedantic(servicio.save_report, args=(_registro(),), rounds=50, warmup_rounds=1)
+
+
+@pytest.mark.benchmark(group="insercion_reporte")
+def test_benchmark_insercion_reporte_reflejando_por_llamada(benchmark, engine_reportes):
+    """Benchmark: save_report reflejando la tabla en cada llamada (comportamiento anterior)"""
+    servicio = ReporteService(engine=engine_reportes, paradero_service=MagicMock())
+
+    def reflejar_e_insertar():
+        get_registro_esquema().invalidar(engine_reportes)
+        servicio.save_report(_registro())
+
+    benchmark.pedantic(reflejar_e_insertar, rounds=50, warmup_rounds=1)
@@ -0,0 +1,119 @@
+"""
+Tests del enrutamiento de lecturas a la réplica y su límite de retraso
+"""
+from unittest.mock import MagicMock
+
+from sqlalchemy import Column, Integer, String, create_engine, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from config.replica import MonitorReplica, SesionEnrutada
+
+BaseLocal = declarative_base()
+
+
+class Nota(BaseLocal):
+    __tablename__ = "nota"
+    id = Column(Integer, primary_key=True)
+    texto = Column(String)
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 100.0
+
+    def __call__(self):
+        return self.t
+
+
+def _replica_con_retraso(retraso):
+    replica = MagicMock()
+    conexion = replica.connect.return_value.__enter__.return_value
+    if isinstance(retraso, Exception):
+        conexion.execute.side_effect = retraso
+    else:
+        conexion.execute.return_value.scalar.return_value = retraso
+    return replica
+
+
+def test_limite_de_retraso():
+    """TC1: La réplica se usa solo con una verificación reciente y un retraso dentro del límite"""
+    reloj = Reloj()
+    primario = object()
+    monitor = MonitorReplica(_replica_con_retraso(2.0), max_retraso_s=5, intervalo_s=1, reloj=reloj)
+    assert monitor.engine_lectura(primario) is primario  # aún sin verificar
+    monitor.verificar()
+    assert monitor.engine_lectura(primario) is monitor.replica
+
+    reloj.t += 10  # verificación vieja
+    assert monitor.engine_lectura(primario) is primario
+
+    atrasado = MonitorReplica(_replica_con_retraso(30.0), max_retraso_s=5, reloj=reloj)
+    atrasado.verificar()
+    assert not atrasado.disponible()
+
+    caida = MonitorReplica(_replica_con_retraso(OperationalError("x", {}, Exception())), reloj=reloj)
+    assert caida.verificar() is None
+    assert caida.errores == 1 and not caida.disponible()
+    assert not MonitorReplica(None).disponible()
+
+
+def test_sesion_lee_de_replica_y_escribe_en_primario(tmp_path):
+    """TC2: La sesión enrutada lee de la réplica y, una vez que escribe, usa el primario"""
+    primario = create_engine(f"sqlite:///{tmp_path / 'primario.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for engine in (primario, replica):
+        Nota.__table__.create(engine)
+    with replica.begin() as conexion:
+        conexion.execute(Nota.__table__.insert().values(id=1, texto="en réplica"))
+
+    monitor = MonitorReplica(replica, max_retraso_s=5)
+    monitor.retraso_s, monitor._verificado_en = 0.0, monitor._reloj()
+
+    class Sesion(SesionEnrutada):
+        pass
+
+    Sesion.primario, Sesion.replica, Sesion.monitor = primario, replica, monitor
+    with sessionmaker(class_=Sesion)() as db:
+        assert db.scalars(select(Nota.texto)).all() == ["en réplica"]
+        db.add(Nota(id=2, texto="nueva"))
+        db.commit()
+        # Después de escribir lee del primario (ve su propia escritura)
+        assert db.scalars(select(Nota.texto)).all() == ["nueva"]
+    assert monitor.lecturas_replica == 1
+
+    monitor.retraso_s = 60.0
+    with sessionmaker(class_=Sesion)() as db:
+        assert db.scalars(select(Nota.texto)).all() == ["nueva"]
+    assert monitor.lecturas_primario == 1
+
+
+def test_caches_se_cargan_del_primario(tmp_path, monkeypatch):
+    """TC3: Una caché compartida consultada con una sesión de lectura se carga del primario, no de la réplica"""
+    import config.db
+    from models.Paradero import Paradero
+    from services.indice_espacial import IndiceParaderos
+
+    opciones = {"schema_translate_map": {"public": None}}
+    primario = create_engine(f"sqlite:///{tmp_path / 'primario.db'}", execution_options=opciones)
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}", execution_options=opciones)
+    for engine, nombre in ((primario, "Renombrado"), (replica, "Nombre viejo")):
+        Paradero.__table__.create(engine)
+        with engine.begin() as conexion:
+            conexion.execute(Paradero.__table__.insert().values(
+                id_paradero=1, nombre=nombre, coordenada_lat=-12.0, coordenada_lng=-77.0
+            ))
+
+    monitor = MonitorReplica(replica, max_retraso_s=5)
+    monitor.retraso_s, monitor._verificado_en = 0.0, monitor._reloj()
+
+    class Sesion(SesionEnrutada):
+        pass
+
+    Sesion.primario, Sesion.replica, Sesion.monitor = primario, replica, monitor
+    monkeypatch.setattr(config.db, "SessionLocal", sessionmaker(bind=primario))
+    with sessionmaker(class_=Sesion)() as db:
+        assert IndiceParaderos().obtener(db, 1)["nombre"] == "Renombrado"
+    assert monitor.lecturas_replica == 0
+    primario.dispose()
+    replica.dispose()
@@ -0,0 +1,87 @@
+"""
+Tests del resumen diario de reportes que alimenta el dashboard
+"""
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from config.esquema import get_registro_esquema
+from models.ResumenReporteDia import ResumenReporteDia
+from services import resumen_reportes
+from services.DiagramaClases.reporte_service import ReporteService
+from services.dashboard_service import DashboardService
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dashboard.db'}",
+                           execution_options={"schema_translate_map": {"public": None}})
+    ResumenReporteDia.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE reporte (id_reporte INTEGER PRIMARY KEY AUTOINCREMENT, fecha TIMESTAMP, "
+            "descripcion TEXT, id_emisor INTEGER, id_tipo_reporte INTEGER, id_corredor_afectado INTEGER, "
+            "id_ruta_afectada INTEGER, id_paradero_inicial INTEGER, id_paradero_final INTEGER, "
+            "tiempo_retraso_min INTEGER)"
+        ))
+    yield engine
+    get_registro_esquema().invalidar(engine)
+    engine.dispose()
+
+
+def _filas(engine):
+    with engine.connect() as conn:
+        return sorted(tuple(f) for f in conn.execute(select(ResumenReporteDia.__table__)))
+
+
+def test_insercion_actualiza_resumen_y_dashboard(engine):
+    """TC1: Cada save_report suma al resumen en la misma transacción y el dashboard sale del resumen"""
+    servicio = ReporteService(engine=engine, paradero_service=MagicMock())
+    hoy = datetime.utcnow()
+    for fecha, tipo, ruta in [(hoy, 2, 3), (hoy, 2, 3), (hoy, 2, None), (hoy - timedelta(days=2), 2, 3),
+                              (hoy, 1, None), (hoy - timedelta(days=40), 1, None)]:
+        servicio.save_report({"fecha": fecha, "id_tipo_reporte": tipo, "id_ruta_afectada": ruta, "id_emisor": 1})
+
+    assert (2, hoy.date(), 0, 3, 2) in _filas(engine)
+    assert (2, hoy.date(), 0, 0, 1) in _filas(engine)
+
+    with Session(engine) as db:
+        dashboard = DashboardService(db).getDashboard(dias_serie=5)
+    assert dashboard["numero_fallas"] == 2
+    assert dashboard["numero_desvios"] == 0
+    if hoy.date() == datetime.now().date():  # el dashboard cuenta los días desde la fecha local
+        assert dashboard["retrasos_dia_valor"] == [3, 0, 1, 0, 0]
+
+
+def test_reconstruir_coincide_con_incremental(engine):
+    """TC2: El backfill desde reporte produce las mismas filas que las inserciones incrementales"""
+    servicio = ReporteService(engine=engine, paradero_service=MagicMock())
+    base = datetime(2025, 3, 10, 12)
+    for i in range(12):
+        servicio.save_report({"fecha": base - timedelta(days=i % 4), "id_tipo_reporte": 1 + i % 3,
+                              "id_corredor_afectado": i % 2 or None, "id_emisor": 1})
+    incremental = _filas(engine)
+
+    with engine.begin() as conn:
+        conn.execute(ResumenReporteDia.__table__.delete())
+        assert resumen_reportes.reconstruir(conn) == len(incremental)
+    assert _filas(engine) == incremental
+
+    with engine.begin() as conn:
+        resumen_reportes.reconstruir(conn, desde=(base - timedelta(days=1)).date())
+    assert _filas(engine) == incremental
+
+
+def test_resumen_vacio_se_rellena_al_arrancar(engine):
+    """TC3: Con el resumen vacío y reportes históricos, el arranque lo rellena una sola vez"""
+    with engine.begin() as conn:
+        for dia in (1, 1, 2):
+            conn.execute(text("INSERT INTO reporte (fecha, id_tipo_reporte, id_emisor) VALUES (:f, 1, 1)"),
+                         {"f": datetime(2025, 3, dia, 12)})
+
+    assert resumen_reportes.rellenar_si_vacio(engine) == 2
+    assert [(f[1].day, f[4]) for f in _filas(engine)] == [(1, 2), (2, 1)]
+    assert resumen_reportes.rellenar_si_vacio(engine) is None
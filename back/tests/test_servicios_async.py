@@ -0,0 +1,98 @@
+"""
+Tests de los servicios async (AsyncSession) frente a sus versiones sync
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table
+
+from services.dashboard_service import DashboardService
+from services.dashboard_service_async import DashboardServiceAsync
+from services.DiagramaClases.reporte_service import ReporteService
+from services.DiagramaClases.reporte_service_async import ReporteServiceAsync
+
+pytestmark = pytest.mark.asyncio
+
+
+def _tabla_reporte():
+    return Table(
+        "reporte", MetaData(),
+        Column("id_reporte", Integer, primary_key=True),
+        Column("fecha", DateTime),
+        Column("descripcion", String),
+        Column("id_emisor", Integer),
+        Column("id_tipo_reporte", Integer),
+        Column("id_corredor_afectado", Integer),
+        Column("id_ruta_afectada", Integer),
+        Column("id_paradero_inicial", Integer),
+        Column("id_paradero_final", Integer),
+        Column("tiempo_retraso_min", Integer),
+    )
+
+
+def _resultado(first=None, scalar=None, all_=None, mapping=None):
+    res = MagicMock()
+    res.first.return_value = first
+    res.scalar.return_value = scalar
+    res.all.return_value = all_ or []
+    res.mappings.return_value.first.return_value = mapping
+    return res
+
+
+@pytest.fixture
+def base():
+    servicio = ReporteService(engine=MagicMock(), paradero_service=MagicMock())
+    tabla = _tabla_reporte()
+    servicio._reflect_table = MagicMock(return_value=tabla)
+    return servicio
+
+
+async def test_retraso_async_inserta_y_confirma(base):
+    """TC1: crear_reporte_retraso busca el corredor del conductor, inserta el mismo record que la versión sync y hace commit"""
+    db = AsyncMock()
+    fila = {"id_reporte": 10, "id_emisor": 2, "id_tipo_reporte": 2}
+    db.execute.side_effect = [
+        _resultado(first=SimpleNamespace(id_corredor_asignado=7)),
+        _resultado(mapping=fila),
+    ]
+    payload = {
+        "id_reporte": None, "id_emisor": 2, "conductor_id": 2, "id_tipo_reporte": 2, "ruta_id": 1,
+        "paradero_inicial_id": 3, "paradero_final_id": 4, "tiempo_retraso_min": 5, "descripcion": "Tráfico",
+    }
+
+    assert await ReporteServiceAsync(db, base).crear_reporte_retraso(payload) == fila
+    insert = db.execute.await_args_list[1].args[0]
+    assert insert.table.name == "reporte"
+    assert set(insert.compile().params) >= {"id_emisor", "id_ruta_afectada", "tiempo_retraso_min", "fecha"}
+    db.commit.assert_awaited_once()
+
+
+async def test_retraso_async_conductor_inexistente(base):
+    """TC2: Un conductor inexistente o sin corredor da ValueError sin insertar"""
+    db = AsyncMock()
+    db.execute.return_value = _resultado(first=None)
+    with pytest.raises(ValueError, match="no existe"):
+        await ReporteServiceAsync(db, base).crear_reporte_retraso({"id_emisor": 99})
+
+    db.execute.return_value = _resultado(first=SimpleNamespace(id_corredor_asignado=None))
+    with pytest.raises(ValueError, match="corredor asignado"):
+        await ReporteServiceAsync(db, base).crear_reporte_falla({"id_emisor": 2})
+    db.commit.assert_not_awaited()
+
+
+async def test_dashboard_async_igual_que_sync():
+    """TC3: El dashboard async arma la misma respuesta que el sync con los mismos datos"""
+    hoy = datetime.now().date()
+    filas = [SimpleNamespace(dia=hoy, total=3), SimpleNamespace(dia=hoy - timedelta(days=2), total=1)]
+
+    db_async = AsyncMock()
+    db_async.execute.side_effect = [_resultado(scalar=4), _resultado(scalar=None), _resultado(all_=filas)]
+    db_sync = MagicMock()
+    db_sync.execute.side_effect = [_resultado(scalar=4), _resultado(scalar=None), _resultado(all_=filas)]
+
+    esperado = DashboardService(db_sync).getDashboard(dias_serie=5)
+    assert await DashboardServiceAsync(db_async).getDashboard(dias_serie=5) == esperado
+    assert esperado["numero_desvios"] == 0
+    assert esperado["retrasos_dia_valor"] == [3, 0, 1, 0, 0]
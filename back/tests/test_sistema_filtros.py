@@ -0,0 +1,88 @@
+"""
+Tests del orden por costo, el corte temprano y el empuje a SQL de SistemaFiltros
+"""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.Ruta import Ruta
+from services.DiagramaClases.EstrategiaFiltroRuta import EstrategiaFiltroRuta
+from services.DiagramaClases.FiltroRuta import FiltroRuta
+from services.DiagramaClases.SistemaFiltros import SistemaFiltros
+from services.DiagramaClases.ruta_service import RutaService
+
+
+class FiltroContado(EstrategiaFiltroRuta):
+    """Estrategia de prueba: deja pasar las rutas con id en `ids` y cuenta sus llamadas"""
+
+    def __init__(self, ids, costo, selectividad):
+        self.ids, self.costo, self.selectividad = ids, costo, selectividad
+        self.llamadas = 0
+
+    def filtrar(self, rutas):
+        self.llamadas += 1
+        return [r for r in rutas if r.id_ruta in self.ids]
+
+
+def _rutas(n):
+    return [SimpleNamespace(id_ruta=i, nombre=f"Ruta {i}", paraderos=[]) for i in range(n)]
+
+
+def test_ordena_por_costo_y_selectividad():
+    """TC1: La estrategia cara se ejecuta al final aunque se haya agregado primero"""
+    cara = FiltroContado(set(range(50)), costo=10.0, selectividad=0.5)
+    barata = FiltroContado({1, 2, 3, 70}, costo=0.1, selectividad=0.05)
+    sistema = SistemaFiltros()
+    sistema.agregar_estrategia(cara)
+    sistema.agregar_estrategia(barata)
+
+    assert sistema.estrategias_ordenadas() == [barata, cara]
+    resultado = sistema.aplicar_filtros(_rutas(100))
+
+    assert [r.id_ruta for r in resultado] == [1, 2, 3]
+    assert [(p["entrada"], p["salida"]) for p in sistema.pasos] == [(100, 4), (4, 3)]
+    assert all(p["ms"] >= 0 for p in sistema.pasos)
+
+
+def test_corta_cuando_no_quedan_rutas():
+    """TC2: Si una estrategia deja la lista vacía, las siguientes no se ejecutan"""
+    vacia = FiltroContado(set(), costo=0.1, selectividad=0.01)
+    cara = FiltroContado(set(range(10)), costo=10.0, selectividad=0.5)
+    sistema = SistemaFiltros()
+    sistema.agregar_estrategia(cara)
+    sistema.agregar_estrategia(vacia)
+
+    assert sistema.aplicar_filtros(_rutas(10)) == []
+    assert cara.llamadas == 0
+    assert sistema.pasos[-1]["omitida"] is True
+
+
+@pytest.fixture
+def sesion():
+    """Sesión SQLite en memoria con la tabla ruta; se cierra y libera el engine al terminar"""
+    engine = create_engine("sqlite://", execution_options={"schema_translate_map": {"public": None}})
+    Ruta.__table__.create(engine)
+    sesion = sessionmaker(bind=engine)()
+    yield sesion
+    sesion.close()
+    engine.dispose()
+
+
+def test_filtro_por_nombre_se_resuelve_en_sql(sesion):
+    """TC3: FiltroRuta se aplica en la consulta (ILIKE, con comodines escapados) y no se repite en memoria"""
+    sesion.add_all([Ruta(nombre=n) for n in ("Expreso 10", "Alimentador Norte", "EXPRESO 1_A", "Expreso 100%")])
+    sesion.commit()
+
+    servicio = RutaService(sesion)
+    assert [r["nombre"] for r in servicio.get_rutas("expreso 1")] == ["Expreso 10", "EXPRESO 1_A", "Expreso 100%"]
+    assert [r["nombre"] for r in servicio.get_rutas("1_")] == ["EXPRESO 1_A"]
+    assert [r["nombre"] for r in servicio.get_rutas("0%")] == ["Expreso 100%"]
+    assert len(servicio.get_rutas()) == 4
+
+    sistema = SistemaFiltros()
+    sistema.agregar_estrategia(FiltroRuta("norte"))
+    consulta = sistema.aplicar_a_consulta(sesion.query(Ruta.id_ruta, Ruta.nombre))
+    assert [r.nombre for r in sistema.aplicar_filtros(consulta.all())] == ["Alimentador Norte"]
+    assert [p["en_sql"] for p in sistema.pasos] == [True]
@@ -0,0 +1,104 @@
+"""
+Tests del snapshot versionado de la red con ETag / If-None-Match
+"""
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from config.eventos import al_confirmar_cambios, notificar_cambios_externos
+from models.Corredor import Corredor
+from models.Paradero import Paradero
+from services.snapshot_red import SnapshotRed
+
+
+@pytest.fixture
+def app_con_snapshot():
+    """App mínima con un endpoint servido desde el snapshot"""
+    snapshot = SnapshotRed()
+    construir = MagicMock(return_value=[{"id_ruta": 1, "nombre": "Ruta Ñ"}])
+    app = FastAPI()
+
+    @app.get("/rutas")
+    def rutas(request: Request):
+        return snapshot.respuesta(request, "rutas", construir)
+
+    return TestClient(app), snapshot, construir
+
+
+def test_if_none_match_devuelve_304_sin_reconstruir(app_con_snapshot):
+    """TC1: Con el ETag vigente se responde 304 y la respuesta no se vuelve a construir"""
+    cliente, _, construir = app_con_snapshot
+
+    primera = cliente.get("/rutas")
+    assert primera.status_code == 200
+    assert primera.json() == [{"id_ruta": 1, "nombre": "Ruta Ñ"}]
+    etag = primera.headers["etag"]
+
+    segunda = cliente.get("/rutas", headers={"If-None-Match": etag})
+    assert segunda.status_code == 304
+    assert segunda.content == b""
+    assert cliente.get("/rutas", headers={"If-None-Match": f'"otro", W/{etag}'}).status_code == 304
+    assert construir.call_count == 1
+
+
+def test_nueva_version_reconstruye_y_cambia_etag(app_con_snapshot):
+    """TC2: Al subir la versión se reconstruye; el ETag solo cambia si cambió el contenido"""
+    cliente, snapshot, construir = app_con_snapshot
+    etag = cliente.get("/rutas").headers["etag"]
+
+    snapshot.invalidar()
+    assert cliente.get("/rutas", headers={"If-None-Match": etag}).status_code == 304
+    assert construir.call_count == 2
+
+    construir.return_value = [{"id_ruta": 1, "nombre": "Ruta renombrada"}]
+    snapshot.invalidar()
+    respuesta = cliente.get("/rutas", headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert respuesta.headers["etag"] != etag
+
+
+def test_caducidad_reconstruye_sin_cambiar_etag(app_con_snapshot):
+    """TC3: Un aviso de cambios externos reconstruye la respuesta; si no cambió, el ETag se mantiene"""
+    cliente, snapshot, construir = app_con_snapshot
+    al_confirmar_cambios((Paradero,), snapshot.aplicar_cambios)
+    etag = cliente.get("/rutas").headers["etag"]
+
+    notificar_cambios_externos((Paradero,))
+    assert snapshot.version == 1
+    assert cliente.get("/rutas", headers={"If-None-Match": etag}).status_code == 304
+    assert construir.call_count == 2
+
+
+@pytest.fixture
+def sesion():
+    """Sesión SQLite en memoria con paradero y corredor; se cierra y libera el engine al terminar"""
+    engine = create_engine("sqlite://", execution_options={"schema_translate_map": {"public": None}})
+    Paradero.__table__.create(engine)
+    Corredor.__table__.create(engine)
+    sesion = sessionmaker(bind=engine)()
+    yield sesion
+    sesion.close()
+    engine.dispose()
+
+
+def test_version_sube_con_cambios_de_red_y_no_con_posiciones(sesion):
+    """TC4: Commits sobre paraderos suben la versión; mover un corredor no"""
+    snapshot = SnapshotRed()
+    al_confirmar_cambios((Paradero, Corredor), snapshot.aplicar_cambios)
+
+    sesion.add(Corredor(id_corredor=1, ubicacion_lat=-12.0, ubicacion_lng=-77.0))
+    sesion.commit()
+    assert snapshot.version == 1  # alta de corredor
+
+    corredor = sesion.get(Corredor, 1)
+    corredor.ubicacion_lat = -12.1
+    sesion.commit()
+    assert snapshot.version == 1
+
+    sesion.add(Paradero(id_paradero=1, nombre="Central", coordenada_lat=-12.05, coordenada_lng=-77.04))
+    sesion.commit()
+    assert snapshot.version == 2
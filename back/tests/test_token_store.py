@@ -0,0 +1,52 @@
+"""
+Tests de los almacenes de tokens de ubicación compartida
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+from services.token_store import MemoriaTokenStore, SqlTokenStore
+
+
+@pytest.fixture(params=["memoria", "sql"])
+def store(request, tmp_path):
+    """Cada test corre contra el almacén en memoria y contra el SQL (sqlite local)"""
+    if request.param == "memoria":
+        return MemoriaTokenStore()
+    return SqlTokenStore(create_engine(f"sqlite:///{tmp_path / 'tokens.db'}"))
+
+
+def test_guardar_obtener_y_desactivar(store):
+    """TC1: Un token guardado se lee con sus datos y se puede desactivar"""
+    expira = datetime.utcnow() + timedelta(hours=3)
+    store.guardar("abc", 42, expira)
+
+    datos = store.obtener("abc")
+    assert datos["usuario_id"] == 42
+    assert datos["is_active"] is True
+
+    assert store.desactivar("abc") is True
+    assert store.obtener("abc")["is_active"] is False
+    assert store.desactivar("no-existe") is False
+    assert store.obtener("no-existe") is None
+
+
+def test_purgar_solo_elimina_expirados(store):
+    """TC2: La limpieza borra solo los tokens vencidos"""
+    ahora = datetime.utcnow()
+    for i, horas in enumerate([-2, 1, -1, 3]):
+        store.guardar(f"t{i}", i, ahora + timedelta(hours=horas))
+
+    assert store.purgar_expirados(ahora) == 2
+    assert store.obtener("t0") is None and store.obtener("t2") is None
+    assert store.obtener("t1") is not None and store.obtener("t3") is not None
+    assert store.purgar_expirados(ahora) == 0
+
+
+def test_sql_sobrevive_a_nueva_instancia(tmp_path):
+    """TC3: Con el almacén SQL otro worker (otra instancia) ve los mismos tokens"""
+    url = f"sqlite:///{tmp_path / 'tokens.db'}"
+    SqlTokenStore(create_engine(url)).guardar("abc", 7, datetime.utcnow() + timedelta(hours=1))
+
+    assert SqlTokenStore(create_engine(url)).obtener("abc")["usuario_id"] == 7
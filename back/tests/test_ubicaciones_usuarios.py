@@ -0,0 +1,146 @@
+"""
+Tests de la caché de última ubicación de usuarios y su uso en el filtro por distancia
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from services.DiagramaClases.ruta_service import RutaService
+from services.ubicaciones_usuarios import UbicacionesUsuarios
+from services.usuario_service import UsuarioService
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def reloj():
+    return Reloj()
+
+
+def test_ttl_y_antiguedad(reloj):
+    """TC1: La ubicación se informa con su edad y desaparece al superar el TTL"""
+    cache = UbicacionesUsuarios(ttl_s=300, reloj=reloj)
+    cache.registrar(7, -12.05, -77.04)
+    reloj.t += 120
+
+    ubicacion = cache.obtener(7)
+    assert (ubicacion["lat"], ubicacion["lng"], ubicacion["edad_s"]) == (-12.05, -77.04, 120)
+    assert cache.obtener(7, max_edad_s=60) is None   # más vieja de lo pedido, pero se conserva
+    assert cache.obtener(7) is not None
+
+    reloj.t += 200
+    assert cache.obtener(7) is None
+    assert len(cache) == 0
+    assert cache.metricas()["vencidas"] == 2
+
+
+def test_persistencia_espaciada(reloj):
+    """TC2: Por defecto cada ubicación se escribe en la BD; espaciar las escrituras es opcional"""
+    cache = UbicacionesUsuarios(reloj=reloj, persistir_cada_s=0)
+    for _ in range(3):
+        assert cache.registrar(7, -12.05, -77.04) is True
+        cache.marcar_persistida(7)
+
+    cache = UbicacionesUsuarios(reloj=reloj, persistir_cada_s=60)
+    assert cache.registrar(7, -12.05, -77.04) is True
+    cache.marcar_persistida(7)
+
+    reloj.t += 5
+    assert cache.registrar(7, -12.0501, -77.0401) is False   # ~15 m
+    assert cache.registrar(7, -12.06, -77.04) is True         # ~1.1 km
+    cache.marcar_persistida(7)
+
+    reloj.t += 60
+    assert cache.registrar(7, -12.06, -77.04) is True
+
+
+def test_commit_de_otra_columna_no_pisa_la_ubicacion_reciente(reloj):
+    """TC3: Un commit de usuario_base con la ubicación ya persistida no reemplaza la más nueva en memoria"""
+    cache = UbicacionesUsuarios(reloj=reloj)
+    cache.registrar(7, -12.05, -77.04, fuente="bd")
+    cache.registrar(7, -12.051, -77.041)
+    cache.aplicar_cambios([("update", None, {"id_usuario": 7, "ubicacion_actual_lat": -12.05, "ubicacion_actual_lng": -77.04})])
+    assert cache.obtener(7)["lat"] == -12.051
+
+    cache.aplicar_cambios([("update", None, {"id_usuario": 7, "ubicacion_actual_lat": -12.2, "ubicacion_actual_lng": -77.1})])
+    assert cache.obtener(7)["fuente"] == "bd"
+    cache.aplicar_cambios([("delete", None, {"id_usuario": 7})])
+    assert cache.obtener(7) is None
+
+
+def test_filtro_usa_la_ubicacion_en_cache(mock_db, reloj):
+    """TC4: El filtro por distancia lee la ubicación de la caché; sin ella consulta la BD una sola vez"""
+    cache = UbicacionesUsuarios(reloj=reloj)
+    usuario = SimpleNamespace(id_usuario=7, id_tipo_usuario=1, ubicacion_actual_lat=None, ubicacion_actual_lng=None)
+    mock_db.query.return_value.filter.return_value.first.return_value = usuario
+
+    with patch("services.usuario_service.get_ubicaciones_usuarios", return_value=cache), \
+         patch("services.usuario_service.get_indice_pasajeros"), \
+         patch("services.DiagramaClases.ruta_service.get_ubicaciones_usuarios", return_value=cache):
+        resultado = UsuarioService(mock_db).actualizar_ubicacion(7, -12.05, -77.04)
+        assert resultado["persistida"] is True
+        assert (usuario.ubicacion_actual_lat, usuario.ubicacion_actual_lng) == (-12.05, -77.04)
+
+        mock_db.query.reset_mock()
+        servicio = RutaService(mock_db)
+        assert servicio._obtener_ubicacion_usuario(7) == (-12.05, -77.04)
+        assert mock_db.query.call_count == 0
+
+        # Usuario sin entrada en caché: una consulta y luego queda guardado
+        mock_db.query.return_value.filter.return_value.first.return_value = SimpleNamespace(
+            id_tipo_usuario=1, ubicacion_actual_lat=-12.1, ubicacion_actual_lng=-77.0
+        )
+        assert servicio._obtener_ubicacion_usuario(8) == (-12.1, -77.0)
+        assert servicio._obtener_ubicacion_usuario(8) == (-12.1, -77.0)
+        assert mock_db.query.call_count == 1
+        # usuario_base no dice cuándo se registró: la edad es desconocida
+        assert cache.obtener(8)["edad_s"] is None
+        assert cache.obtener(8, max_edad_s=60) is None
+        assert cache.obtener(7)["edad_s"] == 0
+        assert servicio._obtener_ubicacion_usuario(None) is None
+
+
+def test_distancia_sin_usuario_es_error():
+    """TC5: /ruta/filtrar con distancia y sin usuario_id responde 400 en lugar de no filtrar"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from config.db import get_db
+    from routes.ruta_routes import router
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = lambda: MagicMock()
+
+    respuesta = TestClient(app).get("/ruta/filtrar", params={"distancia": 2})
+    assert respuesta.status_code == 400
+    assert "usuario_id" in respuesta.json()["detail"]
+
+
+def test_distancia_sin_ubicacion_es_404(reloj):
+    """TC6: /ruta/filtrar con distancia para un usuario sin ubicación responde 404 en lugar de no filtrar"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from config.db import get_db
+    from routes.ruta_routes import router
+
+    db = MagicMock()
+    db.query.return_value.filter.return_value.first.return_value = None
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = lambda: db
+
+    with patch("services.DiagramaClases.ruta_service.get_catalogo_rutas"), \
+         patch("services.DiagramaClases.ruta_service.get_ubicaciones_usuarios",
+               return_value=UbicacionesUsuarios(reloj=reloj)):
+        respuesta = TestClient(app).get("/ruta/filtrar", params={"distancia": 2, "usuario_id": 99})
+    assert respuesta.status_code == 404
+    assert "99" in respuesta.json()["detail"]